@@ -3,10 +3,10 @@ import subprocess
 import shutil
 from pathlib import Path
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 import uvicorn
 from datetime import datetime
@@ -15,19 +15,80 @@ import httpx
 import logging
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
-import base64
 import json
 import mimetypes
 import re
+import asyncio
+import time
 
 # 加载 .env 文件
 load_dotenv()
 
 # R2 上传模块
-from scripts.r2_upload import upload_pptx_to_r2, check_r2_config
+from scripts.r2_upload import check_r2_config, get_upload_stats, create_presigned_put, download_file_from_r2, R2_PRESIGN_EXPIRES
+from scripts.artifact_store import artifact_store, Artifact
 
 # 任务队列模块
-from scripts.task_queue import task_queue, TaskStatus
+from scripts.task_queue import task_queue, TaskStatus, report_progress
+
+# LLM 响应缓存模块
+from scripts.llm_cache import llm_cache, make_cache_key, hash_bytes
+
+# 布局 JSON 精简模块
+from scripts.layout_distiller import distill_layout_text, LAYOUT_DETAIL_LEVEL, DETAIL_LEVELS
+
+# Prompt token 估算与图片编码模块
+from scripts.token_budget import estimate_prompt_tokens, estimate_messages_tokens
+from scripts.image_prep import get_image_size, get_image_profile, encode_image_data_url, get_stats as get_image_prep_stats
+
+# LLM 对冲请求模块
+from scripts.llm_hedge import hedge_policy
+
+# Prompt 注册表模块
+from scripts.prompt_registry import prompt_registry
+
+# 整套幻灯片共享主题模块
+from scripts.deck_theme import extract_theme, theme_css, theme_instruction, inject_theme_css
+
+# 版式模板检索模块
+from scripts.template_index import template_index
+
+# 简单页规则生成模块
+from scripts.simple_slide import slide_router, render_simple_slide
+
+# HTML 后处理模块
+from scripts.html_postprocess import postprocess_html, local_html_path
+
+# HTML 转换前校验模块
+from scripts.html_validator import html_validator, HTMLValidationError
+
+# 常驻 PPTX 转换进程模块
+from scripts.pptx_worker import pptx_worker, PptxWorkerUnavailable
+
+# PPTX 转换结果缓存模块
+from scripts.pptx_cache import pptx_cache
+
+# 纯 Python PPTX 转换模块
+from scripts.py_converter import py_converter
+
+# PPTX 合并模块
+from scripts.pptx_merge import pptx_merger, PptxMergeError
+
+# PPTX 上传前优化模块
+from scripts.pptx_optimizer import pptx_optimizer
+
+# 输入图片流式接收模块
+from scripts.image_ingest import ingest_upload, ingest_url, check_image_file, ImageIngestError, get_stats as get_ingest_stats
+
+# 输入图片预计算模块（内容哈希、尺寸、感知哈希、LLM 派生图、缩略图）
+from scripts.image_meta import image_precomputer, image_content_hash, load_image_meta, thumbnail_path
+
+# LLM 限流模块
+from scripts.rate_limiter import (
+    llm_rate_limiter, parse_retry_after, backoff_delay,
+    RETRYABLE_STATUS_CODES, LLM_MAX_RETRIES, LLM_EXPECTED_COMPLETION_TOKENS,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH,
+)
 
 # ============ 环境配置 ============
 # 环境标识：development / production
@@ -105,12 +166,27 @@ if not logger.handlers:
 
 # OpenRouter 配置
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# 可覆盖为本地桩服务（scripts/stub_llm_server.py）进行联调
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 # 默认模型配置：用于 HTML 生成
 # 可通过环境变量 DEFAULT_MODEL 覆盖，或在请求时通过 model 参数指定
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "openrouter/bert-nebulon-alpha")
 
+# HTML 生成的 LLM 采样参数（同时参与缓存键计算）
+LLM_TEMPERATURE = 0.7
+LLM_MAX_TOKENS = 16000
+
+# 输出被截断（finish_reason=length 或缺少 </html>）时最多追加的续写请求轮数
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+
+# Prompt token 预算（0 表示不限制）：超出时自动精简布局 JSON、去掉冗余 Markdown、缩小图片
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+# 超出预算时图片依次尝试的最长边（像素）
+PROMPT_IMAGE_DOWNSCALE_STEPS = [
+    int(x) for x in os.getenv("PROMPT_IMAGE_DOWNSCALE_STEPS", "1568,1024,768").split(",") if x.strip()
+]
+
 # 静态资源基础 URL（用于在 HTML 中生成可被前端访问的绝对图片地址）
 _host_env = os.getenv("HOST", "0.0.0.0")
 _port_env = os.getenv("PORT", "8000")
@@ -142,6 +218,19 @@ print(f"=" * 50)
 # ============ 任务队列配置 ============
 MAX_GPU_WORKERS = int(os.getenv("MAX_GPU_WORKERS", "3"))  # 最大并发 GPU 任务数
 
+# 整套幻灯片（/decks）配置
+DECK_MAX_SLIDES = int(os.getenv("DECK_MAX_SLIDES", "100"))
+DECK_SLIDE_CONCURRENCY = int(os.getenv("DECK_SLIDE_CONCURRENCY", "3"))  # 单个 deck 内并发处理的页数
+DECK_CONVERT_TIMEOUT_BASE = int(os.getenv("DECK_CONVERT_TIMEOUT_BASE", "60"))  # 多页转换超时 = 基础 + 每页 × 页数（秒）
+DECK_CONVERT_TIMEOUT_PER_SLIDE = int(os.getenv("DECK_CONVERT_TIMEOUT_PER_SLIDE", "30"))
+# 默认是否启用共享主题（逐页只生成页面特有的标记），可在请求中通过 shared_theme 覆盖
+DECK_SHARED_THEME = os.getenv("DECK_SHARED_THEME", "false").lower() == "true"
+
+# 输入图片大小上限（/upload、URL 下载、预签名直传的对象）
+INPUT_MAX_MB = int(os.getenv("INPUT_MAX_MB", "20"))
+# 预签名直传的输入图片（POST /upload/presign）：对象键与本地路径一致，input/{date}/{uuid}.ext
+INPUT_OBJECT_KEY_PATTERN = re.compile(r"^input/\d{4}-\d{2}-\d{2}/[0-9a-f-]{36}\.[A-Za-z0-9]{1,5}$")
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -149,14 +238,19 @@ async def startup_event():
     task_queue.max_workers = MAX_GPU_WORKERS
     await task_queue.start()
     task_queue.register_handler("gpu_ocr_full", process_gpu_ocr_task)
+    task_queue.register_handler("deck", process_deck_task)
     logger.info(f"[TaskQueue] 已启动，最大并发: {MAX_GPU_WORKERS}")
+    pptx_worker.tmp_dir = TEMP_DIR
+    await pptx_worker.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """应用关闭时停止任务队列"""
+    """应用关闭时停止任务队列和常驻转换进程，等待未完成的后台上传"""
     await task_queue.stop()
     logger.info("[TaskQueue] 已停止")
+    await pptx_worker.stop()
+    await artifact_store.stop()
 
 
 class ProcessRequest(BaseModel):
@@ -167,22 +261,34 @@ class CloudOcrRequest(BaseModel):
     """请求体：云端 OCR（输入公开图片 URL）"""
     file_url: str  # 图片的公开 URL（如 R2 URL）
     model: Optional[str] = "google/gemini-2.5-flash"  # LLM 模型（用于后续 HTML 生成）
+    no_cache: Optional[bool] = False  # 跳过 LLM 响应缓存，强制重新生成
+    template_scope: Optional[str] = None  # 版式模板作用域（如用户 ID），提供时才读写模板索引
 
 
 class SlideHtmlRequest(BaseModel):
     image_path: str
     model: Optional[str] = None  # 不传则使用 DEFAULT_MODEL
+    no_cache: Optional[bool] = False  # 跳过 LLM 响应缓存，强制重新生成
+    template_scope: Optional[str] = None  # 版式模板作用域（如用户 ID），提供时才读写模板索引
 
 
 class SlidePptxRequest(BaseModel):
     """请求体：HTML 转换为 PPTX"""
     html_file_path: str  # HTML 文件相对路径，如 output/2025-11-24/uuid/uuid/auto/uuid.html
     output_filename: Optional[str] = None  # 可选的输出文件名
+    no_cache: Optional[bool] = False  # 跳过转换结果缓存，强制重新转换
+
+
+class SlideMergeRequest(BaseModel):
+    """请求体：合并多个已生成的 PPTX"""
+    pptx_file_paths: List[str]  # PPTX 相对路径（按页序），如 output/2025-11-24/uuid/uuid/auto/uuid.pptx
+    output_filename: Optional[str] = None  # 可选的输出文件名
 
 
 class SlidePromptPreviewRequest(BaseModel):
     """请求体：预览 Prompt"""
     image_path: str  # 图片路径，格式: input/YYYY-MM-DD/UUID.ext
+    layout_detail: Optional[str] = None  # 布局 JSON 精简级别：full / lines / blocks / minimal，不传则使用 LAYOUT_DETAIL_LEVEL
 
 
 class GpuOcrRequest(BaseModel):
@@ -203,16 +309,46 @@ class GpuOcrFullRequest(BaseModel):
     model: Optional[str] = None  # LLM 模型（用于 HTML 生成）
     enable_table: Optional[bool] = False
     enable_formula: Optional[bool] = False
+    no_cache: Optional[bool] = False  # 跳过 LLM 响应缓存，强制重新生成
+    template_scope: Optional[str] = None  # 版式模板作用域（如用户 ID），提供时才读写模板索引
 
 
 class AsyncTaskRequest(BaseModel):
-    """请求体：异步任务提交"""
-    file_url: str  # 图片的公开 URL
+    """请求体：异步任务提交（file_url 或 object_key 二选一）"""
+    file_url: Optional[str] = None  # 图片的公开 URL
+    object_key: Optional[str] = None  # 或者：通过 POST /upload/presign 直传的对象键，格式: input/YYYY-MM-DD/UUID.ext
+    backend: Optional[str] = "vlm-transformers"
+    lang: Optional[str] = "ch"
+    model: Optional[str] = None
+    enable_table: Optional[bool] = False
+    enable_formula: Optional[bool] = False
+    no_cache: Optional[bool] = False
+    template_scope: Optional[str] = None  # 版式模板作用域（如用户 ID），提供时才读写模板索引
+
+
+class DeckSlideSource(BaseModel):
+    """整套幻灯片中的单页输入：file_url 或 file_path 二选一"""
+    file_url: Optional[str] = None  # 图片的公开 URL
+    file_path: Optional[str] = None  # 或者：已上传的本地文件路径，格式: input/YYYY-MM-DD/UUID.ext
+    object_key: Optional[str] = None  # 或者：通过 POST /upload/presign 直传的对象键
+
+
+class PresignUploadRequest(BaseModel):
+    """请求体：申请输入图片的预签名上传 URL"""
+    content_type: str  # 图片 MIME 类型，上传时 Content-Type 请求头必须一致
+    filename: Optional[str] = None  # 原文件名（用于确定扩展名）
+
+
+class DeckRequest(BaseModel):
+    """请求体：整套幻灯片（多张图片 → 一个多页 PPTX）"""
+    slides: List[DeckSlideSource]  # 按页序排列
     backend: Optional[str] = "vlm-transformers"
     lang: Optional[str] = "ch"
     model: Optional[str] = None
     enable_table: Optional[bool] = False
     enable_formula: Optional[bool] = False
+    no_cache: Optional[bool] = False
+    shared_theme: Optional[bool] = None  # 共享主题模式，不传则使用 DECK_SHARED_THEME
 
 
 # GPU OCR 配置
@@ -231,11 +367,17 @@ async def root():
             "POST /ocr/process-cloud": "云端 OCR 一键处理",
             "POST /ocr/process-gpu": "GPU OCR 处理（VLM 后端，高精度）",
             "POST /ocr/process-gpu-full": "GPU OCR 一键处理（OCR + HTML + PPTX）",
+            "POST /upload/presign": "申请预签名 URL，直接上传图片到对象存储",
+            "GET /upload/{date}/{uuid}/meta": "查询上传图片的预计算结果",
+            "GET /upload/{date}/{uuid}/thumbnail": "获取上传图片的缩略图",
             "POST /tasks/submit": "提交异步 OCR 任务（返回 task_id）",
             "GET /tasks/{task_id}": "查询任务状态",
             "GET /tasks/queue/status": "查询队列状态",
+            "POST /decks": "提交整套幻灯片任务（多张图片 → 一个多页 PPTX，返回 task_id）",
             "POST /slides/html": "生成 HTML Slides",
             "POST /slides/pptx": "将 HTML 转换为 PPTX",
+            "POST /slides/merge": "合并多个已生成的 PPTX",
+            "GET /artifacts/{file_uuid}": "查询 PPTX 下载链接和 R2 上传状态",
             "POST /slides/preview-prompt": "预览 LLM Prompt",
             "GET /health": "健康检查"
         }
@@ -256,6 +398,23 @@ async def health():
         "mineru_path": mineru_path,
         "static_base_url": STATIC_BASE_URL,
         "task_queue": queue_status,
+        "llm_cache": llm_cache.get_stats(),
+        "llm_hedge": hedge_policy.get_stats(),
+        "llm_rate_limit": llm_rate_limiter.get_stats(),
+        "llm_image": get_image_prep_stats(),
+        "image_ingest": get_ingest_stats(),
+        "image_meta": image_precomputer.get_stats(),
+        "prompt_registry": prompt_registry.get_stats(),
+        "template_index": template_index.get_stats(),
+        "slide_router": slide_router.get_stats(),
+        "html_validator": html_validator.get_stats(),
+        "pptx_worker": pptx_worker.get_stats(),
+        "pptx_cache": pptx_cache.get_stats(),
+        "py_converter": py_converter.get_stats(),
+        "pptx_merge": pptx_merger.get_stats(),
+        "pptx_optimizer": pptx_optimizer.get_stats(),
+        "artifacts": artifact_store.get_stats(),
+        "r2": {**check_r2_config(), "uploads": get_upload_stats()},
     }
 
 
@@ -268,15 +427,23 @@ async def submit_task(request: AsyncTaskRequest):
     
     返回 task_id，可通过 GET /tasks/{task_id} 查询状态
     """
+    if not request.file_url and not request.object_key:
+        raise HTTPException(status_code=400, detail="必须提供 file_url 或 object_key")
+    if request.object_key and not INPUT_OBJECT_KEY_PATTERN.match(request.object_key):
+        raise HTTPException(status_code=400, detail=f"object_key 格式错误: {request.object_key}")
+    
     task_id = str(uuid_lib.uuid4())
     
     params = {
         "file_url": request.file_url,
+        "object_key": request.object_key,
+        "template_scope": request.template_scope,
         "backend": request.backend or GPU_OCR_BACKEND,
         "lang": request.lang,
         "model": request.model or DEFAULT_MODEL,
         "enable_table": request.enable_table,
         "enable_formula": request.enable_formula,
+        "no_cache": request.no_cache,
     }
     
     try:
@@ -297,6 +464,60 @@ async def submit_task(request: AsyncTaskRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/decks")
+async def submit_deck(request: DeckRequest):
+    """
+    提交整套幻灯片任务
+    
+    每页并发执行 OCR + HTML 生成，全部完成后一次转换为多页 PPTX 并上传。
+    返回 task_id，可通过 GET /tasks/{task_id} 查询状态和逐页进度（progress 字段）
+    """
+    if not request.slides:
+        raise HTTPException(status_code=400, detail="slides 不能为空")
+    if len(request.slides) > DECK_MAX_SLIDES:
+        raise HTTPException(status_code=400, detail=f"页数超过上限 ({DECK_MAX_SLIDES})")
+    for i, source in enumerate(request.slides):
+        if not source.file_url and not source.file_path and not source.object_key:
+            raise HTTPException(status_code=400, detail=f"第 {i + 1} 页必须提供 file_path、file_url 或 object_key")
+        if source.object_key and not INPUT_OBJECT_KEY_PATTERN.match(source.object_key):
+            raise HTTPException(status_code=400, detail=f"第 {i + 1} 页 object_key 格式错误: {source.object_key}")
+        if source.file_path and not source.file_url:
+            if not (BASE_DIR / source.file_path).resolve().is_relative_to(INPUT_DIR.resolve()):
+                raise HTTPException(status_code=400, detail=f"第 {i + 1} 页 file_path 必须位于 input/ 目录下: {source.file_path}")
+            if not (BASE_DIR / source.file_path).is_file():
+                raise HTTPException(status_code=404, detail=f"文件不存在: {source.file_path}")
+    
+    task_id = str(uuid_lib.uuid4())
+    
+    params = {
+        "slides": [source.model_dump() for source in request.slides],
+        "backend": request.backend or GPU_OCR_BACKEND,
+        "lang": request.lang,
+        "model": request.model or DEFAULT_MODEL,
+        "enable_table": request.enable_table,
+        "enable_formula": request.enable_formula,
+        "no_cache": request.no_cache,
+        "shared_theme": DECK_SHARED_THEME if request.shared_theme is None else request.shared_theme,
+    }
+    
+    try:
+        task = await task_queue.submit(task_id, "deck", params)
+        queue_status = task_queue.get_queue_status()
+        
+        return JSONResponse(content={
+            "success": True,
+            "task_id": task_id,
+            "status": task.status.value,
+            "message": "整套幻灯片任务已提交",
+            "slide_count": len(request.slides),
+            "queue_position": queue_status["queue_size"],
+        })
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/tasks/queue/status")
 async def get_queue_status():
     """获取任务队列状态"""
@@ -315,58 +536,82 @@ async def get_task_status(task_id: str):
     if not task:
         raise HTTPException(status_code=404, detail=f"任务不存在: {task_id}")
     
-    return JSONResponse(content=task.to_dict())
+    # 后台上传完成后返回 R2 链接
+    data = task.to_dict()
+    data["result"] = artifact_store.resolve_result(data["result"])
+    return JSONResponse(content=data)
 
 
-async def process_gpu_ocr_task(params: dict) -> dict:
+@app.get("/artifacts/{file_uuid}")
+async def get_artifact(file_uuid: str):
     """
-    GPU OCR 任务处理函数（供任务队列调用）
+    查询 PPTX 下载链接
     
-    与 /ocr/process-gpu-full 端点相同的处理逻辑
+    background 上传模式下先返回本地链接，R2 上传完成后 download_url 变为 R2 链接（status=uploaded）
     """
-    file_url = params["file_url"]
-    backend = params["backend"]
-    lang = params["lang"]
-    model = params["model"]
-    enable_table = params["enable_table"]
-    enable_formula = params["enable_formula"]
+    artifact = artifact_store.get(file_uuid)
     
-    # 生成文件标识
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    file_uuid = str(uuid_lib.uuid4())
-    
-    logger.info(f"[Task] 开始处理: {file_url}")
-    
-    # 下载图片
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.get(file_url)
-        if response.status_code != 200:
-            raise Exception(f"下载图片失败: HTTP {response.status_code}")
-        image_data = response.content
+    if not artifact:
+        raise HTTPException(status_code=404, detail=f"产物不存在: {file_uuid}")
     
-    # 确定文件扩展名
-    content_type = response.headers.get("content-type", "image/png")
-    ext = mimetypes.guess_extension(content_type) or ".png"
-    if ext == ".jpe":
-        ext = ".jpg"
-    
-    # 保存到本地
-    save_dir = INPUT_DIR / date_str
-    save_dir.mkdir(parents=True, exist_ok=True)
-    filename = f"{file_uuid}{ext}"
-    input_file_path = save_dir / filename
+    return JSONResponse(content=artifact.to_dict())
+
+
+async def download_input_image(file_url: str, date_str: str, file_uuid: str) -> Path:
+    """流式下载公开 URL 的图片并保存到 input/{date}/{uuid}.ext（扩展名按文件头识别）"""
+    ingested = await ingest_url(file_url, INPUT_DIR / date_str, file_uuid, INPUT_MAX_MB * 1024 * 1024)
+    image_precomputer.submit(ingested.path, ingested.sha256)
+    return ingested.path
+
+
+async def fetch_input_object(object_key: str) -> Path:
+    """
+    把直传到对象存储的输入图片流式下载到 input/{date}/{uuid}.ext（已存在时直接复用）
     
-    with open(input_file_path, "wb") as f:
-        f.write(image_data)
+    预签名 PUT 无法限制上传内容，下载后按文件头检查真实类型，检查通过才放到正式路径
     
-    logger.info(f"[Task] 图片已保存: {input_file_path}")
+    Raises:
+        ImageIngestError: 不是支持的图片格式（415）
+    """
+    if not INPUT_OBJECT_KEY_PATTERN.match(object_key):
+        raise ValueError(f"object_key 格式错误: {object_key}")
+    input_file_path = BASE_DIR / object_key
+    if input_file_path.is_file():
+        return input_file_path
+    download_path = input_file_path.with_name(f".{input_file_path.name}.check")
+    try:
+        await asyncio.to_thread(download_file_from_r2, object_key, download_path, INPUT_MAX_MB * 1024 * 1024)
+        check_image_file(download_path)
+        os.replace(download_path, input_file_path)
+    finally:
+        if download_path.exists():
+            download_path.unlink()
+    image_precomputer.submit(input_file_path)
+    return input_file_path
+
+
+async def run_slide_ocr(
+    input_file_path: Path,
+    date_str: str,
+    file_uuid: str,
+    backend: str,
+    lang: str,
+    enable_table: bool = False,
+    enable_formula: bool = False,
+    log_prefix: str = "[Task]",
+) -> dict:
+    """
+    单页 OCR：GPU OCR → 简化文件命名 → 定位输出文件
     
+    Returns:
+        {"vlm_dir", "md_path", "json_path", "renamed_images"}
+    """
     # 构建输出路径
     output_dir = OUTPUT_DIR / date_str / file_uuid
     output_dir.mkdir(parents=True, exist_ok=True)
     
     # Step 1: GPU OCR
-    ocr_result = await run_mineru_gpu(
+    await run_mineru_gpu(
         str(input_file_path),
         str(output_dir),
         backend=backend,
@@ -375,7 +620,7 @@ async def process_gpu_ocr_task(params: dict) -> dict:
         enable_formula=enable_formula,
     )
     
-    logger.info(f"[Task] OCR 完成")
+    logger.info(f"{log_prefix} OCR 完成")
     
     # Step 2: 简化文件命名
     rename_mapping = simplify_ocr_output(output_dir)
@@ -398,62 +643,121 @@ async def process_gpu_ocr_task(params: dict) -> dict:
     if not json_path.exists():
         raise Exception(f"OCR JSON 文件不存在: {json_path}")
     
-    # 读取系统提示词
-    system_prompt_path = BASE_DIR / "system_prompt.md"
-    if system_prompt_path.exists():
-        system_prompt = system_prompt_path.read_text(encoding="utf-8").strip()
-    else:
-        system_prompt = "You are an AI assistant that generates HTML slides."
+    return {
+        "vlm_dir": vlm_dir,
+        "md_path": md_path,
+        "json_path": json_path,
+        "renamed_images": len(rename_mapping),
+    }
+
+
+async def generate_slide_html_from_ocr(
+    ocr: dict,
+    input_file_path: Path,
+    date_str: str,
+    file_uuid: str,
+    image_url: Optional[str],
+    model: str,
+    no_cache: bool = False,
+    priority: str = PRIORITY_BATCH,
+    log_prefix: str = "[Task]",
+    deck_theme_css: Optional[str] = None,
+    template_scope: Optional[str] = None,
+) -> dict:
+    """
+    根据 OCR 结果调用 LLM 生成 HTML 并保存
+    
+    Args:
+        ocr: run_slide_ocr 的返回值
+        image_url: 发送给 LLM 的公开图片 URL，为 None 时使用本地原图
+        deck_theme_css: 整套幻灯片的共享主题 CSS；提供时 LLM 只输出页面特有的样式和标记，
+                        主题 CSS 在转换前校验之前注入 <head>
+        template_scope: 版式模板作用域（见 generate_cleaned_html）
+        
+    Returns:
+        {"html_file_path", "vlm_dir", "usage", "llm_cache_hit", "token_report", "template", "route", "renamed_images"}
+    """
+    # 读取系统提示词（注册表缓存，文件修改后自动重新加载）
+    system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
     
     # 读取 Markdown 和 JSON
-    md_text = md_path.read_text(encoding="utf-8")
-    layout_json = json.load(open(json_path, "r", encoding="utf-8"))
+    md_text = ocr["md_path"].read_text(encoding="utf-8")
+    layout_json = json.load(open(ocr["json_path"], "r", encoding="utf-8"))
     
-    # 使用原始公开 URL 发送给 LLM
-    image_url_for_llm = file_url
+    # Step 4: 生成 HTML（模板命中时跳过 LLM；有公开 URL 时发送 URL，本地副本用于估算 token 和缩图）
+    logger.info(f"{log_prefix} 开始生成 HTML...")
     
-    # 构建消息
-    messages = build_slide_messages(system_prompt, md_text, layout_json, image_url_for_llm)
+    generated = await generate_cleaned_html(
+        system_prompt, md_text, layout_json, model, "ReDeck GPU OCR", image_content_hash(input_file_path),
+        image_url=image_url, image_path=input_file_path, no_cache=no_cache, priority=priority,
+        extra_instruction=theme_instruction(deck_theme_css) if deck_theme_css else None,
+        template_scope=template_scope, deck_theme_css=deck_theme_css,
+    )
     
-    # Step 4: 调用 LLM 生成 HTML
-    logger.info(f"[Task] 开始生成 HTML...")
+    # 保存 HTML 文件（公开版 + 转换版；共享主题 CSS 已在校验前注入）
+    html_file_path = ocr["vlm_dir"] / f"{file_uuid}.html"
+    save_slide_html(generated["html"], html_file_path, date_str, file_uuid, backend="vlm")
     
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 16000,
-    }
+    logger.info(f"{log_prefix} HTML 生成完成")
     
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": HTTP_REFERER,
-        "X-Title": "ReDeck GPU OCR",
+    return {
+        "html_file_path": html_file_path,
+        "vlm_dir": ocr["vlm_dir"],
+        "usage": generated["usage"],
+        "llm_cache_hit": generated["llm_cache_hit"],
+        "token_report": generated["token_report"],
+        "template": generated["template"],
+        "route": generated["route"],
+        "renamed_images": ocr["renamed_images"],
     }
+
+
+async def generate_slide_html_from_image(
+    input_file_path: Path,
+    date_str: str,
+    file_uuid: str,
+    image_url: Optional[str],
+    backend: str,
+    lang: str,
+    model: str,
+    enable_table: bool = False,
+    enable_formula: bool = False,
+    no_cache: bool = False,
+    priority: str = PRIORITY_BATCH,
+    log_prefix: str = "[Task]",
+    template_scope: Optional[str] = None,
+) -> dict:
+    """
+    单页处理流程：GPU OCR → 简化文件命名 → 调用 LLM 生成 HTML 并保存
     
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
-        
-        if response.status_code != 200:
-            raise Exception(f"LLM API 错误: {response.text}")
+    Args:
+        input_file_path: 本地原图路径
+        date_str / file_uuid: 输出目录 output/{date}/{uuid}
+        image_url: 发送给 LLM 的公开图片 URL，为 None 时使用本地原图
         
-        result = response.json()
-        html_content = result["choices"][0]["message"]["content"]
-        usage = result.get("usage", {})
-    
-    # 清理和处理 HTML
-    cleaned_html = clean_html_from_markdown_code_block(html_content)
-    final_html = replace_html_image_paths(cleaned_html, date_str, file_uuid, backend="vlm")
-    
-    # 保存 HTML 文件
-    html_file_path = vlm_dir / f"{file_uuid}.html"
-    html_file_path.write_text(final_html, encoding="utf-8")
+    Returns:
+        {"html_file_path", "vlm_dir", "usage", "llm_cache_hit", "token_report", "template", "route", "renamed_images"}
+    """
+    ocr = await run_slide_ocr(
+        input_file_path, date_str, file_uuid, backend, lang,
+        enable_table=enable_table, enable_formula=enable_formula, log_prefix=log_prefix,
+    )
+    return await generate_slide_html_from_ocr(
+        ocr, input_file_path, date_str, file_uuid, image_url, model,
+        no_cache=no_cache, priority=priority, log_prefix=log_prefix, template_scope=template_scope,
+    )
+
+
+def run_pptx_converter_cli(html_files: List[Path], output_pptx_path: Path, timeout: int = 120) -> dict:
+    """
+    一次性调用 Node 转换脚本（常驻转换进程不可用时的回退路径）
     
-    logger.info(f"[Task] HTML 生成完成")
+    Args:
+        html_files: 转换版 HTML 路径（见 converter_html_path）
     
-    # Step 5: 转换为 PPTX
-    output_pptx_path = vlm_dir / f"{file_uuid}.pptx"
+    Returns:
+        转换脚本输出的 JSON 结果
+    """
     scripts_dir = BASE_DIR / "scripts"
     converter_script = scripts_dir / "convert-html-to-pptx.js"
     
@@ -463,7 +767,7 @@ async def process_gpu_ocr_task(params: dict) -> dict:
     cmd = [
         "node",
         str(converter_script),
-        str(html_file_path),
+        *[str(p) for p in html_files],
         str(output_pptx_path),
         "--tmp-dir", str(TEMP_DIR)
     ]
@@ -475,24 +779,121 @@ async def process_gpu_ocr_task(params: dict) -> dict:
         encoding='utf-8',
         errors='replace',
         cwd=str(scripts_dir),
-        timeout=120
+        timeout=timeout
     )
     
+    # 转换脚本的结果 JSON 在最后一行（之前是预处理日志）
+    stdout_lines = (process.stdout or '').strip().splitlines()
+    
     if process.returncode != 0:
         stderr = process.stderr or process.stdout or "转换失败"
         raise Exception(f"PPTX 转换失败: {stderr[:500]}")
     
+    try:
+        return json.loads(stdout_lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"success": True}
+
+
+async def convert_html_files_to_pptx(
+    html_files: List[Path], output_pptx_path: Path, timeout: int = 120, no_cache: bool = False
+) -> dict:
+    """
+    将一个或多个 HTML 按顺序转换为同一个 PPTX（每个 HTML 一页）
+    
+    HTML 和引用的图片都没变时直接复用上次的结果（见 scripts/pptx_cache.py）；
+    几何可以静态确定的页面直接用 python-pptx 生成（见 scripts/py_converter.py）；
+    否则交给常驻转换进程（浏览器和页面已预热），进程无法启动时回退到一次性 CLI 转换
+    
+    Returns:
+        转换结果 JSON（含 placeholders；命中缓存时 cache_hit 为 True）
+    """
+    converter_files = [converter_html_path(p) for p in html_files]
+    cache_key = None
+    if pptx_cache.enabled and not no_cache:
+        cache_key = await asyncio.to_thread(pptx_cache.make_key, converter_files)
+        cached = await asyncio.to_thread(pptx_cache.get, cache_key, output_pptx_path)
+        if cached is not None:
+            logger.info(f"[PptxCache] 命中: {output_pptx_path.name} ({len(html_files)} 页)")
+            return {**cached, "cache_hit": True}
+    
+    start = time.time()
+    result = await asyncio.to_thread(py_converter.try_convert, converter_files, output_pptx_path)
+    if result is None:
+        try:
+            result = await pptx_worker.convert(converter_files, output_pptx_path, timeout=timeout)
+        except PptxWorkerUnavailable as e:
+            logger.info(f"[PptxWorker] {e}，使用一次性 CLI 转换")
+            result = await asyncio.to_thread(run_pptx_converter_cli, converter_files, output_pptx_path, timeout)
+    
     if not output_pptx_path.exists():
         raise Exception("PPTX 文件生成失败")
+    elapsed = time.time() - start
+    html_validator.record_conversion(elapsed, len(html_files))
+    if cache_key:
+        await asyncio.to_thread(pptx_cache.set, cache_key, output_pptx_path, result, elapsed)
+    return {**result, "cache_hit": False}
+
+
+async def publish_pptx(output_pptx_path: Path, date_str: str, file_uuid: str, log_prefix: str = "[Task]") -> Artifact:
+    """
+    发布 PPTX（见 scripts/artifact_store.py）
+
+    sync 模式等待 R2 上传，失败时使用本地静态链接；background 模式立即返回本地静态链接，
+    R2 链接在后台上传成功后可通过 GET /artifacts/{file_uuid} 或 GET /tasks/{task_id} 获取
+    """
+    pptx_relative_path = str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/")
+    local_url = f"{STATIC_BASE_URL.rstrip('/')}/static/{pptx_relative_path}"
+    return await artifact_store.publish(output_pptx_path, date_str, file_uuid, local_url, log_prefix)
+
+
+async def process_gpu_ocr_task(params: dict) -> dict:
+    """
+    GPU OCR 任务处理函数（供任务队列调用）
+    
+    与 /ocr/process-gpu-full 端点相同的处理逻辑
+    """
+    file_url = params.get("file_url")
+    object_key = params.get("object_key")
+    backend = params["backend"]
+    model = params["model"]
+    
+    logger.info(f"[Task] 开始处理: {object_key or file_url}")
+    
+    if object_key:
+        # 直传的对象：沿用对象键中的日期和 UUID，LLM 使用本地原图
+        input_file_path = await fetch_input_object(object_key)
+        date_str = input_file_path.parent.name
+        file_uuid = input_file_path.stem
+        file_url = None
+    else:
+        # 生成文件标识
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        file_uuid = str(uuid_lib.uuid4())
+        
+        # 下载图片
+        input_file_path = await download_input_image(file_url, date_str, file_uuid)
+    logger.info(f"[Task] 图片已保存: {input_file_path}")
+    
+    # Step 1-4: OCR + HTML 生成（使用原始公开 URL 发送给 LLM）
+    slide = await generate_slide_html_from_image(
+        input_file_path, date_str, file_uuid, file_url,
+        backend=backend,
+        lang=params["lang"],
+        model=model,
+        enable_table=params["enable_table"],
+        enable_formula=params["enable_formula"],
+        no_cache=params.get("no_cache", False),
+        template_scope=params.get("template_scope"),
+    )
+    
+    # Step 5: 转换为 PPTX
+    output_pptx_path = slide["vlm_dir"] / f"{file_uuid}.pptx"
+    await convert_html_files_to_pptx([slide["html_file_path"]], output_pptx_path)
     
     # 上传到 R2
-    pptx_relative_path = str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/")
-    try:
-        download_url = upload_pptx_to_r2(output_pptx_path, date_str, file_uuid)
-        logger.info(f"[Task] PPTX 已上传到 R2: {download_url}")
-    except Exception as e:
-        logger.warning(f"[Task] R2 上传失败，使用本地链接: {e}")
-        download_url = f"{STATIC_BASE_URL.rstrip('/')}/static/{pptx_relative_path}"
+    artifact = await publish_pptx(output_pptx_path, date_str, file_uuid)
+    download_url = artifact.download_url
     
     logger.info(f"[Task] 任务完成: {download_url}")
     
@@ -503,7 +904,186 @@ async def process_gpu_ocr_task(params: dict) -> dict:
         "backend": backend,
         "download_url": download_url,
         "model": model,
-        "usage": usage,
+        "usage": slide["usage"],
+        "llm_cache_hit": slide["llm_cache_hit"],
+        "token_report": slide["token_report"],
+    }
+
+
+async def process_deck_task(params: dict) -> dict:
+    """
+    整套幻灯片任务处理函数（供任务队列调用）
+    
+    1. 按 DECK_SLIDE_CONCURRENCY 并发对每页执行 OCR
+    2. 启用共享主题时，从样本页本地提取主题 CSS（不调用 LLM）
+    3. 并发生成每页 HTML（共享主题时只生成页面特有的标记）
+    4. 一次性转换为多页 PPTX 并只上传一次
+    同一输入在多页中重复出现时只处理一次，结果按页序复用
+    进度通过 report_progress 上报
+    """
+    slides = params["slides"]
+    backend = params["backend"]
+    model = params["model"]
+    total = len(slides)
+    
+    # 本地输入的输出目录由文件 UUID 决定，同一文件并发处理会互相覆盖，因此按输入去重
+    unique_sources: List[dict] = []
+    page_sources: List[int] = []   # 每页对应的 unique_sources 下标
+    seen_sources: Dict[tuple, int] = {}
+    for source in slides:
+        if source.get("file_url"):
+            key = ("url", source["file_url"])
+        else:
+            key = ("path", str((BASE_DIR / (source.get("file_path") or source["object_key"])).resolve()))
+        if key not in seen_sources:
+            seen_sources[key] = len(unique_sources)
+            unique_sources.append(source)
+        page_sources.append(seen_sources[key])
+    
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    deck_uuid = str(uuid_lib.uuid4())
+    
+    logger.info(f"[Deck] 开始处理: {deck_uuid}, 共 {total} 页")
+    
+    slide_states = [{"index": i, "status": "pending"} for i in range(total)]
+    report_progress(stage="ocr", total=total, completed=0, failed=0, slides=slide_states)
+    
+    semaphore = asyncio.Semaphore(DECK_SLIDE_CONCURRENCY)
+    
+    def update_state(index: int, **fields):
+        """更新 unique_sources[index] 对应的所有页"""
+        for page, source_index in enumerate(page_sources):
+            if source_index == index:
+                slide_states[page].update(fields)
+    
+    def fail(index: int, log_prefix: str, error: Exception):
+        logger.error(f"{log_prefix} 处理失败: {error}")
+        update_state(index, status="failed", error=str(error))
+        report_progress(failed=sum(1 for s in slide_states if s["status"] == "failed"))
+    
+    async def ocr_slide(index: int, source: dict) -> Optional[dict]:
+        async with semaphore:
+            update_state(index, status="ocr")
+            log_prefix = f"[Deck {deck_uuid[:8]} #{page_sources.index(index) + 1}]"
+            try:
+                if source.get("file_url"):
+                    file_uuid = str(uuid_lib.uuid4())
+                    input_file_path = await download_input_image(source["file_url"], date_str, file_uuid)
+                    slide_date = date_str
+                else:
+                    if source.get("object_key"):
+                        await fetch_input_object(source["object_key"])
+                    relative_path = source.get("file_path") or source["object_key"]
+                    input_file_path = BASE_DIR / relative_path
+                    if not input_file_path.is_file():
+                        raise FileNotFoundError(f"文件不存在: {relative_path}")
+                    # 沿用上传时的日期和 UUID 作为输出目录
+                    path_parts = Path(relative_path).parts
+                    slide_date = path_parts[1] if len(path_parts) >= 3 else date_str
+                    file_uuid = input_file_path.stem
+                
+                ocr = await run_slide_ocr(
+                    input_file_path, slide_date, file_uuid, backend, params["lang"],
+                    enable_table=params["enable_table"],
+                    enable_formula=params["enable_formula"],
+                    log_prefix=log_prefix,
+                )
+                update_state(index, status="ocr_done", file_uuid=file_uuid)
+                return {
+                    "ocr": ocr,
+                    "input_file_path": input_file_path,
+                    "date_str": slide_date,
+                    "file_uuid": file_uuid,
+                    "image_url": source.get("file_url"),
+                    "log_prefix": log_prefix,
+                }
+            except Exception as e:
+                fail(index, log_prefix, e)
+                return None
+    
+    ocr_results = await asyncio.gather(*(ocr_slide(i, source) for i, source in enumerate(unique_sources)))
+    
+    # 共享主题：从成功 OCR 的样本页提取（失败时退回逐页独立生成）
+    deck_css = None
+    theme = None
+    ready = [r for r in ocr_results if r is not None]
+    if params.get("shared_theme") and ready:
+        report_progress(stage="theme")
+        try:
+            layouts = [json.loads(r["ocr"]["json_path"].read_text(encoding="utf-8")) for r in ready]
+            theme = await asyncio.to_thread(extract_theme, [r["input_file_path"] for r in ready], layouts)
+            deck_css = theme_css(theme)
+            logger.info(f"[Deck] 共享主题: {theme}")
+        except Exception as e:
+            logger.warning(f"[Deck] 主题提取失败，逐页独立生成: {e}")
+    
+    report_progress(stage="html")
+    
+    async def html_slide(index: int, item: Optional[dict]) -> Optional[dict]:
+        if item is None:
+            return None
+        async with semaphore:
+            update_state(index, status="generating")
+            try:
+                slide = await generate_slide_html_from_ocr(
+                    item["ocr"], item["input_file_path"], item["date_str"], item["file_uuid"], item["image_url"], model,
+                    no_cache=params.get("no_cache", False),
+                    log_prefix=item["log_prefix"],
+                    deck_theme_css=deck_css,
+                    template_scope=f"deck:{deck_uuid}",
+                )
+                update_state(index, status="completed")
+                report_progress(completed=sum(1 for s in slide_states if s["status"] == "completed"))
+                return slide
+            except Exception as e:
+                fail(index, item["log_prefix"], e)
+                return None
+    
+    results = await asyncio.gather(*(html_slide(i, item) for i, item in enumerate(ocr_results)))
+    
+    succeeded = [(page, results[index]) for page, index in enumerate(page_sources) if results[index] is not None]
+    unique_succeeded = [r for r in results if r is not None]
+    if not succeeded:
+        raise Exception("所有页面均处理失败")
+    
+    # 一次转换：按原顺序把所有 HTML 合成一个多页 PPTX
+    report_progress(stage="converting")
+    deck_dir = OUTPUT_DIR / date_str / deck_uuid
+    deck_dir.mkdir(parents=True, exist_ok=True)
+    output_pptx_path = deck_dir / f"{deck_uuid}.pptx"
+    html_files = [r["html_file_path"] for _, r in succeeded]
+    await convert_html_files_to_pptx(
+        html_files, output_pptx_path,
+        DECK_CONVERT_TIMEOUT_BASE + DECK_CONVERT_TIMEOUT_PER_SLIDE * len(html_files),
+    )
+    
+    # 只上传一次
+    report_progress(stage="uploading")
+    artifact = await publish_pptx(output_pptx_path, date_str, deck_uuid, "[Deck]")
+    download_url = artifact.download_url
+    
+    usage_total = {}
+    for r in unique_succeeded:
+        for key, value in r["usage"].items():
+            if isinstance(value, (int, float)):
+                usage_total[key] = usage_total.get(key, 0) + value
+    
+    report_progress(stage="done")
+    logger.info(f"[Deck] 完成: {download_url}, 成功 {len(succeeded)}/{total} 页")
+    
+    return {
+        "success": True,
+        "deck_uuid": deck_uuid,
+        "date": date_str,
+        "backend": backend,
+        "download_url": download_url,
+        "pptx_file_path": str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/"),
+        "model": model,
+        "slide_count": len(succeeded),
+        "failed_slides": [s for s in slide_states if s["status"] == "failed"],
+        "theme": theme,
+        "usage": usage_total,
+        "llm_cache_hits": sum(1 for r in unique_succeeded if r["llm_cache_hit"]),
     }
 
 
@@ -520,36 +1100,102 @@ async def upload_image(file: UploadFile = File(...)):
     date_str = datetime.now().strftime("%Y-%m-%d")
     file_uuid = str(uuid_lib.uuid4())
     
-    # 获取扩展名
-    ext = Path(file.filename).suffix
-    if not ext:
-        ext = mimetypes.guess_extension(file.content_type) or ".jpg"
-        
-    # 构建保存路径
-    save_dir = INPUT_DIR / date_str
-    save_dir.mkdir(parents=True, exist_ok=True)
+    # 流式写入临时文件，扩展名按文件头识别
+    try:
+        ingested = await ingest_upload(file, INPUT_DIR / date_str, file_uuid, INPUT_MAX_MB * 1024 * 1024)
+    except ImageIngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+    
+    # 后台预计算哈希、尺寸、派生图和缩略图，后续阶段直接读取
+    image_precomputer.submit(ingested.path, ingested.sha256)
     
-    filename = f"{file_uuid}{ext}"
-    file_path = save_dir / filename
+    # 返回相对路径，供后续接口使用
+    filename = ingested.path.name
+    relative_path = f"input/{date_str}/{filename}"
+    
+    return {
+        "status": "success",
+        "message": "文件上传成功",
+        "file_path": relative_path,
+        "filename": filename,
+        "uuid": file_uuid,
+        "date": date_str,
+        "size": ingested.size,
+        "sha256": ingested.sha256,
+    }
+
+
+def find_input_image(date_str: str, file_uuid: str) -> Path:
+    """按日期和 UUID 查找 input/{date}/{uuid}.ext"""
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", date_str) or not re.fullmatch(r"[0-9a-f-]{36}", file_uuid):
+        raise HTTPException(status_code=400, detail="日期或 UUID 格式错误")
+    matches = sorted((INPUT_DIR / date_str).glob(f"{file_uuid}.*"))
+    if not matches:
+        raise HTTPException(status_code=404, detail=f"图片不存在: {date_str}/{file_uuid}")
+    return matches[0]
+
+
+@app.get("/upload/{date_str}/{file_uuid}/meta")
+async def get_upload_meta(date_str: str, file_uuid: str):
+    """
+    查询上传图片的预计算结果（内容哈希、感知哈希、尺寸、LLM 派生图信息）
+    
+    预计算在后台进行，尚未完成时返回 status=pending
+    """
+    image_path = find_input_image(date_str, file_uuid)
+    meta = load_image_meta(image_path)
+    if meta is None:
+        return JSONResponse(status_code=202, content={"status": "pending"})
+    return JSONResponse(content={"status": "ready", **meta})
+
+
+@app.get("/upload/{date_str}/{file_uuid}/thumbnail")
+async def get_upload_thumbnail(date_str: str, file_uuid: str):
+    """获取上传图片的缩略图（预计算尚未完成时返回 404）"""
+    thumb = thumbnail_path(find_input_image(date_str, file_uuid))
+    if not thumb.is_file():
+        raise HTTPException(status_code=404, detail="缩略图尚未生成")
+    return FileResponse(thumb, media_type="image/jpeg")
+
+
+@app.post("/upload/presign")
+async def presign_upload(request: PresignUploadRequest):
+    """
+    申请输入图片的预签名 PUT URL，客户端直接上传到对象存储，图片不经过 API 进程
+    
+    上传完成后把 object_key 传给 POST /tasks/submit 或 POST /decks，任务开始时再下载到本地
+    """
+    if not request.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="文件必须是图片格式")
+    if not check_r2_config()["configured"]:
+        raise HTTPException(status_code=503, detail="对象存储未配置，请使用 POST /upload")
+    
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    file_uuid = str(uuid_lib.uuid4())
+    ext = Path(request.filename).suffix.lower() if request.filename else ""
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", ext):
+        ext = mimetypes.guess_extension(request.content_type) or ".jpg"
+    object_key = f"input/{date_str}/{file_uuid}{ext}"
     
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-            
-        # 返回相对路径，供后续接口使用
-        relative_path = f"input/{date_str}/{filename}"
-        
-        return {
-            "status": "success",
-            "message": "文件上传成功",
-            "file_path": relative_path,
-            "filename": filename,
-            "uuid": file_uuid,
-            "date": date_str
-        }
+        upload_url = await asyncio.to_thread(create_presigned_put, object_key, request.content_type)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+        logger.error(f"[Presign] 生成预签名 URL 失败: {e}")
+        raise HTTPException(status_code=502, detail="生成预签名 URL 失败")
+    
+    return {
+        "status": "success",
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": {"Content-Type": request.content_type},
+        "object_key": object_key,
+        "uuid": file_uuid,
+        "date": date_str,
+        "expires_in": R2_PRESIGN_EXPIRES,
+        "max_size_mb": INPUT_MAX_MB,
+    }
 
 
 @app.post("/ocr/process")
@@ -677,56 +1323,26 @@ async def process_cloud_ocr(request: CloudOcrRequest):
         if not json_path.exists():
             raise FileNotFoundError(f"OCR JSON 文件不存在: {json_path}")
         
-        # 读取系统提示词
-        system_prompt_path = BASE_DIR / "system_prompt.md"
-        if system_prompt_path.exists():
-            system_prompt = system_prompt_path.read_text(encoding="utf-8").strip()
-        else:
-            system_prompt = "You are an AI assistant that generates HTML slides."
+        # 读取系统提示词（注册表缓存，文件修改后自动重新加载）
+        system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
         
         # 读取 Markdown 和 JSON
         md_text = md_path.read_text(encoding="utf-8")
         layout_json = json.load(open(json_path, "r", encoding="utf-8"))
         
-        # 直接使用公开 URL，LLM API 会自动获取图片
-        data_url = request.file_url
-        
-        # 构建消息
-        messages = build_slide_messages(system_prompt, md_text, layout_json, data_url)
-        
-        # 调用 OpenRouter API
+        # 生成 HTML（直接使用公开 URL，LLM API 会自动获取图片）
+        # 云端 OCR 没有本地原图，以图片 URL 作为图片指纹
         model = request.model or DEFAULT_MODEL
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 16000,
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": HTTP_REFERER,
-            "X-Title": "ReDeck Cloud OCR",
-        }
-        
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=f"LLM API 错误: {response.text}")
-            
-            result = response.json()
-            html_content = result["choices"][0]["message"]["content"]
-            usage = result.get("usage", {})
-        
-        # 清理和处理 HTML
-        cleaned_html = clean_html_from_markdown_code_block(html_content)
-        final_html = replace_html_image_paths(cleaned_html, date_str, file_uuid)
+        generated = await generate_cleaned_html(
+            system_prompt, md_text, layout_json, model, "ReDeck Cloud OCR",
+            hash_bytes(request.file_url.encode("utf-8")),
+            image_url=request.file_url, no_cache=request.no_cache, template_scope=request.template_scope,
+        )
+        usage = generated["usage"]
         
-        # 保存 HTML 文件
+        # 保存 HTML 文件（公开版 + 转换版）
         html_file_path = md_path.parent / f"{file_uuid}.html"
-        html_file_path.write_text(final_html, encoding="utf-8")
+        save_slide_html(generated["html"], html_file_path, date_str, file_uuid)
         html_relative_path = str(html_file_path.relative_to(BASE_DIR)).replace("\\", "/")
         
         logger.info(f"[云端OCR] HTML 生成完成: {html_relative_path}")
@@ -735,46 +1351,16 @@ async def process_cloud_ocr(request: CloudOcrRequest):
         logger.info(f"[云端OCR] 开始转换 PPTX...")
         
         output_pptx_path = html_file_path.parent / f"{file_uuid}.pptx"
-        scripts_dir = BASE_DIR / "scripts"
-        converter_script = scripts_dir / "convert-html-to-pptx.js"
-        
-        if not converter_script.exists():
-            raise HTTPException(status_code=500, detail="PPTX 转换脚本不存在")
-        
-        cmd = [
-            "node",
-            str(converter_script),
-            str(html_file_path),
-            str(output_pptx_path),
-            "--tmp-dir", str(TEMP_DIR)
-        ]
-        
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            cwd=str(scripts_dir),
-            timeout=120
-        )
-        
-        if process.returncode != 0:
-            stderr = process.stderr or process.stdout or "转换失败"
-            logger.error(f"[云端OCR] PPTX 转换失败: {stderr}")
-            raise HTTPException(status_code=500, detail=f"PPTX 转换失败: {stderr[:500]}")
-        
-        if not output_pptx_path.exists():
-            raise HTTPException(status_code=500, detail="PPTX 文件生成失败")
+        try:
+            await convert_html_files_to_pptx([html_file_path], output_pptx_path)
+        except Exception as e:
+            logger.error(f"[云端OCR] {e}")
+            raise HTTPException(status_code=500, detail=str(e)[:500])
         
         # 上传到 R2 并获取公开链接
         pptx_relative_path = str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/")
-        try:
-            download_url = upload_pptx_to_r2(output_pptx_path, date_str, file_uuid)
-            logger.info(f"[云端OCR] PPTX 已上传到 R2: {download_url}")
-        except Exception as e:
-            logger.warning(f"[云端OCR] R2 上传失败，使用本地链接: {e}")
-            download_url = f"{STATIC_BASE_URL.rstrip('/')}/static/{pptx_relative_path}"
+        artifact = await publish_pptx(output_pptx_path, date_str, file_uuid, log_prefix="[云端OCR]")
+        download_url = artifact.download_url
         
         logger.info(f"[云端OCR] PPTX 生成完成: {download_url}")
         
@@ -787,8 +1373,14 @@ async def process_cloud_ocr(request: CloudOcrRequest):
             "html_file_path": html_relative_path,
             "pptx_file_path": pptx_relative_path,
             "download_url": download_url,
+            "upload_status": artifact.status.value,
             "model": model,
             "usage": usage,
+            "llm_cache_hit": generated["llm_cache_hit"],
+            "token_report": generated["token_report"],
+            "image_payload": generated["image_report"],
+            "template": generated["template"],
+            "route": generated["route"],
             "renamed_images": len(rename_mapping)
         })
         
@@ -914,30 +1506,11 @@ async def process_gpu_ocr_full(request: GpuOcrFullRequest):
         if request.file_url:
             logger.info(f"[GPU OCR Full] 从 URL 下载图片: {request.file_url}")
             
-            # 下载图片
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.get(request.file_url)
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"下载图片失败: HTTP {response.status_code}"
-                    )
-                image_data = response.content
-            
-            # 确定文件扩展名
-            content_type = response.headers.get("content-type", "image/png")
-            ext = mimetypes.guess_extension(content_type) or ".png"
-            if ext == ".jpe":
-                ext = ".jpg"
-            
-            # 保存到本地
-            save_dir = INPUT_DIR / date_str
-            save_dir.mkdir(parents=True, exist_ok=True)
-            filename = f"{file_uuid}{ext}"
-            input_file_path = save_dir / filename
-            
-            with open(input_file_path, "wb") as f:
-                f.write(image_data)
+            # 流式下载图片到本地
+            try:
+                input_file_path = await download_input_image(request.file_url, date_str, file_uuid)
+            except ImageIngestError as e:
+                raise HTTPException(status_code=e.status_code, detail=str(e))
             
             logger.info(f"[GPU OCR Full] 图片已保存: {input_file_path}")
             
@@ -1006,12 +1579,8 @@ async def process_gpu_ocr_full(request: GpuOcrFullRequest):
         if not json_path.exists():
             raise FileNotFoundError(f"OCR JSON 文件不存在: {json_path}")
         
-        # 读取系统提示词
-        system_prompt_path = BASE_DIR / "system_prompt.md"
-        if system_prompt_path.exists():
-            system_prompt = system_prompt_path.read_text(encoding="utf-8").strip()
-        else:
-            system_prompt = "You are an AI assistant that generates HTML slides."
+        # 读取系统提示词（注册表缓存，文件修改后自动重新加载）
+        system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
         
         # 读取 Markdown 和 JSON
         md_text = md_path.read_text(encoding="utf-8")
@@ -1021,56 +1590,22 @@ async def process_gpu_ocr_full(request: GpuOcrFullRequest):
         # 如果有原始公开 URL，直接使用（更快，节省 token）
         # 否则读取本地文件并编码为 base64
         if original_image_url:
-            image_url_for_llm = original_image_url
             logger.info(f"[GPU OCR Full] 使用公开 URL 发送给 LLM")
-        else:
-            with open(input_file_path, "rb") as img_file:
-                image_data = img_file.read()
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-            
-            content_type, _ = mimetypes.guess_type(str(input_file_path))
-            if not content_type:
-                content_type = "image/png"
-            image_url_for_llm = f"data:{content_type};base64,{base64_image}"
-        
-        # 构建消息
-        messages = build_slide_messages(system_prompt, md_text, layout_json, image_url_for_llm)
         
-        # Step 4: 调用 LLM 生成 HTML
+        # Step 4: 生成 HTML（模板命中时跳过 LLM）
         logger.info(f"[GPU OCR Full] 开始生成 HTML...")
         
         model = request.model or DEFAULT_MODEL
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 16000,
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": HTTP_REFERER,
-            "X-Title": "ReDeck GPU OCR",
-        }
-        
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=f"LLM API 错误: {response.text}")
-            
-            result = response.json()
-            html_content = result["choices"][0]["message"]["content"]
-            usage = result.get("usage", {})
-        
-        # 清理和处理 HTML
-        cleaned_html = clean_html_from_markdown_code_block(html_content)
-        final_html = replace_html_image_paths(cleaned_html, date_str, file_uuid, backend="vlm")
+        generated = await generate_cleaned_html(
+            system_prompt, md_text, layout_json, model, "ReDeck GPU OCR", image_content_hash(input_file_path),
+            image_url=original_image_url, image_path=input_file_path, no_cache=request.no_cache,
+            template_scope=request.template_scope,
+        )
+        usage = generated["usage"]
         
-        # 保存 HTML 文件
+        # 保存 HTML 文件（公开版 + 转换版）
         html_file_path = vlm_dir / f"{file_uuid}.html"
-        html_file_path.write_text(final_html, encoding="utf-8")
+        save_slide_html(generated["html"], html_file_path, date_str, file_uuid, backend="vlm")
         html_relative_path = str(html_file_path.relative_to(BASE_DIR)).replace("\\", "/")
         
         logger.info(f"[GPU OCR Full] HTML 生成完成: {html_relative_path}")
@@ -1079,46 +1614,16 @@ async def process_gpu_ocr_full(request: GpuOcrFullRequest):
         logger.info(f"[GPU OCR Full] 开始转换 PPTX...")
         
         output_pptx_path = vlm_dir / f"{file_uuid}.pptx"
-        scripts_dir = BASE_DIR / "scripts"
-        converter_script = scripts_dir / "convert-html-to-pptx.js"
-        
-        if not converter_script.exists():
-            raise HTTPException(status_code=500, detail="PPTX 转换脚本不存在")
-        
-        cmd = [
-            "node",
-            str(converter_script),
-            str(html_file_path),
-            str(output_pptx_path),
-            "--tmp-dir", str(TEMP_DIR)
-        ]
-        
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            cwd=str(scripts_dir),
-            timeout=120
-        )
-        
-        if process.returncode != 0:
-            stderr = process.stderr or process.stdout or "转换失败"
-            logger.error(f"[GPU OCR Full] PPTX 转换失败: {stderr}")
-            raise HTTPException(status_code=500, detail=f"PPTX 转换失败: {stderr[:500]}")
-        
-        if not output_pptx_path.exists():
-            raise HTTPException(status_code=500, detail="PPTX 文件生成失败")
+        try:
+            await convert_html_files_to_pptx([html_file_path], output_pptx_path)
+        except Exception as e:
+            logger.error(f"[GPU OCR Full] {e}")
+            raise HTTPException(status_code=500, detail=str(e)[:500])
         
         # 上传到 R2 并获取公开链接
         pptx_relative_path = str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/")
-        try:
-            download_url = upload_pptx_to_r2(output_pptx_path, date_str, file_uuid)
-            logger.info(f"[GPU OCR Full] PPTX 已上传到 R2: {download_url}")
-        except Exception as e:
-            logger.warning(f"[GPU OCR Full] R2 上传失败，使用本地链接: {e}")
-            download_url = f"{STATIC_BASE_URL.rstrip('/')}/static/{pptx_relative_path}"
+        artifact = await publish_pptx(output_pptx_path, date_str, file_uuid, log_prefix="[GPU OCR Full]")
+        download_url = artifact.download_url
         
         logger.info(f"[GPU OCR Full] PPTX 生成完成: {download_url}")
         
@@ -1131,8 +1636,14 @@ async def process_gpu_ocr_full(request: GpuOcrFullRequest):
             "html_file_path": html_relative_path,
             "pptx_file_path": pptx_relative_path,
             "download_url": download_url,
+            "upload_status": artifact.status.value,
             "model": model,
             "usage": usage,
+            "llm_cache_hit": generated["llm_cache_hit"],
+            "token_report": generated["token_report"],
+            "image_payload": generated["image_report"],
+            "template": generated["template"],
+            "route": generated["route"],
             "renamed_images": len(rename_mapping)
         }
         
@@ -1502,41 +2013,51 @@ def clean_html_from_markdown_code_block(html_content: str) -> str:
     """
     从 markdown 代码块中提取纯 HTML 内容，并移除 LLM 生成的前置/后置解释文字
     
+    图片路径统一为 images/xxx 相对路径（单次扫描，见 scripts/html_postprocess.py）
+    
     Args:
         html_content: 可能包含 markdown 代码块标记和 LLM 解释文字的 HTML 内容
         
     Returns:
         清理后的纯 HTML 内容
     """
-    # 移除开头的 ```html 或 ``` 标记
-    html_content = re.sub(r'^```html\s*\n?', '', html_content, flags=re.MULTILINE)
-    html_content = re.sub(r'^```\s*\n?', '', html_content, flags=re.MULTILINE)
-    
-    # 移除结尾的 ``` 标记
-    html_content = re.sub(r'\n?```\s*$', '', html_content, flags=re.MULTILINE)
-    
-    # 查找 HTML 文档的真正开始位置（<!DOCTYPE 或 <html）
-    # 这会移除 LLM 在 HTML 前添加的解释性文字
-    doctype_match = re.search(r'<!DOCTYPE\s+html[^>]*>', html_content, re.IGNORECASE)
-    html_tag_match = re.search(r'<html[^>]*>', html_content, re.IGNORECASE)
-    
-    start_pos = 0
-    if doctype_match:
-        start_pos = doctype_match.start()
-    elif html_tag_match:
-        start_pos = html_tag_match.start()
-    
-    # 查找 HTML 文档的结束位置（</html>）
-    html_end_match = re.search(r'</html\s*>', html_content, re.IGNORECASE)
-    end_pos = len(html_content)
-    if html_end_match:
-        end_pos = html_end_match.end()
-    
-    # 提取纯 HTML 内容
-    if start_pos > 0 or end_pos < len(html_content):
-        html_content = html_content[start_pos:end_pos]
+    return postprocess_html(html_content)["local"]
+
+
+def is_html_complete(html_content: str) -> bool:
+    """判断 LLM 输出（清理后）是否包含完整的 HTML 文档结尾"""
+    return re.search(r'</html\s*>', clean_html_from_markdown_code_block(html_content), re.IGNORECASE) is not None
+
+
+# 续写请求的用户指令
+HTML_CONTINUATION_INSTRUCTION = (
+    "Your previous response was cut off. Continue the HTML exactly where it stopped. "
+    "Do not repeat any earlier content, do not restart the document, and do not add code fences or explanations."
+)
+
+
+def merge_continuation(partial: str, continuation: str) -> str:
+    """
+    将续写内容拼接到已有输出之后
     
-    return html_content.strip()
+    去掉续写开头的代码块标记；模型重复了已有结尾时去掉重叠部分（至少 16 个字符，
+    避免把正常衔接的短片段误判为重复）；模型重新输出了完整文档时直接使用新文档
+    """
+    continuation = re.sub(r'^\s*```(?:html)?\s*\n?', '', continuation)
+    if re.match(r'\s*(<!DOCTYPE\s+html|<html[\s>])', continuation, re.IGNORECASE):
+        return continuation
+    
+    tail = partial[-200:]
+    for size in range(min(len(tail), len(continuation)), 15, -1):
+        if continuation.startswith(tail[-size:]):
+            continuation = continuation[size:]
+            break
+    return partial + continuation
+
+
+def image_base_url(date_str: str, uuid: str, backend: str = "auto") -> str:
+    """图片的公开 URL 前缀: {STATIC_BASE_URL}/static/output/date/uuid/uuid/{backend}/images/"""
+    return f"{STATIC_BASE_URL.rstrip('/')}/static/output/{date_str}/{uuid}/{uuid}/{backend}/images/"
 
 
 def replace_html_image_paths(html_content: str, date_str: str, uuid: str, backend: str = "auto") -> str:
@@ -1557,86 +2078,92 @@ def replace_html_image_paths(html_content: str, date_str: str, uuid: str, backen
     Returns:
         替换后的 HTML 内容
     """
-    # 匹配 HTML 中的图片路径
-    # 情况1: src="images/xxx.jpg" 或 src='images/xxx.jpg'
-    pattern1 = r'src=["\']images/([^"\']+)["\']'
-    
-    # 情况2: src="F:\...\images\xxx.jpg" 或 src="output/.../images/xxx.jpg" (绝对路径或完整相对路径)
-    pattern2 = r'src=["\']([^"\']*[/\\])images/([^"\']+)["\']'
-    
-    # 情况3: src="img_01.jpg" 或 src="img_02.png" (直接文件名，无 images/ 前缀)
-    # 匹配 img_XX.ext 格式，避免匹配已经是完整 URL 的情况
-    pattern3 = r'src=["\'](?!http|/|images/)(img_\d+\.(jpg|jpeg|png|webp|gif))["\']'
-    
-    def replace_relative_image(match):
-        image_filename = match.group(1)
-        # 构建 HTTP 可访问的绝对路径（带协议和主机）
-        http_path = f"{STATIC_BASE_URL.rstrip('/')}/static/output/{date_str}/{uuid}/{uuid}/{backend}/images/{image_filename}"
-        logger.info(f"替换相对图片路径: images/{image_filename} -> {http_path}")
-        return f'src="{http_path}"'
-    
-    def replace_absolute_image(match):
-        image_filename = match.group(2)
-        # 构建 HTTP 可访问的绝对路径（带协议和主机）
-        http_path = f"{STATIC_BASE_URL.rstrip('/')}/static/output/{date_str}/{uuid}/{uuid}/{backend}/images/{image_filename}"
-        logger.info(f"替换绝对/完整图片路径: {match.group(0)} -> {http_path}")
-        return f'src="{http_path}"'
+    return postprocess_html(html_content, image_base_url(date_str, uuid, backend))["public"]
+
+
+def save_slide_html(html_content: str, html_file_path: Path, date_str: str, uuid: str, backend: str = "auto") -> str:
+    """
+    保存单页 HTML：一次扫描同时生成公开版和转换版
     
-    def replace_direct_image(match):
-        image_filename = match.group(1)
-        # 构建 HTTP 可访问的绝对路径（带协议和主机）
-        http_path = f"{STATIC_BASE_URL.rstrip('/')}/static/output/{date_str}/{uuid}/{uuid}/{backend}/images/{image_filename}"
-        logger.info(f"替换直接图片引用: {image_filename} -> {http_path}")
-        return f'src="{http_path}"'
+    - html_file_path: 公开版（图片为完整 URL，返回给前端）
+    - {name}_local.html: 转换版（图片为 images/ 相对路径，供 Node 转换脚本直接加载）
     
-    # 先处理绝对路径或完整路径（包含 images/ 的路径）
-    result = re.sub(pattern2, replace_absolute_image, html_content)
-    # 再处理简单的相对路径
-    result = re.sub(pattern1, replace_relative_image, result)
-    # 最后处理直接文件名（img_XX.ext 格式）
-    result = re.sub(pattern3, replace_direct_image, result)
+    Returns:
+        公开版 HTML
+    """
+    result = postprocess_html(html_content, image_base_url(date_str, uuid, backend))
+    html_file_path.write_text(result["public"], encoding="utf-8")
+    local_html_path(html_file_path).write_text(result["local"], encoding="utf-8")
+    return result["public"]
+
+
+def converter_html_path(html_file_path: Path) -> Path:
+    """
+    返回交给 Node 转换脚本的 HTML 路径（转换版）
     
-    return result
+    旧版本生成的页面没有转换版时，从公开版生成一份（图片 URL 改回 images/ 相对路径）
+    """
+    path = local_html_path(html_file_path)
+    if not path.exists():
+        html_content = Path(html_file_path).read_text(encoding="utf-8")
+        path.write_text(postprocess_html(html_content)["local"], encoding="utf-8")
+    return path
+
+
+# system_prompt.md 不存在时使用的默认系统提示词
+DEFAULT_SYSTEM_PROMPT = (
+    "You are an AI assistant that generates HTML slides from images, markdown content, and layout information. "
+    "Create beautiful, responsive HTML slides that accurately represent the content and layout of the input."
+)
+
+# 用户指令（build_slide_messages 和 /slides/preview-prompt 共用）
+SLIDE_USER_INSTRUCTION = (
+    "Please analyze this slide image and, using the markdown content and layout JSON (positioning), "
+    "generate a single HTML slide that follows the system instructions.\n\n"
+    "The HTML should be a complete, standalone HTML document that can be displayed in a browser."
+)
+# 预先构建的静态用户指令块（所有请求共享，不能修改）
+_SLIDE_INSTRUCTION_BLOCK = {"type": "text", "text": SLIDE_USER_INSTRUCTION}
 
 
 def build_slide_messages(
     system_prompt: str,
     md_text: str,
-    layout_json: dict,
-    image_data_url: str
+    layout_text: str,
+    image_data_url: str,
+    model: Optional[str] = None,
+    extra_instruction: Optional[str] = None
 ) -> list:
     """
     构建 OpenRouter API 的 messages
     
+    系统消息和用户指令块由 prompt_registry 预先构建并复用，
+    需要显式标记的模型会在系统提示词上带 cache_control（提供方 Prompt 缓存）
+    
     Args:
         system_prompt: 系统提示词
-        md_text: Markdown 文本内容
-        layout_json: 布局 JSON 数据
+        md_text: Markdown 文本内容（为空时不发送 Markdown 部分）
+        layout_text: 精简后的布局 JSON 字符串（distill_layout_text 生成）
         image_data_url: base64 编码的图片 data URL
+        model: 目标模型，决定是否添加 cache_control 标记
+        extra_instruction: 追加在用户指令之后的说明（如整套幻灯片的共享主题）
         
     Returns:
         messages 列表
     """
-    # 将 JSON 格式化为字符串
-    layout_json_str = json.dumps(layout_json, ensure_ascii=False, indent=2)
-    
     # 构建用户消息内容（按照 OpenRouter 文档建议：文本在前，图片在后）
-    user_content = [
-        {
-            "type": "text",
-            "text": (
-                "Please analyze this slide image and, using the markdown content and layout JSON (positioning), "
-                "generate a single HTML slide that follows the system instructions.\n\n"
-                "The HTML should be a complete, standalone HTML document that can be displayed in a browser."
-            )
-        },
-        {
+    user_content = [_SLIDE_INSTRUCTION_BLOCK]
+    if extra_instruction:
+        user_content.append({"type": "text", "text": extra_instruction})
+    if md_text:
+        user_content.append({
             "type": "text",
             "text": f"Content markdown:\n\n```markdown\n{md_text}\n```"
-        },
+        })
+    user_content.extend([
         {
             "type": "text",
-            "text": f"Layout JSON:\n\n```json\n{layout_json_str}\n```"
+            "text": f"Layout JSON:\n\n```json\n{layout_text}\n```"
         },
         {
             "type": "image_url",
@@ -1644,13 +2171,10 @@ def build_slide_messages(
                 "url": image_data_url
             }
         }
-    ]
+    ])
     
     return [
-        {
-            "role": "system",
-            "content": system_prompt
-        },
+        prompt_registry.system_message(system_prompt, model),
         {
             "role": "user",
             "content": user_content
@@ -1658,6 +2182,401 @@ def build_slide_messages(
     ]
 
 
+def prepare_slide_prompt(
+    system_prompt: str,
+    md_text: str,
+    layout_json: dict,
+    image_url: Optional[str] = None,
+    image_path: Optional[Path] = None,
+    model: Optional[str] = None,
+    extra_instruction: Optional[str] = None,
+) -> dict:
+    """
+    构建 LLM messages，并在超出 PROMPT_TOKEN_BUDGET 时自动缩减 Prompt
+    
+    本地图片先经过派生图处理（按模型配置缩放、重新编码并缓存，见 scripts/image_prep.py），
+    不再直接 base64 编码原图
+    
+    缩减手段按代价从低到高依次应用，直到满足预算：
+    1. 将布局 JSON 精简到 blocks 级别
+    2. 去掉 Markdown（blocks 级别的布局 JSON 已包含全部文本）
+    3. 逐级缩小图片（仅当有本地原图时）
+    
+    Args:
+        system_prompt: 系统提示词
+        md_text: Markdown 文本内容
+        layout_json: 原始 _middle.json
+        image_url: 发送给 LLM 的图片 URL（如公开 URL），为 None 时由 image_path 编码为 data URL
+        image_path: 本地原图路径，用于估算图片 token 以及缩图
+        model: 目标模型，用于选择派生图参数
+        extra_instruction: 追加的用户指令（见 build_slide_messages）
+        
+    Returns:
+        {"messages", "md_text", "layout_text", "token_report", "image_report"}
+        image_report 为图片请求体积报告（使用公开 URL 时为 None）
+    """
+    layout_detail = LAYOUT_DETAIL_LEVEL
+    layout_text = distill_layout_text(layout_json, layout_detail)
+    
+    image_report = None
+    if image_url is None:
+        image_url, image_size, image_report = encode_image_data_url(image_path, model=model)
+    else:
+        image_size = get_image_size(image_path) if image_path else None
+    
+    def estimate() -> dict:
+        return estimate_prompt_tokens(
+            system_prompt, SLIDE_USER_INSTRUCTION + (extra_instruction or ""), md_text, layout_text, image_size
+        )
+    
+    current = estimate()
+    report = {
+        "budget": PROMPT_TOKEN_BUDGET or None,
+        "initial": current,
+        "reductions": [],
+    }
+    
+    if PROMPT_TOKEN_BUDGET and current["total"] > PROMPT_TOKEN_BUDGET:
+        # 1. 精简布局 JSON
+        if DETAIL_LEVELS.index(layout_detail) < DETAIL_LEVELS.index("blocks"):
+            layout_detail = "blocks"
+            layout_text = distill_layout_text(layout_json, layout_detail)
+            current = estimate()
+            report["reductions"].append({"step": "distill_layout", "detail": layout_detail, "total": current["total"]})
+        
+        # 2. 去掉冗余 Markdown（minimal 级别的布局不含文本，不能去掉）
+        if current["total"] > PROMPT_TOKEN_BUDGET and md_text and layout_detail != "minimal":
+            md_text = ""
+            current = estimate()
+            report["reductions"].append({"step": "drop_markdown", "total": current["total"]})
+        
+        # 3. 缩小图片
+        if current["total"] > PROMPT_TOKEN_BUDGET and image_path:
+            for max_side in PROMPT_IMAGE_DOWNSCALE_STEPS:
+                if image_size and max(image_size) <= max_side:
+                    continue
+                image_url, image_size, image_report = encode_image_data_url(image_path, max_side=max_side, model=model)
+                current = estimate()
+                report["reductions"].append({"step": "downscale_image", "max_side": max_side, "total": current["total"]})
+                if current["total"] <= PROMPT_TOKEN_BUDGET:
+                    break
+        
+        if current["total"] > PROMPT_TOKEN_BUDGET:
+            logger.warning(f"[TokenBudget] 缩减后仍超出预算: {current['total']} > {PROMPT_TOKEN_BUDGET}")
+    
+    report["final"] = current
+    report["over_budget"] = bool(PROMPT_TOKEN_BUDGET) and current["total"] > PROMPT_TOKEN_BUDGET
+    if report["reductions"]:
+        logger.info(f"[TokenBudget] Prompt tokens: {report['initial']['total']} -> {current['total']}")
+    if image_report:
+        logger.info(
+            f"[ImagePrep] 图片 {image_report['original_size']} -> {image_report['sent_size']}, "
+            f"请求体积减少 {image_report['payload_reduction']:.1%}"
+            f"{'（缓存命中）' if image_report['cache_hit'] else ''}"
+        )
+    
+    return {
+        "messages": build_slide_messages(system_prompt, md_text, layout_text, image_url, model, extra_instruction),
+        "md_text": md_text,
+        "layout_text": layout_text,
+        "token_report": report,
+        "image_report": image_report,
+    }
+
+
+def llm_cache_settings(model: str, local_image: bool) -> dict:
+    """
+    参与 LLM 缓存键的配置：缓存键由原始输入计算（不需要先构建 Prompt），
+    因此决定 Prompt 构建结果（布局精简级别、token 预算、图片派生参数）和输出长度的配置都要计入
+    """
+    return {
+        "max_tokens": LLM_MAX_TOKENS,
+        "user_instruction": SLIDE_USER_INSTRUCTION,
+        "layout_detail": LAYOUT_DETAIL_LEVEL,
+        "token_budget": PROMPT_TOKEN_BUDGET,
+        "downscale_steps": PROMPT_IMAGE_DOWNSCALE_STEPS if PROMPT_TOKEN_BUDGET else None,
+        # 使用公开 URL 时由提供方获取原图，派生参数不影响请求
+        "image_profile": get_image_profile(model) if local_image else None,
+    }
+
+
+async def call_llm_for_html(
+    messages: list,
+    model: str,
+    x_title: str,
+    cache_key: Optional[str] = None,
+    no_cache: bool = False,
+    priority: str = PRIORITY_INTERACTIVE,
+) -> dict:
+    """
+    调用 OpenRouter API 生成 HTML（带响应缓存、对冲请求和限流）
+    
+    配置了 LLM_HEDGE_MODELS 时，主模型在 p95 延迟内未返回或请求失败，
+    会向备用模型发出请求，取最先成功的结果（见 scripts/llm_hedge.py）
+    
+    每次发出请求前都要从全局限流器获取额度（见 scripts/rate_limiter.py），
+    收到 429/502/503 时按 Retry-After 带抖动退避重试
+    
+    输出被截断（finish_reason=length 或缺少 </html>）时，把已有输出作为 assistant 消息
+    追加续写请求，最多 LLM_MAX_CONTINUATIONS 轮
+    
+    Args:
+        messages: build_slide_messages 构建的消息列表
+        model: LLM 模型
+        x_title: OpenRouter X-Title 请求头
+        cache_key: 缓存键（make_cache_key 生成），为 None 时不使用缓存
+        no_cache: 为 True 时跳过缓存读取，但仍会用新结果刷新缓存
+        priority: 限流优先级，interactive（同步接口）或 batch（队列任务）
+        
+    Returns:
+        {"content": 原始 completion, "usage": token 用量, "cache_hit": 是否命中缓存, "cacheable": 结果是否可以写入缓存}
+        发生对冲/回退时，usage["hedge"] 记录实际返回结果的模型和发出的额外请求数；
+        发生续写时，usage 为各轮累计值，usage["continuation"] 记录续写轮数和是否补全
+    """
+    if cache_key and not no_cache:
+        cached = llm_cache.get(cache_key)
+        if cached:
+            logger.info(f"[LLMCache] 命中缓存: {cache_key[:12]}..., 模型: {model}")
+            return {"content": cached["content"], "usage": cached.get("usage", {}), "cache_hit": True}
+    
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": HTTP_REFERER,
+        "X-Title": x_title,
+    }
+    
+    estimated_tokens = estimate_messages_tokens(messages) + LLM_EXPECTED_COMPLETION_TOKENS
+    
+    async def send(target_model: str, request_messages: Optional[list] = None) -> dict:
+        payload = {
+            "model": target_model,
+            "messages": request_messages or messages,
+            "temperature": LLM_TEMPERATURE,
+            "max_tokens": LLM_MAX_TOKENS,
+            # 让 OpenRouter 返回详细 usage（含 prompt_tokens_details.cached_tokens）
+            "usage": {"include": True},
+        }
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                await llm_rate_limiter.acquire(estimated_tokens, priority)
+                response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    llm_rate_limiter.reconcile(estimated_tokens, result.get("usage", {}).get("total_tokens", 0))
+                    prompt_registry.record_usage(result.get("usage", {}))
+                    return result
+                
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    delay = backoff_delay(attempt, retry_after)
+                    if response.status_code == 429 or retry_after is not None:
+                        # 上游限流：暂停所有请求，避免其它 worker 继续撞墙
+                        llm_rate_limiter.penalize(delay)
+                    llm_rate_limiter.stats["retries"] += 1
+                    logger.warning(
+                        f"[RateLimiter] {target_model} 返回 {response.status_code}，"
+                        f"{delay:.1f}s 后重试 ({attempt + 1}/{LLM_MAX_RETRIES})"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    llm_rate_limiter.stats["gave_up"] += 1
+                error_msg = f"LLM API 错误 (状态码: {response.status_code}, 模型: {target_model}): {response.text}"
+                logger.error(error_msg)
+                raise HTTPException(status_code=response.status_code, detail=error_msg)
+    
+    result, hedge_info = await hedge_policy.run(send, model)
+    
+    choice = result["choices"][0]
+    content = choice["message"]["content"]
+    usage = result.get("usage", {})
+    if hedge_info["hedges_fired"] or hedge_info["fallbacks_fired"]:
+        usage["hedge"] = hedge_info
+    
+    # 截断续写：由返回结果的模型继续生成，直到文档闭合或达到轮数上限
+    truncated = choice.get("finish_reason") == "length" or not is_html_complete(content)
+    if truncated:
+        rounds = 0
+        while truncated and rounds < LLM_MAX_CONTINUATIONS:
+            rounds += 1
+            logger.warning(
+                f"[Continuation] 输出被截断 (finish_reason={choice.get('finish_reason')})，"
+                f"续写第 {rounds}/{LLM_MAX_CONTINUATIONS} 轮"
+            )
+            continuation_messages = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": HTML_CONTINUATION_INSTRUCTION},
+            ]
+            result = await send(hedge_info["model"], continuation_messages)
+            choice = result["choices"][0]
+            content = merge_continuation(content, choice["message"]["content"])
+            for key, value in result.get("usage", {}).items():
+                if isinstance(value, (int, float)) and isinstance(usage.get(key, 0), (int, float)):
+                    usage[key] = usage.get(key, 0) + value
+            truncated = choice.get("finish_reason") == "length" or not is_html_complete(content)
+        
+        usage["continuation"] = {"rounds": rounds, "completed": not truncated, "max_rounds": LLM_MAX_CONTINUATIONS}
+        if truncated:
+            logger.warning(f"[Continuation] 续写 {rounds} 轮后 HTML 仍不完整")
+    
+    # 被截断且未补全的输出不写入缓存，避免反复返回残缺的 HTML；
+    # 由备用模型返回的结果也不写入，缓存键对应的是请求的模型
+    cacheable = not truncated and hedge_info["model"] == model
+    if cache_key and cacheable:
+        llm_cache.set(cache_key, content, usage, model)
+    
+    return {"content": content, "usage": usage, "cache_hit": False, "cacheable": cacheable}
+
+
+async def generate_cleaned_html(
+    system_prompt: str,
+    md_text: str,
+    layout_json: dict,
+    model: str,
+    x_title: str,
+    image_hash: str,
+    image_url: Optional[str] = None,
+    image_path: Optional[Path] = None,
+    no_cache: bool = False,
+    priority: str = PRIORITY_INTERACTIVE,
+    extra_instruction: Optional[str] = None,
+    reject_invalid: bool = True,
+    template_scope: Optional[str] = None,
+    deck_theme_css: Optional[str] = None,
+) -> dict:
+    """
+    生成单页清理后的 HTML（尚未替换图片 URL）
+    
+    按以下顺序选择生成路径，并按路径记录耗时：
+    1. 版式模板索引（见 scripts/template_index.py），置信度足够时直接填充模板
+    2. 简单页规则生成（见 scripts/simple_slide.py），通过质量闸门时直接使用；有追加指令或 no_cache 时跳过
+    3. 构建 Prompt 调用 LLM，并尝试把结果入库为新模板
+    
+    Args:
+        image_hash: 图片指纹（参与 LLM 缓存键）
+        no_cache: 为 True 时同时跳过 LLM 响应缓存、模板索引和规则生成
+        extra_instruction: 追加的用户指令；共享主题模式下的 HTML 依赖外部 CSS，不读写模板索引
+        deck_theme_css: 共享主题 CSS，在转换前校验之前注入 <head>，校验才能看到主题里的 body 尺寸；
+            提示 LLM 使用主题的指令仍由调用方通过 extra_instruction 传入
+        template_scope: 版式模板作用域（用户 ID 或整套幻灯片 ID），模板只在同一作用域内复用；为空时不读写模板索引
+        reject_invalid: LLM 输出未通过转换前校验（见 scripts/html_validator.py）时抛出 HTMLValidationError；
+            只生成 HTML、不转换 PPTX 的调用方传 False，由调用方决定如何处理
+        其余参数见 prepare_slide_prompt / call_llm_for_html
+        
+    Returns:
+        {"html", "usage", "llm_cache_hit", "token_report", "image_report", "template", "route", "validation"}
+        template 为命中的模板信息 {"template_id", "confidence", "time_saved_seconds"}，未命中时为 None
+        route 为生成路径 {"path": "template" | "rule" | "llm", "reason", ...}
+        validation 为 LLM 输出的校验结果 {"valid", "errors", "warnings", "fixes"}（模板和规则生成为 None）
+        命中 LLM 响应缓存时不构建 Prompt，token_report 和 image_report 为 None
+    """
+    start = time.time()
+    use_templates = extra_instruction is None and bool(template_scope)
+    if use_templates and not no_cache:
+        hit = template_index.lookup(layout_json, template_scope)
+        if hit:
+            slide_router.record("template", time.time() - start)
+            return {
+                "html": hit["html"],
+                "usage": {},
+                "llm_cache_hit": False,
+                "token_report": None,
+                "image_report": None,
+                "template": {k: hit[k] for k in ("template_id", "confidence", "time_saved_seconds")},
+                "route": {"path": "template", "reason": "template_hit"},
+                "validation": None,
+            }
+    
+    # 追加指令（共享主题、用户修改意见）和显式跳过缓存都要求真正调用 LLM，不走规则生成
+    if extra_instruction is not None or no_cache:
+        route = {"path": "llm", "reason": "extra_instruction" if extra_instruction is not None else "no_cache"}
+    else:
+        route = slide_router.route(layout_json)
+    if route["path"] == "rule":
+        # 规则生成会解码原图取配色，放到线程池里执行，避免阻塞事件循环
+        simple = await asyncio.to_thread(render_simple_slide, layout_json, image_path=image_path)
+        if simple["errors"]:
+            slide_router.reject(simple["errors"])
+            route = {**route, "path": "llm", "reason": "quality_gate"}
+        else:
+            slide_router.record("rule", time.time() - start)
+            logger.info(f"简单页规则生成完成（{route['blocks']} 个块），跳过 LLM")
+            return {
+                "html": simple["html"],
+                "usage": {},
+                "llm_cache_hit": False,
+                "token_report": None,
+                "image_report": None,
+                "template": None,
+                "route": {**route, "warnings": simple["warnings"]},
+                "validation": None,
+            }
+    
+    # 缓存键由原始输入和相关配置计算，命中时跳过派生图处理和 Prompt 构建；
+    # 追加指令也是 Prompt 的一部分，与系统提示词一起参与缓存键
+    cache_key = make_cache_key(
+        model, LLM_TEMPERATURE, system_prompt + (extra_instruction or ""),
+        md_text, layout_json, image_hash, settings=llm_cache_settings(model, local_image=image_url is None),
+    )
+    cached = None if no_cache else llm_cache.get(cache_key)
+    llm_start = time.time()
+    if cached:
+        logger.info(f"[LLMCache] 命中缓存: {cache_key[:12]}..., 模型: {model}")
+        prompt = {"token_report": None, "image_report": None}
+        llm_result = {"content": cached["content"], "usage": cached.get("usage", {}), "cache_hit": True}
+    else:
+        # 派生图解码、缩放、重新编码和 base64 编码都是 CPU 密集操作，放到线程池里执行，避免阻塞事件循环
+        prompt = await asyncio.to_thread(
+            prepare_slide_prompt,
+            system_prompt, md_text, layout_json, image_url=image_url, image_path=image_path,
+            model=model, extra_instruction=extra_instruction,
+        )
+        logger.info(f"预估 Prompt tokens: {prompt['token_report']['final']['total']}（布局精简级别: {LAYOUT_DETAIL_LEVEL}）")
+        # 上面已经查过缓存；新结果通过转换前校验后才写入缓存（见下方）
+        llm_result = await call_llm_for_html(prompt["messages"], model, x_title, priority=priority)
+    cleaned_html = clean_html_from_markdown_code_block(llm_result["content"])
+    if deck_theme_css:
+        cleaned_html = inject_theme_css(cleaned_html, deck_theme_css)
+    
+    # 转换前校验：修复简单问题，注定转换失败的页面直接拒绝，不再启动 Node/Chromium
+    validation = html_validator.check(cleaned_html, label=x_title)
+    cleaned_html = validation.pop("html")
+    
+    # 只缓存通过校验的输出，否则重试会从缓存拿回同一份不合格的 HTML；已缓存的不合格输出同时淘汰
+    if validation["valid"]:
+        if llm_result.get("cacheable"):
+            llm_cache.set(cache_key, llm_result["content"], llm_result["usage"], model)
+    elif llm_result["cache_hit"]:
+        llm_cache.delete(cache_key)
+    
+    slide_router.record("llm_cache" if llm_result["cache_hit"] else "llm", time.time() - start)
+    if not llm_result["cache_hit"]:
+        template_index.record_generation(time.time() - llm_start)
+    continuation = llm_result["usage"].get("continuation")
+    truncated = bool(continuation and not continuation["completed"])
+    if truncated:
+        logger.warning(f"⚠️ 警告：续写 {continuation['rounds']} 轮后输出仍被截断，HTML 可能不完整！")
+        logger.warning(f"建议：1) 使用更大输出能力的模型，2) 简化系统提示词，3) 调大 LLM_MAX_CONTINUATIONS")
+    if not validation["valid"] and reject_invalid:
+        raise HTMLValidationError(validation["errors"] or validation["warnings"])
+    if use_templates and validation["valid"] and not truncated:
+        template_index.store(layout_json, cleaned_html, template_scope)
+    
+    return {
+        "html": cleaned_html,
+        "usage": llm_result["usage"],
+        "llm_cache_hit": llm_result["cache_hit"],
+        "token_report": prompt["token_report"],
+        "image_report": prompt["image_report"],
+        "template": None,
+        "route": route,
+        "validation": validation,
+    }
+
+
 @app.post("/slides/preview-prompt")
 async def preview_slide_prompt(request: SlidePromptPreviewRequest):
     """
@@ -1695,16 +2614,8 @@ async def preview_slide_prompt(request: SlidePromptPreviewRequest):
             logger.error(error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
         
-        # 读取系统提示词
-        system_prompt_path = BASE_DIR / "system_prompt.md"
-        if system_prompt_path.exists():
-            with open(system_prompt_path, "r", encoding="utf-8") as f:
-                system_prompt = f.read().strip()
-        else:
-            system_prompt = (
-                "You are an AI assistant that generates HTML slides from images, markdown content, and layout information. "
-                "Create beautiful, responsive HTML slides that accurately represent the content and layout of the input."
-            )
+        # 读取系统提示词（注册表缓存，文件修改后自动重新加载）
+        system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
         
         # 读取 Markdown 文件
         try:
@@ -1728,14 +2639,21 @@ async def preview_slide_prompt(request: SlidePromptPreviewRequest):
             logger.error(error_msg)
             raise HTTPException(status_code=500, detail=error_msg)
         
-        # 格式化 JSON
-        layout_json_str = json.dumps(layout_json, ensure_ascii=False, indent=2)
+        # 精简并序列化 JSON（与实际发送给 LLM 的内容一致）
+        layout_detail = request.layout_detail or LAYOUT_DETAIL_LEVEL
+        try:
+            layout_json_str = distill_layout_text(layout_json, layout_detail)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        raw_layout_chars = len(json.dumps(layout_json, ensure_ascii=False, indent=2))
         
         # 用户消息模板
-        user_instruction = (
-            "Please analyze this slide image and, using the markdown content and layout JSON (positioning), "
-            "generate a single HTML slide that follows the system instructions.\n\n"
-            "The HTML should be a complete, standalone HTML document that can be displayed in a browser."
+        user_instruction = SLIDE_USER_INSTRUCTION
+        
+        # 离线估算各部分 token 数
+        token_counts = estimate_prompt_tokens(
+            system_prompt, user_instruction, md_text, layout_json_str,
+            get_image_size(ocr_files["image_path"]),
         )
         
         # 返回各部分内容
@@ -1745,33 +2663,42 @@ async def preview_slide_prompt(request: SlidePromptPreviewRequest):
                 "system_prompt": {
                     "title": "系统提示词 (System Prompt)",
                     "content": system_prompt,
-                    "char_count": len(system_prompt)
+                    "char_count": len(system_prompt),
+                    "token_count": token_counts["system_prompt"]
                 },
                 "user_instruction": {
                     "title": "用户指令 (User Instruction)",
                     "content": user_instruction,
-                    "char_count": len(user_instruction)
+                    "char_count": len(user_instruction),
+                    "token_count": token_counts["user_instruction"]
                 },
                 "markdown_content": {
                     "title": "Markdown 内容 (OCR 识别结果)",
                     "content": md_text,
                     "char_count": len(md_text),
+                    "token_count": token_counts["markdown"],
                     "source_file": str(md_path.relative_to(BASE_DIR))
                 },
                 "layout_json": {
                     "title": "布局 JSON (位置信息)",
                     "content": layout_json_str,
                     "char_count": len(layout_json_str),
+                    "raw_char_count": raw_layout_chars,
+                    "token_count": token_counts["layout_json"],
+                    "detail_level": layout_detail,
                     "source_file": str(json_path.relative_to(BASE_DIR))
                 },
                 "image_note": {
                     "title": "图片 (Base64 编码)",
                     "content": "[图片将以 Base64 格式发送给模型]",
                     "char_count": 0,
+                    "token_count": token_counts["image"],
                     "note": "实际调用时图片会被编码为 Base64 并作为 image_url 发送"
                 }
             },
             "total_text_chars": len(system_prompt) + len(user_instruction) + len(md_text) + len(layout_json_str),
+            "total_tokens_estimate": token_counts["total"],
+            "prompt_token_budget": PROMPT_TOKEN_BUDGET or None,
             "image_path": request.image_path
         })
         
@@ -1828,17 +2755,8 @@ async def generate_slide_html(request: SlideHtmlRequest):
         
         logger.info(f"找到 OCR 文件 - Markdown: {md_path.relative_to(BASE_DIR)}, JSON: {json_path.relative_to(BASE_DIR)}")
         
-        # 读取系统提示词
-        system_prompt_path = BASE_DIR / "system_prompt.md"
-        if system_prompt_path.exists():
-            with open(system_prompt_path, "r", encoding="utf-8") as f:
-                system_prompt = f.read().strip()
-        else:
-            system_prompt = (
-                "You are an AI assistant that generates HTML slides from images, markdown content, and layout information. "
-                "Create beautiful, responsive HTML slides that accurately represent the content and layout of the input."
-            )
-            logger.warning("system_prompt.md 不存在，使用默认系统提示词")
+        # 读取系统提示词（注册表缓存，文件修改后自动重新加载）
+        system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
         
         # 读取 Markdown 文件
         try:
@@ -1862,135 +2780,80 @@ async def generate_slide_html(request: SlideHtmlRequest):
             logger.error(error_msg)
             raise HTTPException(status_code=500, detail=error_msg)
         
-        # 读取并编码图片为 base64
-        try:
-            with open(image_path, "rb") as image_file:
-                image_data = image_file.read()
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-            
-            content_type, _ = mimetypes.guess_type(str(image_path))
-            if not content_type:
-                content_type = "image/png"
-            data_url = f"data:{content_type};base64,{base64_image}"
-        except Exception as e:
-            error_msg = f"读取或编码图片失败: {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
-        
-        # 构建 OpenRouter API 请求消息
-        messages = build_slide_messages(system_prompt, md_text, layout_json, data_url)
-        
         # 使用环境变量配置的默认模型，也可通过请求参数覆盖
         model = request.model or DEFAULT_MODEL
         
-        logger.info(f"准备调用 OpenRouter API - 模型: {model}")
+        logger.info(f"准备生成 HTML - 模型: {model}")
         logger.info(f"系统提示词长度: {len(system_prompt)} 字符")
         logger.info(f"Markdown 长度: {len(md_text)} 字符")
-        logger.info(f"JSON 大小: {len(json.dumps(layout_json))} 字符")
         
-        # 准备请求数据
-        payload = {
+        # 生成 HTML：先查版式模板，未命中时调用 OpenRouter API（带响应缓存）
+        # 图片转为按模型配置的派生图 data URL，超出 token 预算时自动缩减
+        generated = await generate_cleaned_html(
+            system_prompt, md_text, layout_json, model, "ReDeck API", image_content_hash(image_path),
+            image_path=image_path, no_cache=request.no_cache, reject_invalid=False,
+            template_scope=request.template_scope,
+        )
+        usage = generated["usage"]
+        
+        # 保存 HTML 文件到输出目录（公开版图片为完整路径，另存一份本地路径的转换版）
+        html_file_path = md_path.parent / f"{file_uuid}.html"
+        try:
+            final_html = save_slide_html(generated["html"], html_file_path, date_str, file_uuid)
+            html_file_relative_path = str(html_file_path.relative_to(BASE_DIR)).replace("\\", "/")
+            logger.info(f"HTML 文件已保存: {html_file_relative_path}")
+        except Exception as e:
+            logger.warning(f"保存 HTML 文件失败: {str(e)}")
+            final_html = replace_html_image_paths(generated["html"], date_str, file_uuid)
+            html_file_relative_path = None
+        
+        # 将完整的 HTML 内容写入单独的日志文件，避免主日志被截断
+        html_log_file = LOG_DIR / f"html_{file_uuid}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        html_log_file_name = None
+        try:
+            with open(html_log_file, "w", encoding="utf-8") as f:
+                f.write(f"=== HTML 生成日志 ===\n")
+                f.write(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"模型: {model}\n")
+                f.write(f"图片路径: {request.image_path}\n")
+                f.write(f"HTML 长度: {len(final_html)} 字符\n")
+                f.write(f"Token 使用情况: {usage}\n")
+                f.write(f"HTML 文件路径: {html_file_relative_path}\n")
+                f.write(f"\n=== 生成的 HTML 内容 ===\n")
+                f.write(final_html)
+                f.write(f"\n=== HTML 内容结束 ===\n")
+            html_log_file_name = html_log_file.name
+            logger.info(f"完整 HTML 内容已保存到日志文件: {html_log_file_name}")
+        except Exception as e:
+            logger.warning(f"保存 HTML 日志文件失败: {str(e)}")
+        
+        logger.info(f"HTML 生成成功 - 模型: {model}, HTML 长度: {len(final_html)} 字符")
+        logger.info(f"Token 使用情况: {usage}")
+        if html_log_file_name:
+            logger.info(f"HTML 内容已保存到文件: {html_file_relative_path}，完整内容见日志文件: {html_log_file_name}")
+        else:
+            logger.info(f"HTML 内容已保存到文件: {html_file_relative_path}")
+        
+        response_data = {
+            "success": True,
+            "message": "HTML Slides 生成成功",
+            "html": final_html,
             "model": model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 16000,  # 大幅增加到 16K，匹配大模型的输出能力
+            "image_path": str(request.image_path),
+            "usage": usage,
+            "llm_cache_hit": generated["llm_cache_hit"],
+            "token_report": generated["token_report"],
+            "image_payload": generated["image_report"],
+            "template": generated["template"],
+            "route": generated["route"],
+            "validation": generated["validation"]
         }
         
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": HTTP_REFERER,
-            "X-Title": "ReDeck API",
-        }
+        if html_file_relative_path:
+            response_data["html_file_path"] = html_file_relative_path
         
-        # 调用 OpenRouter API
-        logger.info(f"正在调用 OpenRouter API 生成 HTML: {OPENROUTER_API_URL}")
-        async with httpx.AsyncClient(timeout=120.0) as client:  # 增加超时时间到 120 秒
-            response = await client.post(
-                OPENROUTER_API_URL,
-                json=payload,
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                error_text = response.text
-                error_msg = f"OpenRouter API 错误 (状态码: {response.status_code}): {error_text}"
-                logger.error(error_msg)
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_msg
-                )
-            
-            result = response.json()
-            
-            # 提取响应内容（HTML）
-            assistant_message = result["choices"][0]["message"]["content"]
-            usage = result.get("usage", {})
-            
-            # 检查是否因 token 限制而截断
-            completion_tokens = usage.get("completion_tokens", 0)
-            if completion_tokens >= 15000:  # 接近 16K 限制
-                logger.warning(f"⚠️ 警告：输出 tokens ({completion_tokens}) 接近上限，可能被截断！")
-                logger.warning(f"建议：1) 使用更大输出能力的模型，2) 简化系统提示词")
-            
-            # 清理 markdown 代码块标记（如果存在）
-            cleaned_html = clean_html_from_markdown_code_block(assistant_message)
-            
-            # 替换图片路径为完整路径
-            final_html = replace_html_image_paths(cleaned_html, date_str, file_uuid)
-            
-            # 保存 HTML 文件到输出目录
-            html_file_path = md_path.parent / f"{file_uuid}.html"
-            try:
-                with open(html_file_path, "w", encoding="utf-8") as f:
-                    f.write(final_html)
-                html_file_relative_path = str(html_file_path.relative_to(BASE_DIR)).replace("\\", "/")
-                logger.info(f"HTML 文件已保存: {html_file_relative_path}")
-            except Exception as e:
-                logger.warning(f"保存 HTML 文件失败: {str(e)}")
-                html_file_relative_path = None
-            
-            # 将完整的 HTML 内容写入单独的日志文件，避免主日志被截断
-            html_log_file = LOG_DIR / f"html_{file_uuid}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-            html_log_file_name = None
-            try:
-                with open(html_log_file, "w", encoding="utf-8") as f:
-                    f.write(f"=== HTML 生成日志 ===\n")
-                    f.write(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write(f"模型: {model}\n")
-                    f.write(f"图片路径: {request.image_path}\n")
-                    f.write(f"HTML 长度: {len(final_html)} 字符\n")
-                    f.write(f"Token 使用情况: {usage}\n")
-                    f.write(f"HTML 文件路径: {html_file_relative_path}\n")
-                    f.write(f"\n=== 生成的 HTML 内容 ===\n")
-                    f.write(final_html)
-                    f.write(f"\n=== HTML 内容结束 ===\n")
-                html_log_file_name = html_log_file.name
-                logger.info(f"完整 HTML 内容已保存到日志文件: {html_log_file_name}")
-            except Exception as e:
-                logger.warning(f"保存 HTML 日志文件失败: {str(e)}")
-            
-            logger.info(f"HTML 生成成功 - 模型: {model}, HTML 长度: {len(final_html)} 字符")
-            logger.info(f"Token 使用情况: {usage}")
-            if html_log_file_name:
-                logger.info(f"HTML 内容已保存到文件: {html_file_relative_path}，完整内容见日志文件: {html_log_file_name}")
-            else:
-                logger.info(f"HTML 内容已保存到文件: {html_file_relative_path}")
-            
-            response_data = {
-                "success": True,
-                "message": "HTML Slides 生成成功",
-                "html": final_html,
-                "model": model,
-                "image_path": str(request.image_path),
-                "usage": usage
-            }
-            
-            if html_file_relative_path:
-                response_data["html_file_path"] = html_file_relative_path
-            
-            return JSONResponse(content=response_data)
-    
+        return JSONResponse(content=response_data)
+
     except httpx.TimeoutException:
         error_msg = "OpenRouter API 请求超时（超过120秒）"
         logger.error(error_msg)
@@ -2044,69 +2907,18 @@ async def convert_html_to_pptx(request: SlidePptxRequest):
         
         output_file_path = html_file_path.parent / output_filename
         
-        # Node.js 脚本路径
-        scripts_dir = BASE_DIR / "scripts"
-        converter_script = scripts_dir / "convert-html-to-pptx.js"
-        
-        if not converter_script.exists():
-            raise HTTPException(
-                status_code=500, 
-                detail="转换脚本不存在。请确保 scripts/convert-html-to-pptx.js 已安装。"
-            )
-        
-        # 构建命令
-        cmd = [
-            "node",
-            str(converter_script),
-            str(html_file_path),
-            str(output_file_path),
-            "--tmp-dir", str(TEMP_DIR)
-        ]
-        
-        logger.info(f"执行 HTML → PPTX 转换: {' '.join(cmd)}")
-        
-        # 执行 Node.js 脚本（指定 UTF-8 编码避免 Windows GBK 编码问题）
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',  # 遇到无法解码的字符时替换而不是报错
-            cwd=str(scripts_dir),
-            timeout=120  # 2分钟超时
-        )
-        
-        # 解析输出（添加空值检查）
-        stdout = (process.stdout or '').strip()
-        stderr = (process.stderr or '').strip()
-        
-        if process.returncode != 0:
-            # 尝试解析错误信息
-            error_detail = stderr or stdout or "转换失败"
-            try:
-                error_json = json.loads(stderr or stdout)
-                error_detail = error_json.get('error', error_detail)
-            except json.JSONDecodeError:
-                pass
-            
-            logger.error(f"HTML → PPTX 转换失败: {error_detail}")
+        # 转换前校验：注定失败的页面直接拒绝，不启动 Node/Chromium（不修改用户指定的文件）
+        converter_html = converter_html_path(html_file_path)
+        validation = html_validator.check(converter_html.read_text(encoding="utf-8"), label=request.html_file_path)
+        if not validation["valid"]:
             raise HTTPException(
-                status_code=500,
-                detail=f"PPTX 转换失败: {error_detail}"
+                status_code=422,
+                detail=f"HTML 未通过转换前校验: {'; '.join(validation['errors'] or validation['warnings'])}",
             )
         
-        # 解析成功结果
-        try:
-            result = json.loads(stdout)
-        except json.JSONDecodeError:
-            result = {"success": True}
+        logger.info(f"执行 HTML → PPTX 转换: {converter_html} -> {output_file_path}")
         
-        # 验证输出文件存在
-        if not output_file_path.exists():
-            raise HTTPException(
-                status_code=500,
-                detail="PPTX 文件生成失败：输出文件不存在"
-            )
+        result = await convert_html_files_to_pptx([html_file_path], output_file_path, no_cache=request.no_cache)
         
         # 构建相对路径
         relative_path = str(output_file_path.relative_to(BASE_DIR)).replace("\\", "/")
@@ -2121,12 +2933,8 @@ async def convert_html_to_pptx(request: SlidePptxRequest):
             file_uuid = str(uuid_lib.uuid4())
         
         # 上传到 R2 并获取公开链接
-        try:
-            download_url = upload_pptx_to_r2(output_file_path, date_str, file_uuid)
-            logger.info(f"PPTX 已上传到 R2: {download_url}")
-        except Exception as e:
-            logger.warning(f"R2 上传失败，使用本地链接: {e}")
-            download_url = f"{STATIC_BASE_URL.rstrip('/')}/static/{relative_path}"
+        artifact = await publish_pptx(output_file_path, date_str, file_uuid, log_prefix="[Slides]")
+        download_url = artifact.download_url
         
         logger.info(f"PPTX 生成成功: {relative_path}")
         
@@ -2135,10 +2943,12 @@ async def convert_html_to_pptx(request: SlidePptxRequest):
             "message": "PPTX 文件生成成功",
             "pptx_file_path": relative_path,
             "download_url": download_url,
-            "placeholders": result.get("placeholders", [])
+            "upload_status": artifact.status.value,
+            "placeholders": result.get("placeholders", []),
+            "conversion_cache_hit": result.get("cache_hit", False),
         })
         
-    except subprocess.TimeoutExpired:
+    except (subprocess.TimeoutExpired, TimeoutError):
         error_msg = "PPTX 转换超时（超过2分钟）"
         logger.error(error_msg)
         raise HTTPException(status_code=504, detail=error_msg)
@@ -2150,6 +2960,63 @@ async def convert_html_to_pptx(request: SlidePptxRequest):
         raise HTTPException(status_code=500, detail=error_msg)
 
 
+@app.post("/slides/merge")
+async def merge_pptx_files(request: SlideMergeRequest):
+    """
+    合并多个已生成的 PPTX（按顺序追加幻灯片）
+    
+    直接在 zip 层面复制幻灯片、备注和图片部件，版式/母版去重，不重新渲染 HTML
+    
+    Args:
+        request: 包含 PPTX 文件路径列表的请求体
+        
+    Returns:
+        合并后的 PPTX 文件路径和下载链接
+    """
+    if len(request.pptx_file_paths) < 2:
+        raise HTTPException(status_code=400, detail="至少需要两个 PPTX 文件")
+    
+    input_files = []
+    for pptx_file_path in request.pptx_file_paths:
+        path = (BASE_DIR / pptx_file_path).resolve()
+        if not path.is_relative_to(OUTPUT_DIR.resolve()):
+            raise HTTPException(status_code=400, detail=f"只能合并 output/ 下的文件: {pptx_file_path}")
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail=f"PPTX 文件不存在: {pptx_file_path}")
+        if path.suffix.lower() != ".pptx":
+            raise HTTPException(status_code=400, detail=f"文件不是 PPTX 格式: {pptx_file_path}")
+        input_files.append(path)
+    
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    file_uuid = str(uuid_lib.uuid4())
+    output_filename = Path(request.output_filename or file_uuid).name
+    if not output_filename.endswith(".pptx"):
+        output_filename += ".pptx"
+    output_pptx_path = OUTPUT_DIR / date_str / file_uuid / output_filename
+    
+    try:
+        result = await asyncio.to_thread(pptx_merger.merge, input_files, output_pptx_path)
+    except PptxMergeError as e:
+        raise HTTPException(status_code=422, detail=f"PPTX 合并失败: {e}")
+    except Exception as e:
+        error_msg = f"PPTX 合并失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+    
+    artifact = await publish_pptx(output_pptx_path, date_str, file_uuid, log_prefix="[Merge]")
+    download_url = artifact.download_url
+    return JSONResponse(content={
+        "success": True,
+        "message": "PPTX 合并成功",
+        "pptx_file_path": str(output_pptx_path.relative_to(BASE_DIR)).replace("\\", "/"),
+        "download_url": download_url,
+        "upload_status": artifact.status.value,
+        "slides": result["slides"],
+        "layouts_reused": result["layouts_reused"],
+        "media_reused": result["media_reused"],
+    })
+
+
 if __name__ == "__main__":
     import os
     port = int(os.getenv("PORT", "8000"))
@@ -0,0 +1,196 @@
+"""
+产物发布模块
+记录每个生成的 PPTX（按 file_uuid）的下载链接和上传状态：
+
+- sync 模式：等待 R2 上传完成后返回链接（失败时返回本地静态链接），与原行为一致
+- background 模式：立即返回本地静态链接（文件已可通过 /static/output 访问），
+  后台带重试上传到 R2，上传成功后 GET /artifacts/{uuid} 和 GET /tasks/{id} 返回 R2 链接
+"""
+
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+from scripts.r2_upload import upload_pptx_to_r2_async, check_r2_config
+
+logger = logging.getLogger(__name__)
+
+# 配置
+R2_UPLOAD_MODE = os.getenv("R2_UPLOAD_MODE", "sync").lower()                # sync / background
+R2_UPLOAD_RETRIES = int(os.getenv("R2_UPLOAD_RETRIES", "3"))                 # background 模式的重试次数
+R2_UPLOAD_RETRY_DELAY = float(os.getenv("R2_UPLOAD_RETRY_DELAY", "2"))       # 首次重试等待（秒），之后指数增长
+ARTIFACT_MAX_ENTRIES = int(os.getenv("ARTIFACT_MAX_ENTRIES", "2000"))        # 内存中保留的产物记录数
+R2_UPLOAD_SHUTDOWN_WAIT = float(os.getenv("R2_UPLOAD_SHUTDOWN_WAIT", "30"))  # 关闭时等待未完成上传的时间
+
+
+class ArtifactStatus(str, Enum):
+    PENDING = "pending"      # 等待后台上传
+    UPLOADED = "uploaded"    # 已上传到 R2
+    FAILED = "failed"        # 重试后仍上传失败，只有本地链接
+    LOCAL = "local"          # R2 未配置，只有本地链接
+
+
+@dataclass
+class Artifact:
+    file_uuid: str
+    date: str
+    local_path: str
+    local_url: str
+    status: ArtifactStatus = ArtifactStatus.PENDING
+    r2_url: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    uploaded_at: Optional[float] = None
+
+    @property
+    def download_url(self) -> str:
+        return self.r2_url or self.local_url
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_uuid": self.file_uuid,
+            "date": self.date,
+            "status": self.status.value,
+            "download_url": self.download_url,
+            "local_url": self.local_url,
+            "r2_url": self.r2_url,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "uploaded_at": datetime.fromtimestamp(self.uploaded_at).isoformat() if self.uploaded_at else None,
+        }
+
+
+class ArtifactStore:
+    """产物上传与链接查询"""
+
+    def __init__(self, mode: str = "sync", retries: int = 3, retry_delay: float = 2.0, max_entries: int = 2000):
+        self.mode = mode
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_entries = max_entries
+        self.artifacts: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._uploads: set = set()  # 保持后台任务的引用，避免被回收
+        self.stats = {
+            "published": 0,
+            "uploaded": 0,
+            "failed": 0,
+            "retries": 0,
+            "upload_seconds": 0.0,
+        }
+
+    async def publish(
+        self,
+        local_path: Path,
+        date_str: str,
+        file_uuid: str,
+        local_url: str,
+        log_prefix: str = "[Task]",
+    ) -> Artifact:
+        """
+        发布一个 PPTX
+
+        sync 模式等待上传结束；background 模式立即返回（status=pending），上传在后台进行
+        """
+        artifact = Artifact(file_uuid=file_uuid, date=date_str, local_path=str(local_path), local_url=local_url)
+        self._remember(artifact)
+        self.stats["published"] += 1
+
+        if not check_r2_config()["configured"]:
+            artifact.status = ArtifactStatus.LOCAL
+            logger.warning(f"{log_prefix} R2 未配置，使用本地链接: {local_url}")
+            return artifact
+
+        if self.mode != "background":
+            await self._upload(artifact, log_prefix, retries=0)
+            return artifact
+
+        upload = asyncio.create_task(self._upload(artifact, log_prefix, retries=self.retries))
+        self._uploads.add(upload)
+        upload.add_done_callback(self._uploads.discard)
+        logger.info(f"{log_prefix} 先返回本地链接，R2 上传在后台进行: {file_uuid}")
+        return artifact
+
+    async def _upload(self, artifact: Artifact, log_prefix: str, retries: int):
+        start = time.time()
+        for attempt in range(retries + 1):
+            artifact.attempts = attempt + 1
+            try:
+                artifact.r2_url = await upload_pptx_to_r2_async(artifact.local_path, artifact.date, artifact.file_uuid)
+                artifact.status = ArtifactStatus.UPLOADED
+                artifact.uploaded_at = time.time()
+                artifact.error = None
+                self.stats["uploaded"] += 1
+                self.stats["upload_seconds"] += artifact.uploaded_at - start
+                logger.info(f"{log_prefix} PPTX 已上传到 R2: {artifact.r2_url}")
+                return
+            except Exception as e:
+                artifact.error = str(e)[:500]
+                if attempt < retries:
+                    self.stats["retries"] += 1
+                    delay = self.retry_delay * (2 ** attempt)
+                    logger.warning(f"{log_prefix} R2 上传失败，{delay:.0f}s 后重试 ({attempt + 1}/{retries}): {e}")
+                    await asyncio.sleep(delay)
+        artifact.status = ArtifactStatus.FAILED
+        self.stats["failed"] += 1
+        logger.warning(f"{log_prefix} R2 上传失败，使用本地链接: {artifact.error}")
+
+    def _remember(self, artifact: Artifact):
+        self.artifacts[artifact.file_uuid] = artifact
+        self.artifacts.move_to_end(artifact.file_uuid)
+        while len(self.artifacts) > self.max_entries:
+            self.artifacts.popitem(last=False)
+
+    def get(self, file_uuid: str) -> Optional[Artifact]:
+        return self.artifacts.get(file_uuid)
+
+    def resolve_result(self, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """把任务结果中的 download_url 换成最新链接，并附带 upload_status"""
+        if not result:
+            return result
+        artifact = self.get(result.get("file_uuid") or result.get("deck_uuid") or "")
+        if artifact is None:
+            return result
+        return {**result, "download_url": artifact.download_url, "upload_status": artifact.status.value}
+
+    async def stop(self, timeout: float = R2_UPLOAD_SHUTDOWN_WAIT):
+        """关闭时等待未完成的后台上传"""
+        if not self._uploads:
+            return
+        logger.info(f"[Artifacts] 等待 {len(self._uploads)} 个后台上传完成...")
+        done, pending = await asyncio.wait(list(self._uploads), timeout=timeout)
+        for upload in pending:
+            upload.cancel()
+        if pending:
+            logger.warning(f"[Artifacts] {len(pending)} 个上传未完成，已取消")
+
+    def get_stats(self) -> Dict[str, Any]:
+        uploaded = self.stats["uploaded"]
+        return {
+            "mode": self.mode,
+            "retries": self.retries,
+            "tracked": len(self.artifacts),
+            "pending_uploads": len(self._uploads),
+            "published": self.stats["published"],
+            "uploaded": uploaded,
+            "failed": self.stats["failed"],
+            "retry_count": self.stats["retries"],
+            "avg_upload_seconds": round(self.stats["upload_seconds"] / uploaded, 2) if uploaded else None,
+        }
+
+
+# 全局产物实例
+artifact_store = ArtifactStore(
+    mode=R2_UPLOAD_MODE,
+    retries=R2_UPLOAD_RETRIES,
+    retry_delay=R2_UPLOAD_RETRY_DELAY,
+    max_entries=ARTIFACT_MAX_ENTRIES,
+)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+共享主题基准测试脚本
+
+对已有 OCR 输出的若干页，分别用逐页独立生成（当前方式）和共享主题模式调用 LLM，
+对比输出 token 数和延迟。会真实调用 OPENROUTER_API_URL（可指向 scripts/stub_llm_server.py），
+两种模式都跳过 LLM 响应缓存
+
+用法:
+    python scripts/bench_deck_theme.py [--limit 5] [--model google/gemini-2.5-flash]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import (
+    BASE_DIR, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT,
+    prepare_slide_prompt, call_llm_for_html, prompt_registry,
+)
+from scripts.deck_theme import extract_theme, theme_css, theme_instruction
+
+
+def find_slides(limit: int) -> list:
+    """查找有原图的 OCR 输出: output/{date}/{uuid}/**/{name}_middle.json + input/{date}/{uuid}.*"""
+    slides = []
+    for json_path in sorted((BASE_DIR / "output").glob("*/*/**/*_middle.json")):
+        date_str, file_uuid = json_path.relative_to(BASE_DIR / "output").parts[:2]
+        md_path = json_path.with_name(json_path.name.replace("_middle.json", ".md"))
+        images = list((BASE_DIR / "input" / date_str).glob(f"{file_uuid}.*"))
+        if md_path.exists() and images:
+            slides.append({"json_path": json_path, "md_path": md_path, "image_path": images[0]})
+        if limit and len(slides) >= limit:
+            break
+    return slides
+
+
+async def run_mode(slide: dict, model: str, system_prompt: str, extra_instruction):
+    layout_json = json.loads(slide["json_path"].read_text(encoding="utf-8"))
+    md_text = slide["md_path"].read_text(encoding="utf-8")
+    prompt = prepare_slide_prompt(
+        system_prompt, md_text, layout_json, image_path=slide["image_path"],
+        model=model, extra_instruction=extra_instruction,
+    )
+    start = time.time()
+    result = await call_llm_for_html(prompt["messages"], model, "ReDeck Bench", no_cache=True)
+    return {
+        "latency": time.time() - start,
+        "completion_tokens": result["usage"].get("completion_tokens", 0),
+        "prompt_tokens": result["usage"].get("prompt_tokens", 0),
+        "chars": len(result["content"]),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="共享主题基准测试")
+    parser.add_argument("--limit", type=int, default=5, help="测试页数")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    slides = find_slides(args.limit)
+    if not slides:
+        print("未找到可用的 OCR 输出（需要 output/ 下的 *_middle.json 和 input/ 下对应的原图）")
+        return
+
+    system_prompt = prompt_registry.get("system_prompt.md", DEFAULT_SYSTEM_PROMPT)
+    layouts = [json.loads(s["json_path"].read_text(encoding="utf-8")) for s in slides]
+
+    start = time.time()
+    theme = extract_theme([s["image_path"] for s in slides], layouts)
+    theme_seconds = time.time() - start
+    instruction = theme_instruction(theme_css(theme))
+
+    modes = {"per_slide": None, "shared_theme": instruction}
+    results = {mode: [] for mode in modes}
+    for i, slide in enumerate(slides):
+        # 两种模式交替执行，减少模型负载波动的影响
+        for mode, extra in modes.items():
+            try:
+                results[mode].append(await run_mode(slide, args.model, system_prompt, extra))
+            except Exception as e:
+                print(f"  [{mode}] 第 {i + 1} 页失败: {e}")
+        print(f"  已完成 {i + 1}/{len(slides)} 页")
+
+    def summary(rows, key):
+        return statistics.mean(r[key] for r in rows) if rows else 0.0
+
+    base = results["per_slide"]
+    print("=" * 72)
+    print(f"  共享主题基准 ({len(slides)} 页, 模型: {args.model}, 主题提取 {theme_seconds:.2f}s)")
+    print("=" * 72)
+    print(f"  {'模式':<14}{'输出 tokens':>14}{'输入 tokens':>14}{'延迟 (s)':>12}{'输出字符':>12}")
+    for mode, rows in results.items():
+        print(
+            f"  {mode:<14}{summary(rows, 'completion_tokens'):>14.0f}{summary(rows, 'prompt_tokens'):>14.0f}"
+            f"{summary(rows, 'latency'):>12.2f}{summary(rows, 'chars'):>12.0f}"
+        )
+    if base and results["shared_theme"]:
+        for key, label in (("completion_tokens", "输出 token"), ("latency", "延迟")):
+            before = summary(base, key)
+            after = summary(results["shared_theme"], key)
+            if before:
+                print(f"  {label}减少: {1 - after / before:.1%}")
+    print(f"  主题: {theme}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+HTML 后处理微基准
+
+对比旧流程和单次扫描后处理在不同大小 LLM 输出上的耗时：
+- 旧流程：5 次正则清理代码块/解释文字 + 3 次正则替换图片 URL（每处替换一条 INFO 日志），
+  转换前再由 convert-html-to-pptx.js 的 preprocessHtml 正则改回本地路径并写临时文件（这里用等价的 Python 实现）
+- 新流程：scripts/html_postprocess.py 一次扫描同时生成公开版和转换版，写一次转换版文件
+
+用法:
+    python scripts/bench_html_postprocess.py [--repeat 20]
+"""
+
+import argparse
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.html_postprocess import postprocess_html
+
+BASE_URL = "http://127.0.0.1:8000/static/output/2025-01-01/u/u/auto/images/"
+
+# 旧流程的日志与服务一致：INFO 级别写入日志文件
+logger = logging.getLogger("bench_legacy")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.FileHandler(os.devnull, encoding="utf-8"))
+logger.propagate = False
+
+
+def legacy_clean(html_content: str) -> str:
+    html_content = re.sub(r'^```html\s*\n?', '', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^```\s*\n?', '', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'\n?```\s*$', '', html_content, flags=re.MULTILINE)
+    doctype_match = re.search(r'<!DOCTYPE\s+html[^>]*>', html_content, re.IGNORECASE)
+    html_tag_match = re.search(r'<html[^>]*>', html_content, re.IGNORECASE)
+    start_pos = doctype_match.start() if doctype_match else (html_tag_match.start() if html_tag_match else 0)
+    html_end_match = re.search(r'</html\s*>', html_content, re.IGNORECASE)
+    end_pos = html_end_match.end() if html_end_match else len(html_content)
+    return html_content[start_pos:end_pos].strip()
+
+
+def legacy_replace(html_content: str) -> str:
+    def relative(match):
+        http_path = f"{BASE_URL}{match.group(1)}"
+        logger.info(f"替换相对图片路径: images/{match.group(1)} -> {http_path}")
+        return f'src="{http_path}"'
+
+    def absolute(match):
+        http_path = f"{BASE_URL}{match.group(2)}"
+        logger.info(f"替换绝对/完整图片路径: {match.group(0)} -> {http_path}")
+        return f'src="{http_path}"'
+
+    def direct(match):
+        http_path = f"{BASE_URL}{match.group(1)}"
+        logger.info(f"替换直接图片引用: {match.group(1)} -> {http_path}")
+        return f'src="{http_path}"'
+
+    result = re.sub(r'src=["\']([^"\']*[/\\])images/([^"\']+)["\']', absolute, html_content)
+    result = re.sub(r'src=["\']images/([^"\']+)["\']', relative, result)
+    return re.sub(r'src=["\'](?!http|/|images/)(img_\d+\.(jpg|jpeg|png|webp|gif))["\']', direct, result)
+
+
+def legacy_preprocess(html_content: str, tmp_dir: Path) -> None:
+    """convert-html-to-pptx.js preprocessHtml 的等价实现：URL 改回本地路径并写临时文件"""
+    def local(match):
+        parts = match.group(1).split("/")
+        return "/".join(parts[parts.index("images"):]) if "images" in parts else match.group(0)
+
+    content = re.sub(r'https?://[^/]+/static/output/([^"\']+)', local, html_content)
+    temp_file = tmp_dir / "slide_temp.html"
+    temp_file.write_text(content, encoding="utf-8")
+    temp_file.unlink()
+
+
+def make_output(images: int, filler_kb: int) -> str:
+    """构造一份带前置说明和代码块标记的 LLM 输出"""
+    body = []
+    for i in range(images):
+        body.append(f'<div style="position:absolute;left:{i}pt;top:10pt;"><img src="images/img_{i:02d}.jpg"></div>')
+    filler = '<div style="position:absolute;left:10pt;top:20pt;"><p>Lorem ipsum dolor sit amet 示例文本</p></div>\n'
+    body.append(filler * (filler_kb * 1024 // len(filler.encode("utf-8"))))
+    return (
+        "Here is the HTML slide:\n```html\n<!DOCTYPE html>\n<html>\n<head><style>body{width:720pt;height:405pt;}</style>"
+        "</head>\n<body>\n" + "\n".join(body) + "\n</body>\n</html>\n```\nLet me know if you need changes."
+    )
+
+
+def measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML 后处理微基准")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+
+        def legacy(raw):
+            public = legacy_replace(legacy_clean(raw))
+            legacy_preprocess(public, tmp_dir)
+
+        def single_pass(raw):
+            result = postprocess_html(raw, BASE_URL)
+            (tmp_dir / "slide_local.html").write_text(result["local"], encoding="utf-8")
+
+        print("=" * 72)
+        print(f"  HTML 后处理微基准（中位数，重复 {args.repeat} 次）")
+        print("=" * 72)
+        print(f"  {'输出大小':>10}{'图片数':>8}{'旧流程 (ms)':>16}{'单次扫描 (ms)':>16}{'加速':>10}")
+        for images, filler_kb in ((5, 8), (20, 64), (50, 256), (100, 1024)):
+            raw = make_output(images, filler_kb)
+            # 两种流程的公开版结果一致
+            assert postprocess_html(raw, BASE_URL)["public"] == legacy_replace(legacy_clean(raw))
+            old = measure(lambda: legacy(raw), args.repeat)
+            new = measure(lambda: single_pass(raw), args.repeat)
+            size = f"{len(raw.encode('utf-8')) / 1024:.0f}KB"
+            print(f"  {size:>10}{images:>8}{old:>16.2f}{new:>16.2f}{old / new:>9.1f}x")
+        print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+布局 JSON 精简基准测试脚本
+
+扫描 OCR 输出目录中的 *_middle.json，对比各精简级别下发送给 LLM 的
+布局 JSON 字符数和估算 token 数（基准为原来的 indent=2 格式）
+
+用法:
+    python scripts/bench_layout_distill.py [output_dir] [--limit N]
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.layout_distiller import DETAIL_LEVELS, distill_layout_text
+
+_CJK_RE = re.compile(r"[　-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：CJK 字符按 1 token，其余按 4 字符 1 token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description="布局 JSON 精简基准测试")
+    parser.add_argument("output_dir", nargs="?", default=str(Path(__file__).resolve().parent.parent / "output"))
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的文件数（0 表示不限）")
+    args = parser.parse_args()
+
+    files = sorted(Path(args.output_dir).rglob("*_middle.json"))
+    if args.limit:
+        files = files[:args.limit]
+    if not files:
+        print(f"未找到 *_middle.json: {args.output_dir}")
+        return
+
+    levels = ["indent=2"] + list(DETAIL_LEVELS)
+    totals = {level: {"chars": 0, "tokens": 0} for level in levels}
+
+    for path in files:
+        layout_json = json.loads(path.read_text(encoding="utf-8"))
+        texts = {"indent=2": json.dumps(layout_json, ensure_ascii=False, indent=2)}
+        for level in DETAIL_LEVELS:
+            texts[level] = distill_layout_text(layout_json, level)
+        for level, text in texts.items():
+            totals[level]["chars"] += len(text)
+            totals[level]["tokens"] += estimate_tokens(text)
+
+    base = totals["indent=2"]
+    print("=" * 64)
+    print(f"  布局 JSON 精简基准 ({len(files)} 个文件)")
+    print("=" * 64)
+    print(f"  {'级别':<10}{'平均字符':>12}{'平均 tokens':>14}{'token 减少':>14}")
+    for level in levels:
+        chars = totals[level]["chars"] / len(files)
+        tokens = totals[level]["tokens"] / len(files)
+        reduction = 1 - totals[level]["tokens"] / base["tokens"] if base["tokens"] else 0
+        print(f"  {level:<10}{chars:>12.0f}{tokens:>14.0f}{reduction:>13.1%}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+纯 Python PPTX 转换评估脚本
+
+对已有的转换版 HTML（output/**/*_local.html）逐页统计能否走 python-pptx、各自的转换耗时；
+加 --compare 时同时用 convert-html-to-pptx.js 转换同一页，用 doc/pptx/scripts/inventory.py
+提取两份 PPTX 的文本框，按文本配对后对比位置、字号、加粗和颜色
+
+用法:
+    python scripts/bench_py_converter.py [--limit 50] [--compare] [--tolerance 0.05]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.py_converter import convert_html_files
+from scripts.static_layout import StaticLayoutUnsupported
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = BASE_DIR / "scripts"
+INVENTORY_DIR = BASE_DIR.parent / "doc" / "pptx" / "scripts"
+
+
+def find_html_files(limit: int) -> list:
+    paths = sorted((BASE_DIR / "output").glob("*/*/**/*_local.html"))
+    return paths[:limit] if limit else paths
+
+
+def convert_with_node(html_path: Path, output: Path, tmp_dir: Path) -> float:
+    """用一次性 CLI 转换，返回耗时（秒）；失败时抛出异常"""
+    start = time.time()
+    process = subprocess.run(
+        ["node", str(SCRIPTS_DIR / "convert-html-to-pptx.js"), str(html_path), str(output), "--tmp-dir", str(tmp_dir)],
+        capture_output=True, text=True, encoding="utf-8", errors="replace", cwd=str(SCRIPTS_DIR), timeout=120,
+    )
+    if process.returncode != 0 or not output.exists():
+        raise RuntimeError((process.stderr or process.stdout or "")[-300:])
+    return time.time() - start
+
+
+def text_shapes(pptx_path: Path) -> dict:
+    """inventory.py 提取的文本框，按文本索引"""
+    from inventory import get_inventory_as_dict
+    shapes = {}
+    for slide in get_inventory_as_dict(pptx_path).values():
+        for shape in slide.values():
+            text = " ".join(p.get("text", "") for p in shape.get("paragraphs", [])).strip()
+            if text:
+                shapes[text] = shape
+    return shapes
+
+
+def compare(python_pptx: Path, node_pptx: Path, tolerance: float) -> dict:
+    """按文本配对两份 PPTX 的文本框，返回位置最大偏差（英寸）和样式不一致项"""
+    ours, theirs = text_shapes(python_pptx), text_shapes(node_pptx)
+    deltas, mismatches = [], []
+    for text, expected in theirs.items():
+        actual = ours.get(text)
+        if actual is None:
+            mismatches.append(f"缺少文本框: {text[:30]}")
+            continue
+        delta = max(abs(actual[k] - expected[k]) for k in ("left", "top", "width", "height"))
+        deltas.append(delta)
+        if delta > tolerance:
+            mismatches.append(f"位置偏差 {delta:.2f}in: {text[:30]}")
+        first_actual, first_expected = actual["paragraphs"][0], expected["paragraphs"][0]
+        for key in ("font_size", "bold", "color", "bullet", "alignment"):
+            if first_actual.get(key) != first_expected.get(key):
+                mismatches.append(f"{key} {first_actual.get(key)} != {first_expected.get(key)}: {text[:30]}")
+    mismatches += [f"多余文本框: {text[:30]}" for text in ours.keys() - theirs.keys()]
+    return {"max_delta": max(deltas) if deltas else 0.0, "mismatches": mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="纯 Python PPTX 转换评估")
+    parser.add_argument("--limit", type=int, default=50, help="评估页数（0 为全部）")
+    parser.add_argument("--compare", action="store_true", help="同时用 Node 转换并对比文本框")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="位置偏差阈值（英寸）")
+    args = parser.parse_args()
+
+    html_files = find_html_files(args.limit)
+    if not html_files:
+        print("未找到转换版 HTML（需要 output/ 下的 *_local.html）")
+        return
+    if args.compare:
+        sys.path.insert(0, str(INVENTORY_DIR))
+
+    reasons, python_times, node_times, rows = {}, [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        for index, html_path in enumerate(html_files):
+            python_output = tmp_dir / f"{index}_python.pptx"
+            start = time.time()
+            try:
+                convert_html_files([html_path], python_output)
+            except StaticLayoutUnsupported as e:
+                reasons[e.reason] = reasons.get(e.reason, 0) + 1
+                continue
+            python_times.append(time.time() - start)
+            reasons["python"] = reasons.get("python", 0) + 1
+
+            if not args.compare:
+                continue
+            node_output = tmp_dir / f"{index}_node.pptx"
+            try:
+                node_times.append(convert_with_node(html_path, node_output, tmp_dir))
+            except Exception as e:
+                print(f"  Node 转换失败 {html_path.name}: {e}")
+                continue
+            result = compare(python_output, node_output, args.tolerance)
+            rows.append((html_path, result))
+            status = "OK" if not result["mismatches"] else f"{len(result['mismatches'])} 处不一致"
+            print(f"  {html_path.parent.name}/{html_path.name}: 最大偏差 {result['max_delta']:.3f}in, {status}")
+            for mismatch in result["mismatches"][:5]:
+                print(f"      {mismatch}")
+
+    total = len(html_files)
+    print(f"\n页数: {total}, python-pptx: {reasons.get('python', 0)} ({reasons.get('python', 0) / total:.0%})")
+    for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+        if reason != "python":
+            print(f"  回退 {reason}: {count}")
+    if python_times:
+        print(f"python-pptx 耗时: p50 {statistics.median(python_times) * 1000:.0f}ms, max {max(python_times) * 1000:.0f}ms")
+    if node_times:
+        print(f"Node CLI 耗时:    p50 {statistics.median(node_times) * 1000:.0f}ms, max {max(node_times) * 1000:.0f}ms")
+    if rows:
+        exact = sum(1 for _, r in rows if not r["mismatches"])
+        print(f"一致: {exact}/{len(rows)}（位置阈值 {args.tolerance}in）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+简单页规则生成评估脚本
+
+对已有 OCR 输出逐页路由，统计走规则生成的比例、规则生成耗时和质量闸门结果；
+加 --convert 时把规则生成的 HTML 交给 convert-html-to-pptx.js（html2pptx 校验），
+对比质量闸门与 html2pptx 的校验结论
+
+用法:
+    python scripts/bench_simple_slide.py [--limit 50] [--convert]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.simple_slide import classify_slide, render_simple_slide
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = BASE_DIR / "scripts"
+
+
+def find_layouts(limit: int) -> list:
+    """查找 OCR 输出: output/{date}/{uuid}/**/{name}_middle.json"""
+    paths = sorted((BASE_DIR / "output").glob("*/*/**/*_middle.json"))
+    return paths[:limit] if limit else paths
+
+
+def html2pptx_warnings(html_path: Path, tmp_dir: Path) -> dict:
+    """用 Node 转换脚本转换单页，返回 html2pptx 的校验结论"""
+    output = tmp_dir / f"{html_path.stem}.pptx"
+    process = subprocess.run(
+        ["node", str(SCRIPTS_DIR / "convert-html-to-pptx.js"), str(html_path), str(output), "--tmp-dir", str(tmp_dir)],
+        capture_output=True, text=True, encoding="utf-8", errors="replace", cwd=str(SCRIPTS_DIR), timeout=120,
+    )
+    log = (process.stdout or "") + (process.stderr or "")
+    return {"converted": process.returncode == 0 and output.exists(), "warnings": "Validation warnings" in log}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="简单页规则生成评估")
+    parser.add_argument("--limit", type=int, default=50, help="评估页数（0 为全部）")
+    parser.add_argument("--convert", action="store_true", help="同时用 html2pptx 校验规则生成结果")
+    args = parser.parse_args()
+
+    layouts = find_layouts(args.limit)
+    if not layouts:
+        print("未找到 OCR 输出（需要 output/ 下的 *_middle.json）")
+        return
+
+    reasons, latencies, rows = {}, [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        for json_path in layouts:
+            layout_json = json.loads(json_path.read_text(encoding="utf-8"))
+            info = classify_slide(layout_json)
+            reasons[info["reason"]] = reasons.get(info["reason"], 0) + 1
+            if not info["simple"]:
+                continue
+
+            start = time.perf_counter()
+            result = render_simple_slide(layout_json)
+            latencies.append(time.perf_counter() - start)
+            row = {
+                "path": json_path,
+                "gate_pass": not result["errors"],
+                "gate_clean": not result["errors"] and not result["warnings"],
+            }
+
+            if args.convert:
+                # 写到 OCR 输出目录旁边，使 images/ 相对路径可以解析
+                html_path = json_path.with_name(json_path.name.replace("_middle.json", "_rule.html"))
+                html_path.write_text(result["html"], encoding="utf-8")
+                try:
+                    row.update(html2pptx_warnings(html_path, tmp_dir))
+                finally:
+                    html_path.unlink(missing_ok=True)
+            rows.append(row)
+
+    total = len(layouts)
+    passed = sum(1 for r in rows if r["gate_pass"])
+    print("=" * 64)
+    print(f"  简单页规则生成评估 ({total} 页)")
+    print("=" * 64)
+    print(f"  路由到规则生成: {len(rows)} ({len(rows) / total:.1%})，质量闸门通过: {passed}")
+    for reason, count in sorted(reasons.items(), key=lambda kv: -kv[1]):
+        print(f"    {reason:<28}{count:>6}")
+    if latencies:
+        print(f"  规则生成耗时: 平均 {statistics.mean(latencies) * 1000:.1f}ms，最大 {max(latencies) * 1000:.1f}ms")
+
+    if args.convert and rows:
+        # html2pptx 非严格模式下错误和警告都只打印警告，对比时闸门的 warning 也计入
+        agree = sum(1 for r in rows if r["gate_clean"] == (r["converted"] and not r["warnings"]))
+        print(f"  html2pptx 转换成功: {sum(1 for r in rows if r['converted'])}/{len(rows)}，"
+              f"无校验警告: {sum(1 for r in rows if r['converted'] and not r['warnings'])}")
+        print(f"  质量闸门与 html2pptx 结论一致: {agree}/{len(rows)}")
+        for r in rows:
+            if r["gate_pass"] and (not r["converted"] or r["warnings"]):
+                print(f"    闸门通过但 html2pptx 报警: {r['path']}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+整套幻灯片主题提取模块
+从若干样本页（原图 + MinerU 布局 JSON）中用本地启发式提取共享主题：
+背景色、文字色、强调色（图片调色板）和标题/正文字号（布局行高），生成共享 CSS；
+逐页生成时 LLM 只需引用主题 CSS 变量输出页面特有的标记，不必每页重新推导全局样式
+"""
+
+import os
+import re
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from PIL import Image
+
+from scripts.layout_distiller import distill_layout
+
+# 配置
+DECK_THEME_SAMPLES = int(os.getenv("DECK_THEME_SAMPLES", "3"))  # 参与主题提取的样本页数
+DECK_THEME_FONT = os.getenv(
+    "DECK_THEME_FONT", '"Microsoft YaHei", "PingFang SC", "Noto Sans CJK SC", Arial, sans-serif'
+)
+
+_PALETTE_SIZE = 8
+_THUMB_SIZE = (160, 90)
+
+Color = Tuple[int, int, int]
+
+
+def _hex(color: Color) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*color)
+
+
+def _luminance(color: Color) -> float:
+    """相对亮度（WCAG）"""
+    def channel(c: int) -> float:
+        c = c / 255
+        return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+    r, g, b = color
+    return 0.2126 * channel(r) + 0.7152 * channel(g) + 0.0722 * channel(b)
+
+
+def _contrast(a: Color, b: Color) -> float:
+    la, lb = sorted((_luminance(a), _luminance(b)), reverse=True)
+    return (la + 0.05) / (lb + 0.05)
+
+
+def _saturation(color: Color) -> float:
+    hi, lo = max(color), min(color)
+    return (hi - lo) / hi if hi else 0.0
+
+
+def _distance(a: Color, b: Color) -> float:
+    return sum((x - y) ** 2 for x, y in zip(a, b)) ** 0.5
+
+
+def _palette(path: Union[str, Path]) -> Tuple[Color, List[Tuple[float, Color]]]:
+    """
+    计算单张图片的边缘主色（近似背景色）和整体调色板
+
+    Returns:
+        (边缘主色, [(占比, 颜色), ...] 按占比降序)
+    """
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        img.thumbnail(_THUMB_SIZE)
+        quantized = img.quantize(colors=_PALETTE_SIZE, method=Image.Quantize.MEDIANCUT)
+
+    palette = quantized.getpalette()
+    colors = {i: tuple(palette[i * 3:i * 3 + 3]) for i in range(_PALETTE_SIZE)}
+    counts = quantized.getcolors() or []
+    total = sum(count for count, _ in counts) or 1
+    ranked = sorted(((count / total, colors[index]) for count, index in counts), reverse=True)
+
+    # 边缘像素的众数作为背景色（幻灯片四周通常是背景）
+    width, height = quantized.size
+    border = {}
+    for x in range(width):
+        for y in (0, height - 1):
+            index = quantized.getpixel((x, y))
+            border[index] = border.get(index, 0) + 1
+    for y in range(height):
+        for x in (0, width - 1):
+            index = quantized.getpixel((x, y))
+            border[index] = border.get(index, 0) + 1
+    background = colors[max(border, key=border.get)]
+    return background, ranked
+
+
+def _typography(layout_jsons: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+    """根据布局行高估算标题和正文字号（pt），字号约为行高的 0.8"""
+    title_heights, text_heights = [], []
+    for layout_json in layout_jsons:
+        for block in distill_layout(layout_json, "lines").get("blocks", []):
+            lines = block.get("lines") or ([{"bbox": block["bbox"]}] if block.get("text") and block.get("bbox") else [])
+            heights = [line["bbox"][3] - line["bbox"][1] for line in lines if line.get("bbox")]
+            if block.get("type") == "title":
+                title_heights.extend(heights)
+            elif block.get("type") == "text":
+                text_heights.extend(heights)
+
+    def size(heights: List[float], default: int, low: int, high: int) -> int:
+        if not heights:
+            return default
+        return max(low, min(high, round(statistics.median(heights) * 0.8)))
+
+    return {
+        "title_size": size(title_heights, 32, 20, 54),
+        "body_size": size(text_heights, 16, 10, 28),
+    }
+
+
+def extract_theme(
+    image_paths: Sequence[Union[str, Path]],
+    layout_jsons: Sequence[Dict[str, Any]] = (),
+    samples: int = DECK_THEME_SAMPLES,
+) -> Dict[str, Any]:
+    """
+    从样本页提取共享主题
+
+    Args:
+        image_paths: 各页原图（均匀抽取 samples 张）
+        layout_jsons: 对应的 _middle.json（用于估算字号，可为空）
+        samples: 样本页数
+
+    Returns:
+        {"background", "text", "muted", "accent", "font_family", "title_size", "body_size", "samples"}
+    """
+    if not image_paths:
+        raise ValueError("至少需要一张样本图片")
+
+    step = max(1, len(image_paths) // max(1, samples))
+    indices = list(range(0, len(image_paths), step))[:samples]
+
+    backgrounds: List[Color] = []
+    weighted: Dict[Color, float] = {}
+    for i in indices:
+        background, ranked = _palette(image_paths[i])
+        backgrounds.append(background)
+        for share, color in ranked:
+            weighted[color] = weighted.get(color, 0.0) + share
+
+    background = tuple(int(statistics.median(c[k] for c in backgrounds)) for k in range(3))
+
+    # 文字色：深色或浅色中与背景对比度更高的一个
+    dark, light = (31, 31, 31), (245, 245, 245)
+    text = dark if _contrast(dark, background) >= _contrast(light, background) else light
+    muted = tuple(int(t * 0.7 + b * 0.3) for t, b in zip(text, background))
+
+    # 强调色：与背景差异明显、饱和度高且占比不可忽略的颜色
+    candidates = [
+        (share * (0.2 + _saturation(color)), color)
+        for color, share in weighted.items()
+        if share / len(indices) >= 0.01 and _distance(color, background) > 80 and _saturation(color) > 0.25
+    ]
+    accent = max(candidates)[1] if candidates else text
+
+    sample_layouts = [layout_jsons[i] for i in indices if i < len(layout_jsons)]
+    return {
+        "background": _hex(background),
+        "text": _hex(text),
+        "muted": _hex(muted),
+        "accent": _hex(accent),
+        "font_family": DECK_THEME_FONT,
+        **_typography(sample_layouts),
+        "samples": len(indices),
+    }
+
+
+def theme_css(theme: Dict[str, Any]) -> str:
+    """生成共享主题 CSS（CSS 变量 + 基础排版）"""
+    return (
+        ":root{"
+        f"--deck-bg:{theme['background']};"
+        f"--deck-text:{theme['text']};"
+        f"--deck-muted:{theme['muted']};"
+        f"--deck-accent:{theme['accent']};"
+        f"--deck-font:{theme['font_family']};"
+        f"--deck-title-size:{theme['title_size']}pt;"
+        f"--deck-body-size:{theme['body_size']}pt;"
+        "}"
+        "body{width:720pt;height:405pt;margin:0;overflow:hidden;"
+        "background:var(--deck-bg);color:var(--deck-text);font-family:var(--deck-font);font-size:var(--deck-body-size);}"
+        "h1,h2{font-size:var(--deck-title-size);color:var(--deck-text);margin:0;}"
+        "p,li{margin:0;}"
+        ".accent{color:var(--deck-accent);}"
+        ".muted{color:var(--deck-muted);}"
+    )
+
+
+def theme_instruction(css: str) -> str:
+    """逐页 Prompt 中追加的主题说明：LLM 只输出页面特有的标记"""
+    return (
+        "Deck theme mode: this slide belongs to a deck that shares the theme stylesheet below. "
+        "It is injected into <head> automatically, so do NOT repeat global styles (body size, background, "
+        "fonts, base colors). Use the CSS variables (var(--deck-accent), var(--deck-title-size), ...) and the "
+        ".accent / .muted classes. Output only a minimal document: <html><head> with a <style> holding "
+        "slide-specific rules only </head><body>slide markup</body></html>.\n\n"
+        f"```css\n{css}\n```"
+    )
+
+
+def inject_theme_css(html: str, css: str) -> str:
+    """把主题 CSS 注入到 <head> 最前面（页面自己的样式在后，可以覆盖主题）"""
+    style = f"<style data-deck-theme>{css}</style>"
+    head = re.search(r"<head[^>]*>", html, re.IGNORECASE)
+    if head:
+        return html[:head.end()] + style + html[head.end():]
+    root = re.search(r"<html[^>]*>", html, re.IGNORECASE)
+    if root:
+        return html[:root.end()] + f"<head>{style}</head>" + html[root.end():]
+    return f"<!DOCTYPE html><html><head><meta charset=\"UTF-8\">{style}</head><body>{html}</body></html>"
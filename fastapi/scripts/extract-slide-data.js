@@ -0,0 +1,48 @@
+/**
+ * 输出 html2pptx extractSlideData 的结果（JSON），用于和 scripts/static_layout.py 的静态布局对比
+ *
+ * Usage:
+ *   node extract-slide-data.js <html_file> [<html_file> ...]
+ *
+ * 输出: [{ "file": "...", "slideData": { background, elements, placeholders, errors } }, ...]
+ */
+
+const path = require('path');
+const { chromium } = require('playwright');
+const { extractSlideData, getBodyDimensions } = require('./html2pptx');
+
+async function main() {
+    const files = process.argv.slice(2);
+    if (files.length === 0) {
+        console.error('Usage: node extract-slide-data.js <html_file> [<html_file> ...]');
+        process.exit(1);
+    }
+
+    const browser = await chromium.launch({
+        headless: true,
+        args: ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage', '--disable-gpu'],
+    });
+    const results = [];
+    try {
+        const page = await browser.newPage();
+        for (const file of files) {
+            const filePath = path.resolve(file);
+            // 与 html2pptx 相同：按 body 尺寸设置视口后再提取
+            await page.goto(`file://${filePath}`, { waitUntil: 'domcontentloaded', timeout: 60000 });
+            const bodyDimensions = await getBodyDimensions(page);
+            await page.setViewportSize({
+                width: Math.round(bodyDimensions.width),
+                height: Math.round(bodyDimensions.height),
+            });
+            results.push({ file, slideData: await extractSlideData(page) });
+        }
+    } finally {
+        await browser.close();
+    }
+    process.stdout.write(JSON.stringify(results));
+}
+
+main().catch((error) => {
+    console.error(error.stack || error.message);
+    process.exit(1);
+});
@@ -910,7 +910,9 @@ async function html2pptx(htmlFile, pres, options = {}) {
   const {
     tmpDir = process.env.TMPDIR || '/tmp',
     slide = null,
-    strict = false  // 默认不严格验证，溢出只警告不报错
+    strict = false,  // 默认不严格验证，溢出只警告不报错
+    browser: sharedBrowser = null,  // 常驻转换进程传入已启动的浏览器
+    page: sharedPage = null         // 或直接传入页面池中的页面（调用方负责复用和关闭）
   } = options;
 
   try {
@@ -930,7 +932,9 @@ async function html2pptx(htmlFile, pres, options = {}) {
       launchOptions.channel = 'chrome';
     }
 
-    const browser = await chromium.launch(launchOptions);
+    // 没有传入浏览器/页面时（CLI 单次转换）才启动并在结束时关闭自己的浏览器
+    const ownBrowser = !sharedPage && !sharedBrowser;
+    const browser = sharedPage ? null : (sharedBrowser || await chromium.launch(launchOptions));
 
     let bodyDimensions;
     let slideData;
@@ -938,12 +942,15 @@ async function html2pptx(htmlFile, pres, options = {}) {
     const filePath = path.isAbsolute(htmlFile) ? htmlFile : path.join(process.cwd(), htmlFile);
     const validationErrors = [];
 
+    let page = sharedPage;
     try {
-      const page = await browser.newPage();
-      page.on('console', (msg) => {
-        // Log the message text to your test runner's console
-        console.log(`Browser console: ${msg.text()}`);
-      });
+      if (!page) {
+        page = await browser.newPage();
+        page.on('console', (msg) => {
+          // Log the message text to your test runner's console
+          console.log(`Browser console: ${msg.text()}`);
+        });
+      }
 
       // 使用 domcontentloaded 而不是 load，避免等待外部图片资源
       // 增加超时时间到 60 秒
@@ -961,7 +968,11 @@ async function html2pptx(htmlFile, pres, options = {}) {
 
       slideData = await extractSlideData(page);
     } finally {
-      await browser.close();
+      if (ownBrowser) {
+        await browser.close();
+      } else if (!sharedPage && page) {
+        await page.close();
+      }
     }
 
     // Collect all validation errors
@@ -1012,4 +1023,7 @@ async function html2pptx(htmlFile, pres, options = {}) {
   }
 }
 
-module.exports = html2pptx;
\ No newline at end of file
+module.exports = html2pptx;
+// 供 extract-slide-data.js 对比纯 Python 静态布局（scripts/static_layout.py）使用
+module.exports.extractSlideData = extractSlideData;
+module.exports.getBodyDimensions = getBodyDimensions;
@@ -0,0 +1,93 @@
+"""
+HTML 后处理模块
+一次遍历 LLM 输出，同时完成：
+- 去除 markdown 代码块标记和 HTML 文档前后的解释文字
+- 生成两份 HTML：公开版（图片为 STATIC_BASE_URL 下的完整 URL）和转换版（图片为 images/xxx 本地相对路径）
+
+转换版保存在公开版旁边（{name}_local.html），Node 转换脚本直接加载，不再需要把 URL 改写回本地路径
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+# 文档边界和代码块标记（只在文档首尾附近匹配）
+_START_RE = re.compile(r'<!DOCTYPE\s+html|<html[\s>]', re.IGNORECASE)
+_END_RE = re.compile(r'</html\s*>', re.IGNORECASE)
+_LEADING_FENCE_RE = re.compile(r'\s*```[\w-]*[ \t]*\n?')
+
+# 图片 src 属性（以字面量开头，正则引擎可以快速跳过无关文本）
+_SRC_RE = re.compile(r'src=(["\'])([^"\']*)\1')
+
+# src 中的图片引用：.../images/xxx（相对路径、绝对路径或本服务的静态 URL）或直接文件名 img_XX.ext
+_IMAGES_PATH_RE = re.compile(r'(?:.*[/\\])?images[/\\](?P<name>[^/\\]+)$')
+_DIRECT_IMAGE_RE = re.compile(r'img_\d+\.(?:jpg|jpeg|png|webp|gif)$', re.IGNORECASE)
+
+
+def _image_name(path: str) -> Optional[str]:
+    """返回 src 指向的 MinerU 输出图片文件名，不是输出图片时返回 None"""
+    if path.startswith("data:"):
+        return None
+    if path.startswith(("http://", "https://")) and "/static/output/" not in path:
+        return None  # 外部图片保持原样
+    match = _IMAGES_PATH_RE.match(path)
+    if match:
+        return match.group("name")
+    if _DIRECT_IMAGE_RE.match(path):
+        return path
+    return None
+
+
+def postprocess_html(content: str, image_base_url: Optional[str] = None) -> Dict[str, Union[str, int]]:
+    """
+    单次扫描处理 HTML
+
+    Args:
+        content: LLM 原始输出或已清理的 HTML
+        image_base_url: 公开版图片 URL 前缀（以 / 结尾，如 .../auto/images/）；
+            为 None 时公开版与转换版相同
+
+    Returns:
+        {"public": 公开版 HTML, "local": 转换版 HTML, "images": 处理的图片引用数}
+    """
+    # 文档边界：<!DOCTYPE html> 或 <html> 之前、</html> 之后都是解释文字或代码块标记
+    start_match = _START_RE.search(content)
+    if start_match:
+        start = start_match.start()
+    else:
+        fence = _LEADING_FENCE_RE.match(content)
+        start = fence.end() if fence else 0
+    end_match = _END_RE.search(content, start)
+    if end_match:
+        end = end_match.end()
+    else:
+        end = len(content.rstrip())
+        if content.endswith("```", start, end):
+            end -= 3
+
+    # 在文档范围内一次遍历所有图片 src，同时写出两份结果
+    public, local = [], []
+    cursor = start
+    images = 0
+    for match in _SRC_RE.finditer(content, start, end):
+        name = _image_name(match.group(2))
+        if name is None:
+            continue
+        text = content[cursor:match.start()]
+        public.append(text)
+        local.append(text)
+        public.append(f'src="{image_base_url}{name}"' if image_base_url else f'src="images/{name}"')
+        local.append(f'src="images/{name}"')
+        cursor = match.end()
+        images += 1
+    tail = content[cursor:end]
+    public.append(tail)
+    local.append(tail)
+
+    return {"public": "".join(public).strip(), "local": "".join(local).strip(), "images": images}
+
+
+def local_html_path(html_file_path: Union[str, Path]) -> Path:
+    """公开版 HTML 对应的转换版路径（同目录，images/ 相对路径可以直接解析）"""
+    path = Path(html_file_path)
+    return path.with_name(f"{path.stem}_local.html")
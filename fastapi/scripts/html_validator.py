@@ -0,0 +1,395 @@
+"""
+HTML 转换前校验模块
+用 html.parser 静态检查 system_prompt.md / html2pptx.js 中可以不渲染就判断的规则，
+在启动 Node + Chromium（每次 2~5 秒）之前修复简单问题，或直接拒绝注定失败的页面
+
+- 自动修复：body 尺寸不是 720pt × 405pt、div/body 中未包裹的文本、p/h 开头的手工项目符号、CSS 渐变
+- 拒绝（errors）：没有 <body>、文档被截断（缺少 </html>）、页面没有任何可见内容
+- 警告（warnings）：绝对定位元素超出页面、文本元素带背景/边框/阴影、非 Web 安全字体等
+  html2pptx 非严格模式下只打印警告的问题；HTML_VALIDATION_STRICT=true 时同样拒绝
+"""
+
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置
+HTML_VALIDATION_ENABLED = os.getenv("HTML_VALIDATION_ENABLED", "true").lower() == "true"
+HTML_VALIDATION_AUTOFIX = os.getenv("HTML_VALIDATION_AUTOFIX", "true").lower() == "true"
+HTML_VALIDATION_STRICT = os.getenv("HTML_VALIDATION_STRICT", "false").lower() == "true"
+# 还没有转换耗时记录时，每次拒绝按该耗时估算节省的时间（秒/页）
+HTML_VALIDATION_DEFAULT_CONVERT_SECONDS = float(os.getenv("HTML_VALIDATION_DEFAULT_CONVERT_SECONDS", "3"))
+
+SLIDE_WIDTH_PT = 720
+SLIDE_HEIGHT_PT = 405
+
+TEXT_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li"}
+HEADING_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+WEB_SAFE_FONTS = {
+    "arial", "helvetica", "times new roman", "times", "georgia", "courier new", "courier", "verdana",
+    "tahoma", "trebuchet ms", "impact", "sans-serif", "serif", "monospace",
+}
+
+_UNIT_PT = {"pt": 1.0, "px": 0.75, "in": 72.0, "": 0.75}
+_LENGTH_RE = re.compile(r'^\s*(-?[\d.]+)\s*(pt|px|in)?\s*$', re.IGNORECASE)
+_BODY_RULE_RE = re.compile(r'(?:^|[},])\s*((?:[^{}]*,)?\s*body\s*(?:,[^{}]*)?)\{([^}]*)\}', re.IGNORECASE)
+_GRADIENT_RE = re.compile(r'(?:repeating-)?(?:linear|radial|conic)-gradient\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_GRADIENT_PROPERTY_RE = re.compile(
+    r'background-image\s*:\s*((?:repeating-)?(?:linear|radial|conic)-gradient\((?:[^()]|\([^()]*\))*\))',
+    re.IGNORECASE,
+)
+_COLOR_RE = re.compile(r'#[0-9a-fA-F]{3,8}\b|rgba?\([^)]*\)', re.IGNORECASE)
+# 与 html2pptx.js 相同：项目符号后必须跟空白（避免误伤 "-5%" 之类的文本）
+_BULLET_TEXT_RE = re.compile(r'^\s*[•\-\*▪▸○●◆◇■□]\s')
+_BULLET_RAW_RE = re.compile(r'^(\s*)(?:[•\-\*▪▸○●◆◇■□]|&bull;|&#8226;|&#x2022;)\s+', re.IGNORECASE)
+_FONT_FAMILY_RE = re.compile(r'font-family\s*:\s*([^;}"]+)', re.IGNORECASE)
+
+
+def _parse_style(style: str) -> Dict[str, str]:
+    """解析 CSS 声明块为 {属性: 值}（后出现的覆盖前面的）"""
+    declarations = {}
+    for part in style.split(";"):
+        if ":" in part:
+            name, value = part.split(":", 1)
+            declarations[name.strip().lower()] = value.strip().replace("!important", "").strip()
+    return declarations
+
+
+def _important_declarations(style: str) -> Dict[str, str]:
+    """CSS 声明块中带 !important 的声明 {属性: 值}"""
+    declarations = {}
+    for part in style.split(";"):
+        if ":" in part and "!important" in part.lower():
+            name, value = part.split(":", 1)
+            declarations[name.strip().lower()] = re.sub(r"!important", "", value, flags=re.IGNORECASE).strip()
+    return declarations
+
+
+def _to_pt(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    match = _LENGTH_RE.match(value)
+    if not match:
+        return None
+    try:
+        return float(match.group(1)) * _UNIT_PT[(match.group(2) or "").lower()]
+    except ValueError:
+        return None
+
+
+def _first_color(gradient: str) -> str:
+    match = _COLOR_RE.search(gradient)
+    return match.group(0) if match else "transparent"
+
+
+def fix_gradients(css: str) -> Tuple[str, int]:
+    """把 CSS 渐变替换为第一个色标的纯色（html2pptx 不支持渐变）"""
+    css, count = _GRADIENT_PROPERTY_RE.subn(lambda m: f"background-color: {_first_color(m.group(1))}", css)
+    css, more = _GRADIENT_RE.subn(lambda m: _first_color(m.group(0)), css)
+    return css, count + more
+
+
+class _SlideParser(HTMLParser):
+    """收集校验结果和修复操作（修复以源码偏移记录，解析结束后统一应用）"""
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self._line_starts = [0]
+        for match in re.finditer("\n", source):
+            self._line_starts.append(match.end())
+        self.stack: List[str] = []
+        self.warnings: List[str] = []
+        self.fixes: List[str] = []
+        self.edits: List[Tuple[int, int, str]] = []   # (start, end, replacement)
+        self.css: List[str] = []
+        self.body_style: Dict[str, str] = {}
+        self.body_important: Dict[str, str] = {}
+        self.has_body = False
+        self.has_html_end = False
+        self.head_end: Optional[int] = None
+        self.body_start_end: Optional[int] = None
+        self.visible = 0
+        self._pending_data: Optional[Tuple[int, str, str]] = None  # (start, text, kind)
+        self._fresh_text_tag = False  # 刚进入 p/h 元素，下一段文本是其开头
+
+    # 源码偏移
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def _flush_data(self, end: Optional[int] = None):
+        """上一段文本的源码范围在下一个事件开始处（或文档末尾）结束"""
+        if self._pending_data is None:
+            return
+        start, text, kind = self._pending_data
+        self._pending_data = None
+        end = self._offset() if end is None else end
+        raw = self.source[start:end]
+        if kind == "wrap":
+            self.edits.append((start, end, f'<p style="margin:0">{raw.strip()}</p>'))
+            self.fixes.append(f"未包裹的文本已放入 <p>: {text[:30]}")
+        elif kind == "bullet":
+            match = _BULLET_RAW_RE.match(raw)
+            if match:
+                self.edits.append((start, start + match.end(), match.group(1)))
+                self.fixes.append(f"已去除手工项目符号: {text[:30]}")
+
+    def _text_container(self) -> Optional[str]:
+        for tag in reversed(self.stack):
+            if tag in TEXT_TAGS:
+                return tag
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        start = self._offset()
+        raw = self.get_starttag_text() or ""
+        attrs = dict(attrs)
+        style = _parse_style(attrs.get("style") or "")
+        self._fresh_text_tag = tag in HEADING_TAGS
+
+        if tag == "body":
+            self.has_body = True
+            self.body_style = style
+            self.body_important = _important_declarations(attrs.get("style") or "")
+            self.body_start_end = start + len(raw)
+        elif tag in ("img", "svg", "canvas"):
+            self.visible += 1
+        elif tag == "div" and any(k in style for k in ("background", "background-color", "border")):
+            self.visible += 1
+
+        if _GRADIENT_RE.search(raw):
+            fixed, count = fix_gradients(raw)
+            self.edits.append((start, start + len(raw), fixed))
+            self.fixes.append(f"<{tag}> 的 {count} 处渐变已替换为纯色")
+
+        if tag in TEXT_TAGS:
+            decorated = [k for k in ("background", "background-color", "border", "box-shadow") if k in style]
+            if decorated:
+                self.warnings.append(
+                    f"文本元素 <{tag}> 带有 {decorated[0]}，html2pptx 只支持在 <div> 上设置背景/边框/阴影"
+                )
+
+        if style.get("position") == "absolute":
+            left, top = _to_pt(style.get("left")) or 0.0, _to_pt(style.get("top")) or 0.0
+            width, height = _to_pt(style.get("width")), _to_pt(style.get("height"))
+            if left + (width or 0) > SLIDE_WIDTH_PT + 1 or top + (height or 0) > SLIDE_HEIGHT_PT + 1:
+                self.warnings.append(
+                    f"<{tag}> 超出页面: left={left:.0f}pt top={top:.0f}pt "
+                    f"width={width or 0:.0f}pt height={height or 0:.0f}pt"
+                )
+
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack and self.stack[-1] == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        self._fresh_text_tag = False
+        if tag == "head":
+            self.head_end = self._offset()
+        elif tag == "html":
+            self.has_html_end = True
+        if tag in self.stack:
+            while self.stack:
+                if self.stack.pop() == tag:
+                    break
+
+    def handle_data(self, data):
+        self._flush_data()
+        fresh, self._fresh_text_tag = self._fresh_text_tag, False
+        parent = self.stack[-1] if self.stack else None
+        if parent == "style":
+            start = self._offset()
+            self.css.append(data)
+            if _GRADIENT_RE.search(data):
+                fixed, count = fix_gradients(data)
+                self.edits.append((start, start + len(data), fixed))
+                self.fixes.append(f"<style> 中 {count} 处渐变已替换为纯色")
+            return
+        if parent in ("script", "title") or not data.strip():
+            return
+
+        self.visible += 1
+        container = self._text_container()
+        if container is None:
+            if parent in ("div", "body"):
+                self._pending_data = (self._offset(), data.strip(), "wrap")
+            else:
+                self.warnings.append(f"文本不在 <p>/<h1>-<h6>/<ul>/<ol> 中，转换后不会显示: {data.strip()[:30]}")
+        elif fresh and parent in HEADING_TAGS and _BULLET_TEXT_RE.match(data):
+            self._pending_data = (self._offset(), data.strip(), "bullet")
+
+    def handle_comment(self, data):
+        self._flush_data()
+
+    def close(self):
+        super().close()
+        self._flush_data(end=len(self.source))
+
+
+def _check_body_size(parser: _SlideParser) -> Optional[str]:
+    """
+    根据 <style> 中的 body 规则和 body 内联样式判断尺寸，不符合时返回说明
+
+    层叠顺序：内联 !important > 样式表 !important > 内联 > 样式表
+    """
+    sheet: Dict[str, str] = {}
+    sheet_important: Dict[str, str] = {}
+    for css in parser.css:
+        for match in _BODY_RULE_RE.finditer(css):
+            selectors = [s.strip().lower() for s in match.group(1).split(",")]
+            if "body" in selectors:
+                sheet.update(_parse_style(match.group(2)))
+                sheet_important.update(_important_declarations(match.group(2)))
+    declarations = {**sheet, **parser.body_style, **sheet_important, **parser.body_important}
+    width, height = _to_pt(declarations.get("width")), _to_pt(declarations.get("height"))
+    if width is None or height is None or abs(width - SLIDE_WIDTH_PT) > 1 or abs(height - SLIDE_HEIGHT_PT) > 1:
+        return f"body 尺寸为 {declarations.get('width', '未设置')} × {declarations.get('height', '未设置')}"
+    return None
+
+
+def _check_fonts(parser: _SlideParser) -> List[str]:
+    warnings = []
+    for css in parser.css:
+        for match in _FONT_FAMILY_RE.finditer(css):
+            first = match.group(1).split(",")[0].strip().strip("'\"").lower()
+            if first and first not in WEB_SAFE_FONTS and not first.startswith("var("):
+                warnings.append(f"非 Web 安全字体: {first}")
+    return sorted(set(warnings))
+
+
+def validate_html(html_text: str, autofix: bool = HTML_VALIDATION_AUTOFIX, strict: bool = HTML_VALIDATION_STRICT) -> Dict[str, Any]:
+    """
+    校验（并修复）单页 HTML
+
+    Returns:
+        {"html": 修复后的 HTML, "valid": 是否可以转换, "errors", "warnings", "fixes"}
+    """
+    parser = _SlideParser(html_text)
+    try:
+        parser.feed(html_text)
+        parser.close()
+    except Exception as e:
+        return {"html": html_text, "valid": False, "errors": [f"HTML 解析失败: {e}"], "warnings": [], "fixes": []}
+
+    errors = []
+    if not parser.has_body:
+        errors.append("缺少 <body>")
+    if not parser.has_html_end:
+        errors.append("文档不完整（缺少 </html>），可能被截断")
+    if parser.has_body and parser.visible == 0:
+        errors.append("页面没有任何可见内容")
+
+    warnings = parser.warnings + _check_fonts(parser)
+    fixes = list(parser.fixes)
+    edits = [e for e in parser.edits if e[2] != html_text[e[0]:e[1]]]
+
+    size_problem = _check_body_size(parser) if parser.has_body else None
+    if size_problem:
+        # !important 才能覆盖 body 的内联样式
+        override = f"<style>body{{width:{SLIDE_WIDTH_PT}pt !important;height:{SLIDE_HEIGHT_PT}pt !important;}}</style>"
+        position = parser.head_end if parser.head_end is not None else parser.body_start_end
+        edits.append((position, position, override))
+        fixes.append(f"{size_problem}，已覆盖为 {SLIDE_WIDTH_PT}pt × {SLIDE_HEIGHT_PT}pt")
+
+    if autofix:
+        result = html_text
+        for start, end, replacement in sorted(edits, key=lambda e: e[0], reverse=True):
+            result = result[:start] + replacement + result[end:]
+        if size_problem:
+            # 确认覆盖后尺寸确实正确（body 内联样式自带 !important 时无法覆盖）
+            check = _SlideParser(result)
+            check.feed(result)
+            check.close()
+            remaining = _check_body_size(check)
+            if remaining:
+                fixes.pop()
+                errors.append(f"{remaining}，无法自动修复")
+    else:
+        # 不修复时，可修复的问题按警告处理
+        result = html_text
+        warnings = fixes + warnings
+        fixes = []
+
+    valid = not errors and not (strict and warnings)
+    return {"html": result, "valid": valid, "errors": errors, "warnings": warnings, "fixes": fixes}
+
+
+class HtmlValidator:
+    """转换前校验：统计修复/拒绝次数，并按实际转换耗时估算拒绝节省的时间"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {
+            "validated": 0,
+            "fixed": 0,              # 至少应用了一处修复
+            "rejected": 0,           # 转换前拒绝，没有启动 Node/Chromium
+            "conversions": 0,        # 实际转换的页数
+            "conversion_seconds": 0.0,
+            "avoided_seconds": 0.0,  # 拒绝节省的转换时间（估算）
+        }
+
+    def check(self, html_text: str, label: str = "") -> Dict[str, Any]:
+        """校验单页 HTML；被拒绝时累计节省的转换时间"""
+        if not self.enabled:
+            return {"html": html_text, "valid": True, "errors": [], "warnings": [], "fixes": []}
+        result = validate_html(html_text)
+        with self._lock:
+            self.stats["validated"] += 1
+            if result["fixes"]:
+                self.stats["fixed"] += 1
+            if not result["valid"]:
+                self.stats["rejected"] += 1
+                self.stats["avoided_seconds"] += self.average_conversion_seconds()
+        if result["fixes"]:
+            logger.info(f"[HtmlValidator] {label} 已自动修复: {result['fixes']}")
+        if not result["valid"]:
+            logger.warning(f"[HtmlValidator] {label} 转换前拒绝: {result['errors'] or result['warnings']}")
+        return result
+
+    def record_conversion(self, seconds: float, slides: int = 1):
+        """记录一次 PPTX 转换耗时"""
+        with self._lock:
+            self.stats["conversions"] += slides
+            self.stats["conversion_seconds"] += seconds
+
+    def average_conversion_seconds(self) -> float:
+        if not self.stats["conversions"]:
+            return HTML_VALIDATION_DEFAULT_CONVERT_SECONDS
+        return self.stats["conversion_seconds"] / self.stats["conversions"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "autofix": HTML_VALIDATION_AUTOFIX,
+            "strict": HTML_VALIDATION_STRICT,
+            **self.stats,
+            "conversion_seconds": round(self.stats["conversion_seconds"], 1),
+            "avoided_seconds": round(self.stats["avoided_seconds"], 1),
+            "avg_conversion_seconds": round(self.average_conversion_seconds(), 2),
+        }
+
+
+class HTMLValidationError(Exception):
+    """HTML 未通过转换前校验"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("HTML 未通过转换前校验: " + "; ".join(errors))
+
+
+# 全局校验器实例
+html_validator = HtmlValidator(enabled=HTML_VALIDATION_ENABLED)
@@ -0,0 +1,188 @@
+"""
+输入图片接收模块
+上传文件和 URL 下载都按块流式写入临时文件，内存占用与文件大小无关：
+
+- 边写边计算 SHA-256
+- 根据文件头魔数识别真实图片类型（不信任 Content-Type 和文件名），据此确定扩展名；
+  预签名直传的对象下载后用 check_image_file 做同样的检查
+- 超过大小上限立即中止（URL 下载时先检查 Content-Length）
+- 完成后原子重命名为 input/{date}/{uuid}.ext，失败时不留下半个文件
+"""
+
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = 256 * 1024
+
+# (魔数前缀, 偏移, 扩展名, MIME)
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", 0, ".png", "image/png"),
+    (b"\xff\xd8\xff", 0, ".jpg", "image/jpeg"),
+    (b"GIF87a", 0, ".gif", "image/gif"),
+    (b"GIF89a", 0, ".gif", "image/gif"),
+    (b"WEBP", 8, ".webp", "image/webp"),   # RIFF....WEBP
+    (b"BM", 0, ".bmp", "image/bmp"),
+    (b"II*\x00", 0, ".tif", "image/tiff"),
+    (b"MM\x00*", 0, ".tif", "image/tiff"),
+]
+_SNIFF_BYTES = 16
+
+
+class ImageIngestError(ValueError):
+    """输入图片不合法（大小超限或不是支持的图片格式）"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class IngestedImage:
+    path: Path
+    sha256: str
+    size: int
+    ext: str
+    content_type: str
+
+
+stats = {
+    "ingested": 0,
+    "bytes": 0,
+    "seconds": 0.0,
+    "rejected_too_large": 0,
+    "rejected_type": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def sniff_image_type(head: bytes) -> Optional[tuple]:
+    """根据文件头识别图片类型，返回 (扩展名, MIME)，无法识别时返回 None"""
+    for magic, offset, ext, content_type in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if ext == ".webp" and head[:4] != b"RIFF":
+                continue
+            return ext, content_type
+    return None
+
+
+def _reject(key: str, message: str, status_code: int) -> ImageIngestError:
+    with _stats_lock:
+        stats[key] += 1
+    return ImageIngestError(message, status_code)
+
+
+def check_image_file(path: Path) -> tuple:
+    """
+    检查已落盘文件的真实类型（预签名直传的对象不经过 ingest_stream，下载后在这里检查）
+
+    Returns:
+        (扩展名, MIME)
+
+    Raises:
+        ImageIngestError: 不是支持的图片格式（415）
+    """
+    with open(path, "rb") as f:
+        detected = sniff_image_type(f.read(_SNIFF_BYTES))
+    if detected is None:
+        raise _reject("rejected_type", "文件不是支持的图片格式", 415)
+    return detected
+
+
+async def ingest_stream(
+    chunks: AsyncIterator[bytes],
+    save_dir: Path,
+    file_uuid: str,
+    max_bytes: int,
+) -> IngestedImage:
+    """
+    把字节流保存为 save_dir/{file_uuid}.ext
+
+    Raises:
+        ImageIngestError: 超过 max_bytes（413）或不是支持的图片格式（415）
+    """
+    start = time.time()
+    save_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = save_dir / f".{file_uuid}.part"
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _reject("rejected_too_large", f"图片超过大小上限 ({max_bytes // 1024 // 1024}MB)", 413)
+                if len(head) < _SNIFF_BYTES:
+                    head += chunk[:_SNIFF_BYTES - len(head)]
+                    if len(head) >= _SNIFF_BYTES and sniff_image_type(head) is None:
+                        raise _reject("rejected_type", "文件不是支持的图片格式", 415)
+                digest.update(chunk)
+                f.write(chunk)
+
+        detected = sniff_image_type(head)
+        if detected is None:
+            raise _reject("rejected_type", "文件不是支持的图片格式", 415)
+        ext, content_type = detected
+        path = save_dir / f"{file_uuid}{ext}"
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    with _stats_lock:
+        stats["ingested"] += 1
+        stats["bytes"] += size
+        stats["seconds"] += time.time() - start
+    return IngestedImage(path=path, sha256=digest.hexdigest(), size=size, ext=ext, content_type=content_type)
+
+
+async def ingest_upload(upload_file, save_dir: Path, file_uuid: str, max_bytes: int) -> IngestedImage:
+    """流式保存 FastAPI UploadFile"""
+    async def chunks():
+        while True:
+            chunk = await upload_file.read(INGEST_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    return await ingest_stream(chunks(), save_dir, file_uuid, max_bytes)
+
+
+async def ingest_url(url: str, save_dir: Path, file_uuid: str, max_bytes: int, timeout: float = 60.0) -> IngestedImage:
+    """
+    流式下载 URL 图片
+
+    Raises:
+        ImageIngestError: 下载失败（400）、超过大小上限（413）或不是图片（415）
+    """
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise ImageIngestError(f"下载图片失败: HTTP {response.status_code}")
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise _reject("rejected_too_large", f"图片超过大小上限 ({max_bytes // 1024 // 1024}MB)", 413)
+            return await ingest_stream(response.aiter_bytes(INGEST_CHUNK_SIZE), save_dir, file_uuid, max_bytes)
+
+
+def get_stats() -> Dict[str, Any]:
+    """获取图片接收统计"""
+    with _stats_lock:
+        snapshot = dict(stats)
+    return {
+        **snapshot,
+        "seconds": round(snapshot["seconds"], 2),
+        "throughput_mbps": round(snapshot["bytes"] / 1024 / 1024 / snapshot["seconds"], 2) if snapshot["seconds"] else None,
+    }
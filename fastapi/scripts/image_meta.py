@@ -0,0 +1,188 @@
+"""
+输入图片预计算模块
+图片进入 input/{date}/ 后在后台线程池中一次性计算后续各阶段需要的信息，写入旁路文件：
+
+    input/{date}/.meta/{uuid}.json       内容哈希、感知哈希（dHash）、尺寸、LLM 派生图信息
+    input/{date}/.meta/{uuid}.thumb.jpg  前端缩略图
+
+LLM 缓存键、派生图、尺寸读取优先使用旁路文件；旁路文件记录了原图的大小和 mtime，
+原图变化或预计算尚未完成时自动退回到直接计算
+"""
+
+import os
+import io
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+import logging
+
+from PIL import Image
+
+from scripts.llm_cache import hash_file
+
+logger = logging.getLogger(__name__)
+
+# 配置
+IMAGE_META_ENABLED = os.getenv("IMAGE_META_ENABLED", "true").lower() == "true"
+IMAGE_META_WORKERS = int(os.getenv("IMAGE_META_WORKERS", "2"))
+IMAGE_THUMB_SIDE = int(os.getenv("IMAGE_THUMB_SIDE", "320"))    # 缩略图最长边
+IMAGE_THUMB_QUALITY = int(os.getenv("IMAGE_THUMB_QUALITY", "80"))
+
+META_DIR_NAME = ".meta"
+
+
+def meta_path(image_path: Union[str, Path]) -> Path:
+    image_path = Path(image_path)
+    return image_path.parent / META_DIR_NAME / f"{image_path.stem}.json"
+
+
+def thumbnail_path(image_path: Union[str, Path]) -> Path:
+    image_path = Path(image_path)
+    return image_path.parent / META_DIR_NAME / f"{image_path.stem}.thumb.jpg"
+
+
+def load_image_meta(image_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """读取旁路文件；不存在、损坏或与原图不一致（大小 / mtime 变化）时返回 None"""
+    try:
+        meta = json.loads(meta_path(image_path).read_text(encoding="utf-8"))
+        st = Path(image_path).stat()
+    except (OSError, ValueError):
+        return None
+    if meta.get("bytes") != st.st_size or meta.get("mtime_ns") != st.st_mtime_ns:
+        return None
+    return meta
+
+
+def image_content_hash(image_path: Union[str, Path]) -> str:
+    """原图 SHA-256（优先读取旁路文件）"""
+    meta = load_image_meta(image_path)
+    return meta["sha256"] if meta else hash_file(image_path)
+
+
+def image_size_from_meta(image_path: Union[str, Path]) -> Optional[Tuple[int, int]]:
+    """旁路文件中记录的尺寸，没有时返回 None"""
+    meta = load_image_meta(image_path)
+    return (meta["width"], meta["height"]) if meta else None
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> str:
+    """差值感知哈希（64 位十六进制），用于识别内容相同但编码不同的图片"""
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def precompute_image_meta(image_path: Union[str, Path], sha256: Optional[str] = None) -> Dict[str, Any]:
+    """
+    计算并写入旁路文件
+
+    Args:
+        image_path: 原图路径
+        sha256: 已知的内容哈希（接收时边写边算的结果），None 时重新计算
+
+    Returns:
+        旁路文件内容
+    """
+    # 延迟导入：image_prep 读取尺寸时依赖本模块
+    from scripts.image_prep import derive_image, get_image_profile
+
+    start = time.time()
+    image_path = Path(image_path)
+    st = image_path.stat()
+    meta: Dict[str, Any] = {
+        "sha256": sha256 or hash_file(image_path),
+        "bytes": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+    with Image.open(image_path) as image:
+        meta.update({"width": image.width, "height": image.height, "format": image.format, "mode": image.mode})
+        image.draft("RGB", (IMAGE_THUMB_SIDE * 2, IMAGE_THUMB_SIDE * 2))  # JPEG 按比例解码，加快缩略图生成
+        meta["dhash"] = dhash(image)
+        thumb = image.copy()
+        thumb.thumbnail((IMAGE_THUMB_SIDE, IMAGE_THUMB_SIDE), Image.LANCZOS)
+        if thumb.mode not in ("RGB", "L"):
+            thumb = thumb.convert("RGB")
+
+    target = thumbnail_path(image_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="JPEG", quality=IMAGE_THUMB_QUALITY, optimize=True)
+    tmp_path = target.with_suffix(".tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, target)
+    meta["thumbnail"] = {"file": target.name, "width": thumb.width, "height": thumb.height}
+
+    # 预热默认配置的 LLM 派生图缓存（按内容哈希缓存，之后编码 data URL 时直接命中）
+    profile = get_image_profile()
+    derived = derive_image(image_path, profile["max_side"], profile["format"], profile["quality"], content_hash=meta["sha256"])
+    meta["llm_derivative"] = {
+        "profile": profile,
+        "content_type": derived["content_type"],
+        "width": derived["size"][0] if derived["size"] else None,
+        "height": derived["size"][1] if derived["size"] else None,
+        "bytes": derived["bytes"],
+        "original": derived["path"] == image_path,
+    }
+    meta["computed_ms"] = round((time.time() - start) * 1000)
+
+    target = meta_path(image_path)
+    tmp_path = target.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, target)
+    return meta
+
+
+class ImagePrecomputer:
+    """后台预计算（有界线程池，不阻塞请求）"""
+
+    def __init__(self, enabled: bool = True, workers: int = 2):
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image-meta")
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failures": 0, "seconds": 0.0}
+
+    def submit(self, image_path: Union[str, Path], sha256: Optional[str] = None) -> Optional[Future]:
+        """提交预计算任务；未启用时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.stats["submitted"] += 1
+        return self._executor.submit(self._run, Path(image_path), sha256)
+
+    def _run(self, image_path: Path, sha256: Optional[str]) -> Optional[Dict[str, Any]]:
+        start = time.time()
+        try:
+            meta = precompute_image_meta(image_path, sha256)
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+            logger.warning(f"[ImageMeta] 预计算失败: {image_path.name}, 错误: {e}")
+            return None
+        with self._lock:
+            self.stats["completed"] += 1
+            self.stats["seconds"] += time.time() - start
+        return meta
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "enabled": self.enabled,
+            **stats,
+            "seconds": round(stats["seconds"], 2),
+            "avg_ms": round(stats["seconds"] * 1000 / stats["completed"]) if stats["completed"] else None,
+        }
+
+
+# 全局预计算实例
+image_precomputer = ImagePrecomputer(enabled=IMAGE_META_ENABLED, workers=IMAGE_META_WORKERS)
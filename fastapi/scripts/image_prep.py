@@ -0,0 +1,246 @@
+"""
+LLM 输入图片处理模块
+读取图片尺寸，为 LLM 生成缩放并重新编码的派生图（按模型配置最长边、格式和质量），
+派生图按 (原图内容哈希, 参数) 缓存在磁盘上，同一输入只处理一次；
+data URL 使用分块流式 base64 编码，并统计相对原图的请求体积缩减
+"""
+
+import io
+import os
+import json
+import base64
+import hashlib
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+import logging
+
+from PIL import Image
+
+from scripts.image_meta import image_content_hash, image_size_from_meta
+
+logger = logging.getLogger(__name__)
+
+# 默认派生图参数
+LLM_IMAGE_MAX_SIDE = int(os.getenv("LLM_IMAGE_MAX_SIDE", "2048"))
+LLM_IMAGE_FORMAT = os.getenv("LLM_IMAGE_FORMAT", "jpeg").lower()  # jpeg / webp
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "85"))
+# 按模型覆盖（JSON，键为模型名前缀），如 {"google/": {"max_side": 1568, "format": "webp", "quality": 80}}
+LLM_IMAGE_PROFILES = json.loads(os.getenv("LLM_IMAGE_PROFILES", "") or "{}")
+LLM_IMAGE_CACHE_DIR = Path(os.getenv("LLM_IMAGE_CACHE_DIR", str(Path(__file__).parent.parent / "cache" / "images")))
+LLM_IMAGE_CACHE_MAX_MB = int(os.getenv("LLM_IMAGE_CACHE_MAX_MB", "500"))
+
+# 流式 base64 编码的分块大小（必须是 3 的倍数，保证分块编码结果可直接拼接）
+_B64_CHUNK_SIZE = 3 * 256 * 1024
+
+_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+}
+
+_lock = threading.Lock()
+_cache_bytes: Optional[int] = None
+
+stats = {
+    "derived": 0,         # 新生成的派生图
+    "cache_hits": 0,      # 直接复用磁盘缓存
+    "kept_original": 0,   # 派生图不比原图小，直接发送原图
+    "original_bytes": 0,
+    "payload_bytes": 0,
+}
+
+
+def get_image_size(path: Union[str, Path]) -> Optional[Tuple[int, int]]:
+    """读取图片尺寸（优先读取预计算的旁路文件，否则只解析文件头，不解码像素）"""
+    size = image_size_from_meta(path)
+    if size:
+        return size
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def get_image_profile(model: Optional[str] = None) -> Dict[str, Any]:
+    """获取模型对应的派生图参数（最长的匹配前缀优先）"""
+    profile = {"max_side": LLM_IMAGE_MAX_SIDE, "format": LLM_IMAGE_FORMAT, "quality": LLM_IMAGE_QUALITY}
+    if model:
+        matches = [prefix for prefix in LLM_IMAGE_PROFILES if model.startswith(prefix)]
+        if matches:
+            profile.update(LLM_IMAGE_PROFILES[max(matches, key=len)])
+    if profile["format"] not in _FORMATS:
+        profile["format"] = "jpeg"
+    return profile
+
+
+def encode_file_data_url(path: Union[str, Path], content_type: str) -> str:
+    """分块读取文件并流式编码为 data URL，避免同时持有整份原始字节和一次性编码的中间副本"""
+    out = io.StringIO()
+    out.write(f"data:{content_type};base64,")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_B64_CHUNK_SIZE), b""):
+            out.write(base64.b64encode(chunk).decode("ascii"))
+    return out.getvalue()
+
+
+def _evict_cache():
+    """派生图缓存超过上限时，按修改时间从旧到新删除到上限的 90%"""
+    global _cache_bytes
+    max_bytes = LLM_IMAGE_CACHE_MAX_MB * 1024 * 1024
+    if _cache_bytes is None:
+        _cache_bytes = sum(p.stat().st_size for p in LLM_IMAGE_CACHE_DIR.rglob("*") if p.is_file())
+    if _cache_bytes <= max_bytes:
+        return
+
+    files = sorted((p for p in LLM_IMAGE_CACHE_DIR.rglob("*") if p.is_file()), key=lambda p: p.stat().st_mtime)
+    for p in files:
+        if _cache_bytes <= max_bytes * 0.9:
+            break
+        try:
+            size = p.stat().st_size
+            p.unlink()
+            _cache_bytes -= size
+        except OSError:
+            pass
+
+
+def derive_image(
+    path: Union[str, Path],
+    max_side: int,
+    fmt: str = "jpeg",
+    quality: int = 85,
+    content_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    生成（或复用缓存的）LLM 派生图
+
+    Args:
+        path: 原图路径
+        max_side: 最长边上限（像素）
+        fmt: jpeg / webp
+        quality: 编码质量
+        content_hash: 已知的原图 SHA-256，None 时读取旁路文件或重新计算
+
+    Returns:
+        {"path", "content_type", "size", "bytes", "original_bytes", "original_size", "cache_hit"}
+        派生图不比原图小时返回原图本身
+    """
+    global _cache_bytes
+    path = Path(path)
+    pil_format, content_type, suffix = _FORMATS[fmt]
+    original_bytes = path.stat().st_size
+    original_size = get_image_size(path)
+
+    key = hashlib.sha256(f"{content_hash or image_content_hash(path)}:{max_side}:{fmt}:{quality}".encode("utf-8")).hexdigest()
+    cached = LLM_IMAGE_CACHE_DIR / key[:2] / f"{key}{suffix}"
+    # 记录 "原图更优" 的判定结果，避免每次重新编码后再丢弃
+    keep_marker = cached.with_suffix(".original")
+
+    result = {"original_bytes": original_bytes, "original_size": original_size, "cache_hit": False}
+
+    if keep_marker.exists():
+        result["cache_hit"] = True
+        cached = None
+    elif cached.exists():
+        result["cache_hit"] = True
+        os.utime(cached)
+    else:
+        with Image.open(path) as img:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            buffer = io.BytesIO()
+            img.save(buffer, format=pil_format, quality=quality, optimize=True)
+        data = buffer.getvalue()
+
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        target = cached
+        if len(data) >= original_bytes and (original_size is None or max(original_size) <= max_side):
+            # 原图无需缩放且已比派生图小：只写一个标记文件
+            target, data, cached = keep_marker, b"", None
+        # 临时文件名带进程号和线程号：图片元数据线程池和请求路径可能同时生成同一张派生图
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+        with _lock:
+            if _cache_bytes is not None:
+                _cache_bytes += len(data)
+            _evict_cache()
+
+    if result["cache_hit"]:
+        stats["cache_hits"] += 1
+    else:
+        stats["kept_original" if cached is None else "derived"] += 1
+
+    if cached is None:
+        original_type, _ = mimetypes.guess_type(str(path))
+        result.update({
+            "path": path,
+            "content_type": original_type or "image/png",
+            "size": original_size,
+            "bytes": original_bytes,
+        })
+    else:
+        result.update({
+            "path": cached,
+            "content_type": content_type,
+            "size": get_image_size(cached),
+            "bytes": cached.stat().st_size,
+        })
+    return result
+
+
+def encode_image_data_url(
+    path: Union[str, Path],
+    max_side: Optional[int] = None,
+    quality: Optional[int] = None,
+    model: Optional[str] = None,
+) -> Tuple[str, Optional[Tuple[int, int]], Dict[str, Any]]:
+    """
+    将本地图片编码为发送给 LLM 的 data URL（经过派生图处理）
+
+    Args:
+        path: 图片路径
+        max_side: 最长边上限（像素），None 时使用模型配置；与模型配置同时存在时取较小值
+        quality: 编码质量，None 时使用模型配置
+        model: 模型名，用于选择派生图参数
+
+    Returns:
+        (data URL, 实际发送的图片尺寸, 体积报告)
+    """
+    profile = get_image_profile(model)
+    if max_side is not None:
+        profile["max_side"] = min(max_side, profile["max_side"])
+    if quality is not None:
+        profile["quality"] = quality
+
+    derived = derive_image(path, profile["max_side"], profile["format"], profile["quality"])
+    data_url = encode_file_data_url(derived["path"], derived["content_type"])
+
+    stats["original_bytes"] += derived["original_bytes"]
+    stats["payload_bytes"] += len(data_url)
+    # 原方案：原图整体 base64 编码，体积约为原文件的 4/3
+    original_payload = (derived["original_bytes"] + 2) // 3 * 4
+    report = {
+        "profile": profile,
+        "original_size": derived["original_size"],
+        "sent_size": derived["size"],
+        "original_bytes": derived["original_bytes"],
+        "sent_bytes": derived["bytes"],
+        "payload_chars": len(data_url),
+        "payload_reduction": round(1 - len(data_url) / original_payload, 3) if original_payload else 0.0,
+        "cache_hit": derived["cache_hit"],
+    }
+    return data_url, derived["size"], report
+
+
+def get_stats() -> Dict[str, Any]:
+    """获取派生图统计"""
+    original_payload = (stats["original_bytes"] + 2) // 3 * 4
+    return {
+        **stats,
+        "payload_reduction": round(1 - stats["payload_bytes"] / original_payload, 3) if original_payload else 0.0,
+        "cache_dir": str(LLM_IMAGE_CACHE_DIR),
+    }
@@ -0,0 +1,134 @@
+"""
+布局 JSON 精简模块
+将 MinerU 的 _middle.json 提炼为 LLM 真正需要的信息（块类型、bbox、文本、图片引用），
+坐标换算到 720pt × 405pt 的幻灯片坐标系并量化，输出紧凑 JSON 以缩短 Prompt
+
+精简级别 (LAYOUT_DETAIL_LEVEL):
+- full:    原始 _middle.json，仅去除缩进和空白
+- lines:   块 + 每行的 bbox 和文本（多行排版更精确）
+- blocks:  块类型、bbox、文本、图片引用（默认）
+- minimal: 仅块类型、bbox、图片引用（文本由 Markdown 提供）
+"""
+
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+# 配置
+LAYOUT_DETAIL_LEVEL = os.getenv("LAYOUT_DETAIL_LEVEL", "blocks")
+LAYOUT_BBOX_QUANTUM = float(os.getenv("LAYOUT_BBOX_QUANTUM", "1"))  # bbox 量化步长（pt）
+
+DETAIL_LEVELS = ("full", "lines", "blocks", "minimal")
+
+# 目标幻灯片尺寸（与 system_prompt.md 的 body 尺寸一致）
+SLIDE_WIDTH_PT = 720
+SLIDE_HEIGHT_PT = 405
+
+
+def _quantize(value: float, quantum: float) -> float:
+    q = round(value / quantum) * quantum
+    return int(q) if float(q).is_integer() else round(q, 2)
+
+
+def _scale_bbox(bbox: List[float], sx: float, sy: float, quantum: float) -> List[float]:
+    x0, y0, x1, y1 = bbox[:4]
+    return [
+        _quantize(x0 * sx, quantum),
+        _quantize(y0 * sy, quantum),
+        _quantize(x1 * sx, quantum),
+        _quantize(y1 * sy, quantum),
+    ]
+
+
+def _line_text(line: Dict[str, Any]) -> str:
+    return "".join(
+        span.get("content", "") for span in line.get("spans", []) if span.get("type") != "image"
+    ).strip()
+
+
+def _iter_lines(block: Dict[str, Any]):
+    """遍历块内所有行（含 image/list 等嵌套子块）"""
+    for line in block.get("lines", []) or []:
+        yield line
+    for sub in block.get("blocks", []) or []:
+        yield from _iter_lines(sub)
+
+
+def _find_image_path(block: Dict[str, Any]) -> Optional[str]:
+    for line in _iter_lines(block):
+        for span in line.get("spans", []):
+            if span.get("image_path"):
+                return span["image_path"]
+    return None
+
+
+def _distill_block(block: Dict[str, Any], detail: str, sx: float, sy: float, quantum: float) -> Dict[str, Any]:
+    block_type = block.get("type", "text")
+    out: Dict[str, Any] = {"type": block_type}
+    if block.get("bbox"):
+        out["bbox"] = _scale_bbox(block["bbox"], sx, sy, quantum)
+
+    image_path = _find_image_path(block)
+    if image_path:
+        out["image"] = image_path if image_path.startswith("images/") else f"images/{image_path}"
+
+    if detail == "minimal":
+        return out
+
+    lines = [line for line in _iter_lines(block) if _line_text(line)]
+    if detail == "lines" and len(lines) > 1:
+        out["lines"] = [
+            {"bbox": _scale_bbox(line["bbox"], sx, sy, quantum), "text": _line_text(line)}
+            for line in lines if line.get("bbox")
+        ]
+    else:
+        text = "\n".join(_line_text(line) for line in lines)
+        if text:
+            out["text"] = text
+    return out
+
+
+def distill_layout(layout_json: Dict[str, Any], detail: str = LAYOUT_DETAIL_LEVEL, quantum: float = LAYOUT_BBOX_QUANTUM) -> Dict[str, Any]:
+    """
+    提炼 MinerU _middle.json
+
+    Args:
+        layout_json: 原始 _middle.json 内容
+        detail: 精简级别（full / lines / blocks / minimal）
+        quantum: bbox 量化步长（pt）
+
+    Returns:
+        精简后的布局字典；detail=full 时原样返回
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"未知的布局精简级别: {detail}，可选: {', '.join(DETAIL_LEVELS)}")
+    if detail == "full":
+        return layout_json
+
+    pages = layout_json.get("pdf_info", [])
+    page = pages[0] if pages else {}
+    page_w, page_h = (page.get("page_size") or [SLIDE_WIDTH_PT, SLIDE_HEIGHT_PT])[:2]
+    sx = SLIDE_WIDTH_PT / page_w if page_w else 1.0
+    sy = SLIDE_HEIGHT_PT / page_h if page_h else 1.0
+
+    blocks = []
+    for block in page.get("para_blocks", []) or page.get("preproc_blocks", []):
+        blocks.append(_distill_block(block, detail, sx, sy, quantum))
+    # 页眉/页脚/页码等在幻灯片上同样可见，一并保留
+    for block in page.get("discarded_blocks", []):
+        blocks.append(_distill_block(block, detail, sx, sy, quantum))
+
+    return {
+        "slide": {"width": SLIDE_WIDTH_PT, "height": SLIDE_HEIGHT_PT, "unit": "pt", "bbox": "[left, top, right, bottom]"},
+        "blocks": blocks,
+    }
+
+
+def dump_layout(layout: Any) -> str:
+    """序列化为紧凑 JSON（无缩进、无多余空白）"""
+    return json.dumps(layout, ensure_ascii=False, separators=(",", ":"))
+
+
+def distill_layout_text(layout_json: Dict[str, Any], detail: Optional[str] = None) -> str:
+    """提炼并序列化布局 JSON，直接用于 Prompt"""
+    return dump_layout(distill_layout(layout_json, detail or LAYOUT_DETAIL_LEVEL))
@@ -0,0 +1,223 @@
+"""
+LLM 响应缓存模块
+按 (模型, 温度, 系统提示词, Markdown, 布局 JSON, 图片哈希) 的指纹缓存 HTML 生成结果，
+同一张图片 + 同一模型重复生成时直接返回缓存，不再重复支付 LLM 延迟和费用
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 缓存配置
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", str(Path(__file__).parent.parent / "cache" / "llm")))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 默认 7 天
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "200"))
+
+
+def hash_bytes(data: bytes) -> str:
+    """计算字节内容的 SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的 SHA-256（避免一次性读入大文件）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_cache_key(
+    model: str,
+    temperature: float,
+    system_prompt: str,
+    md_text: str,
+    layout_json: Union[dict, str],
+    image_hash: str,
+    settings: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    生成缓存键
+
+    布局 JSON 统一序列化为紧凑格式（sort_keys + 无空白），
+    避免同一份数据因缩进不同产生不同的键；
+    settings 为不体现在输入文本里、但会改变输出的配置（如 max_tokens、图片派生参数），修改后旧结果不再命中
+    """
+    if isinstance(layout_json, str):
+        layout_str = layout_json
+    else:
+        layout_str = json.dumps(layout_json, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    settings_str = json.dumps(settings or {}, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+    h = hashlib.sha256()
+    for part in (model, repr(float(temperature)), system_prompt, md_text, layout_str, image_hash, settings_str):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """基于磁盘的 LLM 响应缓存，支持 TTL 过期和按总大小淘汰（最久未访问优先）"""
+
+    def __init__(self, cache_dir: Path, ttl_seconds: int, max_bytes: int, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "expired": 0,
+            "evicted": 0,
+        }
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _scan_total_bytes(self) -> int:
+        if not self.cache_dir.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.cache_dir.rglob("*.json"))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中或已过期返回 None"""
+        if not self.enabled:
+            return None
+
+        path = self._path_for(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"[LLMCache] 读取缓存失败，忽略: {path.name}, 错误: {e}")
+            self.stats["misses"] += 1
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self._remove(path)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        # 更新 mtime 作为最近访问时间，供淘汰使用
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self.stats["hits"] += 1
+        return entry
+
+    def set(self, key: str, content: str, usage: Dict[str, Any], model: str) -> None:
+        """写入缓存（原子替换），写入后按需淘汰"""
+        if not self.enabled:
+            return
+
+        entry = {
+            "model": model,
+            "content": content,
+            "usage": usage,
+            "created_at": time.time(),
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._path_for(key)
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[LLMCache] 写入缓存失败: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += len(data) - old_size
+        self.stats["writes"] += 1
+
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        """删除缓存项（不存在时忽略）"""
+        if self.enabled:
+            self._remove(self._path_for(key))
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _evict(self) -> None:
+        """淘汰最久未访问的条目，直到总大小降到上限的 90%"""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self.cache_dir.rglob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort(key=lambda e: e[0])
+
+        total = sum(e[1] for e in entries)
+        evicted = 0
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._total_bytes = total
+        self.stats["evicted"] += evicted
+        if evicted:
+            logger.info(f"[LLMCache] 淘汰 {evicted} 个缓存条目，当前大小 {total / 1024 / 1024:.1f}MB")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "size_mb": round((self._total_bytes or 0) / 1024 / 1024, 2),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats,
+        }
+
+
+# 全局 LLM 缓存实例
+llm_cache = LLMCache(
+    cache_dir=LLM_CACHE_DIR,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+    enabled=LLM_CACHE_ENABLED,
+)
@@ -0,0 +1,223 @@
+"""
+LLM 对冲请求模块
+HTML 生成请求在 p95 延迟内未返回时，向备用模型/提供方再发一个请求，
+取最先成功的结果并取消其余请求；主请求超时、被限流（429）或服务端错误（5xx）时立即回退到备用模型，
+其它错误（如 400 请求不合法、401 鉴权失败）换模型也不会成功，直接抛出
+
+说明: 目前 LLM 调用均为非流式请求，"首个响应" 以完整响应到达为准
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 配置
+# 备用模型列表（逗号分隔，按优先级排列），为空时不对冲
+LLM_HEDGE_MODELS = [m.strip() for m in os.getenv("LLM_HEDGE_MODELS", "").split(",") if m.strip()]
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # 样本不足时使用默认延迟
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "45"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "5"))
+LLM_HEDGE_MAX_HEDGES = int(os.getenv("LLM_HEDGE_MAX_HEDGES", "1"))  # 每次请求最多额外发出的对冲请求数
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def is_fallback_error(error: BaseException) -> bool:
+    """请求失败后是否值得换备用模型：超时、429、5xx"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+    else:
+        # send 对 HTTP 错误抛出 HTTPException，带 status_code 属性
+        status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class LatencyTracker:
+    """按模型记录最近的成功请求延迟，用于计算对冲延迟"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.samples: Dict[str, deque] = {}
+
+    def record(self, model: str, seconds: float):
+        self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        samples = self.samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def count(self, model: str) -> int:
+        return len(self.samples.get(model, ()))
+
+
+class HedgePolicy:
+    """对冲策略：延迟达到 p95 时发出对冲请求，并统计对冲的触发与胜出情况"""
+
+    def __init__(
+        self,
+        hedge_models: List[str],
+        percentile: float,
+        min_samples: int,
+        default_delay: float,
+        min_delay: float,
+        max_hedges: int,
+    ):
+        self.hedge_models = hedge_models
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_hedges = max_hedges
+        self.latency = LatencyTracker()
+        self.stats = {
+            "requests": 0,
+            "hedges_fired": 0,      # 因超过对冲延迟而发出的请求
+            "fallbacks_fired": 0,   # 因请求失败而发出的回退请求
+            "hedges_won": 0,        # 由备用请求返回结果的次数
+            "primary_won": 0,
+            "cancelled": 0,         # 被取消的未完成请求（可能仍被上游计费）
+            "failed": 0,
+            "not_retryable": 0,     # 因错误不可重试而未回退、直接失败的请求
+        }
+
+    def hedge_delay(self, model: str) -> float:
+        """对冲延迟：样本足够时取 p95，否则使用默认值"""
+        if self.latency.count(model) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.latency.percentile(model, self.percentile))
+
+    def _alternates(self, model: str) -> List[str]:
+        return [m for m in self.hedge_models if m != model]
+
+    async def run(
+        self,
+        send: Callable[[str], Awaitable[Dict[str, Any]]],
+        model: str,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        执行（可能被对冲的）请求
+
+        Args:
+            send: 发送单个请求的协程函数，参数为模型名，失败时抛出异常
+            model: 主模型
+
+        Raises:
+            send 抛出的异常：不可回退的错误（见 is_fallback_error）立即抛出，其余在备用模型都失败后抛出
+
+        Returns:
+            (响应结果, 对冲信息 {"model", "hedges_fired", "fallbacks_fired", "hedge_won"})
+        """
+        self.stats["requests"] += 1
+        alternates = self._alternates(model)
+        info = {"model": model, "hedges_fired": 0, "fallbacks_fired": 0, "hedge_won": False}
+
+        if not alternates:
+            start = time.time()
+            result = await send(model)
+            self.latency.record(model, time.time() - start)
+            self.stats["primary_won"] += 1
+            return result, info
+
+        tasks: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+        def launch(target: str):
+            tasks[asyncio.create_task(send(target))] = (target, time.time())
+
+        launch(model)
+        hedges_left = self.max_hedges
+        deadline = time.time() + self.hedge_delay(model)
+        last_error: Optional[BaseException] = None
+
+        try:
+            while tasks:
+                timeout = max(0.0, deadline - time.time()) if hedges_left > 0 and alternates else None
+                done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 超过对冲延迟仍无响应：向下一个备用模型发出对冲请求
+                    target = alternates.pop(0)
+                    hedges_left -= 1
+                    info["hedges_fired"] += 1
+                    self.stats["hedges_fired"] += 1
+                    logger.info(f"[LLMHedge] {model} 超过 {self.hedge_delay(model):.1f}s 未响应，对冲请求: {target}")
+                    launch(target)
+                    deadline = time.time() + self.hedge_delay(target)
+                    continue
+
+                for task in done:
+                    target, started = tasks.pop(task)
+                    if task.exception() is None:
+                        self.latency.record(target, time.time() - started)
+                        info["model"] = target
+                        info["hedge_won"] = target != model
+                        self.stats["hedges_won" if target != model else "primary_won"] += 1
+                        return task.result(), info
+
+                    last_error = task.exception()
+                    logger.warning(f"[LLMHedge] {target} 请求失败: {last_error}")
+                    if not is_fallback_error(last_error):
+                        self.stats["failed"] += 1
+                        self.stats["not_retryable"] += 1
+                        raise last_error
+
+                # 全部失败且还有备用模型：立即回退
+                if not tasks and alternates:
+                    target = alternates.pop(0)
+                    info["fallbacks_fired"] += 1
+                    self.stats["fallbacks_fired"] += 1
+                    logger.info(f"[LLMHedge] 回退请求: {target}")
+                    launch(target)
+                    deadline = time.time() + self.hedge_delay(target)
+
+            self.stats["failed"] += 1
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.stats["cancelled"] += len(tasks)
+                await asyncio.gather(*tasks.keys(), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计（含各模型当前对冲延迟）"""
+        models = set(self.latency.samples) | set(self.hedge_models)
+        return {
+            "hedge_models": self.hedge_models,
+            **self.stats,
+            "models": {
+                m: {
+                    "samples": self.latency.count(m),
+                    "p50": _round(self.latency.percentile(m, 50)),
+                    "p95": _round(self.latency.percentile(m, 95)),
+                    "hedge_delay": round(self.hedge_delay(m), 2),
+                }
+                for m in sorted(models)
+            },
+        }
+
+
+# 全局对冲策略实例
+hedge_policy = HedgePolicy(
+    hedge_models=LLM_HEDGE_MODELS,
+    percentile=LLM_HEDGE_PERCENTILE,
+    min_samples=LLM_HEDGE_MIN_SAMPLES,
+    default_delay=LLM_HEDGE_DEFAULT_DELAY,
+    min_delay=LLM_HEDGE_MIN_DELAY,
+    max_hedges=LLM_HEDGE_MAX_HEDGES,
+)
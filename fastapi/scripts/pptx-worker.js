@@ -0,0 +1,222 @@
+/**
+ * 常驻 HTML → PPTX 转换进程
+ *
+ * 启动一次 Chromium 并维护一个页面池，通过 stdin/stdout 逐行 JSON-RPC 接收转换请求，
+ * 多个请求（以及同一请求中的多页）并发处理，避免每次转换都重新加载依赖和启动浏览器
+ *
+ * Usage:
+ *   node pptx-worker.js [--pool-size 4] [--tmp-dir /tmp/pptx]
+ *
+ * 协议（每行一个 JSON）:
+ *   → {"id": 1, "method": "convert", "params": {"html_files": [...], "output_file": "...", "tmp_dir": "..."}}
+ *   ← {"id": 1, "result": {...}, "stats": {...}}  或  {"id": 1, "error": "...", "stats": {...}}
+ *   → {"id": 2, "method": "ping" | "stats" | "shutdown"}
+ *   启动完成后输出 {"event": "ready", "pid": ..., "pool_size": ...}
+ *
+ * 浏览器断开时进程以非 0 退出，由 Python 侧（scripts/pptx_worker.py）重启
+ */
+
+const path = require('path');
+const fs = require('fs');
+const readline = require('readline');
+const { chromium } = require('playwright');
+const pptxgen = require('pptxgenjs');
+const html2pptx = require('./html2pptx');
+
+// stdout 只用于协议，html2pptx 等模块的日志全部改到 stderr
+console.log = (...args) => console.error(...args);
+
+const PAGE_MAX_USES = 50;  // 单个页面复用次数上限，超过后重建，避免页面内存增长
+
+function parseArgs(argv) {
+    const options = {
+        poolSize: parseInt(process.env.PPTX_WORKER_POOL_SIZE || '4', 10),
+        tmpDir: process.env.TMPDIR || process.env.TEMP || '/tmp',
+    };
+    for (let i = 0; i < argv.length; i++) {
+        if (argv[i] === '--pool-size' && argv[i + 1]) {
+            options.poolSize = parseInt(argv[++i], 10);
+        } else if (argv[i] === '--tmp-dir' && argv[i + 1]) {
+            options.tmpDir = argv[++i];
+        }
+    }
+    options.poolSize = Math.max(1, options.poolSize || 1);
+    return options;
+}
+
+function send(message) {
+    process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+class PagePool {
+    constructor(browser, size) {
+        this.browser = browser;
+        this.size = size;
+        this.idle = [];
+        this.waiters = [];
+        this.busy = 0;
+    }
+
+    async init() {
+        for (let i = 0; i < this.size; i++) {
+            this.idle.push(await this.createPage());
+        }
+    }
+
+    async createPage() {
+        const page = await this.browser.newPage();
+        page.on('console', (msg) => console.error(`Browser console: ${msg.text()}`));
+        page.uses = 0;
+        return page;
+    }
+
+    acquire() {
+        if (this.idle.length > 0) {
+            this.busy++;
+            return Promise.resolve(this.idle.pop());
+        }
+        return new Promise((resolve) => this.waiters.push(resolve)).then((page) => {
+            this.busy++;
+            return page;
+        });
+    }
+
+    async release(page) {
+        this.busy--;
+        page.uses++;
+        if (page.isClosed() || page.uses >= PAGE_MAX_USES) {
+            await page.close().catch(() => {});
+            page = await this.createPage();
+        }
+        const waiter = this.waiters.shift();
+        if (waiter) {
+            waiter(page);
+        } else {
+            this.idle.push(page);
+        }
+    }
+}
+
+async function convert(pool, params, defaultTmpDir) {
+    const { html_files: htmlFiles, output_file: outputFile } = params;
+    const tmpDir = path.resolve(params.tmp_dir || defaultTmpDir);
+    if (!Array.isArray(htmlFiles) || htmlFiles.length === 0 || !outputFile) {
+        throw new Error('params.html_files and params.output_file are required');
+    }
+    if (!fs.existsSync(tmpDir)) {
+        fs.mkdirSync(tmpDir, { recursive: true });
+    }
+
+    const started = Date.now();
+    const pptx = new pptxgen();
+    pptx.layout = 'LAYOUT_16x9';
+    pptx.author = 'ReDeck';
+    pptx.title = 'Generated Presentation';
+
+    // 先按顺序建好所有页，各页再并发渲染，保证页序与输入一致
+    const slides = htmlFiles.map(() => pptx.addSlide());
+    const slidePlaceholders = await Promise.all(htmlFiles.map(async (htmlFile, index) => {
+        const page = await pool.acquire();
+        try {
+            const { placeholders } = await html2pptx(htmlFile, pptx, { tmpDir, page, slide: slides[index] });
+            return placeholders;
+        } finally {
+            await pool.release(page);
+        }
+    }));
+
+    await pptx.writeFile({ fileName: outputFile });
+
+    return {
+        success: true,
+        message: 'PPTX generated successfully',
+        output_file: outputFile,
+        slides: htmlFiles.length,
+        placeholders: slidePlaceholders[0],
+        slide_placeholders: slidePlaceholders,
+        duration_ms: Date.now() - started,
+    };
+}
+
+async function main() {
+    const options = parseArgs(process.argv.slice(2));
+    const stats = { conversions: 0, failures: 0, in_flight: 0 };
+
+    const launchOptions = {
+        headless: true,
+        args: ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage', '--disable-gpu'],
+    };
+    if (process.platform === 'darwin') {
+        launchOptions.channel = 'chrome';
+    }
+    const browser = await chromium.launch(launchOptions);
+    browser.on('disconnected', () => {
+        console.error('[pptx-worker] 浏览器已断开，退出等待重启');
+        process.exit(2);
+    });
+
+    const pool = new PagePool(browser, options.poolSize);
+    await pool.init();
+
+    const snapshot = () => ({
+        ...stats,
+        pool_size: pool.size,
+        busy_pages: pool.busy,
+        queued_pages: pool.waiters.length,
+        rss_mb: Math.round(process.memoryUsage().rss / 1024 / 1024),
+    });
+
+    const handle = async (request) => {
+        const { id, method, params = {} } = request;
+        if (method === 'ping' || method === 'stats') {
+            send({ id, result: { ready: true }, stats: snapshot() });
+            return;
+        }
+        if (method === 'shutdown') {
+            send({ id, result: { shutting_down: true }, stats: snapshot() });
+            await browser.close().catch(() => {});
+            process.exit(0);
+        }
+        if (method !== 'convert') {
+            send({ id, error: `Unknown method: ${method}`, stats: snapshot() });
+            return;
+        }
+
+        stats.in_flight++;
+        try {
+            const result = await convert(pool, params, options.tmpDir);
+            stats.conversions++;
+            stats.in_flight--;
+            send({ id, result, stats: snapshot() });
+        } catch (error) {
+            stats.failures++;
+            stats.in_flight--;
+            send({ id, error: error.message, stats: snapshot() });
+        }
+    };
+
+    const rl = readline.createInterface({ input: process.stdin });
+    rl.on('line', (line) => {
+        if (!line.trim()) return;
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (error) {
+            send({ id: null, error: `Invalid JSON: ${error.message}` });
+            return;
+        }
+        handle(request);
+    });
+    // Python 侧关闭 stdin（父进程退出）时跟着退出
+    rl.on('close', async () => {
+        await browser.close().catch(() => {});
+        process.exit(0);
+    });
+
+    send({ event: 'ready', pid: process.pid, pool_size: pool.size });
+}
+
+main().catch((error) => {
+    console.error(`[pptx-worker] 启动失败: ${error.stack || error.message}`);
+    process.exit(1);
+});
@@ -0,0 +1,242 @@
+"""
+PPTX 转换结果缓存模块
+按 (转换版 HTML 内容, 引用的本地图片内容, 转换脚本版本) 的指纹缓存生成的 PPTX，
+同一份 HTML 重复转换（前端反复调用 /slides/pptx）时直接复制上次的结果，不再启动 Chromium + pptxgenjs
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import logging
+
+from scripts.llm_cache import hash_file
+
+logger = logging.getLogger(__name__)
+
+# 缓存配置
+PPTX_CACHE_ENABLED = os.getenv("PPTX_CACHE_ENABLED", "true").lower() == "true"
+PPTX_CACHE_DIR = Path(os.getenv("PPTX_CACHE_DIR", str(Path(__file__).parent.parent / "cache" / "pptx")))
+PPTX_CACHE_MAX_MB = int(os.getenv("PPTX_CACHE_MAX_MB", "500"))
+
+# HTML 中引用的本地资源：src="..." 和 CSS url(...)
+_RESOURCE_RE = re.compile(r'src=(["\'])([^"\']+)\1|url\(\s*(["\']?)([^"\')]+)\3\s*\)')
+
+# 转换脚本变化后旧缓存自动失效
+_CONVERTER_FILES = ("html2pptx.js", "convert-html-to-pptx.js", "pptx-worker.js", "static_layout.py", "py_converter.py")
+
+
+def _converter_version(scripts_dir: Path) -> str:
+    h = hashlib.sha256()
+    for name in _CONVERTER_FILES:
+        try:
+            h.update((scripts_dir / name).read_bytes())
+        except OSError:
+            h.update(b"missing")
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def local_resources(html: str, base_dir: Path) -> List[Path]:
+    """HTML 引用的本地资源路径（去重，保持出现顺序；外部 URL 和 data: 忽略）"""
+    seen = {}
+    for match in _RESOURCE_RE.finditer(html):
+        ref = (match.group(2) or match.group(4) or "").strip()
+        if not ref or ref.startswith(("http://", "https://", "data:", "//", "#")):
+            continue
+        if ref.startswith("file://"):
+            ref = ref[len("file://"):]
+        path = Path(ref) if os.path.isabs(ref) else base_dir / ref
+        seen.setdefault(str(path), path)
+    return list(seen.values())
+
+
+def make_conversion_key(html_files: List[Union[str, Path]], converter_version: str = "") -> str:
+    """
+    生成缓存键
+
+    Args:
+        html_files: 转换版 HTML 路径（按页序）
+        converter_version: 转换脚本版本（脚本内容哈希）
+    """
+    h = hashlib.sha256(converter_version.encode("utf-8"))
+    for html_file in html_files:
+        html_file = Path(html_file)
+        data = html_file.read_bytes()
+        h.update(b"\0html\0")
+        h.update(hashlib.sha256(data).digest())
+        for resource in local_resources(data.decode("utf-8", errors="replace"), html_file.parent):
+            h.update(b"\0res\0")
+            h.update(resource.name.encode("utf-8"))
+            # 缺失的图片也参与指纹：之后补上图片时不会命中旧结果
+            h.update(hash_file(resource).encode("ascii") if resource.is_file() else b"missing")
+    return h.hexdigest()
+
+
+def _tmp_path(path: Path) -> Path:
+    """每次写入使用独立的临时文件名（进程号 + 线程号），并发写入同一缓存键时互不覆盖"""
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+class PptxCache:
+    """基于磁盘的 PPTX 缓存，按总大小淘汰（最久未访问优先）"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int, scripts_dir: Path, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.scripts_dir = Path(scripts_dir)
+        self.enabled = enabled
+        self.converter_version = _converter_version(self.scripts_dir)
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evicted": 0,
+            "saved_seconds": 0.0,  # 命中时省下的转换耗时（按写入时记录的耗时累计）
+        }
+
+    def make_key(self, html_files: List[Union[str, Path]]) -> str:
+        return make_conversion_key(html_files, self.converter_version)
+
+    def _paths_for(self, key: str):
+        base = self.cache_dir / key[:2]
+        return base / f"{key}.pptx", base / f"{key}.json"
+
+    def _scan_total_bytes(self) -> int:
+        if not self.cache_dir.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.cache_dir.rglob("*") if p.suffix in (".pptx", ".json"))
+
+    def get(self, key: str, output_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        命中时把缓存的 PPTX 复制到 output_file，返回转换结果 JSON；未命中返回 None
+
+        使用复制而不是硬链接：输出文件之后可能被原地修改，不能影响缓存条目
+        """
+        if not self.enabled:
+            return None
+
+        pptx_path, meta_path = self._paths_for(key)
+        try:
+            entry = json.loads(meta_path.read_text(encoding="utf-8"))
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = output_file.with_name(f".{output_file.name}.{os.getpid()}.tmp")
+            shutil.copyfile(pptx_path, tmp_path)
+            os.replace(tmp_path, output_file)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"[PptxCache] 读取缓存失败，忽略: {key[:12]}, 错误: {e}")
+            self.stats["misses"] += 1
+            return None
+
+        # 更新 mtime 作为最近访问时间，供淘汰使用
+        for path in (pptx_path, meta_path):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+        self.stats["hits"] += 1
+        self.stats["saved_seconds"] += entry.get("seconds", 0)
+        result = dict(entry.get("result") or {"success": True})
+        result["output_file"] = str(output_file)
+        return result
+
+    def set(self, key: str, pptx_file: Path, result: Dict[str, Any], seconds: float) -> None:
+        """写入缓存（原子替换），写入后按需淘汰"""
+        if not self.enabled:
+            return
+
+        pptx_path, meta_path = self._paths_for(key)
+        meta = json.dumps(
+            {"result": result, "seconds": round(seconds, 3), "created_at": time.time()},
+            ensure_ascii=False,
+        ).encode("utf-8")
+
+        try:
+            pptx_path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = sum(p.stat().st_size for p in (pptx_path, meta_path) if p.exists())
+            tmp_path = _tmp_path(pptx_path)
+            shutil.copyfile(pptx_file, tmp_path)
+            os.replace(tmp_path, pptx_path)
+            tmp_path = _tmp_path(meta_path)
+            tmp_path.write_bytes(meta)
+            os.replace(tmp_path, meta_path)
+            new_size = pptx_path.stat().st_size + len(meta)
+        except OSError as e:
+            logger.warning(f"[PptxCache] 写入缓存失败: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += new_size - old_size
+        self.stats["writes"] += 1
+
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """淘汰最久未访问的条目（PPTX + 元数据成对删除），直到总大小降到上限的 90%"""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self.cache_dir.rglob("*.pptx"):
+            meta = p.with_suffix(".json")
+            try:
+                st = p.stat()
+                size = st.st_size + (meta.stat().st_size if meta.exists() else 0)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, size, p, meta))
+        entries.sort(key=lambda e: e[0])
+
+        total = sum(e[1] for e in entries)
+        evicted = 0
+        for _, size, p, meta in entries:
+            if total <= target:
+                break
+            try:
+                meta.unlink(missing_ok=True)
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._total_bytes = total
+        self.stats["evicted"] += evicted
+        if evicted:
+            logger.info(f"[PptxCache] 淘汰 {evicted} 个缓存条目，当前大小 {total / 1024 / 1024:.1f}MB")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "converter_version": self.converter_version,
+            "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "size_mb": round((self._total_bytes or 0) / 1024 / 1024, 2),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats,
+            "saved_seconds": round(self.stats["saved_seconds"], 1),
+        }
+
+
+# 全局 PPTX 缓存实例
+pptx_cache = PptxCache(
+    cache_dir=PPTX_CACHE_DIR,
+    max_bytes=PPTX_CACHE_MAX_MB * 1024 * 1024,
+    scripts_dir=Path(__file__).parent,
+    enabled=PPTX_CACHE_ENABLED,
+)
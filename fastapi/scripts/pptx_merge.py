@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+PPTX 合并模块
+直接在 OOXML 包（zip）层面把多个已生成的 PPTX 合并为一个：复制幻灯片、备注和媒体部件，
+重新编号部件名、关系和内容类型，版式/母版按内容去重；不经过 Chromium，也不逐个元素深拷贝
+
+- 第一个文件作为基础包（保留其主题、母版、演示文稿属性），其余文件的幻灯片按顺序追加
+- 相同内容的图片只保留一份；与已有版式完全相同的版式直接复用，否则连同母版、主题一起复制
+- 所有部件在一次 zip 写入中流式复制（已压缩的媒体不再重复压缩），写完后原子替换
+
+用法:
+    python scripts/pptx_merge.py output.pptx a.pptx b.pptx [c.pptx ...]
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import zipfile
+import posixpath
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+NS_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+RT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+RT_SLIDE = RT + "slide"
+RT_LAYOUT = RT + "slideLayout"
+RT_MASTER = RT + "slideMaster"
+RT_NOTES = RT + "notesSlide"
+RT_NOTES_MASTER = RT + "notesMaster"
+RT_MEDIA = {RT + "image", RT + "media", RT + "video", RT + "audio", "http://schemas.microsoft.com/office/2007/relationships/media"}
+
+# 这些扩展名的部件本身已压缩，写入时不再 deflate
+_STORED_EXTS = {"png", "jpg", "jpeg", "gif", "mp4", "m4v", "mov", "mp3", "m4a", "wav", "wmv", "webp"}
+_FIRST_MASTER_ID = 2147483648  # sldMasterId / sldLayoutId 的取值下限
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+class PptxMergeError(Exception):
+    """输入无法合并（文件损坏、幻灯片尺寸不一致等）"""
+
+
+def _rels_name(part: str) -> str:
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def _resolve(source_part: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def _relative(source_part: str, target_part: str) -> str:
+    return posixpath.relpath(target_part, posixpath.dirname(source_part) or ".")
+
+
+class _Rel:
+    __slots__ = ("id", "type", "target", "external")
+
+    def __init__(self, rel_id: str, rel_type: str, target: str, external: bool):
+        self.id = rel_id
+        self.type = rel_type
+        self.target = target    # 内部关系为包内部件名（已解析），外部关系为原始 URL
+        self.external = external
+
+
+def _serialize_rels(source_part: str, rels: List[_Rel]) -> bytes:
+    root = etree.Element(f"{{{NS_RELS}}}Relationships", nsmap={None: NS_RELS})
+    for rel in rels:
+        element = etree.SubElement(root, f"{{{NS_RELS}}}Relationship")
+        element.set("Id", rel.id)
+        element.set("Type", rel.type)
+        if rel.external:
+            element.set("Target", rel.target)
+            element.set("TargetMode", "External")
+        else:
+            element.set("Target", _relative(source_part, rel.target))
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+class _Package:
+    """只读 PPTX 包"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        try:
+            self.zip = zipfile.ZipFile(self.path)
+        except (zipfile.BadZipFile, OSError) as e:
+            raise PptxMergeError(f"无法打开 {self.path.name}: {e}")
+        self.names = set(self.zip.namelist())
+        if "[Content_Types].xml" not in self.names or "ppt/presentation.xml" not in self.names:
+            raise PptxMergeError(f"{self.path.name} 不是有效的 PPTX")
+        types = etree.fromstring(self.zip.read("[Content_Types].xml"))
+        self.defaults = {e.get("Extension").lower(): e.get("ContentType") for e in types.iter(f"{{{NS_CT}}}Default")}
+        self.overrides = {e.get("PartName").lstrip("/"): e.get("ContentType") for e in types.iter(f"{{{NS_CT}}}Override")}
+        self.presentation = etree.fromstring(self.zip.read("ppt/presentation.xml"))
+        self._rels_cache: Dict[str, List[_Rel]] = {}
+
+    def read(self, part: str) -> bytes:
+        return self.zip.read(part)
+
+    def content_type(self, part: str) -> Optional[str]:
+        if part in self.overrides:
+            return self.overrides[part]
+        return self.defaults.get(posixpath.splitext(part)[1].lstrip(".").lower())
+
+    def rels(self, part: str) -> List[_Rel]:
+        if part not in self._rels_cache:
+            rels = []
+            name = _rels_name(part)
+            if name in self.names:
+                for element in etree.fromstring(self.zip.read(name)).iter(f"{{{NS_RELS}}}Relationship"):
+                    external = element.get("TargetMode") == "External"
+                    target = element.get("Target")
+                    rels.append(_Rel(element.get("Id"), element.get("Type"), target if external else _resolve(part, target), external))
+            self._rels_cache[part] = rels
+        return self._rels_cache[part]
+
+    def related(self, part: str, rel_type: str) -> List[str]:
+        return [r.target for r in self.rels(part) if r.type == rel_type and not r.external]
+
+    def slide_size(self) -> Tuple[str, str]:
+        size = self.presentation.find(f"{{{NS_P}}}sldSz")
+        return (size.get("cx"), size.get("cy")) if size is not None else ("", "")
+
+    def slides(self) -> List[str]:
+        """按演示文稿顺序返回幻灯片部件名"""
+        by_id = {r.id: r.target for r in self.rels("ppt/presentation.xml")}
+        id_list = self.presentation.find(f"{{{NS_P}}}sldIdLst")
+        if id_list is None:
+            return []
+        return [by_id[e.get(f"{{{NS_R}}}id")] for e in id_list if e.get(f"{{{NS_R}}}id") in by_id]
+
+    def close(self):
+        self.zip.close()
+
+
+class _Merger:
+    """一次合并操作：规划输出包的所有部件，再一次性写出"""
+
+    def __init__(self, base: _Package):
+        self.base = base
+        # 输出部件：部件名 → (源包, 源部件名) 或 bytes
+        self.parts: Dict[str, Union[Tuple[_Package, str], bytes]] = {}
+        self.defaults = dict(base.defaults)
+        self.overrides = dict(base.overrides)
+        self.media: Dict[str, str] = {}        # 内容哈希 → 输出部件名
+        self.layouts: Dict[str, str] = {}      # 版式指纹 → 输出部件名
+        self.memo: Dict[Tuple[int, str], str] = {}
+        self.presentation_rels = list(base.rels("ppt/presentation.xml"))
+        self.new_slides: List[Tuple[int, str]] = []    # (sldId, 关系 ID)
+        self.new_masters: List[Tuple[int, str]] = []
+        self.stats = {"media_reused": 0, "layouts_reused": 0, "masters_added": 0}
+
+        regenerated = {"[Content_Types].xml", "ppt/presentation.xml", _rels_name("ppt/presentation.xml"), "docProps/app.xml"}
+        for name in base.zip.namelist():
+            if name not in regenerated and not name.endswith("/"):
+                self.parts[name] = (base, name)
+        for name in base.names:
+            if name.startswith("ppt/media/"):
+                self.media.setdefault(self._hash(base, name), name)
+        for master in base.related("ppt/presentation.xml", RT_MASTER):
+            master_key = self._master_key(base, master)
+            for layout in base.related(master, RT_LAYOUT):
+                self.layouts.setdefault(self._layout_key(base, layout, master_key), layout)
+
+        self.next_id = max([_FIRST_MASTER_ID - 1] + self._master_ids(base))
+        slide_ids = [int(e.get("id")) for e in base.presentation.iterfind(f"{{{NS_P}}}sldIdLst/{{{NS_P}}}sldId")]
+        self.next_slide_id = max([255] + slide_ids)
+        notes_masters = base.related("ppt/presentation.xml", RT_NOTES_MASTER)
+        self.notes_master = notes_masters[0] if notes_masters else None
+        self.new_notes_master: Optional[str] = None   # 从其它输入包引入的备注母版的关系 ID
+
+    # --- 工具 ---
+
+    @staticmethod
+    def _hash(package: _Package, part: str) -> str:
+        h = hashlib.sha256()
+        with package.zip.open(part) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _master_key(self, package: _Package, master: str) -> str:
+        h = hashlib.sha256(package.read(master))
+        for theme in package.related(master, RT + "theme"):
+            h.update(package.read(theme))
+        return h.hexdigest()
+
+    def _layout_key(self, package: _Package, layout: str, master_key: str) -> str:
+        return hashlib.sha256(package.read(layout) + master_key.encode("ascii")).hexdigest()
+
+    def _master_ids(self, package: _Package) -> List[int]:
+        ids = [int(e.get("id")) for e in package.presentation.iterfind(f"{{{NS_P}}}sldMasterIdLst/{{{NS_P}}}sldMasterId")]
+        for master in package.related("ppt/presentation.xml", RT_MASTER):
+            root = etree.fromstring(package.read(master))
+            ids += [int(e.get("id")) for e in root.iterfind(f"{{{NS_P}}}sldLayoutIdLst/{{{NS_P}}}sldLayoutId")]
+        return ids
+
+    def _allocate(self, like: str) -> str:
+        """按源部件名的模式分配一个未使用的输出部件名（slide3.xml → slideN.xml）"""
+        directory, name = posixpath.split(like)
+        stem, ext = posixpath.splitext(name)
+        prefix = re.sub(r"\d+$", "", stem)
+        index = 1
+        while True:
+            candidate = posixpath.join(directory, f"{prefix}{index}{ext}")
+            if candidate not in self.parts:
+                return candidate
+            index += 1
+
+    def _add_part(self, name: str, package: _Package, source: str, data: Optional[bytes] = None):
+        self.parts[name] = data if data is not None else (package, source)
+        content_type = package.content_type(source)
+        ext = posixpath.splitext(name)[1].lstrip(".").lower()
+        if source in package.overrides:
+            self.overrides[name] = content_type
+        elif content_type and ext not in self.defaults:
+            self.defaults[ext] = content_type
+
+    def _add_rels(self, name: str, rels: List[_Rel]):
+        if rels:
+            self.parts[_rels_name(name)] = _serialize_rels(name, rels)
+
+    # --- 部件复制 ---
+
+    def _map_target(self, package: _Package, rel: _Rel, owner: str) -> Optional[str]:
+        """复制关系目标，返回输出部件名；返回 None 表示丢弃该关系"""
+        if rel.type in RT_MEDIA:
+            return self._copy_media(package, rel.target)
+        if rel.type == RT_LAYOUT:
+            return self._map_layout(package, rel.target)
+        if rel.type == RT_NOTES:
+            if self.notes_master is None:
+                self._adopt_notes_master(package)
+            return self._copy_notes(package, rel.target, owner) if self.notes_master else None
+        if rel.type == RT_NOTES_MASTER:
+            return self.notes_master
+        if rel.type == RT_SLIDE:
+            return self.memo.get((id(package), rel.target))
+        return self._copy_generic(package, rel.target)
+
+    def _copy_rels(self, package: _Package, source: str, name: str, overrides: Optional[Dict[str, str]] = None):
+        rels = []
+        for rel in package.rels(source):
+            if rel.external:
+                rels.append(rel)
+                continue
+            target = (overrides or {}).get(rel.target) or self._map_target(package, rel, name)
+            if target is not None:
+                rels.append(_Rel(rel.id, rel.type, target, False))
+        self._add_rels(name, rels)
+
+    def _copy_media(self, package: _Package, source: str) -> str:
+        digest = self._hash(package, source)
+        if digest in self.media:
+            self.stats["media_reused"] += 1
+            return self.media[digest]
+        name = self._allocate(source)
+        self._add_part(name, package, source)
+        self.media[digest] = name
+        return name
+
+    def _copy_generic(self, package: _Package, source: str) -> str:
+        key = (id(package), source)
+        if key in self.memo:
+            return self.memo[key]
+        if source not in package.names:
+            raise PptxMergeError(f"{package.path.name} 缺少部件 {source}")
+        name = self._allocate(source)
+        self.memo[key] = name
+        self._add_part(name, package, source)
+        self._copy_rels(package, source, name)
+        return name
+
+    def _copy_notes(self, package: _Package, source: str, slide: str) -> str:
+        name = self._allocate(source)
+        self._add_part(name, package, source)
+        self._copy_rels(package, source, name, overrides={t: slide for t in package.related(source, RT_SLIDE)})
+        return name
+
+    def _adopt_notes_master(self, package: _Package):
+        """基础包没有备注母版时，使用第一个带备注的输入包的备注母版"""
+        masters = package.related("ppt/presentation.xml", RT_NOTES_MASTER)
+        if masters:
+            self.notes_master = self._copy_generic(package, masters[0])
+            self.new_notes_master = self._add_presentation_rel(RT_NOTES_MASTER, self.notes_master)
+
+    def _map_layout(self, package: _Package, layout: str) -> str:
+        masters = package.related(layout, RT_MASTER)
+        if not masters:
+            raise PptxMergeError(f"{package.path.name}: 版式 {layout} 没有母版")
+        key = self._layout_key(package, layout, self._master_key(package, masters[0]))
+        if key in self.layouts:
+            self.stats["layouts_reused"] += 1
+            return self.layouts[key]
+        self._copy_master(package, masters[0])
+        return self.layouts[key]
+
+    def _copy_master(self, package: _Package, master: str):
+        """复制母版及其全部版式和主题，并在演示文稿中登记"""
+        master_key = self._master_key(package, master)
+        master_name = self._allocate(master)
+        self.parts[master_name] = b""  # 先占位，避免版式分配到同名
+        layout_names = {}
+        for layout in package.related(master, RT_LAYOUT):
+            layout_names[layout] = self._allocate(layout)
+            self.parts[layout_names[layout]] = b""
+            self.layouts.setdefault(self._layout_key(package, layout, master_key), layout_names[layout])
+
+        # 母版中的版式 ID 与已有母版/版式 ID 共用一个编号空间，需要重新编号
+        root = etree.fromstring(package.read(master))
+        for element in root.iterfind(f"{{{NS_P}}}sldLayoutIdLst/{{{NS_P}}}sldLayoutId"):
+            self.next_id += 1
+            element.set("id", str(self.next_id))
+        self._add_part(master_name, package, master, etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True))
+        self._copy_rels(package, master, master_name, overrides=layout_names)
+
+        for layout, layout_name in layout_names.items():
+            self._add_part(layout_name, package, layout)
+            self._copy_rels(package, layout, layout_name, overrides={master: master_name})
+
+        self.next_id += 1
+        rel_id = self._add_presentation_rel(RT_MASTER, master_name)
+        self.new_masters.append((self.next_id, rel_id))
+        self.stats["masters_added"] += 1
+
+    def _add_presentation_rel(self, rel_type: str, target: str) -> str:
+        used = {r.id for r in self.presentation_rels}
+        index = len(used) + 1
+        while f"rId{index}" in used:
+            index += 1
+        self.presentation_rels.append(_Rel(f"rId{index}", rel_type, target, False))
+        return f"rId{index}"
+
+    def append_package(self, package: _Package):
+        if package.slide_size() != self.base.slide_size():
+            raise PptxMergeError(
+                f"{package.path.name} 的幻灯片尺寸 {package.slide_size()} 与 {self.base.path.name} {self.base.slide_size()} 不一致"
+            )
+        slides = package.slides()
+        # 先为本包的全部幻灯片分配名字，幻灯片之间的超链接关系才能映射
+        for slide in slides:
+            name = self._allocate(slide)
+            self.parts[name] = b""
+            self.memo[(id(package), slide)] = name
+        for slide in slides:
+            name = self.memo[(id(package), slide)]
+            self._add_part(name, package, slide)
+            self._copy_rels(package, slide, name)
+            self.next_slide_id += 1
+            self.new_slides.append((self.next_slide_id, self._add_presentation_rel(RT_SLIDE, name)))
+
+    # --- 输出 ---
+
+    def _presentation_xml(self) -> bytes:
+        root = etree.fromstring(etree.tostring(self.base.presentation))
+        r_id = f"{{{NS_R}}}id"
+        if self.new_masters:
+            master_list = root.find(f"{{{NS_P}}}sldMasterIdLst")
+            for master_id, rel_id in self.new_masters:
+                etree.SubElement(master_list, f"{{{NS_P}}}sldMasterId", {"id": str(master_id), r_id: rel_id})
+        if self.new_notes_master:
+            notes_list = etree.Element(f"{{{NS_P}}}notesMasterIdLst")
+            etree.SubElement(notes_list, f"{{{NS_P}}}notesMasterId", {r_id: self.new_notes_master})
+            root.find(f"{{{NS_P}}}sldMasterIdLst").addnext(notes_list)
+        if self.new_slides:
+            slide_list = root.find(f"{{{NS_P}}}sldIdLst")
+            if slide_list is None:
+                slide_list = etree.Element(f"{{{NS_P}}}sldIdLst")
+                anchor = root.find(f"{{{NS_P}}}sldSz")
+                anchor.addprevious(slide_list)
+            for slide_id, rel_id in self.new_slides:
+                etree.SubElement(slide_list, f"{{{NS_P}}}sldId", {"id": str(slide_id), r_id: rel_id})
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def _content_types_xml(self) -> bytes:
+        root = etree.Element(f"{{{NS_CT}}}Types", nsmap={None: NS_CT})
+        for ext, content_type in sorted(self.defaults.items()):
+            etree.SubElement(root, f"{{{NS_CT}}}Default", {"Extension": ext, "ContentType": content_type})
+        for name, content_type in self.overrides.items():
+            if name in self.parts or name in ("ppt/presentation.xml", "docProps/app.xml"):
+                etree.SubElement(root, f"{{{NS_CT}}}Override", {"PartName": f"/{name}", "ContentType": content_type})
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def _app_xml(self, slide_count: int) -> Optional[bytes]:
+        if "docProps/app.xml" not in self.base.names:
+            return None
+        data = self.base.read("docProps/app.xml")
+        return re.sub(rb"<Slides>\d+</Slides>", f"<Slides>{slide_count}</Slides>".encode("ascii"), data, count=1)
+
+    def write(self, output_file: Path) -> int:
+        """一次写出整个包，返回幻灯片数"""
+        slide_count = len(self.base.slides()) + len(self.new_slides)
+        generated = {
+            "[Content_Types].xml": self._content_types_xml(),
+            "ppt/presentation.xml": self._presentation_xml(),
+            _rels_name("ppt/presentation.xml"): _serialize_rels("ppt/presentation.xml", self.presentation_rels),
+        }
+        app_xml = self._app_xml(slide_count)
+        if app_xml is not None:
+            generated["docProps/app.xml"] = app_xml
+
+        tmp_path = output_file.with_name(f".{output_file.name}.{os.getpid()}.tmp")
+        try:
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as out:
+                # [Content_Types].xml 放在最前面，部分读取器依赖这个顺序
+                entries = list(generated.items()) + [(k, v) for k, v in self.parts.items() if k not in generated]
+                for name, source in entries:
+                    info = zipfile.ZipInfo(name, date_time=_ZIP_DATE)
+                    ext = posixpath.splitext(name)[1].lstrip(".").lower()
+                    info.compress_type = zipfile.ZIP_STORED if ext in _STORED_EXTS else zipfile.ZIP_DEFLATED
+                    if isinstance(source, bytes):
+                        out.writestr(info, source)
+                    else:
+                        package, part = source
+                        with package.zip.open(part) as src, out.open(info, "w") as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, output_file)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return slide_count
+
+
+def merge_pptx(input_files: List[Union[str, Path]], output_file: Union[str, Path]) -> Dict[str, Any]:
+    """
+    把多个 PPTX 按顺序合并为一个
+
+    Args:
+        input_files: 输入 PPTX（至少一个；第一个作为基础包）
+        output_file: 输出路径（可以与输入相同）
+
+    Returns:
+        {"output_file", "inputs", "slides", "media_reused", "layouts_reused", "masters_added", "duration_ms"}
+
+    Raises:
+        PptxMergeError: 输入无效或幻灯片尺寸不一致
+    """
+    if not input_files:
+        raise PptxMergeError("没有输入文件")
+    start = time.time()
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    packages = []
+    try:
+        for path in input_files:
+            packages.append(_Package(path))
+        merger = _Merger(packages[0])
+        for package in packages[1:]:
+            merger.append_package(package)
+        slides = merger.write(output_file)
+    finally:
+        for package in packages:
+            package.close()
+
+    return {
+        "output_file": str(output_file),
+        "inputs": len(input_files),
+        "slides": slides,
+        **merger.stats,
+        "duration_ms": round((time.time() - start) * 1000),
+    }
+
+
+class PptxMerger:
+    """合并统计（供 /health 使用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"merges": 0, "failures": 0, "inputs": 0, "slides": 0, "seconds": 0.0}
+
+    def merge(self, input_files: List[Union[str, Path]], output_file: Union[str, Path]) -> Dict[str, Any]:
+        try:
+            result = merge_pptx(input_files, output_file)
+        except Exception:
+            with self._lock:
+                self.stats["failures"] += 1
+            raise
+        with self._lock:
+            self.stats["merges"] += 1
+            self.stats["inputs"] += result["inputs"]
+            self.stats["slides"] += result["slides"]
+            self.stats["seconds"] += result["duration_ms"] / 1000
+        logger.info(f"[PptxMerge] {result['inputs']} 个文件 → {result['slides']} 页, 耗时 {result['duration_ms']}ms")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "seconds": round(self.stats["seconds"], 2)}
+
+
+# 全局合并实例
+pptx_merger = PptxMerger()
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="合并多个 PPTX（按输入顺序追加幻灯片）")
+    parser.add_argument("output", help="输出 PPTX 路径")
+    parser.add_argument("inputs", nargs="+", help="输入 PPTX（第一个作为基础包）")
+    args = parser.parse_args()
+
+    try:
+        result = merge_pptx(args.inputs, args.output)
+    except PptxMergeError as e:
+        print(f"合并失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+PPTX 包优化模块
+上传 R2 前对生成的 PPTX 做一次瘦身，减少上传时间和用户下载体积：
+
+- 删除不可达部件：从包根关系出发遍历不到的部件（及其 Override 声明）
+- 媒体去重：内容相同的图片只保留一份，改写引用它们的关系
+- 图片重压缩：超过大小或分辨率阈值的图片用 Pillow 缩小到最长边上限并重新编码；
+  不透明的 PNG 转为 JPEG（部件改名、补充内容类型），透明 PNG 保持 PNG；结果不更小时保留原图
+- 可选地用 doc/pptx/ooxml/scripts/validate.py 校验输出，校验失败时保留原文件
+
+用法:
+    python scripts/pptx_optimizer.py input.pptx [-o output.pptx] [--validate]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import hashlib
+import zipfile
+import posixpath
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+import logging
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# 配置
+PPTX_OPTIMIZE_ENABLED = os.getenv("PPTX_OPTIMIZE_ENABLED", "true").lower() == "true"
+PPTX_OPTIMIZE_MIN_IMAGE_KB = int(os.getenv("PPTX_OPTIMIZE_MIN_IMAGE_KB", "200"))     # 超过该大小的图片尝试重压缩
+PPTX_OPTIMIZE_MAX_IMAGE_PX = int(os.getenv("PPTX_OPTIMIZE_MAX_IMAGE_PX", "1920"))    # 图片最长边上限
+PPTX_OPTIMIZE_JPEG_QUALITY = int(os.getenv("PPTX_OPTIMIZE_JPEG_QUALITY", "85"))
+PPTX_OPTIMIZE_VALIDATE = os.getenv("PPTX_OPTIMIZE_VALIDATE", "false").lower() == "true"  # XSD 校验较慢，默认关闭
+
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+NS_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+VALIDATE_SCRIPT = Path(__file__).resolve().parent.parent.parent / "doc" / "pptx" / "ooxml" / "scripts" / "validate.py"
+
+_RECOMPRESS_EXTS = {"png", "jpg", "jpeg"}
+_STORED_EXTS = {"png", "jpg", "jpeg", "gif", "mp4", "m4v", "mov", "mp3", "m4a", "wav", "wmv", "webp"}
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def _rels_name(part: str) -> str:
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def _source_of_rels(rels_name: str) -> str:
+    """ppt/slides/_rels/slide1.xml.rels → ppt/slides/slide1.xml（包关系 _rels/.rels → ""）"""
+    directory, name = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(directory), name[: -len(".rels")])
+
+
+def _resolve(source_part: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def _ext(part: str) -> str:
+    return posixpath.splitext(part)[1].lstrip(".").lower()
+
+
+def _recompress(data: bytes, ext: str, max_px: int, quality: int) -> Optional[Tuple[bytes, str]]:
+    """
+    重压缩一张图片
+
+    Returns:
+        (新数据, 新扩展名)；无法处理或结果不更小时返回 None
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return None
+    if getattr(image, "is_animated", False):
+        return None
+
+    if max(image.size) > max_px:
+        scale = max_px / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        alpha = image.convert("RGBA").getchannel("A")
+        has_alpha = alpha.getextrema()[0] < 255
+
+    output = io.BytesIO()
+    if has_alpha:
+        image.save(output, format="PNG", optimize=True)
+        new_ext = "png"
+    else:
+        image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        new_ext = "jpeg" if ext == "jpeg" else "jpg"
+    new_data = output.getvalue()
+    if len(new_data) >= len(data):
+        return None
+    return new_data, new_ext
+
+
+def validate_package(
+    pptx_path: Union[str, Path],
+    original: Union[str, Path],
+    timeout: float = 300,
+) -> Tuple[bool, str]:
+    """
+    用 doc/pptx/ooxml/scripts/validate.py 校验 PPTX，返回 (是否通过, 输出)
+
+    validate.py 只报告相对 original 新增的 XSD 错误，因此 original 必须是优化前的文件
+    """
+    if not VALIDATE_SCRIPT.exists():
+        return True, "validate.py 不存在，跳过校验"
+    with tempfile.TemporaryDirectory() as tmp:
+        with zipfile.ZipFile(pptx_path) as zf:
+            zf.extractall(tmp)
+        process = subprocess.run(
+            [sys.executable, str(VALIDATE_SCRIPT), tmp, "--original", str(original)],
+            capture_output=True, text=True, encoding="utf-8", errors="replace",
+            cwd=str(VALIDATE_SCRIPT.parent), timeout=timeout,
+        )
+    output = ((process.stdout or "") + (process.stderr or "")).strip()
+    return process.returncode == 0, output
+
+
+def optimize_pptx(
+    input_file: Union[str, Path],
+    output_file: Optional[Union[str, Path]] = None,
+    min_image_kb: int = PPTX_OPTIMIZE_MIN_IMAGE_KB,
+    max_image_px: int = PPTX_OPTIMIZE_MAX_IMAGE_PX,
+    jpeg_quality: int = PPTX_OPTIMIZE_JPEG_QUALITY,
+) -> Dict[str, Any]:
+    """
+    优化 PPTX 包
+
+    Args:
+        input_file: 输入 PPTX
+        output_file: 输出路径（默认原地替换）
+
+    Returns:
+        {"bytes_before", "bytes_after", "saved_bytes", "parts_removed", "media_deduped",
+         "images_recompressed", "duration_ms"}
+    """
+    start = time.time()
+    input_file = Path(input_file)
+    output_file = Path(output_file) if output_file else input_file
+    bytes_before = input_file.stat().st_size
+
+    with zipfile.ZipFile(input_file) as zf:
+        names = [n for n in zf.namelist() if not n.endswith("/")]
+        name_set = set(names)
+        types = etree.fromstring(zf.read("[Content_Types].xml"))
+        rels_docs = {n: etree.fromstring(zf.read(n)) for n in names if n.endswith(".rels")}
+
+        def rels_of(part: str):
+            doc = rels_docs.get(_rels_name(part) if part else "_rels/.rels")
+            return [] if doc is None else list(doc.iter(f"{{{NS_RELS}}}Relationship"))
+
+        # 1. 可达性：从包根关系出发遍历
+        reachable, stack = set(), [""]
+        while stack:
+            part = stack.pop()
+            for rel in rels_of(part):
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = _resolve(part, rel.get("Target"))
+                if target in name_set and target not in reachable:
+                    reachable.add(target)
+                    stack.append(target)
+        kept = {n for n in names if n in reachable}
+        kept |= {n for n in rels_docs if n == "_rels/.rels" or _source_of_rels(n) in reachable}
+        kept.add("[Content_Types].xml")
+        removed = sorted(set(names) - kept)
+
+        # 2. 媒体去重 + 3. 重压缩
+        renamed: Dict[str, str] = {}            # 原部件名 → 新部件名（去重或改扩展名）
+        replaced: Dict[str, bytes] = {}         # 新部件名 → 新数据
+        by_hash: Dict[str, str] = {}
+        deduped = recompressed = 0
+        for name in sorted(kept):
+            if not name.startswith("ppt/media/"):
+                continue
+            data = zf.read(name)
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in by_hash:
+                renamed[name] = renamed.get(by_hash[digest], by_hash[digest])
+                deduped += 1
+                continue
+            by_hash[digest] = name
+            if _ext(name) not in _RECOMPRESS_EXTS:
+                continue
+            if len(data) < min_image_kb * 1024:
+                from PIL import Image
+                try:
+                    with Image.open(io.BytesIO(data)) as image:
+                        if max(image.size) <= max_image_px:
+                            continue
+                except Exception:
+                    continue
+            result = _recompress(data, _ext(name), max_image_px, jpeg_quality)
+            if result is None:
+                continue
+            new_data, new_ext = result
+            new_name = name if new_ext == _ext(name) else f"{posixpath.splitext(name)[0]}.{new_ext}"
+            if new_name != name and (new_name in name_set or new_name in replaced):
+                new_name = f"{posixpath.splitext(name)[0]}_{digest[:8]}.{new_ext}"
+            if new_name != name:
+                renamed[name] = new_name
+            replaced[new_name] = new_data
+            recompressed += 1
+
+        dropped = set(removed) | {n for n, target in renamed.items() if target != n}
+
+        # 改写关系目标
+        for rels_name, doc in rels_docs.items():
+            if rels_name not in kept:
+                continue
+            source = "" if rels_name == "_rels/.rels" else _source_of_rels(rels_name)
+            for rel in doc.iter(f"{{{NS_RELS}}}Relationship"):
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = _resolve(source, rel.get("Target"))
+                if target in renamed:
+                    rel.set("Target", posixpath.relpath(renamed[target], posixpath.dirname(source) or "."))
+
+        # 内容类型：删除已删除部件的 Override，补充新扩展名的 Default
+        for override in list(types.iter(f"{{{NS_CT}}}Override")):
+            if override.get("PartName").lstrip("/") in dropped:
+                types.remove(override)
+        defaults = {e.get("Extension").lower() for e in types.iter(f"{{{NS_CT}}}Default")}
+        for new_name in replaced:
+            ext = _ext(new_name)
+            if ext not in defaults:
+                default = etree.Element(f"{{{NS_CT}}}Default", {"Extension": ext, "ContentType": "image/jpeg" if ext in ("jpg", "jpeg") else f"image/{ext}"})
+                types.insert(0, default)
+                defaults.add(ext)
+
+        tmp_path = output_file.with_name(f".{output_file.name}.{os.getpid()}.opt.tmp")
+        try:
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as out:
+                def entry(name: str) -> zipfile.ZipInfo:
+                    info = zipfile.ZipInfo(name, date_time=_ZIP_DATE)
+                    info.compress_type = zipfile.ZIP_STORED if _ext(name) in _STORED_EXTS else zipfile.ZIP_DEFLATED
+                    return info
+
+                out.writestr(entry("[Content_Types].xml"), etree.tostring(types, xml_declaration=True, encoding="UTF-8", standalone=True))
+                for name in names:
+                    if name == "[Content_Types].xml" or name in dropped:
+                        continue
+                    target = renamed.get(name, name)
+                    if name in rels_docs:
+                        out.writestr(entry(name), etree.tostring(rels_docs[name], xml_declaration=True, encoding="UTF-8", standalone=True))
+                    elif target in replaced:
+                        out.writestr(entry(target), replaced.pop(target))
+                    else:
+                        with zf.open(name) as src, out.open(entry(name), "w") as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                # 改了扩展名的重压缩图片（原部件名已在 dropped 中）
+                for target, data in replaced.items():
+                    out.writestr(entry(target), data)
+            os.replace(tmp_path, output_file)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    bytes_after = output_file.stat().st_size
+    return {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "saved_bytes": bytes_before - bytes_after,
+        "parts_removed": len(removed),
+        "media_deduped": deduped,
+        "images_recompressed": recompressed,
+        "duration_ms": round((time.time() - start) * 1000),
+    }
+
+
+class PptxOptimizer:
+    """上传前优化入口（原地优化，失败时保留原文件），并统计节省的字节数"""
+
+    def __init__(self, enabled: bool = True, validate: bool = False):
+        self.enabled = enabled
+        self.validate = validate
+        self._lock = threading.Lock()
+        self.stats = {
+            "optimized": 0,
+            "failures": 0,
+            "validation_failures": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "parts_removed": 0,
+            "media_deduped": 0,
+            "images_recompressed": 0,
+            "seconds": 0.0,
+        }
+
+    def optimize(self, pptx_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """原地优化 PPTX；未启用或失败时返回 None（文件保持不变）"""
+        if not self.enabled:
+            return None
+        pptx_path = Path(pptx_path)
+        tmp_path = pptx_path.with_name(f".{pptx_path.stem}.optimized.pptx")
+        try:
+            report = optimize_pptx(pptx_path, tmp_path)
+            if self.validate:
+                ok, output = validate_package(tmp_path, original=pptx_path)
+                if not ok:
+                    with self._lock:
+                        self.stats["validation_failures"] += 1
+                    logger.warning(f"[PptxOptimizer] 优化结果未通过校验，保留原文件: {pptx_path.name}\n{output[-1000:]}")
+                    return None
+            os.replace(tmp_path, pptx_path)
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+            logger.warning(f"[PptxOptimizer] 优化失败，保留原文件: {pptx_path.name}, 错误: {e}")
+            return None
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        with self._lock:
+            self.stats["optimized"] += 1
+            for key in ("bytes_before", "bytes_after", "parts_removed", "media_deduped", "images_recompressed"):
+                self.stats[key] += report[key]
+            self.stats["seconds"] += report["duration_ms"] / 1000
+        logger.info(
+            f"[PptxOptimizer] {pptx_path.name}: {report['bytes_before'] / 1024:.0f}KB → {report['bytes_after'] / 1024:.0f}KB "
+            f"(去重 {report['media_deduped']}, 重压缩 {report['images_recompressed']}, 删除部件 {report['parts_removed']})"
+        )
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "enabled": self.enabled,
+            "validate": self.validate,
+            "min_image_kb": PPTX_OPTIMIZE_MIN_IMAGE_KB,
+            "max_image_px": PPTX_OPTIMIZE_MAX_IMAGE_PX,
+            "jpeg_quality": PPTX_OPTIMIZE_JPEG_QUALITY,
+            **stats,
+            "saved_mb": round((stats["bytes_before"] - stats["bytes_after"]) / 1024 / 1024, 2),
+            "seconds": round(stats["seconds"], 2),
+        }
+
+
+# 全局优化实例
+pptx_optimizer = PptxOptimizer(enabled=PPTX_OPTIMIZE_ENABLED, validate=PPTX_OPTIMIZE_VALIDATE)
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="优化 PPTX 包（删除无用部件、媒体去重、图片重压缩）")
+    parser.add_argument("input", help="输入 PPTX")
+    parser.add_argument("-o", "--output", help="输出路径（默认原地替换）")
+    parser.add_argument("--min-image-kb", type=int, default=PPTX_OPTIMIZE_MIN_IMAGE_KB)
+    parser.add_argument("--max-image-px", type=int, default=PPTX_OPTIMIZE_MAX_IMAGE_PX)
+    parser.add_argument("--quality", type=int, default=PPTX_OPTIMIZE_JPEG_QUALITY, help="JPEG 质量")
+    parser.add_argument("--validate", action="store_true", help="用 validate.py 校验输出")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = Path(args.input)
+        if args.validate and not args.output:
+            # 原地优化时先保留一份优化前的文件作为校验基准
+            original = Path(tmp) / original.name
+            shutil.copyfile(args.input, original)
+        report = optimize_pptx(args.input, args.output, args.min_image_kb, args.max_image_px, args.quality)
+        if args.validate:
+            ok, output = validate_package(args.output or args.input, original=original)
+            report["valid"] = ok
+            if not ok:
+                print(output, file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report.get("valid", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
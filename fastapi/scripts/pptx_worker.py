@@ -0,0 +1,368 @@
+"""
+常驻 PPTX 转换进程管理模块
+管理 scripts/pptx-worker.js（一个常驻 Chromium + 页面池），通过 stdin/stdout 逐行 JSON-RPC 提交转换请求
+
+- 进程崩溃时自动重启，崩溃时正在处理的请求重试一次
+- 转换超时时认为浏览器卡死，强制重启
+- 进程树内存（Node + Chromium 各进程 RSS 之和）或累计转换次数超过上限时平滑替换：新请求交给新进程，旧进程处理完手上的请求后退出
+- 进程无法启动（未安装 Node 依赖等）时抛出 PptxWorkerUnavailable，调用方回退到一次性 CLI 转换
+"""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置
+PPTX_WORKER_ENABLED = os.getenv("PPTX_WORKER_ENABLED", "true").lower() == "true"
+PPTX_WORKER_POOL_SIZE = int(os.getenv("PPTX_WORKER_POOL_SIZE", "4"))          # 常驻页面数（并发渲染页数）
+PPTX_WORKER_MAX_RSS_MB = int(os.getenv("PPTX_WORKER_MAX_RSS_MB", "2048"))      # 进程树（Node + Chromium）RSS 上限
+PPTX_WORKER_MAX_CONVERSIONS = int(os.getenv("PPTX_WORKER_MAX_CONVERSIONS", "500"))  # 累计转换次数上限
+PPTX_WORKER_START_TIMEOUT = float(os.getenv("PPTX_WORKER_START_TIMEOUT", "60"))
+
+_STREAM_LIMIT = 4 * 1024 * 1024
+_TREE_RSS_INTERVAL = 5.0   # 进程树内存采样间隔（秒）
+
+
+def process_tree_rss_mb(root_pid: int) -> Optional[int]:
+    """
+    进程及其全部子孙进程的 RSS 之和（MB）
+
+    Chromium 的浏览器、渲染、GPU 进程都是 Node 进程的子孙进程，内存主要花在这里，
+    只看 Node 自身的 RSS 会严重低估。读取 /proc，不可用（非 Linux）时返回 None
+    """
+    proc = Path("/proc")
+    if not (proc / str(root_pid)).exists():
+        return None
+    children: Dict[int, List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # 格式: pid (comm) state ppid ...，comm 中可能有空格和括号
+        fields = stat[stat.rfind(")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry.name))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            total += int((proc / str(pid) / "statm").read_text().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        stack.extend(children.get(pid, ()))
+    return round(total / 1024 / 1024)
+
+
+class PptxWorkerUnavailable(Exception):
+    """转换进程无法启动"""
+
+
+class PptxWorkerCrashed(Exception):
+    """转换进程在请求处理期间退出"""
+
+
+class _WorkerProcess:
+    """单个 Node 转换进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.last_stats: Dict[str, Any] = {}
+        self.tree_rss_mb: Optional[int] = None
+        self._tree_rss_at = 0.0
+        self.started_at = time.time()
+        self.reader_task = asyncio.create_task(self._read_stdout())
+        self.stderr_task = asyncio.create_task(self._read_stderr())
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def sample_tree_rss(self) -> Optional[int]:
+        """按采样间隔刷新进程树内存"""
+        now = time.time()
+        if now - self._tree_rss_at >= _TREE_RSS_INTERVAL:
+            self._tree_rss_at = now
+            self.tree_rss_mb = process_tree_rss_mb(self.pid)
+        return self.tree_rss_mb
+
+    async def _read_stdout(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"[PptxWorker] 无法解析的输出: {line[:200]!r}")
+                    continue
+                if message.get("stats"):
+                    self.last_stats = message["stats"]
+                if message.get("event") == "ready":
+                    if not self.ready.done():
+                        self.ready.set_result(message)
+                    continue
+                future = self.pending.pop(message.get("id"), None)
+                if future and not future.done():
+                    future.set_result(message)
+        finally:
+            await self.process.wait()
+            error = PptxWorkerCrashed(f"转换进程已退出 (pid={self.pid}, code={self.process.returncode})")
+            if not self.ready.done():
+                self.ready.set_exception(error)
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def _read_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            logger.debug(f"[PptxWorker:{self.pid}] {line.decode('utf-8', errors='replace').rstrip()}")
+
+    async def request(self, method: str, params: Optional[dict] = None) -> Dict[str, Any]:
+        if not self.alive:
+            raise PptxWorkerCrashed(f"转换进程已退出 (pid={self.pid})")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        payload = json.dumps({"id": request_id, "method": method, "params": params or {}}, ensure_ascii=False)
+        try:
+            self.process.stdin.write(payload.encode("utf-8") + b"\n")
+            await self.process.stdin.drain()
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def close(self, graceful: bool = True, timeout: float = 30):
+        """graceful=True 时等待手上的请求完成后再让进程退出"""
+        if graceful:
+            deadline = time.monotonic() + timeout
+            while self.pending and self.alive and time.monotonic() < deadline:
+                await asyncio.sleep(0.2)
+            if self.alive:
+                try:
+                    await asyncio.wait_for(self.request("shutdown"), timeout=5)
+                except Exception:
+                    pass
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+        await asyncio.gather(self.reader_task, self.stderr_task, return_exceptions=True)
+
+
+class PptxWorker:
+    """常驻转换进程的生命周期管理（由 FastAPI startup/shutdown 事件驱动）"""
+
+    def __init__(
+        self,
+        scripts_dir: Path,
+        pool_size: int,
+        max_rss_mb: int,
+        max_conversions: int,
+        tmp_dir: Optional[Path] = None,
+        enabled: bool = True,
+    ):
+        self.scripts_dir = Path(scripts_dir)
+        self.pool_size = pool_size
+        self.max_rss_mb = max_rss_mb
+        self.max_conversions = max_conversions
+        self.tmp_dir = tmp_dir
+        self.enabled = enabled
+        self._worker: Optional[_WorkerProcess] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._retiring: set = set()
+        self._stopped = False
+        self.stats = {
+            "starts": 0,
+            "crashes": 0,       # 意外退出
+            "recycled": 0,      # 超过内存/次数上限后平滑替换
+            "timeouts": 0,
+            "retried": 0,       # 进程崩溃后重试的请求
+            "conversions": 0,
+            "failures": 0,
+            "slides": 0,
+            "seconds": 0.0,
+        }
+
+    async def start(self):
+        """启动转换进程（startup_event 调用；失败时只记录日志，后续请求会再次尝试）"""
+        self._stopped = False
+        if not self.enabled:
+            return
+        try:
+            await self._get_worker()
+            logger.info(f"[PptxWorker] 已启动 (pid={self._worker.pid}, 页面池: {self.pool_size})")
+        except PptxWorkerUnavailable as e:
+            logger.warning(f"[PptxWorker] 启动失败，将使用一次性 CLI 转换: {e}")
+
+    async def stop(self):
+        """停止转换进程（shutdown_event 调用）"""
+        self._stopped = True
+        workers = list(self._retiring) + ([self._worker] if self._worker else [])
+        self._worker = None
+        await asyncio.gather(*(w.close(graceful=True, timeout=10) for w in workers), return_exceptions=True)
+
+    async def _spawn(self) -> _WorkerProcess:
+        cmd = ["node", str(self.scripts_dir / "pptx-worker.js"), "--pool-size", str(self.pool_size)]
+        if self.tmp_dir:
+            cmd += ["--tmp-dir", str(self.tmp_dir)]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(self.scripts_dir),
+                limit=_STREAM_LIMIT,
+            )
+        except (FileNotFoundError, PermissionError) as e:
+            raise PptxWorkerUnavailable(f"无法执行 node: {e}")
+
+        worker = _WorkerProcess(process)
+        try:
+            await asyncio.wait_for(asyncio.shield(worker.ready), timeout=PPTX_WORKER_START_TIMEOUT)
+        except (asyncio.TimeoutError, PptxWorkerCrashed) as e:
+            await worker.close(graceful=False)
+            raise PptxWorkerUnavailable(f"转换进程未就绪: {e or '启动超时'}")
+        self.stats["starts"] += 1
+        return worker
+
+    def _should_recycle(self, worker: _WorkerProcess) -> bool:
+        stats = worker.last_stats
+        # 优先使用进程树内存；/proc 不可用时退回到 Node 自报的 RSS（不含 Chromium）
+        tree_rss = worker.sample_tree_rss()
+        rss = tree_rss if tree_rss is not None else stats.get("rss_mb", 0)
+        return (
+            rss > self.max_rss_mb
+            or stats.get("conversions", 0) + stats.get("failures", 0) >= self.max_conversions
+        )
+
+    async def _retire(self, worker: _WorkerProcess):
+        self._retiring.add(worker)
+        try:
+            await worker.close(graceful=True)
+        finally:
+            self._retiring.discard(worker)
+
+    async def _get_worker(self) -> _WorkerProcess:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            worker = self._worker
+            if worker is not None and not worker.alive:
+                self.stats["crashes"] += 1
+                logger.warning(f"[PptxWorker] 转换进程已退出 (pid={worker.pid}, code={worker.process.returncode})，重新启动")
+                worker = self._worker = None
+            if worker is not None and self._should_recycle(worker):
+                self.stats["recycled"] += 1
+                logger.info(
+                    f"[PptxWorker] 转换进程达到上限 {worker.last_stats}（进程树 RSS: {worker.tree_rss_mb}MB），"
+                    f"平滑替换 (pid={worker.pid})"
+                )
+                asyncio.create_task(self._retire(worker))
+                worker = self._worker = None
+            if worker is None:
+                worker = self._worker = await self._spawn()
+            return worker
+
+    async def convert(self, html_files: List[Path], output_file: Path, timeout: float = 120) -> Dict[str, Any]:
+        """
+        把一个或多个 HTML 按顺序转换为同一个 PPTX
+
+        Returns:
+            转换结果（与 convert-html-to-pptx.js 输出的 JSON 相同，另含 duration_ms）
+
+        Raises:
+            PptxWorkerUnavailable: 转换进程无法启动（调用方可回退到 CLI）
+            TimeoutError: 转换超时
+            Exception: 转换失败
+        """
+        if not self.enabled or self._stopped:
+            raise PptxWorkerUnavailable("常驻转换进程未启用")
+
+        params = {
+            "html_files": [str(p) for p in html_files],
+            "output_file": str(output_file),
+            "tmp_dir": str(self.tmp_dir) if self.tmp_dir else None,
+        }
+        start = time.time()
+        for attempt in range(2):
+            worker = await self._get_worker()
+            try:
+                response = await asyncio.wait_for(worker.request("convert", params), timeout=timeout)
+                break
+            except asyncio.TimeoutError:
+                # 超时通常是浏览器卡死，强制重启（其余在途请求会因进程退出而重试）
+                self.stats["timeouts"] += 1
+                self.stats["failures"] += 1
+                logger.warning(f"[PptxWorker] 转换超时 ({timeout}s)，重启转换进程 (pid={worker.pid})")
+                await worker.close(graceful=False)
+                if self._worker is worker:
+                    self._worker = None
+                raise TimeoutError(f"PPTX 转换超时（超过 {timeout} 秒）")
+            except PptxWorkerCrashed as e:
+                if attempt == 0:
+                    self.stats["retried"] += 1
+                    logger.warning(f"[PptxWorker] {e}，重试一次")
+                    continue
+                self.stats["failures"] += 1
+                raise Exception(f"PPTX 转换失败: {e}")
+
+        if "error" in response:
+            self.stats["failures"] += 1
+            raise Exception(f"PPTX 转换失败: {response['error']}")
+        self.stats["conversions"] += 1
+        self.stats["slides"] += len(html_files)
+        self.stats["seconds"] += time.time() - start
+        return response["result"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        worker = self._worker
+        conversions = self.stats["conversions"]
+        return {
+            "enabled": self.enabled,
+            "running": bool(worker and worker.alive),
+            "pid": worker.pid if worker and worker.alive else None,
+            "uptime_seconds": round(time.time() - worker.started_at, 1) if worker and worker.alive else 0,
+            "pool_size": self.pool_size,
+            "max_rss_mb": self.max_rss_mb,
+            "max_conversions": self.max_conversions,
+            **self.stats,
+            "seconds": round(self.stats["seconds"], 1),
+            "avg_seconds": round(self.stats["seconds"] / conversions, 2) if conversions else 0.0,
+            "retiring": len(self._retiring),
+            "tree_rss_mb": worker.tree_rss_mb if worker and worker.alive else None,
+            "worker": worker.last_stats if worker else {},
+        }
+
+
+# 全局转换进程实例（tmp_dir 由 main.py 在启动时设置）
+pptx_worker = PptxWorker(
+    scripts_dir=Path(__file__).parent,
+    pool_size=PPTX_WORKER_POOL_SIZE,
+    max_rss_mb=PPTX_WORKER_MAX_RSS_MB,
+    max_conversions=PPTX_WORKER_MAX_CONVERSIONS,
+    enabled=PPTX_WORKER_ENABLED,
+)
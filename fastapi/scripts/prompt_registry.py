@@ -0,0 +1,151 @@
+"""
+Prompt 注册表模块
+提示词文件只在首次使用或文件修改（mtime 变化）时读取，静态消息块预先构建并复用；
+对需要显式标记的模型，在系统提示词上添加 cache_control，让提供方把它作为缓存前缀计费和处理，
+并根据响应 usage 中的 cached_tokens 统计提供方缓存命中情况
+"""
+
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置
+PROMPT_DIR = Path(os.getenv("PROMPT_DIR", str(Path(__file__).parent.parent)))
+PROMPT_RELOAD_CHECK_INTERVAL = float(os.getenv("PROMPT_RELOAD_CHECK_INTERVAL", "2"))  # 检查 mtime 的最小间隔（秒）
+PROMPT_CACHE_CONTROL = os.getenv("PROMPT_CACHE_CONTROL", "true").lower() == "true"
+# 需要显式 cache_control 标记的模型前缀（OpenAI / DeepSeek 等由提供方自动缓存，无需标记）
+PROMPT_CACHE_CONTROL_MODELS = [
+    m.strip() for m in os.getenv("PROMPT_CACHE_CONTROL_MODELS", "anthropic/,google/gemini").split(",") if m.strip()
+]
+
+
+class _PromptFile:
+    """单个提示词文件的缓存状态"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.text: Optional[str] = None
+        self.mtime: Optional[float] = None
+        self.checked_at = 0.0
+
+
+class PromptRegistry:
+    """提示词注册表：按 mtime 热加载文件内容，并缓存构建好的系统消息"""
+
+    def __init__(self, prompt_dir: Path, check_interval: float, cache_control: bool):
+        self.prompt_dir = Path(prompt_dir)
+        self.check_interval = check_interval
+        self.cache_control = cache_control
+        self._files: Dict[str, _PromptFile] = {}
+        self._system_messages: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "loads": 0,      # 文件读取次数（含热加载）
+            "reloads": 0,
+            "hits": 0,       # 直接使用内存中的内容
+            "llm_requests": 0,
+            "llm_cached_requests": 0,   # 提供方报告了缓存命中的请求
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+        }
+
+    def get(self, name: str, default: str = "") -> str:
+        """
+        获取提示词文件内容（去除首尾空白）
+
+        Args:
+            name: 相对 prompt_dir 的文件名，如 system_prompt.md
+            default: 文件不存在时返回的内容
+        """
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is None:
+                entry = self._files[name] = _PromptFile(self.prompt_dir / name)
+
+            now = time.monotonic()
+            if entry.text is not None and now - entry.checked_at < self.check_interval:
+                self.stats["hits"] += 1
+                return entry.text
+            entry.checked_at = now
+
+            try:
+                mtime = entry.path.stat().st_mtime
+            except FileNotFoundError:
+                if entry.mtime is not None or entry.text is None:
+                    logger.warning(f"[PromptRegistry] {name} 不存在，使用默认提示词")
+                entry.text, entry.mtime = default, None
+                return default
+
+            if entry.text is not None and mtime == entry.mtime:
+                self.stats["hits"] += 1
+                return entry.text
+
+            if entry.mtime is not None:
+                self.stats["reloads"] += 1
+                logger.info(f"[PromptRegistry] 检测到 {name} 已修改，重新加载")
+            self.stats["loads"] += 1
+            entry.text = entry.path.read_text(encoding="utf-8").strip()
+            entry.mtime = mtime
+            return entry.text
+
+    def wants_cache_control(self, model: Optional[str]) -> bool:
+        return bool(self.cache_control and model and any(model.startswith(p) for p in PROMPT_CACHE_CONTROL_MODELS))
+
+    def system_message(self, text: str, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        构建（并缓存）系统消息
+
+        需要显式标记的模型使用 content 数组并在系统提示词上加 cache_control，
+        其余模型保持纯字符串 content。返回的字典会被多个请求共享，调用方不能修改
+        """
+        marked = self.wants_cache_control(model)
+        key = (text, marked)
+        message = self._system_messages.get(key)
+        if message is None:
+            if marked:
+                content = [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+            else:
+                content = text
+            message = {"role": "system", "content": content}
+            with self._lock:
+                # 提示词热加载后旧版本不再使用，只保留最新的几个
+                if len(self._system_messages) >= 8:
+                    self._system_messages.clear()
+                self._system_messages[key] = message
+        return message
+
+    def record_usage(self, usage: Dict[str, Any]):
+        """记录一次 LLM 响应的 usage，统计提供方 Prompt 缓存命中"""
+        details = usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens") or 0
+        self.stats["llm_requests"] += 1
+        self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0) or 0
+        self.stats["cached_prompt_tokens"] += cached
+        if cached:
+            self.stats["llm_cached_requests"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        prompt_tokens = self.stats["prompt_tokens"]
+        return {
+            **self.stats,
+            "cached_token_ratio": round(self.stats["cached_prompt_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "cache_control": self.cache_control,
+            "cache_control_models": PROMPT_CACHE_CONTROL_MODELS,
+            "files": {
+                name: {"loaded": entry.text is not None, "mtime": entry.mtime}
+                for name, entry in self._files.items()
+            },
+        }
+
+
+# 全局 Prompt 注册表实例
+prompt_registry = PromptRegistry(
+    prompt_dir=PROMPT_DIR,
+    check_interval=PROMPT_RELOAD_CHECK_INTERVAL,
+    cache_control=PROMPT_CACHE_CONTROL,
+)
@@ -0,0 +1,410 @@
+"""
+纯 Python HTML → PPTX 转换模块
+对几何可以静态确定的幻灯片（见 scripts/static_layout.py），直接用 python-pptx 按 html2pptx.js addElements
+的方式写出 PPTX，不经过 Node + Chromium + pptxgenjs；其余页面返回 None，由调用方交给 Node 转换
+
+- 路由：一个文件中任意一页不支持时整份交给 Node（保证一份 PPTX 只由一种转换器生成）
+- 按原因统计回退次数，按路径统计延迟
+- 未安装 python-pptx 时自动禁用
+"""
+
+import os
+import copy
+import time
+import statistics
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import logging
+
+from scripts.static_layout import extract_slide_data, StaticLayoutUnsupported
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pptx import Presentation
+    from pptx.util import Emu, Inches
+    from pptx.dml.color import RGBColor
+    from pptx.enum.shapes import MSO_SHAPE, MSO_CONNECTOR
+    from pptx.enum.text import MSO_ANCHOR, MSO_AUTO_SIZE, PP_ALIGN
+    from pptx.oxml import parse_xml
+    from pptx.oxml.ns import nsdecls, qn
+    from lxml import etree
+except ImportError:
+    Presentation = None
+
+# 配置
+PYTHON_CONVERTER_ENABLED = os.getenv("PYTHON_CONVERTER_ENABLED", "false").lower() == "true"
+
+EMU_PER_PT = 12700
+EMU_PER_IN = 914400
+SLIDE_WIDTH_IN = 10
+SLIDE_HEIGHT_IN = 5.625
+# python-pptx 可以直接嵌入的图片格式（svg 等交给 Node）
+_IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff"}
+_LATENCY_WINDOW = 200
+
+_ALIGN = {
+    "left": "LEFT", "center": "CENTER", "right": "RIGHT", "justify": "JUSTIFY",
+    "end": "RIGHT", "-webkit-center": "CENTER",
+}
+
+
+def _check_supported(slide_data: Dict[str, Any]):
+    """写入前检查 python-pptx 能否还原所有元素"""
+    if slide_data["background"]["type"] == "image":
+        path = slide_data["background"]["path"]
+        if not os.path.isfile(path) or Path(path).suffix.lower() not in _IMAGE_SUFFIXES:
+            raise StaticLayoutUnsupported("image_format", Path(path).name)
+    for el in slide_data["elements"]:
+        if el["type"] == "image":
+            if not os.path.isfile(el["src"]) or Path(el["src"]).suffix.lower() not in _IMAGE_SUFFIXES:
+                raise StaticLayoutUnsupported("image_format", Path(el["src"]).name)
+        elif el["type"] not in ("line", "shape", "list", "p", "h1", "h2", "h3", "h4", "h5", "h6", "li"):
+            raise StaticLayoutUnsupported("element_type", el["type"])
+
+
+# ============ 写入（对应 addElements + pptxgenjs 的 XML 生成） ============
+
+def _emu(inches: float) -> "Emu":
+    """英寸 → EMU（与 pptxgenjs 一样四舍五入；Inches() 会截断）"""
+    return Emu(round(inches * EMU_PER_IN))
+
+
+def _pt(points: float) -> "Emu":
+    """pt → EMU，先按 pptxgenjs 取整到 1/100 pt（Pt() 的浮点截断会让 19.6pt 变成 1959）"""
+    return Emu(round(points * 100) * (EMU_PER_PT // 100))
+
+
+def _solid_fill_xml(color: str, transparency: Optional[float] = None) -> str:
+    alpha = ""
+    if transparency is not None:
+        alpha = f'<a:alpha val="{round((100 - transparency) * 1000)}"/>'
+    return f'<a:solidFill {nsdecls("a")}><a:srgbClr val="{color.upper()}">{alpha}</a:srgbClr></a:solidFill>'
+
+
+def _set_spacing(paragraph, options: Dict[str, Any]):
+    if options.get("lineSpacing"):
+        paragraph.line_spacing = _pt(options["lineSpacing"])
+    if options.get("paraSpaceBefore"):
+        paragraph.space_before = _pt(options["paraSpaceBefore"])
+    if options.get("paraSpaceAfter"):
+        paragraph.space_after = _pt(options["paraSpaceAfter"])
+
+
+def _set_bullet(paragraph, indent_pt: float):
+    """pptxgenjs bullet: {indent} → marL = indent，悬挂缩进，• 字符"""
+    pPr = paragraph._p.get_or_add_pPr()
+    marL = round(indent_pt * EMU_PER_PT)
+    pPr.set("marL", str(marL))
+    pPr.set("indent", str(-marL))
+    for tag in ("a:buSzPct", "a:buChar"):
+        for old in pPr.findall(qn(tag)):
+            pPr.remove(old)
+    bu_size = etree.SubElement(pPr, qn("a:buSzPct"))
+    bu_size.set("val", "100000")
+    bu_char = etree.SubElement(pPr, qn("a:buChar"))
+    bu_char.set("char", "•")
+
+
+def _set_run(run, text: str, options: Dict[str, Any]):
+    run.text = text
+    font = run.font
+    if options.get("fontSize"):
+        font.size = _pt(options["fontSize"])
+    if options.get("bold"):
+        font.bold = True
+    if options.get("italic"):
+        font.italic = True
+    if options.get("underline"):
+        font.underline = True
+    rPr = run._r.get_or_add_rPr()
+    if options.get("color"):
+        rPr.append(parse_xml(_solid_fill_xml(options["color"], options.get("transparency"))))
+    if options.get("fontFace"):
+        for tag in ("a:latin", "a:ea", "a:cs"):
+            face = etree.SubElement(rPr, qn(tag))
+            face.set("typeface", options["fontFace"])
+            face.set("pitchFamily", "34")
+            face.set("charset", "0")
+
+
+def _split_lines(runs: List[Dict[str, Any]], base_options: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+    """
+    按 pptxgenjs 的规则把文本段分为段落：文本中的 \\n 和 breakLine 结束当前段落；
+    段的选项为空时继承整体选项（bullet 除外）
+    """
+    lines: List[List[Dict[str, Any]]] = [[]]
+    for run in runs:
+        options = dict(run.get("options") or {})
+        for key, value in base_options.items():
+            if key != "bullet" and not options.get(key):
+                options[key] = value
+        pieces = str(run.get("text", "")).replace("\r\n", "\n").split("\n")
+        for index, piece in enumerate(pieces):
+            piece_options = options if index == 0 else {k: v for k, v in options.items() if k != "bullet"}
+            lines[-1].append({"text": piece, "options": piece_options})
+            if index < len(pieces) - 1:
+                lines.append([])
+        if options.get("breakLine"):
+            lines.append([])
+    if len(lines) > 1 and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _add_text(slide, runs: Union[str, List[Dict[str, Any]]], position: Dict[str, float], options: Dict[str, Any]):
+    textbox = slide.shapes.add_textbox(
+        _emu(position["x"]), _emu(position["y"]), _emu(position["w"]), _emu(position["h"])
+    )
+    frame = textbox.text_frame
+    frame.word_wrap = True
+    frame.auto_size = MSO_AUTO_SIZE.NONE
+    frame.vertical_anchor = MSO_ANCHOR.TOP
+    margin = options.get("margin") or [0, 0, 0, 0]
+    frame.margin_left, frame.margin_right, frame.margin_bottom, frame.margin_top = (
+        Emu(round((value or 0) * EMU_PER_PT)) for value in margin
+    )
+
+    if isinstance(runs, str):
+        runs = [{"text": runs, "options": {}}]
+    run_options = {k: v for k, v in options.items() if k in (
+        "fontSize", "fontFace", "color", "bold", "italic", "underline", "transparency",
+        "align", "lineSpacing", "paraSpaceBefore", "paraSpaceAfter",
+    ) and v is not None}
+
+    for index, line in enumerate(_split_lines(runs, run_options)):
+        paragraph = frame.paragraphs[0] if index == 0 else frame.add_paragraph()
+        first = line[0]["options"] if line else run_options
+        align = first.get("align")
+        if align in _ALIGN:
+            paragraph.alignment = getattr(PP_ALIGN, _ALIGN[align])
+        if first.get("bullet"):
+            _set_bullet(paragraph, first["bullet"].get("indent", 27))
+        _set_spacing(paragraph, first)
+        for piece in line:
+            if piece["text"]:
+                _set_run(paragraph.add_run(), piece["text"], piece["options"])
+    return textbox
+
+
+def _add_shape(slide, el: Dict[str, Any]):
+    position, shape_options = el["position"], el["shape"]
+    round_rect = (shape_options.get("rectRadius") or 0) > 0
+    shape = slide.shapes.add_shape(
+        MSO_SHAPE.ROUNDED_RECTANGLE if round_rect else MSO_SHAPE.RECTANGLE,
+        _emu(position["x"]), _emu(position["y"]), _emu(position["w"]), _emu(position["h"]),
+    )
+    sp = shape._element
+    # pptxgenjs 不写 p:style，去掉 python-pptx 默认的主题样式（否则会带主题色填充和边框）
+    style = sp.find(qn("p:style"))
+    if style is not None:
+        sp.remove(style)
+    spPr = sp.spPr
+
+    if round_rect:
+        min_emu = min(_emu(position["w"]), _emu(position["h"])) or 1
+        adj = round(shape_options["rectRadius"] * EMU_PER_IN * 100000 / min_emu)
+        av_list = spPr.find(qn("a:prstGeom")).find(qn("a:avLst"))
+        for child in list(av_list):
+            av_list.remove(child)
+        gd = etree.SubElement(av_list, qn("a:gd"))
+        gd.set("name", "adj")
+        gd.set("fmla", f"val {adj}")
+
+    if shape_options.get("fill"):
+        spPr.append(parse_xml(_solid_fill_xml(shape_options["fill"], shape_options.get("transparency"))))
+    else:
+        spPr.append(parse_xml(f'<a:noFill {nsdecls("a")}/>'))
+    line = shape_options.get("line")
+    if line:
+        width = round((line.get("width") or 1) * EMU_PER_PT)
+        fill = _solid_fill_xml(line.get("color") or "333333").replace(f' {nsdecls("a")}', "")
+        spPr.append(parse_xml(f'<a:ln {nsdecls("a")} w="{width}">{fill}</a:ln>'))
+    shadow = shape_options.get("shadow")
+    if shadow:
+        opacity = shadow.get("opacity", 0.75)
+        spPr.append(parse_xml(
+            f'<a:effectLst {nsdecls("a")}><a:outerShdw sx="100000" sy="100000" kx="0" ky="0" algn="bl" rotWithShape="0" '
+            f'blurRad="{round(shadow.get("blur", 0) * EMU_PER_PT)}" dist="{round(shadow.get("offset", 0) * EMU_PER_PT)}" '
+            f'dir="{round(shadow.get("angle", 0) * 60000)}">'
+            f'<a:srgbClr val="{shadow.get("color", "000000").upper()}"><a:alpha val="{round(opacity * 100000)}"/></a:srgbClr>'
+            f'</a:outerShdw></a:effectLst>'
+        ))
+    return shape
+
+
+def _add_line(slide, el: Dict[str, Any]):
+    connector = slide.shapes.add_connector(
+        MSO_CONNECTOR.STRAIGHT, _emu(el["x1"]), _emu(el["y1"]), _emu(el["x2"]), _emu(el["y2"])
+    )
+    connector.line.color.rgb = RGBColor.from_string(el["color"].upper())
+    connector.line.width = _pt(el["width"])
+    return connector
+
+
+def _set_background(slide, background: Dict[str, Any]):
+    if background["type"] == "color" and background.get("value"):
+        fill = slide.background.fill
+        fill.solid()
+        fill.fore_color.rgb = RGBColor.from_string(background["value"].upper())
+    elif background["type"] == "image" and background.get("path"):
+        # python-pptx 没有背景图片 API：嵌入图片后手写 p:bg
+        _, rel_id = slide.part.get_or_add_image_part(background["path"])
+        c_sld = slide._element.find(qn("p:cSld"))
+        for old in c_sld.findall(qn("p:bg")):
+            c_sld.remove(old)
+        bg = parse_xml(
+            f'<p:bg {nsdecls("p", "a", "r")}>'
+            f'<p:bgPr><a:blipFill dpi="0" rotWithShape="1"><a:blip r:embed="{rel_id}"/><a:srcRect/>'
+            '<a:stretch><a:fillRect/></a:stretch></a:blipFill><a:effectLst/></p:bgPr></p:bg>'
+        )
+        c_sld.insert(0, bg)
+
+
+def add_slide(prs, slide_data: Dict[str, Any]):
+    """按 html2pptx.js addBackground + addElements 的规则写入一页"""
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    _set_background(slide, slide_data["background"])
+
+    for el in slide_data["elements"]:
+        if el["type"] == "image":
+            p = el["position"]
+            slide.shapes.add_picture(el["src"], _emu(p["x"]), _emu(p["y"]), _emu(p["w"]), _emu(p["h"]))
+        elif el["type"] == "line":
+            _add_line(slide, el)
+        elif el["type"] == "shape":
+            _add_shape(slide, el)
+        elif el["type"] == "list":
+            _add_text(slide, el["items"], el["position"], el["style"])
+        else:
+            style = el["style"]
+            position = dict(el["position"])
+            # 与 html2pptx.js 一致：单行文本加宽 2%（其判断把英寸高度与 pt 行高比较，几乎总是成立）
+            line_height = style.get("lineSpacing") or style["fontSize"] * 1.2
+            if position["h"] <= line_height * 1.5:
+                increase = position["w"] * 0.02
+                if style.get("align") == "center":
+                    position["x"] -= increase / 2
+                elif style.get("align") == "right":
+                    position["x"] -= increase
+                position["w"] += increase
+            _add_text(slide, el["text"], position, style)
+    return slide
+
+
+def convert_html_files(html_files: List[Union[str, Path]], output_file: Union[str, Path]) -> Dict[str, Any]:
+    """
+    把一个或多个转换版 HTML 写成同一个 PPTX（每个 HTML 一页）
+
+    Returns:
+        与 convert-html-to-pptx.js 相同结构的转换结果
+
+    Raises:
+        StaticLayoutUnsupported: 任意一页无法静态布局（不会写出文件）
+    """
+    if Presentation is None:
+        raise StaticLayoutUnsupported("python_pptx_missing")
+
+    slides = []
+    for html_file in html_files:
+        html_file = Path(html_file)
+        slide_data = extract_slide_data(html_file.read_text(encoding="utf-8"), html_file.parent)
+        _check_supported(slide_data)
+        if slide_data["errors"]:
+            # 与 html2pptx.js 非严格模式一致：只警告
+            logger.warning(f"[PyConverter] {html_file.name} 校验警告: {'; '.join(slide_data['errors'])[:500]}")
+        slides.append(slide_data)
+
+    prs = Presentation()
+    prs.slide_width = Inches(SLIDE_WIDTH_IN)
+    prs.slide_height = Inches(SLIDE_HEIGHT_IN)
+    prs.core_properties.author = "ReDeck"
+    prs.core_properties.title = "Generated Presentation"
+    for slide_data in slides:
+        add_slide(prs, slide_data)
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_file.with_name(f".{output_file.name}.{os.getpid()}.tmp")
+    prs.save(str(tmp_path))
+    os.replace(tmp_path, output_file)
+
+    slide_placeholders = [copy.deepcopy(s["placeholders"]) for s in slides]
+    return {
+        "success": True,
+        "message": "PPTX generated successfully",
+        "output_file": str(output_file),
+        "slides": len(slides),
+        "placeholders": slide_placeholders[0] if slide_placeholders else [],
+        "slide_placeholders": slide_placeholders,
+        "converter": "python",
+    }
+
+
+class PyConverter:
+    """转换路由：能静态布局的 HTML 走 python-pptx，其余交给 Node"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled and Presentation is not None
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+        self.stats = {
+            "routed_python": 0,
+            "routed_node": 0,
+            "failures": 0,        # 静态布局通过但写入失败，回退到 Node
+            "reasons": {},
+        }
+
+    def try_convert(self, html_files: List[Path], output_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        尝试用 python-pptx 转换
+
+        Returns:
+            转换结果；页面不支持静态布局或转换失败时返回 None（调用方交给 Node）
+        """
+        if not self.enabled:
+            return None
+        start = time.time()
+        try:
+            result = convert_html_files(html_files, output_file)
+        except StaticLayoutUnsupported as e:
+            self._record_fallback(e.reason)
+            logger.debug(f"[PyConverter] 回退到 Node: {e}")
+            return None
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+            self._record_fallback("error")
+            logger.warning(f"[PyConverter] 转换失败，回退到 Node: {e}")
+            return None
+
+        elapsed = time.time() - start
+        with self._lock:
+            self.stats["routed_python"] += 1
+            self._latencies.append(elapsed)
+            if len(self._latencies) > _LATENCY_WINDOW:
+                self._latencies = self._latencies[-_LATENCY_WINDOW:]
+        result["duration_ms"] = round(elapsed * 1000)
+        return result
+
+    def _record_fallback(self, reason: str):
+        with self._lock:
+            self.stats["routed_node"] += 1
+            self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            stats = {**self.stats, "reasons": dict(self.stats["reasons"])}
+        routed = stats["routed_python"] + stats["routed_node"]
+        return {
+            "enabled": self.enabled,
+            **stats,
+            "python_rate": round(stats["routed_python"] / routed, 3) if routed else None,
+            "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        }
+
+
+# 全局转换路由实例
+py_converter = PyConverter(enabled=PYTHON_CONVERTER_ENABLED)
@@ -4,11 +4,22 @@ Cloudflare R2 上传模块
 """
 
 import os
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from pathlib import Path
 import logging
 
+from scripts.pptx_optimizer import pptx_optimizer
+
 logger = logging.getLogger(__name__)
 
 # R2 配置
@@ -18,40 +29,101 @@ R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "video2ppt")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "").rstrip("/")
 
-# R2 endpoint
-R2_ENDPOINT = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com" if R2_ACCOUNT_ID else None
+# R2 endpoint（R2_ENDPOINT_URL 可覆盖，用于本地 MinIO / moto 等 S3 兼容服务）
+R2_ENDPOINT = os.getenv("R2_ENDPOINT_URL") or (f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com" if R2_ACCOUNT_ID else None)
+
+# 连接池与上传线程池
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "20"))
+R2_UPLOAD_WORKERS = int(os.getenv("R2_UPLOAD_WORKERS", "4"))   # 同时进行的上传数上限
+
+# 分片上传：超过阈值的文件按分片并发上传
+R2_MULTIPART_THRESHOLD_MB = int(os.getenv("R2_MULTIPART_THRESHOLD_MB", "8"))
+R2_MULTIPART_CHUNK_MB = int(os.getenv("R2_MULTIPART_CHUNK_MB", "8"))
+R2_MULTIPART_CONCURRENCY = int(os.getenv("R2_MULTIPART_CONCURRENCY", "8"))   # 单个文件的并发分片数
+
+# 内容寻址：PPTX 按 SHA-256 命名（pptx/sha256/{hash}.pptx），上传前 HEAD 检查，相同内容只上传一次
+R2_CONTENT_ADDRESSED = os.getenv("R2_CONTENT_ADDRESSED", "false").lower() == "true"
+# 内容寻址对象被多个文件名共享，下载文件名通过预签名 GET 的 response-content-disposition 逐次指定
+R2_DOWNLOAD_URL_EXPIRES = int(os.getenv("R2_DOWNLOAD_URL_EXPIRES", "604800"))  # 下载链接有效期（秒，最长 7 天）
+
+# 预签名直传：客户端直接 PUT 输入图片到对象存储
+R2_PRESIGN_EXPIRES = int(os.getenv("R2_PRESIGN_EXPIRES", "900"))  # 预签名 URL 有效期（秒）
+
+_transfer_config = TransferConfig(
+    multipart_threshold=R2_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+    multipart_chunksize=R2_MULTIPART_CHUNK_MB * 1024 * 1024,
+    max_concurrency=R2_MULTIPART_CONCURRENCY,
+    use_threads=True,
+)
+
+_stats_lock = threading.Lock()
+_upload_stats = {
+    "uploads": 0,
+    "multipart_uploads": 0,
+    "failures": 0,
+    "bytes": 0,
+    "seconds": 0.0,
+    "dedup_hits": 0,
+    "bytes_skipped": 0,
+    "presigned": 0,
+    "downloads": 0,
+    "download_bytes": 0,
+}
+
+_client = None
+_client_lock = threading.Lock()
+_upload_executor = ThreadPoolExecutor(max_workers=R2_UPLOAD_WORKERS, thread_name_prefix="r2-upload")
 
 
 def get_r2_client():
-    """获取 R2 客户端"""
-    if not all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
+    """获取 R2 客户端（进程内单例，boto3 客户端本身线程安全）"""
+    global _client
+    if _client is not None:
+        return _client
+    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
         raise ValueError("R2 配置不完整，请检查环境变量")
     
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(
-            signature_version="s3v4",
-            retries={"max_attempts": 3, "mode": "standard"}
-        ),
-        region_name="auto"
-    )
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                "s3",
+                endpoint_url=R2_ENDPOINT,
+                aws_access_key_id=R2_ACCESS_KEY_ID,
+                aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                config=Config(
+                    signature_version="s3v4",
+                    retries={"max_attempts": 3, "mode": "standard"},
+                    max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                ),
+                region_name="auto"
+            )
+    return _client
+
+
+def reset_r2_client():
+    """丢弃缓存的客户端（测试中切换 endpoint 或轮换密钥后调用）"""
+    global _client
+    with _client_lock:
+        _client = None
 
 
 def upload_file_to_r2(
     local_path: str | Path,
     r2_key: str = None,
-    content_type: str = None
+    content_type: str = None,
+    skip_if_exists: bool = False,
+    extra_args: dict = None,
 ) -> str:
     """
-    上传文件到 R2
+    上传文件到 R2（超过 R2_MULTIPART_THRESHOLD_MB 时自动分片并发上传）
     
     Args:
         local_path: 本地文件路径
         r2_key: R2 对象键名（默认使用文件名）
         content_type: 文件 MIME 类型
+        skip_if_exists: 先 HEAD 检查，对象已存在时不再上传（用于内容寻址的键）
+        extra_args: 额外的对象参数（如 ContentDisposition）
     
     Returns:
         公开访问 URL
@@ -80,20 +152,43 @@ def upload_file_to_r2(
         content_type = content_types.get(suffix, "application/octet-stream")
     
     client = get_r2_client()
+    public_url = f"{R2_PUBLIC_URL}/{r2_key}"
+    size = local_path.stat().st_size
     
-    logger.info(f"[R2] 上传文件: {local_path} -> {r2_key}")
+    if skip_if_exists and _object_exists(client, r2_key):
+        with _stats_lock:
+            _upload_stats["dedup_hits"] += 1
+            _upload_stats["bytes_skipped"] += size
+        logger.info(f"[R2] 对象已存在，跳过上传: {r2_key}")
+        return public_url
     
-    extra_args = {"ContentType": content_type}
+    logger.info(f"[R2] 上传文件: {local_path} -> {r2_key} ({size / 1024 / 1024:.1f}MB)")
     
-    client.upload_file(
-        str(local_path),
-        R2_BUCKET_NAME,
-        r2_key,
-        ExtraArgs=extra_args
-    )
+    extra_args = {**(extra_args or {}), "ContentType": content_type}
     
-    public_url = f"{R2_PUBLIC_URL}/{r2_key}"
-    logger.info(f"[R2] 上传成功: {public_url}")
+    start = time.time()
+    try:
+        client.upload_file(
+            str(local_path),
+            R2_BUCKET_NAME,
+            r2_key,
+            ExtraArgs=extra_args,
+            Config=_transfer_config,
+        )
+    except Exception:
+        with _stats_lock:
+            _upload_stats["failures"] += 1
+        raise
+    elapsed = time.time() - start
+    
+    with _stats_lock:
+        _upload_stats["uploads"] += 1
+        _upload_stats["bytes"] += size
+        _upload_stats["seconds"] += elapsed
+        if size >= _transfer_config.multipart_threshold:
+            _upload_stats["multipart_uploads"] += 1
+    
+    logger.info(f"[R2] 上传成功: {public_url} ({elapsed:.2f}s)")
     
     return public_url
 
@@ -108,22 +203,148 @@ def upload_pptx_to_r2(local_path: str | Path, date_str: str, file_uuid: str) ->
         file_uuid: 文件唯一标识
     
     Returns:
-        公开访问 URL
+        公开访问 URL；内容寻址模式下为带原文件名的预签名下载 URL
     """
     local_path = Path(local_path)
     filename = local_path.name
     
+    # 上传前瘦身（删除无用部件、媒体去重、图片重压缩），失败时原文件不变
+    pptx_optimizer.optimize(local_path)
+    
+    if R2_CONTENT_ADDRESSED:
+        # R2 路径: pptx/sha256/{hash}.pptx
+        # 对象只在首次上传时写入，不能带 ContentDisposition（否则后续同内容文件都会用第一个文件名下载），
+        # 文件名由每次生成的下载链接指定
+        r2_key = f"pptx/sha256/{_file_sha256(local_path)}{local_path.suffix}"
+        upload_file_to_r2(local_path, r2_key, skip_if_exists=True)
+        return create_presigned_get(r2_key, filename)
+    
     # R2 路径: pptx/{date}/{uuid}/{filename}
     r2_key = f"pptx/{date_str}/{file_uuid}/{filename}"
     
     return upload_file_to_r2(local_path, r2_key)
 
 
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _object_exists(client, r2_key: str) -> bool:
+    """HEAD 检查对象是否存在（404 视为不存在，其他错误抛出）"""
+    try:
+        client.head_object(Bucket=R2_BUCKET_NAME, Key=r2_key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+async def upload_pptx_to_r2_async(local_path: str | Path, date_str: str, file_uuid: str) -> str:
+    """upload_pptx_to_r2 的异步版本：在上传线程池中执行，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, upload_pptx_to_r2, local_path, date_str, file_uuid)
+
+
+def create_presigned_put(r2_key: str, content_type: str, expires_in: int = R2_PRESIGN_EXPIRES) -> str:
+    """
+    生成预签名 PUT URL，客户端上传时必须带相同的 Content-Type 请求头
+    
+    注意：预签名 PUT 无法限制上传大小，大小在下载到本地时检查（见 download_file_from_r2）
+    """
+    client = get_r2_client()
+    url = client.generate_presigned_url(
+        "put_object",
+        Params={"Bucket": R2_BUCKET_NAME, "Key": r2_key, "ContentType": content_type},
+        ExpiresIn=expires_in,
+    )
+    with _stats_lock:
+        _upload_stats["presigned"] += 1
+    return url
+
+
+def create_presigned_get(r2_key: str, filename: str, expires_in: int = R2_DOWNLOAD_URL_EXPIRES) -> str:
+    """生成预签名下载 URL，浏览器按 filename 保存文件"""
+    client = get_r2_client()
+    return client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": R2_BUCKET_NAME,
+            "Key": r2_key,
+            "ResponseContentDisposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        },
+        ExpiresIn=expires_in,
+    )
+
+
+def download_file_from_r2(r2_key: str, local_path: str | Path, max_bytes: int = None) -> Path:
+    """
+    流式下载对象到本地（大文件按分片并发下载），先写临时文件再原子替换
+    
+    Args:
+        r2_key: R2 对象键名
+        local_path: 本地保存路径
+        max_bytes: 对象大小上限，超过时抛出 ValueError
+    
+    Returns:
+        本地路径
+    """
+    local_path = Path(local_path)
+    client = get_r2_client()
+    
+    try:
+        head = client.head_object(Bucket=R2_BUCKET_NAME, Key=r2_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise FileNotFoundError(f"对象不存在: {r2_key}")
+        raise
+    size = head["ContentLength"]
+    if max_bytes is not None and size > max_bytes:
+        raise ValueError(f"对象过大: {size / 1024 / 1024:.1f}MB")
+    
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = local_path.with_name(f".{local_path.name}.{os.getpid()}.download")
+    try:
+        client.download_file(R2_BUCKET_NAME, r2_key, str(tmp_path), Config=_transfer_config)
+        os.replace(tmp_path, local_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    
+    with _stats_lock:
+        _upload_stats["downloads"] += 1
+        _upload_stats["download_bytes"] += size
+    logger.info(f"[R2] 下载完成: {r2_key} -> {local_path} ({size / 1024:.0f}KB)")
+    return local_path
+
+
 def check_r2_config() -> dict:
     """检查 R2 配置是否完整"""
     return {
-        "configured": all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]),
+        "configured": all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]),
         "account_id": R2_ACCOUNT_ID[:8] + "..." if R2_ACCOUNT_ID else None,
+        "endpoint_override": bool(os.getenv("R2_ENDPOINT_URL")),
+        "upload_workers": R2_UPLOAD_WORKERS,
+        "content_addressed": R2_CONTENT_ADDRESSED,
+        "download_url_expires": R2_DOWNLOAD_URL_EXPIRES if R2_CONTENT_ADDRESSED else None,
         "bucket": R2_BUCKET_NAME,
         "public_url": R2_PUBLIC_URL,
     }
+
+
+def get_upload_stats() -> dict:
+    """上传统计（吞吐量按实际上传的字节数和耗时计算）"""
+    with _stats_lock:
+        stats = dict(_upload_stats)
+    return {
+        **stats,
+        "seconds": round(stats["seconds"], 2),
+        "throughput_mbps": round(stats["bytes"] / 1024 / 1024 / stats["seconds"], 2) if stats["seconds"] else None,
+        "multipart_threshold_mb": R2_MULTIPART_THRESHOLD_MB,
+        "multipart_chunk_mb": R2_MULTIPART_CHUNK_MB,
+        "multipart_concurrency": R2_MULTIPART_CONCURRENCY,
+    }
@@ -0,0 +1,193 @@
+"""
+LLM 客户端限流模块
+进程内共享的令牌桶限流器（每分钟请求数 + 每分钟 token 数），放在所有 LLM 调用之前，
+交互式请求优先于批量任务；遇到 429 时按 Retry-After 暂停整个限流器并带抖动退避重试
+"""
+
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置（0 表示不限制）
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+LLM_BATCH_RESERVE = float(os.getenv("LLM_BATCH_RESERVE", "0.2"))  # 为交互式请求保留的容量比例
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+# 预扣 token 额度时假定的输出 token 数，请求完成后按实际用量修正
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "6000"))
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+# 需要退避重试的状态码
+RETRYABLE_STATUS_CODES = {429, 502, 503}
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按秒连续补充"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        """距离桶内余量达到 amount 还需等待的秒数"""
+        if self.unlimited or self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """请求数 + token 数双令牌桶限流器"""
+
+    def __init__(self, rpm: int, tpm: int, batch_reserve: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.batch_reserve = batch_reserve
+        self.blocked_until = 0.0  # 收到 429 后整体暂停到此时刻（monotonic）
+        self._lock = asyncio.Lock()
+        self._interactive_waiting = 0
+        self.stats = {
+            "acquired": {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 0},
+            "wait_seconds": {PRIORITY_INTERACTIVE: 0.0, PRIORITY_BATCH: 0.0},
+            "throttled": 0,   # 收到的可重试错误（429/502/503）
+            "retries": 0,
+            "gave_up": 0,
+        }
+
+    def _try_consume(self, tokens: int, priority: str) -> float:
+        """尝试扣减额度，成功返回 0，否则返回建议等待秒数"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self.requests.refill()
+        self.tokens.refill()
+
+        # 批量任务让出给正在等待的交互式请求，且不能动用保留额度
+        reserve = self.batch_reserve if priority == PRIORITY_BATCH else 0.0
+        if priority == PRIORITY_BATCH and self._interactive_waiting:
+            return 0.2
+
+        tokens = min(tokens, self.tokens.capacity) if not self.tokens.unlimited else 0
+        need_requests = min(self.requests.capacity, 1 + reserve * self.requests.capacity)
+        need_tokens = min(self.tokens.capacity, tokens + reserve * self.tokens.capacity)
+        wait = max(self.requests.seconds_until(need_requests), self.tokens.seconds_until(need_tokens))
+        if wait > 0:
+            return wait
+
+        if not self.requests.unlimited:
+            self.requests.level -= 1
+        if not self.tokens.unlimited:
+            self.tokens.level -= tokens
+        return 0.0
+
+    async def acquire(self, tokens: int = 0, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """
+        获取一次请求额度
+
+        Args:
+            tokens: 本次请求预估的 token 数（prompt + 预期输出）
+            priority: interactive（同步接口）或 batch（队列任务）
+
+        Returns:
+            等待的秒数
+        """
+        start = time.monotonic()
+        if priority == PRIORITY_INTERACTIVE:
+            self._interactive_waiting += 1
+        try:
+            while True:
+                async with self._lock:
+                    wait = self._try_consume(tokens, priority)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            if priority == PRIORITY_INTERACTIVE:
+                self._interactive_waiting -= 1
+
+        waited = time.monotonic() - start
+        self.stats["acquired"][priority] += 1
+        self.stats["wait_seconds"][priority] += waited
+        if waited > 1:
+            logger.info(f"[RateLimiter] {priority} 请求等待 {waited:.1f}s 后获得额度")
+        return waited
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """请求完成后按实际 token 用量修正 token 桶"""
+        if self.tokens.unlimited or not actual_tokens:
+            return
+        self.tokens.level -= actual_tokens - min(estimated_tokens, self.tokens.capacity)
+
+    def penalize(self, retry_after: float):
+        """收到 429 等限流响应：在 retry_after 秒内暂停所有请求"""
+        self.stats["throttled"] += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def get_stats(self) -> Dict[str, Any]:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            "rpm": int(self.requests.capacity) or None,
+            "tpm": int(self.tokens.capacity) or None,
+            "available_requests": None if self.requests.unlimited else round(self.requests.level, 1),
+            "available_tokens": None if self.tokens.unlimited else int(self.tokens.level),
+            "blocked_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            "interactive_waiting": self._interactive_waiting,
+            "acquired": dict(self.stats["acquired"]),
+            "wait_seconds": {k: round(v, 2) for k, v in self.stats["wait_seconds"].items()},
+            "throttled": self.stats["throttled"],
+            "retries": self.stats["retries"],
+            "gave_up": self.stats["gave_up"],
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    计算第 attempt 次重试前的等待时间
+
+    有 Retry-After 时以其为下限，叠加少量抖动避免多个 worker 同时重试；
+    否则使用带完全抖动的指数退避
+    """
+    exp = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(exp, 1.0 + retry_after * 0.1))
+    return random.uniform(exp / 2, exp)
+
+
+# 全局 LLM 限流器实例
+llm_rate_limiter = RateLimiter(rpm=LLM_RPM, tpm=LLM_TPM, batch_reserve=LLM_BATCH_RESERVE)
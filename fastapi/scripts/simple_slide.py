@@ -0,0 +1,296 @@
+"""
+简单页规则生成模块
+MinerU 只识别出标题和少量文本块的页面，不需要 LLM 也能还原：直接把 _middle.json 的块渲染为
+符合 system_prompt.md 约束的 HTML（720pt × 405pt body、文本在 p/h/ul 中、图片绝对定位）
+
+- 路由：按块类型、块数、图片数和文字量判断页面复杂度，简单页走规则生成，其余走 LLM
+- 质量闸门：按 html2pptx.js 的校验规则（尺寸、溢出、底部留白、手工项目符号、文本完整性）
+  检查规则生成的元素，不通过时回退到 LLM
+- 按路径（rule / template / llm）统计延迟
+"""
+
+import os
+import re
+import html
+import statistics
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import logging
+
+from scripts.layout_distiller import distill_layout, SLIDE_WIDTH_PT, SLIDE_HEIGHT_PT
+
+logger = logging.getLogger(__name__)
+
+# 配置
+SIMPLE_SLIDE_ENABLED = os.getenv("SIMPLE_SLIDE_ENABLED", "true").lower() == "true"
+SIMPLE_SLIDE_MAX_BLOCKS = int(os.getenv("SIMPLE_SLIDE_MAX_BLOCKS", "6"))
+SIMPLE_SLIDE_MAX_IMAGES = int(os.getenv("SIMPLE_SLIDE_MAX_IMAGES", "1"))
+SIMPLE_SLIDE_MAX_CHARS = int(os.getenv("SIMPLE_SLIDE_MAX_CHARS", "600"))  # 全页文字上限
+
+# MinerU discarded_blocks 中的块类型（页眉/页脚/页码等）：layout_distiller 保留原类型，按普通文本渲染
+DISCARDED_BLOCK_TYPES = {"discarded", "header", "footer", "page_number", "page_footnote", "aside_text"}
+# 可以规则还原的块类型
+SIMPLE_BLOCK_TYPES = {"title", "text", "list", "image"} | DISCARDED_BLOCK_TYPES
+
+# 与 html2pptx.js 的校验保持一致
+BOTTOM_MARGIN_PT = 36            # 字号 > 12pt 的文本框距底边至少 0.5"
+BULLET_PATTERN = re.compile(r"^[•\-\*▪▸○●◆◇■□]\s*")
+
+_FONT_FAMILY = "Arial, sans-serif"
+_LATENCY_WINDOW = 200
+
+
+def _block_lines(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """块内各行的 bbox 和文本（单行块用块 bbox）"""
+    if "lines" in block:
+        return [line for line in block["lines"] if line.get("text")]
+    if block.get("text"):
+        return [{"bbox": block.get("bbox"), "text": text} for text in block["text"].split("\n") if text.strip()]
+    return []
+
+
+def _text_width_em(text: str) -> float:
+    """估算文本宽度（以字号为单位）：CJK 全角字符约 1em，其余约 0.55em"""
+    return sum(1.0 if ord(ch) > 0x2E80 else 0.55 for ch in text)
+
+
+def classify_slide(layout_json: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    判断页面复杂度
+
+    Returns:
+        {"simple": bool, "reason": str, "blocks", "images", "chars"}
+    """
+    blocks = distill_layout(layout_json, "lines").get("blocks", [])
+    images = sum(1 for b in blocks if b.get("image"))
+    chars = sum(len(line["text"]) for b in blocks for line in _block_lines(b))
+    summary = {"blocks": len(blocks), "images": images, "chars": chars}
+
+    other_types = sorted({b.get("type", "text") for b in blocks} - SIMPLE_BLOCK_TYPES)
+    if not blocks:
+        reason = "no_blocks"
+    elif other_types:
+        reason = f"block_types:{','.join(other_types)}"
+    elif len(blocks) > SIMPLE_SLIDE_MAX_BLOCKS:
+        reason = "too_many_blocks"
+    elif images > SIMPLE_SLIDE_MAX_IMAGES:
+        reason = "too_many_images"
+    elif chars > SIMPLE_SLIDE_MAX_CHARS:
+        reason = "too_much_text"
+    elif not any(b.get("type") in ("title", "text", "list") for b in blocks):
+        reason = "no_text"
+    elif any(b.get("image") and _block_lines(b) for b in blocks):
+        reason = "image_caption"  # 图文混排的图片块交给 LLM
+    else:
+        reason = "simple"
+    return {"simple": reason == "simple", "reason": reason, **summary}
+
+
+def build_elements(layout_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    把布局块转换为待渲染元素
+
+    每个元素: {"tag", "bbox", "lines", "font_size", "line_height"} 或 {"tag": "img", "bbox", "src"}
+    字号取行高中位数的 0.8，并缩小到最长行能放进块宽度
+    """
+    elements = []
+    title_seen = False
+    for block in distill_layout(layout_json, "lines").get("blocks", []):
+        bbox = block.get("bbox")
+        if not bbox:
+            continue
+        if block.get("image"):
+            elements.append({"tag": "img", "bbox": bbox, "src": block["image"]})
+            continue
+
+        lines = _block_lines(block)
+        if not lines:
+            continue
+        texts = [line["text"].strip() for line in lines]
+        heights = [line["bbox"][3] - line["bbox"][1] for line in lines if line.get("bbox")]
+        line_pitch = (bbox[3] - bbox[1]) / len(lines)
+        font_size = statistics.median(heights) * 0.8 if heights else line_pitch * 0.8
+
+        block_type = block.get("type", "text")
+        if block_type == "list" or (len(texts) > 1 and all(BULLET_PATTERN.match(t) for t in texts)):
+            tag = "ul"
+            texts = [BULLET_PATTERN.sub("", t) for t in texts]
+        elif block_type == "title":
+            tag = "h2" if title_seen else "h1"
+            title_seen = True
+        else:
+            tag = "p"
+            texts = [BULLET_PATTERN.sub("", texts[0])] + texts[1:] if BULLET_PATTERN.match(texts[0]) else texts
+
+        width = bbox[2] - bbox[0]
+        widest = max(_text_width_em(t) for t in texts) + (1.2 if tag == "ul" else 0)  # 列表缩进
+        if widest:
+            font_size = min(font_size, width / widest)
+        font_size = max(6.0, round(font_size, 1))
+
+        elements.append({
+            "tag": tag,
+            "bbox": bbox,
+            "lines": texts,
+            "font_size": font_size,
+            "line_height": round(max(font_size * 1.1, line_pitch), 1),
+        })
+    return elements
+
+
+def check_elements(elements: List[Dict[str, Any]], layout_json: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    质量闸门：对规则生成的元素应用 html2pptx.js 的校验规则
+
+    Returns:
+        {"errors": [...], "warnings": [...]}；errors 非空时不应使用规则生成结果
+        （底部留白在 html2pptx 非严格模式下只是警告，这里同样只记为 warning）
+    """
+    errors, warnings = [], []
+    for el in elements:
+        x0, y0, x1, y1 = el["bbox"]
+        if x0 < 0 or y0 < 0 or x1 > SLIDE_WIDTH_PT or y1 > SLIDE_HEIGHT_PT:
+            errors.append(f"<{el['tag']}> 超出幻灯片范围: {el['bbox']}")
+        if x1 <= x0 or y1 <= y0:
+            errors.append(f"<{el['tag']}> 尺寸为 0: {el['bbox']}")
+        if el["tag"] == "img":
+            continue
+        text_height = len(el["lines"]) * el["line_height"]
+        if y0 + text_height > SLIDE_HEIGHT_PT:
+            errors.append(f"<{el['tag']}> 文本溢出底边 {y0 + text_height - SLIDE_HEIGHT_PT:.1f}pt")
+        if el["font_size"] > 12 and SLIDE_HEIGHT_PT - max(y1, y0 + text_height) < BOTTOM_MARGIN_PT:
+            warnings.append(f"<{el['tag']}> \"{el['lines'][0][:30]}\" 距底边不足 0.5\"")
+        if el["tag"] != "ul" and BULLET_PATTERN.match(el["lines"][0]):
+            errors.append(f"<{el['tag']}> 以手工项目符号开头: {el['lines'][0][:30]}")
+
+    # 文本完整性：OCR 识别出的每一行都要出现在输出中
+    rendered = {BULLET_PATTERN.sub("", t) for el in elements for t in el.get("lines", [])}
+    for block in distill_layout(layout_json, "lines").get("blocks", []):
+        for line in _block_lines(block):
+            if BULLET_PATTERN.sub("", line["text"].strip()) not in rendered:
+                errors.append(f"文本丢失: {line['text'][:30]}")
+    return {"errors": errors, "warnings": warnings}
+
+
+def render_html(elements: List[Dict[str, Any]], background: str = "#ffffff", text_color: str = "#1f1f1f") -> str:
+    """把元素序列化为符合 system_prompt.md 约束的 HTML"""
+    parts = []
+    for el in elements:
+        x0, y0, x1, y1 = el["bbox"]
+        box = f"position:absolute;left:{x0}pt;top:{y0}pt;width:{x1 - x0}pt;"
+        if el["tag"] == "img":
+            parts.append(f'<img src="{html.escape(el["src"])}" style="{box}height:{y1 - y0}pt;object-fit:contain;">')
+            continue
+        text_style = (
+            f"margin:0;font-size:{el['font_size']}pt;line-height:{el['line_height']}pt;"
+            f"color:{text_color};white-space:nowrap;"
+        )
+        if el["tag"] == "ul":
+            items = "".join(f"<li>{html.escape(t, quote=False)}</li>" for t in el["lines"])
+            body = f'<ul style="{text_style}padding-left:{round(el["font_size"] * 1.2, 1)}pt;">{items}</ul>'
+        else:
+            weight = "font-weight:bold;" if el["tag"] in ("h1", "h2") else ""
+            text = "<br>".join(html.escape(t, quote=False) for t in el["lines"])
+            body = f'<{el["tag"]} style="{text_style}{weight}">{text}</{el["tag"]}>'
+        parts.append(f'<div style="{box}">{body}</div>')
+
+    return (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\">\n<style>\n"
+        f"html {{ background: {background}; }}\n"
+        f"body {{ width: {SLIDE_WIDTH_PT}pt; height: {SLIDE_HEIGHT_PT}pt; margin: 0; padding: 0; "
+        f"position: relative; display: flex; overflow: hidden; background: {background}; font-family: {_FONT_FAMILY}; }}\n"
+        "</style>\n</head>\n<body>\n" + "\n".join(parts) + "\n</body>\n</html>"
+    )
+
+
+def render_simple_slide(
+    layout_json: Dict[str, Any],
+    image_path: Optional[Union[str, Path]] = None,
+) -> Dict[str, Any]:
+    """
+    规则生成简单页 HTML
+
+    Args:
+        layout_json: 该页的 _middle.json
+        image_path: 本地原图（可选），用于取背景色和文字色；没有时使用白底深色字
+
+    Returns:
+        {"html", "errors", "warnings"}；图片为 images/xxx 相对路径，与 LLM 输出一致
+    """
+    background, text_color = "#ffffff", "#1f1f1f"
+    if image_path:
+        try:
+            from scripts.deck_theme import extract_theme
+            theme = extract_theme([image_path], samples=1)
+            background, text_color = theme["background"], theme["text"]
+        except Exception as e:
+            logger.warning(f"[SimpleSlide] 提取配色失败，使用默认配色: {e}")
+
+    elements = build_elements(layout_json)
+    check = check_elements(elements, layout_json)
+    return {"html": render_html(elements, background, text_color), **check}
+
+
+class SlideRouter:
+    """HTML 生成路由：简单页走规则生成，并按路径统计延迟"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._latencies: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "routed_rule": 0,
+            "routed_llm": 0,
+            "gate_rejected": 0,   # 规则生成未通过质量闸门，回退到 LLM
+            "reasons": {},
+        }
+
+    def route(self, layout_json: Dict[str, Any]) -> Dict[str, Any]:
+        """返回 {"path": "rule" | "llm", "reason", ...classify_slide 的统计}"""
+        if not self.enabled:
+            return {"path": "llm", "reason": "disabled"}
+        info = classify_slide(layout_json)
+        path = "rule" if info["simple"] else "llm"
+        with self._lock:
+            self.stats[f"routed_{path}"] += 1
+            self.stats["reasons"][info["reason"]] = self.stats["reasons"].get(info["reason"], 0) + 1
+        return {"path": path, **{k: v for k, v in info.items() if k != "simple"}}
+
+    def reject(self, errors: List[str]):
+        """记录一次质量闸门拒绝"""
+        with self._lock:
+            self.stats["gate_rejected"] += 1
+        logger.info(f"[SlideRouter] 规则生成未通过质量闸门，回退到 LLM: {errors[:3]}")
+
+    def record(self, path: str, seconds: float):
+        """记录一次 HTML 生成耗时（path: rule / template / llm）"""
+        with self._lock:
+            samples = self._latencies.setdefault(path, [])
+            samples.append(seconds)
+            del samples[:-_LATENCY_WINDOW]
+
+    def get_stats(self) -> Dict[str, Any]:
+        latency = {}
+        with self._lock:
+            for path, samples in self._latencies.items():
+                ordered = sorted(samples)
+                latency[path] = {
+                    "count": len(ordered),
+                    "avg_seconds": round(sum(ordered) / len(ordered), 3),
+                    "p50_seconds": round(ordered[len(ordered) // 2], 3),
+                    "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                }
+            return {
+                "enabled": self.enabled,
+                "max_blocks": SIMPLE_SLIDE_MAX_BLOCKS,
+                "max_images": SIMPLE_SLIDE_MAX_IMAGES,
+                "max_chars": SIMPLE_SLIDE_MAX_CHARS,
+                **self.stats,
+                "reasons": dict(self.stats["reasons"]),
+                "latency": latency,
+            }
+
+
+# 全局路由实例
+slide_router = SlideRouter(enabled=SIMPLE_SLIDE_ENABLED)
@@ -0,0 +1,1610 @@
+"""
+HTML 静态布局模块
+不启动浏览器，直接由 HTML + CSS 算出 html2pptx.js extractSlideData 的结果（背景、元素、占位符），
+供纯 Python 转换（scripts/py_converter.py）使用
+
+只处理 system_prompt.md 约定的子集：720pt × 405pt body、绝对定位的 div/p/h/ul/ol/img、
+内联 b/i/u/strong/em/span/br、<style> 中的简单选择器（标签/类/ID、后代和子代组合）。
+凡是几何无法静态确定的情况（flex/grid 布局、换行位置取决于字体度量、transform、calc() 等）
+都抛出 StaticLayoutUnsupported，由调用方回退到 Chromium 转换
+
+输出与 extractSlideData 相同：位置为英寸，字号/间距为 pt，颜色为不带 # 的小写十六进制
+"""
+
+import os
+import re
+import math
+import colorsys
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote
+
+PT_PER_PX = 0.75
+PX_PER_IN = 96
+SLIDE_WIDTH_PX = 960     # 720pt
+SLIDE_HEIGHT_PX = 540    # 405pt
+
+# 换行判断的安全边际：估算行宽落在可用宽度 ±5% 内时无法确定浏览器是否换行
+WRAP_TOLERANCE = 0.05
+
+TEXT_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+INLINE_TAGS = {
+    "span", "b", "strong", "i", "em", "u", "a", "br", "img", "small", "code", "mark", "s", "label", "font",
+    "abbr", "cite", "q", "del", "ins", "kbd", "var", "time", "sup", "sub",
+}
+# 打开这些块级元素时隐式关闭未闭合的 <p>（与浏览器一致）
+_P_CLOSERS = {
+    "div", "p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "table", "section", "header", "footer",
+    "article", "aside", "nav", "main", "blockquote", "pre", "figure", "hr",
+}
+# 会改变文档结构或布局、静态布局不处理的元素
+_UNSUPPORTED_TAGS = {"script", "svg", "canvas", "table", "iframe", "video", "object", "math", "input", "textarea", "select", "button"}
+
+INHERITED = {
+    "color", "font-size", "font-family", "font-weight", "font-style", "line-height", "text-align",
+    "text-transform", "white-space", "letter-spacing", "word-spacing", "text-indent", "writing-mode",
+}
+
+# Chromium 默认样式表中与布局/提取相关的部分
+_UA_STYLES = {
+    "html": {"display": "block"},
+    "body": {"display": "block", "margin": "8px"},
+    "p": {"display": "block", "margin-top": "1em", "margin-bottom": "1em"},
+    "h1": {"display": "block", "font-size": "2em", "margin-top": "0.67em", "margin-bottom": "0.67em", "font-weight": "bold"},
+    "h2": {"display": "block", "font-size": "1.5em", "margin-top": "0.83em", "margin-bottom": "0.83em", "font-weight": "bold"},
+    "h3": {"display": "block", "font-size": "1.17em", "margin-top": "1em", "margin-bottom": "1em", "font-weight": "bold"},
+    "h4": {"display": "block", "margin-top": "1.33em", "margin-bottom": "1.33em", "font-weight": "bold"},
+    "h5": {"display": "block", "font-size": "0.83em", "margin-top": "1.67em", "margin-bottom": "1.67em", "font-weight": "bold"},
+    "h6": {"display": "block", "font-size": "0.67em", "margin-top": "2.33em", "margin-bottom": "2.33em", "font-weight": "bold"},
+    "ul": {"display": "block", "margin-top": "1em", "margin-bottom": "1em", "padding-left": "40px"},
+    "ol": {"display": "block", "margin-top": "1em", "margin-bottom": "1em", "padding-left": "40px"},
+    "li": {"display": "list-item"},
+    "b": {"font-weight": "bold"},
+    "strong": {"font-weight": "bold"},
+    "i": {"font-style": "italic"},
+    "em": {"font-style": "italic"},
+    "u": {"text-decoration": "underline"},
+    "img": {"display": "inline"},
+    "head": {"display": "none"},
+    "style": {"display": "none"},
+    "title": {"display": "none"},
+    "meta": {"display": "none"},
+    "link": {"display": "none"},
+}
+_BLOCK_DISPLAY_TAGS = {
+    "div", "section", "article", "header", "footer", "main", "nav", "aside", "figure", "figcaption",
+    "blockquote", "address", "pre", "hr",
+}
+
+_NAMED_COLORS = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0), "green": (0, 128, 0),
+    "blue": (0, 0, 255), "gray": (128, 128, 128), "grey": (128, 128, 128), "silver": (192, 192, 192),
+    "maroon": (128, 0, 0), "navy": (0, 0, 128), "teal": (0, 128, 128), "olive": (128, 128, 0),
+    "purple": (128, 0, 128), "fuchsia": (255, 0, 255), "magenta": (255, 0, 255), "aqua": (0, 255, 255),
+    "cyan": (0, 255, 255), "yellow": (255, 255, 0), "lime": (0, 255, 0), "orange": (255, 165, 0),
+    "gold": (255, 215, 0), "darkgray": (169, 169, 169), "darkgrey": (169, 169, 169),
+    "lightgray": (211, 211, 211), "lightgrey": (211, 211, 211), "whitesmoke": (245, 245, 245),
+    "gainsboro": (220, 220, 220), "dimgray": (105, 105, 105), "dimgrey": (105, 105, 105),
+    "darkblue": (0, 0, 139), "darkred": (139, 0, 0), "darkgreen": (0, 100, 0), "crimson": (220, 20, 60),
+    "tomato": (255, 99, 71), "coral": (255, 127, 80), "steelblue": (70, 130, 180), "royalblue": (65, 105, 225),
+    "skyblue": (135, 206, 235), "lightblue": (173, 216, 230), "slategray": (112, 128, 144),
+    "ivory": (255, 255, 240), "beige": (245, 245, 220), "indigo": (75, 0, 130), "orangered": (255, 69, 0),
+}
+_FONT_SIZE_KEYWORDS = {
+    "xx-small": 9, "x-small": 10, "small": 13, "medium": 16, "large": 18, "x-large": 24, "xx-large": 32, "xxx-large": 48,
+}
+_ABSOLUTE_UNITS = {"px": 1.0, "pt": 4 / 3, "in": 96.0, "cm": 96 / 2.54, "mm": 96 / 25.4, "pc": 16.0}
+_LENGTH_RE = re.compile(r'^(-?(?:\d+\.?\d*|\.\d+))([a-z%]*)$', re.IGNORECASE)
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_VAR_RE = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,\s*([^()]*(?:\([^()]*\)[^()]*)*))?\)')
+_COMPOUND_RE = re.compile(r'^(\*|[a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)((?::{1,2}[\w-]+)*)$')
+_URL_RE = re.compile(r'url\(\s*["\']?([^"\')]+)["\']?\s*\)')
+
+# 字宽（千分之一 em）：Arial/Helvetica 与 Chromium 在 Linux 上实际使用的 Liberation Sans 度量一致
+_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+_SANS_FONTS = {"arial", "helvetica", "liberation sans"}
+_MONO_FONTS = {"courier new", "courier", "liberation mono"}
+_NORMAL_LINE_HEIGHT = {"sans": 1.149, "mono": 1.133}  # Liberation Sans / Mono 的 ascent + descent + lineGap
+
+
+class StaticLayoutUnsupported(Exception):
+    """页面包含无法静态确定几何的内容"""
+
+    def __init__(self, reason: str, detail: str = ""):
+        self.reason = reason
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+
+
+# ============ DOM ============
+
+class _Element:
+    __slots__ = ("tag", "attrs", "children", "parent", "style", "box", "content")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["_Element"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Union["_Element", str]] = []
+        self.parent = parent
+        self.style: Dict[str, Any] = {}
+        self.box: Optional[Tuple[float, float, float, float]] = None       # 边框盒 (x, y, w, h)，px
+        self.content: Optional[Tuple[float, float, float, float]] = None   # 内容盒
+
+    @property
+    def classes(self) -> List[str]:
+        return (self.attrs.get("class") or "").split()
+
+    def elements(self) -> List["_Element"]:
+        return [c for c in self.children if isinstance(c, _Element)]
+
+    def text_content(self) -> str:
+        return "".join(c if isinstance(c, str) else c.text_content() for c in self.children)
+
+    def iter(self):
+        """先序遍历（与 document.querySelectorAll('*') 顺序一致）"""
+        yield self
+        for child in self.elements():
+            yield from child.iter()
+
+    def __repr__(self):
+        return f"<{self.tag}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Element("#document", {}, None)
+        self.stack = [self.root]
+        self.css: List[str] = []
+
+    def _open_tags(self):
+        return [e.tag for e in self.stack]
+
+    def _close(self, tag: str):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _UNSUPPORTED_TAGS:
+            raise StaticLayoutUnsupported("unsupported_tag", tag)
+        if tag == "link" and any(k == "rel" and "stylesheet" in (v or "") for k, v in attrs):
+            raise StaticLayoutUnsupported("external_stylesheet")
+        if tag in _P_CLOSERS and "p" in self._open_tags():
+            self._close("p")
+        if tag == "li" and self.stack[-1].tag == "li":
+            self._close("li")
+        element = _Element(tag, {k: (v or "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        if tag == "p" and "p" not in self._open_tags():
+            # 浏览器把孤立的 </p> 当作空段落，这里忽略
+            return
+        self._close(tag)
+
+    def handle_data(self, data):
+        parent = self.stack[-1]
+        if parent.tag == "style":
+            self.css.append(data)
+        elif parent.tag != "title":
+            parent.children.append(data)
+
+
+# ============ CSS ============
+
+def _split_top_level(text: str, separator: str) -> List[str]:
+    """按分隔符切分，忽略括号和引号内的分隔符"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0 and (ch == separator or (separator == " " and ch.isspace())):
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_declarations(text: str) -> List[Tuple[str, str, bool]]:
+    declarations = []
+    for part in _split_top_level(text, ";"):
+        if ":" not in part:
+            continue
+        name, value = part.split(":", 1)
+        value = value.strip()
+        important = value.lower().endswith("!important")
+        if important:
+            value = value[: -len("!important")].strip()
+        declarations.append((name.strip().lower(), value, important))
+    return declarations
+
+
+def _tokens(value: str) -> List[str]:
+    return _split_top_level(value, " ")
+
+
+def _box_values(value: str) -> List[str]:
+    parts = _tokens(value)
+    if len(parts) == 1:
+        return parts * 4
+    if len(parts) == 2:
+        return [parts[0], parts[1], parts[0], parts[1]]
+    if len(parts) == 3:
+        return [parts[0], parts[1], parts[2], parts[1]]
+    return parts[:4]
+
+
+_SIDES = ("top", "right", "bottom", "left")
+_BORDER_STYLES = {"none", "hidden", "solid", "dashed", "dotted", "double", "groove", "ridge", "inset", "outset"}
+
+
+def _expand(name: str, value: str) -> List[Tuple[str, str]]:
+    """展开简写属性"""
+    if name in ("margin", "padding"):
+        return [(f"{name}-{side}", v) for side, v in zip(_SIDES, _box_values(value))]
+    if name == "inset":
+        return list(zip(_SIDES, _box_values(value)))
+    if name in ("border-width", "border-style", "border-color"):
+        kind = name.split("-")[1]
+        return [(f"border-{side}-{kind}", v) for side, v in zip(_SIDES, _box_values(value))]
+    if name == "border" or name in (f"border-{side}" for side in _SIDES):
+        sides = _SIDES if name == "border" else (name.split("-")[1],)
+        width, style, color = "medium", "none", "currentcolor"
+        for token in _tokens(value):
+            if token.lower() in _BORDER_STYLES:
+                style = token.lower()
+            elif token.lower() in ("thin", "medium", "thick") or _LENGTH_RE.match(token):
+                width = token
+            else:
+                color = token
+        result = []
+        for side in sides:
+            result += [(f"border-{side}-width", width), (f"border-{side}-style", style), (f"border-{side}-color", color)]
+        return result
+    if name == "background":
+        image, color = "none", "transparent"
+        for token in _tokens(value):
+            lowered = token.lower()
+            if lowered.startswith("url(") or "gradient(" in lowered:
+                image = token
+            elif _parse_color(token) is not None:
+                color = token
+        return [("background-image", image), ("background-color", color)]
+    if name == "text-decoration-line":
+        return [("text-decoration", value)]
+    if name == "font":
+        return _expand_font(value)
+    return [(name, value)]
+
+
+def _expand_font(value: str) -> List[Tuple[str, str]]:
+    tokens = _tokens(value)
+    result = [("font-style", "normal"), ("font-weight", "normal"), ("line-height", "normal")]
+    for i, token in enumerate(tokens):
+        size = token
+        if "/" in token:
+            size, line_height = token.split("/", 1)
+            result.append(("line-height", line_height))
+        if size.lower() in _FONT_SIZE_KEYWORDS or _LENGTH_RE.match(size):
+            result.append(("font-size", size))
+            result.append(("font-family", " ".join(tokens[i + 1:])))
+            for prefix in tokens[:i]:
+                lowered = prefix.lower()
+                if lowered in ("italic", "oblique"):
+                    result.append(("font-style", "italic"))
+                elif lowered in ("bold", "bolder", "lighter") or lowered.isdigit():
+                    result.append(("font-weight", lowered))
+            return result
+    raise StaticLayoutUnsupported("css_value", f"font: {value}")
+
+
+class _Rule:
+    __slots__ = ("selector", "specificity", "order", "declarations")
+
+    def __init__(self, selector, specificity, order, declarations):
+        self.selector = selector          # [(combinator, (tag, ids, classes, pseudos)), ...]，从左到右
+        self.specificity = specificity
+        self.order = order
+        self.declarations = declarations
+
+
+def _parse_selector(text: str):
+    """解析选择器，返回 (组合列表, 优先级)；不支持的选择器抛出异常，永不匹配的返回 None"""
+    parts = re.split(r'\s*(>)\s*|\s+', text.strip())
+    compounds, combinator = [], " "
+    ids = classes = tags = 0
+    for part in parts:
+        if not part:
+            continue
+        if part == ">":
+            combinator = ">"
+            continue
+        if part in ("+", "~") or "[" in part:
+            raise StaticLayoutUnsupported("css_selector", text)
+        match = _COMPOUND_RE.match(part)
+        if not match:
+            raise StaticLayoutUnsupported("css_selector", text)
+        tag, rest, pseudo_text = match.groups()
+        pseudos = [p.lstrip(":") for p in re.findall(r'::?[\w-]+', pseudo_text or "")]
+        for pseudo in pseudos:
+            if pseudo in ("hover", "focus", "active", "visited", "focus-within", "focus-visible",
+                          "selection", "placeholder", "marker", "-webkit-scrollbar"):
+                return None
+            if pseudo in ("before", "after"):
+                return "pseudo-element"
+            if pseudo not in ("root", "first-child", "last-child", "link"):
+                raise StaticLayoutUnsupported("css_selector", text)
+        element_ids = re.findall(r'#([\w-]+)', rest or "")
+        element_classes = re.findall(r'\.([\w-]+)', rest or "")
+        ids += len(element_ids)
+        classes += len(element_classes) + len(pseudos)
+        tags += 1 if tag and tag != "*" else 0
+        compounds.append((combinator, ((tag or "*").lower(), element_ids, element_classes, pseudos)))
+        combinator = " "
+    if not compounds:
+        raise StaticLayoutUnsupported("css_selector", text)
+    return compounds, (ids, classes, tags)
+
+
+def _parse_stylesheet(css: str, order_start: int = 0) -> List[_Rule]:
+    css = _COMMENT_RE.sub("", css)
+    rules, pos, order = [], 0, order_start
+    while pos < len(css):
+        brace = css.find("{", pos)
+        if brace < 0:
+            break
+        prelude = css[pos:brace].strip()
+        # 找到匹配的右括号（@media 等块内有嵌套）
+        depth, end = 1, brace + 1
+        while end < len(css) and depth:
+            if css[end] == "{":
+                depth += 1
+            elif css[end] == "}":
+                depth -= 1
+            end += 1
+        body = css[brace + 1:end - 1]
+        pos = end
+        # 前一条 @charset/@import 之类以分号结束的语句混在 prelude 中
+        if ";" in prelude:
+            statements = prelude.split(";")
+            for statement in statements[:-1]:
+                if statement.strip().lower().startswith("@import"):
+                    raise StaticLayoutUnsupported("css_import")
+            prelude = statements[-1].strip()
+        if prelude.startswith("@"):
+            at_rule = prelude.split()[0].lower()
+            if at_rule in ("@font-face", "@keyframes", "@-webkit-keyframes", "@page"):
+                continue
+            raise StaticLayoutUnsupported("css_at_rule", at_rule)
+        declarations = _parse_declarations(body)
+        for selector_text in _split_top_level(prelude, ","):
+            parsed = _parse_selector(selector_text)
+            if parsed is None:
+                continue
+            if parsed == "pseudo-element":
+                if any(name == "content" and value not in ("none", "normal", '""', "''") for name, value, _ in declarations):
+                    raise StaticLayoutUnsupported("css_generated_content", selector_text)
+                continue
+            compounds, specificity = parsed
+            rules.append(_Rule(compounds, specificity, order, declarations))
+            order += 1
+    return rules
+
+
+def _match_compound(element: _Element, compound) -> bool:
+    tag, ids, classes, pseudos = compound
+    if tag != "*" and element.tag != tag:
+        return False
+    if ids and element.attrs.get("id") not in ids:
+        return False
+    if classes and not set(classes) <= set(element.classes):
+        return False
+    for pseudo in pseudos:
+        siblings = element.parent.elements() if element.parent else [element]
+        if pseudo == "root" and element.tag != "html":
+            return False
+        if pseudo == "first-child" and siblings[0] is not element:
+            return False
+        if pseudo == "last-child" and siblings[-1] is not element:
+            return False
+        if pseudo == "link":
+            return False
+    return True
+
+
+def _matches(element: _Element, compounds) -> bool:
+    """从右向左匹配选择器"""
+    *ancestors, (_, last) = compounds
+    if not _match_compound(element, last):
+        return False
+    combinator = compounds[-1][0]
+    current = element
+    for index in range(len(ancestors) - 1, -1, -1):
+        compound = ancestors[index][1]
+        if combinator == ">":
+            current = current.parent
+            if current is None or current.tag == "#document" or not _match_compound(current, compound):
+                return False
+        else:
+            current = current.parent
+            while current is not None and current.tag != "#document" and not _match_compound(current, compound):
+                current = current.parent
+            if current is None or current.tag == "#document":
+                return False
+        combinator = ancestors[index][0]
+    return True
+
+
+# ============ 值解析 ============
+
+def _parse_color(value: str) -> Optional[Tuple[int, int, int, float]]:
+    value = value.strip().lower()
+    if value == "transparent":
+        return (0, 0, 0, 0.0)
+    if value in _NAMED_COLORS:
+        return (*_NAMED_COLORS[value], 1.0)
+    if value.startswith("#"):
+        digits = value[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(ch * 2 for ch in digits)
+        if len(digits) not in (6, 8) or not re.fullmatch(r'[0-9a-f]+', digits):
+            return None
+        alpha = int(digits[6:8], 16) / 255 if len(digits) == 8 else 1.0
+        return (int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16), alpha)
+    match = re.fullmatch(r'(rgba?|hsla?)\(([^)]*)\)', value)
+    if not match:
+        return None
+    args = [a for a in re.split(r'[\s,/]+', match.group(2).strip()) if a]
+    if len(args) not in (3, 4):
+        return None
+    try:
+        alpha = 1.0
+        if len(args) == 4:
+            alpha = float(args[3][:-1]) / 100 if args[3].endswith("%") else float(args[3])
+        if match.group(1).startswith("rgb"):
+            rgb = [round(float(a[:-1]) * 2.55) if a.endswith("%") else round(float(a)) for a in args[:3]]
+        else:
+            hue = float(args[0].replace("deg", "")) / 360
+            r, g, b = colorsys.hls_to_rgb(hue % 1, float(args[2].rstrip("%")) / 100, float(args[1].rstrip("%")) / 100)
+            rgb = [round(r * 255), round(g * 255), round(b * 255)]
+    except ValueError:
+        return None
+    return (*[max(0, min(255, c)) for c in rgb], max(0.0, min(1.0, alpha)))
+
+
+def _hex(color: Tuple[int, int, int, float]) -> str:
+    """与 html2pptx.js rgbToHex 一致：完全透明返回 FFFFFF"""
+    if color[3] == 0 and color[:3] == (0, 0, 0):
+        return "FFFFFF"
+    return "".join(f"{c:02x}" for c in color[:3])
+
+
+def _alpha_transparency(color: Tuple[int, int, int, float]) -> Optional[int]:
+    """与 extractAlpha 一致：只有计算值为 rgba(...)（alpha < 1）时才有透明度"""
+    if color[3] >= 1:
+        return None
+    return round((1 - round(color[3], 3)) * 100)
+
+
+def _length(value: str, font_px: float, percent_base: Optional[float] = None, root_font_px: float = 16.0) -> Optional[float]:
+    """长度转 px；auto 返回 None"""
+    value = value.strip().lower()
+    if value in ("auto", "", "none"):
+        return None
+    if value == "0":
+        return 0.0
+    match = _LENGTH_RE.match(value)
+    if not match:
+        raise StaticLayoutUnsupported("css_value", value)
+    number, unit = float(match.group(1)), match.group(2)
+    if unit in _ABSOLUTE_UNITS:
+        return number * _ABSOLUTE_UNITS[unit]
+    if unit == "em":
+        return number * font_px
+    if unit == "rem":
+        return number * root_font_px
+    if unit == "%":
+        if percent_base is None:
+            raise StaticLayoutUnsupported("css_percentage", value)
+        return number * percent_base / 100
+    if unit == "vw":
+        return number * SLIDE_WIDTH_PX / 100
+    if unit == "vh":
+        return number * SLIDE_HEIGHT_PX / 100
+    if unit == "" and number == 0:
+        return 0.0
+    raise StaticLayoutUnsupported("css_value", value)
+
+
+def _border_width(value: str, font_px: float) -> float:
+    keyword = {"thin": 1.0, "medium": 3.0, "thick": 5.0}.get(value.strip().lower())
+    if keyword is not None:
+        return keyword
+    width = _length(value, font_px) or 0.0
+    # Chromium 把边框宽度向下取整到整数 px（不足 1px 时取 1px）
+    return float(int(width)) if width >= 1 else (1.0 if width > 0 else 0.0)
+
+
+def _first_font(family: str) -> str:
+    return family.split(",")[0].replace('"', "").replace("'", "").strip()
+
+
+# ============ 样式计算 ============
+
+class _StyleResolver:
+    def __init__(self, rules: List[_Rule]):
+        self.rules = rules
+        self.root_font_px = 16.0
+
+    def cascade(self, element: _Element) -> Dict[str, str]:
+        """按优先级合并 UA 样式、样式表和内联样式（!important 优先）"""
+        candidates = []  # (important, origin, specificity, order, name, value)
+        for name, value in _UA_STYLES.get(element.tag, {}).items():
+            for expanded_name, expanded_value in _expand(name, value):
+                candidates.append((False, 0, (0, 0, 0), 0, expanded_name, expanded_value))
+        if element.tag in _BLOCK_DISPLAY_TAGS:
+            candidates.append((False, 0, (0, 0, 0), 0, "display", "block"))
+        for rule in self.rules:
+            if _matches(element, rule.selector):
+                for name, value, important in rule.declarations:
+                    for expanded_name, expanded_value in _expand(name, value):
+                        candidates.append((important, 1, rule.specificity, rule.order, expanded_name, expanded_value))
+        for index, (name, value, important) in enumerate(_parse_declarations(element.attrs.get("style", ""))):
+            for expanded_name, expanded_value in _expand(name, value):
+                candidates.append((important, 2, (1, 0, 0, 0), index, expanded_name, expanded_value))
+        candidates.sort(key=lambda c: (c[0], c[1] if not c[0] else -c[1], c[2], c[3]))
+        declared: Dict[str, str] = {}
+        for *_, name, value in candidates:
+            declared[name] = value
+        return declared
+
+    def compute(self, element: _Element, parent: Optional[Dict[str, Any]]):
+        declared = self.cascade(element)
+        parent = parent or {}
+
+        # 自定义属性（继承）和 var() 替换
+        custom = {k: v for k, v in parent.items() if k.startswith("--")}
+        custom.update({k: v for k, v in declared.items() if k.startswith("--")})
+
+        def substitute(value: str, depth: int = 0) -> str:
+            if "var(" not in value:
+                return value
+            if depth > 8:
+                raise StaticLayoutUnsupported("css_var", value)
+
+            def replace(match):
+                if match.group(1) in custom:
+                    return custom[match.group(1)]
+                if match.group(2) is not None:
+                    return match.group(2)
+                raise StaticLayoutUnsupported("css_var", match.group(1))
+            return substitute(_VAR_RE.sub(replace, value), depth + 1)
+
+        raw = {}
+        for name, value in declared.items():
+            if name.startswith("--"):
+                continue
+            value = substitute(value)
+            if "calc(" in value or "min(" in value or "max(" in value or "clamp(" in value:
+                raise StaticLayoutUnsupported("css_calc", f"{name}: {value}")
+            raw[name] = value
+        for name in INHERITED:
+            if name not in raw or raw[name] in ("inherit", "unset"):
+                raw[name] = parent.get(f"_{name}", None)
+        for name in list(raw):
+            if raw[name] == "inherit":
+                raw[name] = parent.get(f"_{name}")
+
+        style: Dict[str, Any] = dict(custom)
+        # 保留继承属性的声明值，供子元素继承
+        for name in INHERITED:
+            style[f"_{name}"] = raw.get(name)
+
+        parent_font = parent.get("font-size", 16.0)
+        font_value = raw.get("font-size")
+        if element.tag == "html":
+            font_px = self._font_size(font_value, 16.0) if font_value else 16.0
+            self.root_font_px = font_px
+        else:
+            font_px = self._font_size(font_value, parent_font) if font_value else parent_font
+        style["font-size"] = font_px
+        # 字号为计算值（px），子元素继承计算值
+        style["_font-size"] = f"{font_px}px"
+
+        style["font-family"] = raw.get("font-family") or "Times New Roman"
+        style["font-weight"] = self._font_weight(raw.get("font-weight"), parent.get("font-weight", 400))
+        style["font-style"] = "italic" if (raw.get("font-style") or "normal").lower() in ("italic", "oblique") else "normal"
+        style["text-align"] = (raw.get("text-align") or "start").lower()
+        style["text-transform"] = (raw.get("text-transform") or "none").lower()
+        style["white-space"] = (raw.get("white-space") or "normal").lower()
+        style["letter-spacing"] = raw.get("letter-spacing") or "normal"
+        style["word-spacing"] = raw.get("word-spacing") or "normal"
+        style["text-indent"] = raw.get("text-indent") or "0"
+        style["writing-mode"] = (raw.get("writing-mode") or "horizontal-tb").lower()
+        style["text-decoration"] = (raw.get("text-decoration") or "none").lower()
+
+        line_height = (raw.get("line-height") or "normal").strip().lower()
+        if line_height == "normal":
+            style["line-height"] = None
+        elif re.fullmatch(r'\d*\.?\d+', line_height):
+            style["line-height"] = float(line_height) * font_px
+        else:
+            style["line-height"] = _length(line_height, font_px, percent_base=font_px, root_font_px=self.root_font_px)
+            # 长度/百分比行高按计算值继承
+            style["_line-height"] = f"{style['line-height']}px"
+
+        color_value = raw.get("color")
+        color = _parse_color(color_value) if color_value else None
+        if color_value and color is None and color_value.lower() != "currentcolor":
+            raise StaticLayoutUnsupported("css_color", color_value)
+        style["color"] = color or parent.get("color", (0, 0, 0, 1.0))
+        style["_color"] = f"rgba({','.join(str(c) for c in style['color'][:3])},{style['color'][3]})"
+
+        def color_of(name: str, default: str) -> Tuple[int, int, int, float]:
+            value = raw.get(name, default)
+            if value.lower() == "currentcolor":
+                return style["color"]
+            parsed = _parse_color(value)
+            if parsed is None:
+                raise StaticLayoutUnsupported("css_color", f"{name}: {value}")
+            return parsed
+
+        style["background-color"] = color_of("background-color", "transparent")
+        style["background-image"] = raw.get("background-image", "none")
+        for side in _SIDES:
+            border_style = raw.get(f"border-{side}-style", "none").lower()
+            width = 0.0 if border_style in ("none", "hidden") else _border_width(raw.get(f"border-{side}-width", "medium"), font_px)
+            style[f"border-{side}-width"] = width
+            style[f"border-{side}-color"] = color_of(f"border-{side}-color", "currentcolor")
+
+        for name in ("display", "position", "float", "box-sizing", "transform", "box-shadow", "border-radius",
+                     "min-width", "max-width", "min-height", "max-height", "overflow", "vertical-align"):
+            style[name] = (raw.get(name) or "").strip().lower()
+        style["display"] = style["display"] or "inline"
+        style["position"] = style["position"] or "static"
+        for name in ("width", "height", "top", "right", "bottom", "left"):
+            style[name] = raw.get(name, "auto")
+        for side in _SIDES:
+            style[f"margin-{side}"] = raw.get(f"margin-{side}", "0")
+            style[f"padding-{side}"] = raw.get(f"padding-{side}", "0")
+        element.style = style
+
+    def _font_size(self, value: str, parent_px: float) -> float:
+        value = value.strip().lower()
+        if value in _FONT_SIZE_KEYWORDS:
+            return float(_FONT_SIZE_KEYWORDS[value])
+        if value in ("smaller", "larger"):
+            raise StaticLayoutUnsupported("css_value", f"font-size: {value}")
+        size = _length(value, parent_px, percent_base=parent_px, root_font_px=self.root_font_px)
+        return parent_px if size is None else size
+
+    @staticmethod
+    def _font_weight(value: Optional[str], parent_weight: int) -> int:
+        if not value:
+            return parent_weight
+        value = value.strip().lower()
+        if value == "normal":
+            return 400
+        if value == "bold":
+            return 700
+        if value == "bolder":
+            return 700 if parent_weight < 600 else 900
+        if value == "lighter":
+            return 100 if parent_weight < 600 else 400
+        try:
+            return int(float(value))
+        except ValueError:
+            raise StaticLayoutUnsupported("css_value", f"font-weight: {value}")
+
+
+# ============ 文本度量 ============
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x2E80 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF or 0xF900 <= code <= 0xFAFF
+        or 0xFE30 <= code <= 0xFE4F or 0xFF00 <= code <= 0xFF60 or 0x3000 <= code <= 0x303F
+    )
+
+
+def _font_kind(family: str) -> str:
+    first = _first_font(family).lower()
+    if first in _SANS_FONTS:
+        return "sans"
+    if first in _MONO_FONTS:
+        return "mono"
+    raise StaticLayoutUnsupported("font_metrics", first or "default")
+
+
+def _char_width(ch: str, kind: str, bold: bool) -> float:
+    """字宽（em）"""
+    if _is_cjk(ch):
+        return 1.0
+    if kind == "mono":
+        return 0.6
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return (_HELVETICA_BOLD if bold else _HELVETICA)[code - 32] / 1000
+    if ch == " ":
+        return 0.278
+    raise StaticLayoutUnsupported("font_metrics", f"U+{code:04X}")
+
+
+class _Run:
+    """一段同样式的内联文本（宽度计算用）"""
+    __slots__ = ("text", "font_px", "kind", "bold")
+
+    def __init__(self, text, font_px, kind, bold):
+        self.text = text
+        self.font_px = font_px
+        self.kind = kind
+        self.bold = bold
+
+
+def _apply_text_transform(text: str, transform: str) -> str:
+    if transform == "uppercase":
+        return text.upper()
+    if transform == "lowercase":
+        return text.lower()
+    if transform == "capitalize":
+        return re.sub(r'\b\w', lambda m: m.group(0).upper(), text)
+    return text
+
+
+def _count_lines(runs: List[Optional[_Run]], available: float, nowrap: bool) -> int:
+    """
+    按 CSS 规则统计行数（None 表示 <br> 强制换行）
+
+    贪心断行：拉丁文在空格处断行，CJK 字符之间可断行；某一次断行判断中估算宽度
+    落在可用宽度 ±WRAP_TOLERANCE 内时无法确定浏览器结果，抛出 StaticLayoutUnsupported
+    """
+    lines, width, pending_space, line_has_content = 1, 0.0, 0.0, False
+    for run in runs:
+        if run is None:
+            lines += 1
+            width, pending_space, line_has_content = 0.0, 0.0, False
+            continue
+        # 切分为可断行单元：空格 / 单个 CJK 字符 / 连续的其它字符
+        for token in re.findall(r' |[⺀-鿿가-힯豈-﫿︰-﹏＀-｠　-〿]|[^ ⺀-鿿가-힯豈-﫿︰-﹏＀-｠　-〿]+', run.text):
+            token_width = sum(_char_width(ch, run.kind, run.bold) for ch in token) * run.font_px
+            if token == " ":
+                if line_has_content:
+                    pending_space += token_width
+                continue
+            candidate = width + pending_space + token_width
+            if nowrap or not line_has_content:
+                if not nowrap and candidate > available * (1 - WRAP_TOLERANCE):
+                    raise StaticLayoutUnsupported("text_wrap", f"单词宽于文本框: {token[:20]}")
+                width, pending_space, line_has_content = candidate, 0.0, True
+                continue
+            if abs(candidate - available) <= available * WRAP_TOLERANCE:
+                raise StaticLayoutUnsupported("text_wrap", f"无法确定是否换行: {token[:20]}")
+            if candidate > available:
+                lines += 1
+                width, pending_space = token_width, 0.0
+                if width > available * (1 - WRAP_TOLERANCE):
+                    raise StaticLayoutUnsupported("text_wrap", f"单词宽于文本框: {token[:20]}")
+            else:
+                width, pending_space = candidate, 0.0
+            line_has_content = True
+    return lines
+
+
+# ============ 布局 ============
+
+class _Layout:
+    def __init__(self, document: _Element, resolver: _StyleResolver):
+        self.document = document
+        self.resolver = resolver
+        self.deferred: Dict[int, List[_Element]] = {}
+
+    # --- 样式 ---
+
+    def compute_styles(self):
+        def visit(element: _Element, parent_style):
+            self.resolver.compute(element, parent_style)
+            for child in element.elements():
+                visit(child, element.style)
+        for child in self.document.elements():
+            visit(child, None)
+
+    # --- 通用盒模型 ---
+
+    def _px(self, element: _Element, name: str, base: Optional[float]) -> Optional[float]:
+        return _length(element.style[name], element.style["font-size"], base, self.resolver.root_font_px)
+
+    def _edges(self, element: _Element, base_width: float) -> Dict[str, float]:
+        edges = {}
+        for side in _SIDES:
+            margin = element.style[f"margin-{side}"]
+            edges[f"m{side[0]}"] = "auto" if margin.strip().lower() == "auto" else (self._px(element, f"margin-{side}", base_width) or 0.0)
+            edges[f"p{side[0]}"] = self._px(element, f"padding-{side}", base_width) or 0.0
+            edges[f"b{side[0]}"] = element.style[f"border-{side}-width"]
+            if edges[f"p{side[0]}"] < 0 or (edges[f"m{side[0]}"] != "auto" and edges[f"m{side[0]}"] < 0):
+                raise StaticLayoutUnsupported("negative_margin", element.tag)
+        return edges
+
+    def _check_box(self, element: _Element):
+        style = element.style
+        if style["transform"] not in ("", "none"):
+            raise StaticLayoutUnsupported("transform", element.tag)
+        if style["writing-mode"] not in ("horizontal-tb", ""):
+            raise StaticLayoutUnsupported("writing_mode", element.tag)
+        if style["float"] not in ("", "none"):
+            raise StaticLayoutUnsupported("float", element.tag)
+        for name in ("min-width", "min-height"):
+            if style[name] not in ("", "0", "auto", "0px", "0pt"):
+                raise StaticLayoutUnsupported("min_max_size", f"{element.tag} {name}")
+        for name in ("max-width", "max-height"):
+            if style[name] not in ("", "none"):
+                raise StaticLayoutUnsupported("min_max_size", f"{element.tag} {name}")
+
+    def _is_hidden(self, element: _Element) -> bool:
+        return element.style.get("display") == "none"
+
+    def _is_absolute(self, element: _Element) -> bool:
+        return element.style["position"] in ("absolute", "fixed")
+
+    def _is_positioned(self, element: _Element) -> bool:
+        return element.style["position"] != "static"
+
+    def _content_size(self, element, edges, width, height):
+        """width/height 声明值 → 内容盒尺寸（考虑 box-sizing）"""
+        horizontal = edges["pl"] + edges["pr"] + edges["bl"] + edges["br"]
+        vertical = edges["pt"] + edges["pb"] + edges["bt"] + edges["bb"]
+        border_box = element.style["box-sizing"] == "border-box"
+        if width is not None and border_box:
+            width = max(0.0, width - horizontal)
+        if height is not None and border_box:
+            height = max(0.0, height - vertical)
+        return width, height, horizontal, vertical
+
+    def _set_boxes(self, element, x, y, content_w, content_h, edges):
+        content_x = x + edges["bl"] + edges["pl"]
+        content_y = y + edges["bt"] + edges["pt"]
+        element.content = (content_x, content_y, content_w, content_h)
+        element.box = (
+            x, y,
+            content_w + edges["pl"] + edges["pr"] + edges["bl"] + edges["br"],
+            content_h + edges["pt"] + edges["pb"] + edges["bt"] + edges["bb"],
+        )
+
+    def _mark_hidden(self, element: _Element):
+        for node in element.iter():
+            node.box = (0.0, 0.0, 0.0, 0.0)
+            node.content = node.box
+
+    # --- 入口 ---
+
+    def run(self):
+        html = next((e for e in self.document.elements() if e.tag == "html"), None)
+        body = next((e for e in html.elements() if e.tag == "body"), None) if html else None
+        if body is None:
+            raise StaticLayoutUnsupported("no_body")
+        for element in html.elements():
+            if element is not body:
+                self._mark_hidden(element)
+
+        self._check_box(body)
+        edges = self._edges(body, SLIDE_WIDTH_PX)
+        width = self._px(body, "width", SLIDE_WIDTH_PX)
+        height = self._px(body, "height", SLIDE_HEIGHT_PX)
+        if width is None or height is None or abs(width - SLIDE_WIDTH_PX) > 1.5 or abs(height - SLIDE_HEIGHT_PX) > 1.5:
+            raise StaticLayoutUnsupported("body_size", f"{body.style['width']} × {body.style['height']}")
+        if any(edges[f"m{side[0]}"] == "auto" for side in _SIDES):
+            raise StaticLayoutUnsupported("body_margin")
+        content_w, content_h, _, _ = self._content_size(body, edges, width, height)
+        html.box = html.content = (0.0, 0.0, float(SLIDE_WIDTH_PX), float(SLIDE_HEIGHT_PX))
+        self._set_boxes(body, edges["ml"], edges["mt"], content_w, content_h, edges)
+
+        owner = body if self._is_positioned(body) else None
+        self._layout_flow(body, owner)
+        if owner is None:
+            self._layout_deferred(None)
+        else:
+            self._layout_deferred(body)
+
+    def _layout_deferred(self, owner: Optional[_Element]):
+        """布局包含块为 owner 的绝对定位元素"""
+        for element in self.deferred.pop(id(owner), []):
+            self._layout_absolute(element, owner)
+
+    # --- 常规流 ---
+
+    def _layout_flow(self, element: _Element, owner: Optional[_Element], collapse_through: bool = False) -> float:
+        """
+        在 element 的内容盒内布局常规流子元素，返回内容高度
+
+        collapse_through: element 自身不是 BFC 且没有上/下内边距和边框时，首尾子元素的外边距会穿透，
+        这种情况静态布局不处理
+        """
+        content_x, content_y, content_w, _ = element.content
+        child_owner = element if self._is_positioned(element) else owner
+        blocks, inline = [], False
+        for child in element.children:
+            if isinstance(child, str):
+                if child.strip():
+                    inline = True
+                continue
+            if self._is_hidden(child):
+                self._mark_hidden(child)
+                continue
+            if self._is_absolute(child):
+                self.deferred.setdefault(id(child_owner), []).append(child)
+                continue
+            display = child.style["display"]
+            if display in ("block", "list-item", "flow-root"):
+                blocks.append(child)
+            elif display == "inline":
+                inline = True
+            else:
+                raise StaticLayoutUnsupported("display", f"{child.tag} {display}")
+
+        has_flow_children = blocks or inline
+        if has_flow_children and element.style["display"] not in ("block", "list-item", "flow-root"):
+            raise StaticLayoutUnsupported("display", f"{element.tag} {element.style['display']}")
+        if blocks and inline:
+            raise StaticLayoutUnsupported("mixed_inline_block", element.tag)
+        if inline:
+            return self._layout_inline(element)
+
+        cursor, previous_margin = content_y, 0.0
+        for index, child in enumerate(blocks):
+            self._check_box(child)
+            edges = self._edges(child, content_w)
+            margin_top = 0.0 if edges["mt"] == "auto" else edges["mt"]
+            margin_bottom = 0.0 if edges["mb"] == "auto" else edges["mb"]
+            if index == 0 and collapse_through and margin_top > 0:
+                raise StaticLayoutUnsupported("margin_collapse", child.tag)
+            y = cursor + max(previous_margin, margin_top)
+            height = self._layout_block(child, content_x, y, content_w, edges, owner)
+            cursor, previous_margin = y + height, margin_bottom
+            if child.style["position"] == "relative":
+                self._offset_relative(child, element)
+        if blocks and collapse_through and previous_margin > 0:
+            raise StaticLayoutUnsupported("margin_collapse", blocks[-1].tag)
+        return cursor + previous_margin - content_y if blocks else 0.0
+
+    def _layout_block(self, element, x, y, available_w, edges, owner) -> float:
+        """布局一个常规流块级元素，返回边框盒高度"""
+        width = self._px(element, "width", available_w)
+        if element.style["height"].strip().endswith("%"):
+            raise StaticLayoutUnsupported("css_percentage", f"{element.tag} height")
+        height = self._px(element, "height", None)
+        content_w, content_h, horizontal, vertical = self._content_size(element, edges, width, height)
+
+        margin_left = edges["ml"]
+        if content_w is None:
+            margin_left = 0.0 if margin_left == "auto" else margin_left
+            margin_right = 0.0 if edges["mr"] == "auto" else edges["mr"]
+            content_w = max(0.0, available_w - margin_left - margin_right - horizontal)
+        elif margin_left == "auto":
+            free = available_w - content_w - horizontal
+            margin_left = free / 2 if edges["mr"] == "auto" else free - edges["mr"]
+
+        self._set_boxes(element, x + margin_left, y, content_w, content_h or 0.0, edges)
+        is_bfc = element.style["overflow"] not in ("", "visible") or element.style["display"] == "flow-root"
+        collapse = not is_bfc and (edges["pt"] + edges["bt"] == 0 or (content_h is None and edges["pb"] + edges["bb"] == 0))
+        flow_height = self._layout_flow(element, owner, collapse_through=collapse)
+        if content_h is None:
+            content_h = flow_height
+            if content_h == 0 and (edges["mt"] not in (0.0, "auto") or edges["mb"] not in (0.0, "auto")):
+                raise StaticLayoutUnsupported("margin_collapse", f"空块 <{element.tag}>")
+            self._set_boxes(element, x + margin_left, y, content_w, content_h, edges)
+        if self._is_positioned(element):
+            self._layout_deferred(element)
+        return content_h + vertical
+
+    def _offset_relative(self, element: _Element, container: _Element):
+        _, _, width, height = container.content
+        left = self._px(element, "left", width)
+        top = self._px(element, "top", height)
+        dx = left if left is not None else -(self._px(element, "right", width) or 0.0)
+        dy = top if top is not None else -(self._px(element, "bottom", height) or 0.0)
+        if dx or dy:
+            for node in element.iter():
+                if node.box is not None:
+                    node.box = (node.box[0] + dx, node.box[1] + dy, node.box[2], node.box[3])
+                    node.content = (node.content[0] + dx, node.content[1] + dy, node.content[2], node.content[3])
+
+    # --- 绝对定位 ---
+
+    def _layout_absolute(self, element: _Element, owner: Optional[_Element]):
+        self._check_box(element)
+        if owner is None:
+            cb = (0.0, 0.0, float(SLIDE_WIDTH_PX), float(SLIDE_HEIGHT_PX))
+        else:
+            bx, by, bw, bh = owner.box
+            edges_owner = self._edges(owner, bw)
+            cb = (bx + edges_owner["bl"], by + edges_owner["bt"],
+                  bw - edges_owner["bl"] - edges_owner["br"], bh - edges_owner["bt"] - edges_owner["bb"])
+        cb_x, cb_y, cb_w, cb_h = cb
+
+        edges = self._edges(element, cb_w)
+        margins = {k: (0.0 if edges[k] == "auto" else edges[k]) for k in ("ml", "mr", "mt", "mb")}
+        left, right = self._px(element, "left", cb_w), self._px(element, "right", cb_w)
+        top, bottom = self._px(element, "top", cb_h), self._px(element, "bottom", cb_h)
+        width, height = self._px(element, "width", cb_w), self._px(element, "height", cb_h)
+
+        if element.tag == "img":
+            width, height = self._image_size(element, width, height)
+        content_w, content_h, horizontal, vertical = self._content_size(element, edges, width, height)
+
+        if content_w is None:
+            if left is None or right is None:
+                raise StaticLayoutUnsupported("shrink_to_fit", f"<{element.tag}> 未设置宽度")
+            content_w = max(0.0, cb_w - left - right - margins["ml"] - margins["mr"] - horizontal)
+        if content_h is None and top is not None and bottom is not None:
+            content_h = max(0.0, cb_h - top - bottom - margins["mt"] - margins["mb"] - vertical)
+
+        if left is not None:
+            x = cb_x + left + margins["ml"]
+        elif right is not None:
+            x = cb_x + cb_w - right - margins["mr"] - content_w - horizontal
+        else:
+            raise StaticLayoutUnsupported("static_position", f"<{element.tag}> 未设置 left/right")
+
+        if top is None and bottom is None:
+            raise StaticLayoutUnsupported("static_position", f"<{element.tag}> 未设置 top/bottom")
+
+        # 高度为 auto 时先按内容布局（y 暂定为 top，bottom 定位的元素布局后再平移）
+        y = cb_y + (top if top is not None else 0.0) + margins["mt"]
+        self._set_boxes(element, x, y, content_w, content_h or 0.0, edges)
+        if element.tag != "img":
+            flow_height = self._layout_flow(element, element)
+            if content_h is None:
+                content_h = flow_height
+        self._set_boxes(element, x, y, content_w, content_h, edges)
+
+        if top is None:
+            new_y = cb_y + cb_h - bottom - margins["mb"] - element.box[3]
+            self._shift(element, new_y - y)
+        self._layout_deferred(element)
+
+    def _shift(self, element: _Element, dy: float):
+        for node in element.iter():
+            if node.box is not None:
+                node.box = (node.box[0], node.box[1] + dy, node.box[2], node.box[3])
+                node.content = (node.content[0], node.content[1] + dy, node.content[2], node.content[3])
+
+    def _image_size(self, element: _Element, width: Optional[float], height: Optional[float]):
+        """图片尺寸：CSS > HTML 属性 > 按原图比例"""
+        for name in ("width", "height"):
+            attr = element.attrs.get(name, "").strip()
+            if attr and (width if name == "width" else height) is None:
+                try:
+                    value = float(attr.rstrip("px"))
+                except ValueError:
+                    raise StaticLayoutUnsupported("image_size", attr)
+                if name == "width":
+                    width = value
+                else:
+                    height = value
+        if width is None or height is None:
+            intrinsic = element.attrs.get("_intrinsic")
+            if not intrinsic:
+                raise StaticLayoutUnsupported("image_size", element.attrs.get("src", ""))
+            iw, ih = intrinsic
+            if width is None and height is None:
+                width, height = float(iw), float(ih)
+            elif width is None:
+                width = height * iw / ih
+            else:
+                height = width * ih / iw
+        return width, height
+
+    # --- 内联格式化上下文 ---
+
+    def _layout_inline(self, element: _Element) -> float:
+        """只含内联内容的块：按行数计算高度；唯一的内联图片按块内左上角放置"""
+        content_x, content_y, content_w, _ = element.content
+        children = [c for c in element.children if not (isinstance(c, str) and not c.strip())]
+        images = [c for c in children if isinstance(c, _Element) and c.tag == "img"]
+        if images:
+            if len(children) != 1 or element.style["height"] in ("auto", ""):
+                raise StaticLayoutUnsupported("inline_image", element.tag)
+            image = images[0]
+            self._check_box(image)
+            edges = self._edges(image, content_w)
+            if image.style["height"].strip().endswith("%"):
+                raise StaticLayoutUnsupported("css_percentage", "img height")
+            width, height = self._image_size(image, self._px(image, "width", content_w), self._px(image, "height", None))
+            line_height = element.style["line-height"] or element.style["font-size"] * 1.2
+            if height < line_height * 1.5:
+                raise StaticLayoutUnsupported("inline_image", "图片低于行高，基线对齐位置无法静态确定")
+            align = element.style["text-align"]
+            offset = {"center": (content_w - width) / 2, "right": content_w - width, "end": content_w - width}.get(align, 0.0)
+            self._set_boxes(image, content_x + offset, content_y, width, height, edges)
+            return height
+
+        style = element.style
+        if style["white-space"] not in ("normal", "nowrap"):
+            raise StaticLayoutUnsupported("white_space", style["white-space"])
+        if style["letter-spacing"] not in ("normal", "0", "0px", "0pt") or style["word-spacing"] not in ("normal", "0", "0px", "0pt"):
+            raise StaticLayoutUnsupported("letter_spacing", element.tag)
+        if (self._px(element, "text-indent", content_w) or 0.0) != 0.0:
+            raise StaticLayoutUnsupported("text_indent", element.tag)
+
+        runs: List[Optional[_Run]] = []
+        self._collect_runs(element, runs)
+        # 合并空白：连续空白折叠为一个，行首和 <br> 前后的空白去掉
+        text = "".join(r.text for r in runs if r is not None)
+        if not text.strip() and not any(r is None for r in runs):
+            return 0.0
+
+        has_cjk = any(_is_cjk(ch) for ch in text)
+        font_px = style["font-size"]
+        for run in runs:
+            if run is not None and run.font_px > font_px + 0.01:
+                raise StaticLayoutUnsupported("mixed_font_size", element.tag)
+        line_height = style["line-height"]
+        if line_height is None:
+            if has_cjk:
+                raise StaticLayoutUnsupported("line_height_normal", "CJK 文本的 normal 行高取决于回退字体")
+            line_height = font_px * _NORMAL_LINE_HEIGHT[_font_kind(style["font-family"])]
+
+        lines = _count_lines(runs, content_w, nowrap=style["white-space"] == "nowrap")
+        return lines * line_height
+
+    def _collect_runs(self, element: _Element, runs: List[Optional[_Run]]):
+        style = element.style
+        for child in element.children:
+            if isinstance(child, str):
+                text = re.sub(r'[ \t\n\r\f]+', " ", child)
+                if not text:
+                    continue
+                last = next((r for r in reversed(runs) if r is not None), None) if runs and runs[-1] is not None else None
+                if text.startswith(" ") and (last is None or last.text.endswith(" ")):
+                    text = text[1:]
+                if not text:
+                    continue
+                text = _apply_text_transform(text, style["text-transform"])
+                runs.append(_Run(text, style["font-size"], _font_kind(style["font-family"]), style["font-weight"] >= 600))
+                continue
+            if self._is_hidden(child):
+                self._mark_hidden(child)
+                continue
+            if child.tag == "br":
+                if runs and runs[-1] is not None:
+                    runs[-1].text = runs[-1].text.rstrip(" ")
+                runs.append(None)
+                continue
+            if self._is_absolute(child):
+                raise StaticLayoutUnsupported("inline_absolute", child.tag)
+            if child.style["display"] != "inline":
+                raise StaticLayoutUnsupported("display", f"{child.tag} {child.style['display']}")
+            if child.tag in ("sup", "sub", "img") or child.style["vertical-align"] not in ("", "baseline"):
+                raise StaticLayoutUnsupported("inline_vertical_align", child.tag)
+            edges = self._edges(child, 0.0)
+            if any(edges[k] not in (0.0, "auto") for k in ("ml", "mr", "pl", "pr", "bl", "br")):
+                raise StaticLayoutUnsupported("inline_box", child.tag)
+            if child.style["letter-spacing"] not in ("normal", "0", "0px", "0pt"):
+                raise StaticLayoutUnsupported("letter_spacing", child.tag)
+            self._collect_runs(child, runs)
+
+
+# ============ 提取（对应 extractSlideData） ============
+
+def _pt(px: float) -> float:
+    return px * PT_PER_PX
+
+
+def _inch(px: float) -> float:
+    return px / PX_PER_IN
+
+
+def _position(box) -> Dict[str, float]:
+    x, y, w, h = box
+    return {"x": _inch(x), "y": _inch(y), "w": _inch(w), "h": _inch(h)}
+
+
+def _is_bold(style) -> bool:
+    return style["font-weight"] >= 600 and _first_font(style["font-family"]).lower() != "impact"
+
+
+def _font_face(style) -> str:
+    return _first_font(style["font-family"])
+
+
+def _align(style) -> str:
+    return "left" if style["text-align"] == "start" else style["text-align"]
+
+
+def _line_spacing_pt(style) -> Optional[float]:
+    return _pt(style["line-height"]) if style["line-height"] is not None else None
+
+
+def _parse_inline_formatting(element: _Element, base_options: Dict[str, Any], runs: List[Dict[str, Any]],
+                             text_transform: str, errors: List[str]) -> List[Dict[str, Any]]:
+    """对应 parseInlineFormatting：内联 b/i/u/strong/em/span/br 转换为文本段"""
+    previous_is_text = False
+    for node in element.children:
+        is_text = isinstance(node, str) or node.tag == "br"
+        if is_text:
+            text = "\n" if not isinstance(node, str) else _apply_text_transform(re.sub(r'\s+', " ", node), text_transform)
+            if previous_is_text and runs:
+                runs[-1]["text"] += text
+            else:
+                runs.append({"text": text, "options": dict(base_options)})
+        elif node.text_content().strip():
+            options = dict(base_options)
+            style = node.style
+            transform = text_transform
+            if node.tag in ("span", "b", "strong", "i", "em", "u"):
+                if _is_bold(style):
+                    options["bold"] = True
+                if style["font-style"] == "italic":
+                    options["italic"] = True
+                if "underline" in style["text-decoration"]:
+                    options["underline"] = True
+                if style["color"][:3] != (0, 0, 0) or style["color"][3] != 1:
+                    options["color"] = _hex(style["color"])
+                    transparency = _alpha_transparency(style["color"])
+                    if transparency is not None:
+                        options["transparency"] = transparency
+                options["fontSize"] = _pt(style["font-size"])
+                if style["text-transform"] != "none":
+                    transform = style["text-transform"]
+                edges = {side: _length(style[f"margin-{side}"], style["font-size"], 0.0) for side in _SIDES}
+                for side in ("left", "right", "top", "bottom"):
+                    if (edges[side] or 0) > 0:
+                        errors.append(
+                            f"Inline element <{node.tag}> has margin-{side} which is not supported in PowerPoint. "
+                            "Remove margin from inline elements."
+                        )
+                _parse_inline_formatting(node, options, runs, transform, errors)
+        previous_is_text = is_text
+
+    if runs:
+        runs[0]["text"] = runs[0]["text"].lstrip()
+        runs[-1]["text"] = runs[-1]["text"].rstrip()
+    return [r for r in runs if r["text"]]
+
+
+def _descendants_include(element: _Element, tags) -> bool:
+    return any(node.tag in tags for node in element.iter() if node is not element)
+
+
+def _border_radius_in(style, box) -> float:
+    radius = (style["border-radius"] or "0").split()[0]
+    if radius.endswith("%"):
+        value = float(radius[:-1])
+        if value == 0:
+            return 0.0
+        if value >= 50:
+            return 1.0
+        return value / 100 * _inch(min(box[2], box[3]))
+    px = _length(radius, style["font-size"], 0.0) or 0.0
+    return px / PX_PER_IN
+
+
+def _parse_box_shadow(style) -> Optional[Dict[str, Any]]:
+    """对应 parseBoxShadow（按计算值格式：颜色在前，长度为 px）"""
+    value = style["box-shadow"]
+    if not value or value == "none" or "inset" in value:
+        return None
+    if "," in _split_top_level(value, ",")[0] or len(_split_top_level(value, ",")) > 1:
+        raise StaticLayoutUnsupported("box_shadow", "多重阴影")
+    color, lengths = style["color"], []
+    for token in _tokens(value):
+        parsed = _parse_color(token)
+        if parsed is not None and not _LENGTH_RE.match(token):
+            color = parsed
+        else:
+            lengths.append(_length(token, style["font-size"], 0.0) or 0.0)
+    if len(lengths) < 2:
+        return None
+    offset_x, offset_y = lengths[0], lengths[1]
+    blur = lengths[2] if len(lengths) > 2 else 0.0
+    angle = 0.0
+    if offset_x or offset_y:
+        angle = math.degrees(math.atan2(offset_y, offset_x))
+        if angle < 0:
+            angle += 360
+    # 计算值中 alpha 为 1 的颜色写作 rgb(r, g, b)，html2pptx 的正则此时取到的是蓝色分量，这里保持一致
+    opacity = round(color[3], 3) if color[3] < 1 else float(color[2])
+    return {
+        "type": "outer",
+        "angle": round(angle),
+        "blur": blur * 0.75,
+        "color": _hex(color),
+        "offset": (offset_x ** 2 + offset_y ** 2) ** 0.5 * PT_PER_PX,
+        "opacity": opacity,
+    }
+
+
+def _resolve_src(src: str, base_dir: Path) -> str:
+    src = src.strip()
+    if src.startswith("file://"):
+        return unquote(src[len("file://"):])
+    if src.startswith(("http://", "https://", "data:", "//")):
+        raise StaticLayoutUnsupported("remote_image", src[:60])
+    path = Path(unquote(src))
+    return str(path if path.is_absolute() else (base_dir / path).resolve())
+
+
+def _extract(document: _Element, base_dir: Path) -> Dict[str, Any]:
+    html = next(e for e in document.elements() if e.tag == "html")
+    body = next(e for e in html.elements() if e.tag == "body")
+    errors: List[str] = []
+
+    background_image = body.style["background-image"]
+    if "gradient(" in background_image:
+        errors.append(
+            "CSS gradients are not supported. Use Sharp to rasterize gradients as PNG images first, "
+            "then reference with background-image: url('gradient.png')"
+        )
+    url = _URL_RE.search(background_image) if background_image != "none" else None
+    if url:
+        background = {"type": "image", "path": _resolve_src(url.group(1), base_dir)}
+    else:
+        background = {"type": "color", "value": _hex(body.style["background-color"])}
+
+    elements: List[Dict[str, Any]] = []
+    placeholders: List[Dict[str, Any]] = []
+    processed = set()
+
+    for el in html.iter():
+        if id(el) in processed:
+            continue
+        style = el.style
+        box = el.box or (0.0, 0.0, 0.0, 0.0)
+        tag = el.tag.upper()
+        text_tag = el.tag in TEXT_TAGS
+
+        if text_tag:
+            has_bg = style["background-color"][3] > 0
+            has_border = any(style[f"border-{side}-width"] > 0 for side in _SIDES)
+            has_shadow = style["box-shadow"] not in ("", "none")
+            if has_bg or has_border or has_shadow:
+                kind = "background" if has_bg else "border" if has_border else "shadow"
+                errors.append(
+                    f"Text element <{el.tag}> has {kind}. "
+                    "Backgrounds, borders, and shadows are only supported on <div> elements, not text elements."
+                )
+                continue
+
+        if "placeholder" in (el.attrs.get("class") or ""):
+            if box[2] == 0 or box[3] == 0:
+                errors.append(f"Placeholder \"{el.attrs.get('id') or 'unnamed'}\" has {'width: 0' if box[2] == 0 else 'height: 0'}. Check the layout CSS.")
+            else:
+                placeholders.append({"id": el.attrs.get("id") or f"placeholder-{len(placeholders)}", **_position(box)})
+            processed.add(id(el))
+            continue
+
+        if tag == "IMG":
+            if box[2] > 0 and box[3] > 0:
+                elements.append({"type": "image", "src": _resolve_src(el.attrs.get("src", ""), base_dir), "position": _position(box)})
+                processed.add(id(el))
+                continue
+
+        if tag == "DIV":
+            has_bg = style["background-color"][3] > 0
+            for node in el.children:
+                if isinstance(node, str) and node.strip():
+                    text = node.strip()
+                    errors.append(
+                        f"DIV element contains unwrapped text \"{text[:50]}{'...' if len(text) > 50 else ''}\". "
+                        "All text must be wrapped in <p>, <h1>-<h6>, <ul>, or <ol> tags to appear in PowerPoint."
+                    )
+            if style["background-image"] not in ("", "none"):
+                errors.append(
+                    "Background images on DIV elements are not supported. "
+                    "Use solid colors or borders for shapes, or use slide.addImage() in PptxGenJS to layer images."
+                )
+                continue
+            borders = [style[f"border-{side}-width"] for side in _SIDES]
+            has_border = any(b > 0 for b in borders)
+            uniform = has_border and all(b == borders[0] for b in borders)
+            border_lines = []
+            if has_border and not uniform:
+                x, y, w, h = (_inch(v) for v in box)
+                for side, width_px in zip(_SIDES, borders):
+                    if width_px <= 0:
+                        continue
+                    width_pt = _pt(width_px)
+                    inset = (width_pt / 72) / 2
+                    color = _hex(style[f"border-{side}-color"])
+                    coords = {
+                        "top": (x, y + inset, x + w, y + inset),
+                        "right": (x + w - inset, y, x + w - inset, y + h),
+                        "bottom": (x, y + h - inset, x + w, y + h - inset),
+                        "left": (x + inset, y, x + inset, y + h),
+                    }[side]
+                    border_lines.append({"type": "line", "x1": coords[0], "y1": coords[1], "x2": coords[2], "y2": coords[3],
+                                         "width": width_pt, "color": color})
+            if (has_bg or has_border) and box[2] > 0 and box[3] > 0:
+                if has_bg or uniform:
+                    elements.append({
+                        "type": "shape",
+                        "text": "",
+                        "position": _position(box),
+                        "shape": {
+                            "fill": _hex(style["background-color"]) if has_bg else None,
+                            "transparency": _alpha_transparency(style["background-color"]) if has_bg else None,
+                            "line": {"color": _hex(style["border-top-color"]), "width": _pt(borders[0])} if uniform else None,
+                            "rectRadius": _border_radius_in(style, box),
+                            "shadow": _parse_box_shadow(style),
+                        },
+                    })
+                elements.extend(border_lines)
+                processed.add(id(el))
+                continue
+
+        if tag in ("UL", "OL"):
+            if box[2] == 0 or box[3] == 0:
+                continue
+            items_elements = [node for node in el.iter() if node.tag == "li"]
+            items: List[Dict[str, Any]] = []
+            padding_left_pt = _pt(_length(style["padding-left"], style["font-size"], 0.0) or 0.0)
+            margin_left, text_indent = padding_left_pt * 0.5, padding_left_pt * 0.5
+            for index, li in enumerate(items_elements):
+                # 列表项不应用 text-transform（与 html2pptx 一致）
+                runs = _parse_inline_formatting(li, {"breakLine": False}, [], "none", errors)
+                if runs:
+                    runs[0]["text"] = re.sub(r'^[•\-\*▪▸]\s*', "", runs[0]["text"])
+                    runs[0]["options"]["bullet"] = {"indent": text_indent}
+                    if index != len(items_elements) - 1:
+                        runs[-1]["options"]["breakLine"] = True
+                items.extend(runs)
+            first = (items_elements[0] if items_elements else el).style
+            elements.append({
+                "type": "list",
+                "items": items,
+                "position": _position(box),
+                "style": {
+                    "fontSize": _pt(first["font-size"]),
+                    "fontFace": _font_face(first),
+                    "color": _hex(first["color"]),
+                    "transparency": _alpha_transparency(first["color"]),
+                    "align": _align(first),
+                    "lineSpacing": _line_spacing_pt(first),
+                    "paraSpaceBefore": 0,
+                    "paraSpaceAfter": _pt(_length(first["margin-bottom"], first["font-size"], 0.0) or 0.0),
+                    "margin": [margin_left, 0, 0, 0],
+                },
+            })
+            for li in items_elements:
+                processed.add(id(li))
+            processed.add(id(el))
+            continue
+
+        if not text_tag:
+            continue
+        text = el.text_content().strip()
+        if box[2] == 0 or box[3] == 0 or not text:
+            continue
+        if el.tag != "li" and re.match(r'^[•\-\*▪▸○●◆◇■□]\s', text):
+            errors.append(
+                f"Text element <{el.tag}> starts with bullet symbol \"{text[:20]}...\". "
+                "Use <ul> or <ol> lists instead of manual bullet symbols."
+            )
+            continue
+
+        content_w = box[2]
+        edges = {side: _length(style[f"padding-{side}"], style["font-size"], content_w) or 0.0 for side in _SIDES}
+        base_style = {
+            "fontSize": _pt(style["font-size"]),
+            "fontFace": _font_face(style),
+            "color": _hex(style["color"]),
+            "align": _align(style),
+            "lineSpacing": _line_spacing_pt(style),
+            "paraSpaceBefore": _pt(_length(style["margin-top"], style["font-size"], content_w) or 0.0),
+            "paraSpaceAfter": _pt(_length(style["margin-bottom"], style["font-size"], content_w) or 0.0),
+            "margin": [_pt(edges["left"]), _pt(edges["right"]), _pt(edges["bottom"]), _pt(edges["top"])],
+        }
+        transparency = _alpha_transparency(style["color"])
+        if transparency is not None:
+            base_style["transparency"] = transparency
+
+        if _descendants_include(el, {"b", "i", "u", "strong", "em", "span", "br"}):
+            runs = _parse_inline_formatting(el, {}, [], style["text-transform"], errors)
+            adjusted = dict(base_style)
+            if adjusted["lineSpacing"]:
+                max_font = max([adjusted["fontSize"]] + [r["options"].get("fontSize", 0) for r in runs])
+                if max_font > adjusted["fontSize"]:
+                    adjusted["lineSpacing"] = max_font * adjusted["lineSpacing"] / adjusted["fontSize"]
+            elements.append({"type": el.tag, "text": runs, "position": _position(box), "style": adjusted})
+        else:
+            elements.append({
+                "type": el.tag,
+                "text": _apply_text_transform(text, style["text-transform"]),
+                "position": _position(box),
+                "style": {
+                    **base_style,
+                    "bold": _is_bold(style),
+                    "italic": style["font-style"] == "italic",
+                    "underline": "underline" in style["text-decoration"],
+                },
+            })
+        processed.add(id(el))
+
+    return {"background": background, "elements": elements, "placeholders": placeholders, "errors": errors}
+
+
+def _attach_image_sizes(document: _Element, base_dir: Path):
+    """为缺少宽/高的图片读取原图尺寸"""
+    for element in document.iter():
+        if element.tag != "img":
+            continue
+        src = element.attrs.get("src", "")
+        try:
+            path = _resolve_src(src, base_dir)
+        except StaticLayoutUnsupported:
+            continue
+        if not os.path.isfile(path):
+            raise StaticLayoutUnsupported("missing_image", src[:60])
+        try:
+            from PIL import Image
+            with Image.open(path) as image:
+                element.attrs["_intrinsic"] = image.size
+        except Exception:
+            element.attrs["_intrinsic"] = None
+
+
+def extract_slide_data(html_text: str, base_dir: Union[str, Path]) -> Dict[str, Any]:
+    """
+    静态计算单页 HTML 的 slideData（与 html2pptx.js extractSlideData 的返回结构相同）
+
+    Args:
+        html_text: 转换版 HTML（图片为本地相对路径）
+        base_dir: HTML 所在目录，用于解析图片路径
+
+    Raises:
+        StaticLayoutUnsupported: 页面几何无法静态确定（reason 属性为原因代码）
+    """
+    base_dir = Path(base_dir)
+    builder = _TreeBuilder()
+    try:
+        builder.feed(html_text)
+        builder.close()
+    except StaticLayoutUnsupported:
+        raise
+    except Exception as e:
+        raise StaticLayoutUnsupported("parse_error", str(e))
+
+    document = builder.root
+    if not any(e.tag == "html" for e in document.elements()):
+        raise StaticLayoutUnsupported("no_html")
+
+    rules = []
+    for css in builder.css:
+        rules.extend(_parse_stylesheet(css, order_start=len(rules)))
+    _attach_image_sizes(document, base_dir)
+
+    layout = _Layout(document, _StyleResolver(rules))
+    layout.compute_styles()
+    layout.run()
+    return _extract(document, base_dir)
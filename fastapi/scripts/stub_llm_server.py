@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+本地 LLM 桩服务
+
+模拟 OpenRouter 的 /api/v1/chat/completions 接口，返回固定的 HTML 幻灯片，
+用于在不访问真实 LLM 的情况下联调 HTML 生成链路（缓存、限流重试、对冲、Prompt 缓存统计等）
+
+- 系统消息带 cache_control 时模拟提供方 Prompt 缓存：同一系统提示词第二次出现起，
+  usage.prompt_tokens_details.cached_tokens 返回系统提示词的 token 数
+- --fail-first N 让前 N 个请求返回 --fail-status（默认 429，带 Retry-After）
+- --delay 模拟模型延迟
+- --truncate-rounds N 把输出切成 N+1 段，前 N 段以 finish_reason=length 返回；
+  续写请求从 assistant 消息中已输出内容的末尾接着返回下一段，用于联调截断续写
+
+用法:
+    python scripts/stub_llm_server.py [--port 8900] [--delay 0.5] [--fail-first 0]
+    OPENROUTER_API_URL=http://127.0.0.1:8900/api/v1/chat/completions python main.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import sys
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.token_budget import estimate_messages_tokens, estimate_text_tokens
+
+STUB_HTML = """```html
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<style>
+body { width: 720pt; height: 405pt; margin: 0; font-family: Arial, sans-serif; }
+h1 { position: absolute; left: 40pt; top: 30pt; font-size: 32pt; margin: 0; }
+p { position: absolute; left: 40pt; top: 100pt; width: 640pt; font-size: 16pt; margin: 0; }
+</style>
+</head>
+<body>
+<h1>Stub Slide</h1>
+<p>Generated by stub_llm_server.py</p>
+</body>
+</html>
+```"""
+
+app = FastAPI(title="Stub LLM Server")
+config = {"delay": 0.0, "fail_first": 0, "fail_status": 429, "retry_after": 1, "truncate_rounds": 0}
+state = {"requests": 0, "failed": 0, "cached_requests": 0, "seen_prefixes": set(), "by_model": {}}
+
+
+def _system_prefix(messages: list):
+    """返回带 cache_control 的系统提示词文本（无标记时返回 None）"""
+    for message in messages:
+        if message.get("role") != "system" or not isinstance(message.get("content"), list):
+            continue
+        for part in message["content"]:
+            if part.get("cache_control"):
+                return part.get("text", "")
+    return None
+
+
+def _completion(messages: list):
+    """返回 (content, finish_reason)；开启截断时从已输出内容的末尾返回下一段"""
+    rounds = config["truncate_rounds"]
+    if rounds <= 0:
+        return STUB_HTML, "stop"
+    step = -(-len(STUB_HTML) // (rounds + 1))
+    start = sum(len(m.get("content") or "") for m in messages if m.get("role") == "assistant")
+    end = start + step
+    return STUB_HTML[start:end], "length" if end < len(STUB_HTML) else "stop"
+
+
+@app.post("/api/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    state["requests"] += 1
+    model = body.get("model", "stub")
+    state["by_model"][model] = state["by_model"].get(model, 0) + 1
+
+    if state["requests"] <= config["fail_first"]:
+        state["failed"] += 1
+        return JSONResponse(
+            status_code=config["fail_status"],
+            content={"error": {"message": "stub failure", "code": config["fail_status"]}},
+            headers={"Retry-After": str(config["retry_after"])},
+        )
+
+    if config["delay"]:
+        await asyncio.sleep(config["delay"])
+
+    messages = body.get("messages", [])
+    prompt_tokens = estimate_messages_tokens(messages)
+    cached_tokens = 0
+    prefix = _system_prefix(messages)
+    if prefix is not None:
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        if digest in state["seen_prefixes"]:
+            cached_tokens = estimate_text_tokens(prefix)
+            state["cached_requests"] += 1
+        state["seen_prefixes"].add(digest)
+
+    content, finish_reason = _completion(messages)
+    completion_tokens = estimate_text_tokens(content)
+    return {
+        "id": f"stub-{state['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": state["requests"],
+        "failed": state["failed"],
+        "cached_requests": state["cached_requests"],
+        "by_model": state["by_model"],
+        "config": config,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 LLM 桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--fail-first", type=int, default=0, help="前 N 个请求返回错误")
+    parser.add_argument("--fail-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--truncate-rounds", type=int, default=0, help="输出被截断的轮数（测试续写）")
+    args = parser.parse_args()
+
+    config.update({
+        "delay": args.delay,
+        "fail_first": args.fail_first,
+        "fail_status": args.fail_status,
+        "retry_after": args.retry_after,
+        "truncate_rounds": args.truncate_rounds,
+    })
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@
 
 import asyncio
 import time
+import contextvars
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
@@ -22,6 +23,10 @@ class TaskStatus(str, Enum):
     FAILED = "failed"        # 处理失败
 
 
+# 当前正在执行的任务（worker 调用处理函数前设置，处理函数内派生的协程会继承）
+_current_task: contextvars.ContextVar = contextvars.ContextVar("current_task", default=None)
+
+
 @dataclass
 class Task:
     task_id: str
@@ -33,6 +38,7 @@ class Task:
     created_at: float = field(default_factory=time.time)
     started_at: Optional[float] = None
     completed_at: Optional[float] = None
+    progress: Optional[Dict[str, Any]] = None  # 处理函数通过 report_progress 上报的进度
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -41,6 +47,7 @@ class Task:
             "status": self.status.value,
             "result": self.result,
             "error": self.error,
+            "progress": self.progress,
             "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
             "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
             "completed_at": datetime.fromtimestamp(self.completed_at).isoformat() if self.completed_at else None,
@@ -167,6 +174,7 @@ class TaskQueue:
                 
                 try:
                     handler = self.handlers[task.task_type]
+                    _current_task.set(task)
                     result = await handler(task.params)
                     
                     task.status = TaskStatus.COMPLETED
@@ -215,5 +223,19 @@ class TaskQueue:
                 logger.info(f"[TaskQueue] 清理 {len(to_remove)} 个过期任务")
 
 
+def report_progress(**fields):
+    """
+    更新当前任务的进度（在任务处理函数内调用，不在任务中时忽略）
+
+    示例: report_progress(stage="converting", completed=3, total=10)
+    """
+    task = _current_task.get()
+    if task is None:
+        return
+    if task.progress is None:
+        task.progress = {}
+    task.progress.update(fields)
+
+
 # 全局任务队列实例
 task_queue = TaskQueue(max_workers=3, max_queue_size=100)
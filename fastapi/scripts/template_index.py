@@ -0,0 +1,379 @@
+"""
+版式模板检索模块
+以 _middle.json 提炼出的版式签名（块类型 + 量化 bbox + 行数）为键，保存 LLM 生成过的 HTML 模板；
+新页面的版式与已有模板足够接近时，把新的 OCR 文本和图片引用填入模板，跳过 LLM 调用
+
+模板入库条件：模板中每一行 OCR 文本和每个图片引用都能在 HTML 中唯一定位（替换为槽位），
+且替换后不再有任何可见文本（LLM 自行添加的文字会原样出现在复用者的页面中），否则不入库
+
+模板按作用域（用户或整套幻灯片）隔离存储，不同作用域之间互不可见；未提供作用域时不读写模板
+"""
+
+import os
+import json
+import re
+import html
+import hashlib
+import threading
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from scripts.layout_distiller import distill_layout
+
+logger = logging.getLogger(__name__)
+
+# 配置
+TEMPLATE_INDEX_ENABLED = os.getenv("TEMPLATE_INDEX_ENABLED", "false").lower() == "true"
+TEMPLATE_INDEX_DIR = Path(os.getenv("TEMPLATE_INDEX_DIR", str(Path(__file__).parent.parent / "cache" / "templates")))
+TEMPLATE_GRID_PT = float(os.getenv("TEMPLATE_GRID_PT", "24"))  # 签名中 bbox 的量化步长（pt）
+TEMPLATE_MATCH_THRESHOLD = float(os.getenv("TEMPLATE_MATCH_THRESHOLD", "0.85"))
+TEMPLATE_MAX_PER_SHAPE = int(os.getenv("TEMPLATE_MAX_PER_SHAPE", "20"))  # 同一结构下最多保留的模板数
+
+# 新文本比原文本长出该比例以上时按比例降低置信度（避免溢出文本框）
+_LENGTH_TOLERANCE = 1.2
+
+_TEXT_SLOT = "{{{{slot:{}}}}}"
+_IMAGE_SLOT = "{{{{image:{}}}}}"
+_SLOT_PATTERN = re.compile(r"\{\{(?:slot|image):\d+\}\}")
+
+
+class _VisibleText(HTMLParser):
+    """收集可见文本节点（跳过 head / style / script 中的内容）"""
+
+    _HIDDEN = {"head", "style", "script", "title", "template", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hidden_depth = 0
+        self.texts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._HIDDEN:
+            self.hidden_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._HIDDEN and self.hidden_depth:
+            self.hidden_depth -= 1
+
+    def handle_data(self, data):
+        if not self.hidden_depth and data.strip():
+            self.texts.append(data)
+
+
+def _has_non_slot_text(template_html: str) -> bool:
+    """模板中是否还有槽位以外的可见文本"""
+    parser = _VisibleText()
+    parser.feed(template_html)
+    parser.close()
+    return any(_SLOT_PATTERN.sub("", text).strip() for text in parser.texts)
+
+
+def _slide_blocks(layout_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """提取每个块的类型、bbox（幻灯片 pt）、行文本和图片引用"""
+    blocks = []
+    for block in distill_layout(layout_json, "lines").get("blocks", []):
+        if "lines" in block:
+            lines = [line["text"] for line in block["lines"]]
+        elif block.get("text"):
+            lines = block["text"].split("\n")
+        else:
+            lines = []
+        blocks.append({
+            "type": block.get("type", "text"),
+            "bbox": block.get("bbox", [0, 0, 0, 0]),
+            "lines": lines,
+            "image": block.get("image"),
+        })
+    return blocks
+
+
+def shape_key(blocks: List[Dict[str, Any]]) -> str:
+    """结构键：块类型、行数和是否含图片的序列（候选模板必须完全一致）"""
+    parts = [f"{b['type']}:{len(b['lines'])}:{int(bool(b['image']))}" for b in blocks]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def layout_signature(layout_json: Dict[str, Any]) -> str:
+    """版式签名：块类型 + 按 TEMPLATE_GRID_PT 量化的 bbox + 行数"""
+    parts = []
+    for b in _slide_blocks(layout_json):
+        grid = [round(v / TEMPLATE_GRID_PT) for v in b["bbox"]]
+        parts.append(f"{b['type']}@{','.join(map(str, grid))}#{len(b['lines'])}")
+    return ";".join(parts)
+
+
+def _iou(a: List[float], b: List[float]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 1.0
+
+
+def _snap(value: float) -> float:
+    """按网格吸附，网格内的细微位移不影响匹配"""
+    return round(value / TEMPLATE_GRID_PT) * TEMPLATE_GRID_PT
+
+
+def match_confidence(template_blocks: List[Dict[str, Any]], blocks: List[Dict[str, Any]]) -> float:
+    """
+    计算新页面与模板的匹配置信度（0~1）
+
+    结构键一致的前提下，取各块吸附网格后 bbox IoU 的均值，
+    再按新文本相对模板文本的长度超出程度降权
+    """
+    if not blocks:
+        return 0.0
+    ious = [
+        _iou([_snap(v) for v in t["bbox"]], [_snap(v) for v in b["bbox"]])
+        for t, b in zip(template_blocks, blocks)
+    ]
+    factors = []
+    for t, b in zip(template_blocks, blocks):
+        for old, new in zip(t["lines"], b["lines"]):
+            ratio = len(new) / max(1, len(old))
+            factors.append(min(1.0, _LENGTH_TOLERANCE / ratio) if ratio > 0 else 1.0)
+    length_factor = sum(factors) / len(factors) if factors else 1.0
+    return round(sum(ious) / len(ious) * length_factor, 4)
+
+
+def _outside_tags(html_text: str, pos: int) -> bool:
+    """pos 处是否位于文本节点中（不在标签或属性内）"""
+    return html_text.rfind("<", 0, pos) <= html_text.rfind(">", 0, pos)
+
+
+def _find_unique(html_text: str, needle: str, text_only: bool) -> int:
+    """在 HTML 中查找唯一出现的 needle，返回位置，不唯一或不存在时返回 -1"""
+    positions = []
+    start = 0
+    while True:
+        pos = html_text.find(needle, start)
+        if pos < 0:
+            break
+        if not text_only or _outside_tags(html_text, pos):
+            positions.append(pos)
+        start = pos + 1
+    return positions[0] if len(positions) == 1 else -1
+
+
+def make_template(layout_json: Dict[str, Any], html_text: str) -> Optional[Dict[str, Any]]:
+    """
+    从 LLM 生成的 HTML 创建模板（文本和图片引用替换为槽位）
+
+    Args:
+        layout_json: 该页的 _middle.json
+        html_text: 清理后、尚未替换为完整图片 URL 的 HTML（图片为 images/xxx 相对路径）
+
+    Returns:
+        模板字典，无法安全创建时返回 None
+    """
+    if "{{slot:" in html_text or "{{image:" in html_text:
+        return None
+
+    blocks = _slide_blocks(layout_json)
+    replacements: List[Tuple[int, int, str]] = []
+    slot = 0
+    for block_index, block in enumerate(blocks):
+        for line in block["lines"]:
+            needle = html.escape(line.strip(), quote=False)
+            if len(needle) < 2:
+                return None
+            pos = _find_unique(html_text, needle, text_only=True)
+            if pos < 0:
+                return None
+            replacements.append((pos, pos + len(needle), _TEXT_SLOT.format(slot)))
+            slot += 1
+        if block["image"]:
+            pos = _find_unique(html_text, block["image"], text_only=False)
+            if pos < 0:
+                return None
+            replacements.append((pos, pos + len(block["image"]), _IMAGE_SLOT.format(block_index)))
+
+    # 槽位之间不能重叠
+    replacements.sort()
+    for (s1, e1, _), (s2, _, _) in zip(replacements, replacements[1:]):
+        if s2 < e1:
+            return None
+
+    parts, cursor = [], 0
+    for start, end, marker in replacements:
+        parts.append(html_text[cursor:start])
+        parts.append(marker)
+        cursor = end
+    parts.append(html_text[cursor:])
+    template_html = "".join(parts)
+
+    if _has_non_slot_text(template_html):
+        return None
+
+    return {
+        "shape": shape_key(blocks),
+        "signature": layout_signature(layout_json),
+        "blocks": [{"type": b["type"], "bbox": b["bbox"], "lines": b["lines"], "image": b["image"]} for b in blocks],
+        "html": template_html,
+    }
+
+
+def _scope_key(scope: str) -> str:
+    return hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+
+
+def fill_template(template: Dict[str, Any], blocks: List[Dict[str, Any]]) -> str:
+    """把新页面的文本和图片引用填入模板"""
+    result = template["html"]
+    slot = 0
+    for block_index, block in enumerate(blocks):
+        for line in block["lines"]:
+            result = result.replace(_TEXT_SLOT.format(slot), html.escape(line.strip(), quote=False), 1)
+            slot += 1
+        if block["image"]:
+            result = result.replace(_IMAGE_SLOT.format(block_index), block["image"], 1)
+    return result
+
+
+class TemplateIndex:
+    """磁盘持久化的版式模板索引（按 作用域/结构键 分桶，内存中常驻）"""
+
+    def __init__(self, index_dir: Path, threshold: float, max_per_shape: int, enabled: bool = True):
+        self.index_dir = Path(index_dir)
+        self.threshold = threshold
+        self.max_per_shape = max_per_shape
+        self.enabled = enabled
+        self._buckets: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._lock = threading.Lock()
+        self._generation_seconds: List[float] = []
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,           # 没有同结构的模板
+            "below_threshold": 0,  # 有候选但置信度不足，回退到 LLM
+            "stored": 0,
+            "store_skipped": 0,    # HTML 中无法定位全部文本/图片，未入库
+            "time_saved_seconds": 0.0,
+        }
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._buckets is None:
+            buckets: Dict[str, List[Dict[str, Any]]] = {}
+            if self.index_dir.exists():
+                for path in sorted(self.index_dir.glob("*/*/*.json"), key=lambda p: p.stat().st_mtime):
+                    try:
+                        template = json.loads(path.read_text(encoding="utf-8"))
+                        template["id"] = path.stem
+                        template["scope_key"] = path.parent.parent.name
+                        buckets.setdefault(f"{template['scope_key']}/{template['shape']}", []).append(template)
+                    except Exception as e:
+                        logger.warning(f"[TemplateIndex] 读取模板失败 {path}: {e}")
+            self._buckets = buckets
+            logger.info(f"[TemplateIndex] 已加载 {sum(len(v) for v in buckets.values())} 个模板")
+        return self._buckets
+
+    def lookup(self, layout_json: Dict[str, Any], scope: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        在作用域内查找匹配的模板并填充
+
+        Args:
+            scope: 作用域（用户 ID 或整套幻灯片 ID），为空时不查找
+
+        Returns:
+            {"html", "template_id", "confidence", "time_saved_seconds"}，未命中时返回 None
+        """
+        if not self.enabled or not scope:
+            return None
+        self.stats["lookups"] += 1
+        blocks = _slide_blocks(layout_json)
+        if not blocks:
+            self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            candidates = list(self._load().get(f"{_scope_key(scope)}/{shape_key(blocks)}", []))
+        if not candidates:
+            self.stats["misses"] += 1
+            return None
+
+        best, best_confidence = None, 0.0
+        for template in candidates:
+            confidence = match_confidence(template["blocks"], blocks)
+            if confidence > best_confidence:
+                best, best_confidence = template, confidence
+
+        if best is None or best_confidence < self.threshold:
+            self.stats["below_threshold"] += 1
+            logger.info(f"[TemplateIndex] 最佳模板置信度 {best_confidence:.2f} < {self.threshold}，使用 LLM 生成")
+            return None
+
+        saved = self.average_generation_seconds()
+        self.stats["hits"] += 1
+        self.stats["time_saved_seconds"] += saved
+        logger.info(f"[TemplateIndex] 命中模板 {best['id']}（置信度 {best_confidence:.2f}）")
+        return {
+            "html": fill_template(best, blocks),
+            "template_id": best["id"],
+            "confidence": best_confidence,
+            "time_saved_seconds": round(saved, 2),
+        }
+
+    def store(self, layout_json: Dict[str, Any], html_text: str, scope: Optional[str]) -> Optional[str]:
+        """尝试把 LLM 生成的 HTML 存入作用域，返回模板 ID（无法入库或没有作用域时返回 None）"""
+        if not self.enabled or not scope:
+            return None
+        template = make_template(layout_json, html_text)
+        if template is None or not template["blocks"]:
+            self.stats["store_skipped"] += 1
+            return None
+
+        scope_key = _scope_key(scope)
+        template_id = hashlib.sha256(template["html"].encode("utf-8")).hexdigest()[:16]
+        path = self.index_dir / scope_key / template["shape"] / f"{template_id}.json"
+        with self._lock:
+            bucket = self._load().setdefault(f"{scope_key}/{template['shape']}", [])
+            if any(t["id"] == template_id for t in bucket):
+                return template_id
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(template, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+            template["id"] = template_id
+            template["scope_key"] = scope_key
+            bucket.append(template)
+            # 超出上限时淘汰最早入库的模板
+            while len(bucket) > self.max_per_shape:
+                old = bucket.pop(0)
+                (self.index_dir / old["scope_key"] / old["shape"] / f"{old['id']}.json").unlink(missing_ok=True)
+
+        self.stats["stored"] += 1
+        return template_id
+
+    def record_generation(self, seconds: float):
+        """记录一次 LLM 生成耗时（用于估算命中模板节省的时间）"""
+        self._generation_seconds.append(seconds)
+        del self._generation_seconds[:-100]
+
+    def average_generation_seconds(self) -> float:
+        if not self._generation_seconds:
+            return 0.0
+        return sum(self._generation_seconds) / len(self._generation_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "templates": sum(len(v) for v in self._buckets.values()) if self._buckets is not None else None,
+            **self.stats,
+            "time_saved_seconds": round(self.stats["time_saved_seconds"], 1),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "avg_generation_seconds": round(self.average_generation_seconds(), 2),
+        }
+
+
+# 全局模板索引实例
+template_index = TemplateIndex(
+    index_dir=TEMPLATE_INDEX_DIR,
+    threshold=TEMPLATE_MATCH_THRESHOLD,
+    max_per_shape=TEMPLATE_MAX_PER_SHAPE,
+    enabled=TEMPLATE_INDEX_ENABLED,
+)
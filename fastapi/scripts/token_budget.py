@@ -0,0 +1,136 @@
+"""
+离线 token 估算模块
+在发送请求前本地估算 Prompt 的 token 数（文本 + 图片），不访问任何网络
+
+文本: 默认使用内置的正则分词估算（英文单词 / 数字 / CJK 字符 / 标点分别计数），
+      设置 TOKEN_ESTIMATOR=tiktoken 且已安装 tiktoken（编码文件已缓存在本地）时使用 tiktoken
+图片: 按常见 VLM 的切片规则估算（缩放到 2048 以内、短边 768，每 512px 切片计费）
+"""
+
+import os
+import re
+import math
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置
+TOKEN_ESTIMATOR = os.getenv("TOKEN_ESTIMATOR", "regex")  # regex / tiktoken
+IMAGE_BASE_TOKENS = int(os.getenv("IMAGE_BASE_TOKENS", "85"))
+IMAGE_TILE_TOKENS = int(os.getenv("IMAGE_TILE_TOKENS", "170"))
+IMAGE_UNKNOWN_TOKENS = int(os.getenv("IMAGE_UNKNOWN_TOKENS", "1105"))  # 无法获取尺寸时（如公开 URL）的估算值
+
+# 预分词正则：英文单词、数字（每 3 位一组）、CJK 单字、空白、其它单个符号
+_PIECE_RE = re.compile(
+    r"[A-Za-z]+"
+    r"|\d{1,3}"
+    r"|[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]"
+    r"|\s+"
+    r"|[^\sA-Za-z\d]"
+)
+
+_tiktoken_encoding = None
+_tiktoken_failed = False
+
+
+def _get_tiktoken():
+    """懒加载 tiktoken 编码，失败后不再重试"""
+    global _tiktoken_encoding, _tiktoken_failed
+    if _tiktoken_encoding is not None or _tiktoken_failed:
+        return _tiktoken_encoding
+    try:
+        import tiktoken
+        _tiktoken_encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        _tiktoken_failed = True
+        logger.warning(f"[TokenBudget] tiktoken 不可用，改用正则估算: {e}")
+    return _tiktoken_encoding
+
+
+def _regex_token_count(text: str) -> int:
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isspace():
+            # 单个空格通常并入下一个 token，连续空白/换行单独计数
+            if len(piece) > 1 or first != " ":
+                count += 1
+        elif first.isascii() and first.isalpha():
+            # 常见短词为 1 个 token，长词约每 4 个字母 1 个 token
+            count += 1 if len(piece) <= 6 else math.ceil(len(piece) / 4)
+        else:
+            count += 1
+    return count
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    if TOKEN_ESTIMATOR == "tiktoken":
+        encoding = _get_tiktoken()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    return _regex_token_count(text)
+
+
+def estimate_image_tokens(size: Optional[Tuple[int, int]]) -> int:
+    """
+    估算图片的 token 数
+
+    Args:
+        size: (宽, 高) 像素，None 表示未知
+    """
+    if not size or not size[0] or not size[1]:
+        return IMAGE_UNKNOWN_TOKENS
+
+    width, height = size
+    # 先缩放到 2048x2048 以内，再把短边缩放到 768
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_prompt_tokens(
+    system_prompt: str,
+    user_instruction: str,
+    md_text: str,
+    layout_text: str,
+    image_size: Optional[Tuple[int, int]],
+) -> Dict[str, Any]:
+    """
+    按 Prompt 组成部分分别估算 token 数
+
+    Returns:
+        {"system_prompt", "user_instruction", "markdown", "layout_json", "image", "total"}
+    """
+    parts = {
+        "system_prompt": estimate_text_tokens(system_prompt),
+        "user_instruction": estimate_text_tokens(user_instruction),
+        "markdown": estimate_text_tokens(md_text),
+        "layout_json": estimate_text_tokens(layout_text),
+        "image": estimate_image_tokens(image_size),
+    }
+    parts["total"] = sum(parts.values())
+    return parts
+
+
+def estimate_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """估算 OpenAI 格式 messages 的总 token 数（图片尺寸未知时按 IMAGE_UNKNOWN_TOKENS 计）"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_text_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                total += estimate_text_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                total += IMAGE_UNKNOWN_TOKENS
+    return total
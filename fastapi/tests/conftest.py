@@ -0,0 +1,69 @@
+"""
+测试公共配置
+
+测试从 fastapi/ 目录运行：python -m pytest -q
+"""
+
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def stub_llm():
+    """在后台线程启动 scripts/stub_llm_server.py，返回 (模块, chat/completions URL)"""
+    uvicorn = pytest.importorskip("uvicorn")
+    from scripts import stub_llm_server
+
+    saved_config = dict(stub_llm_server.config)
+    stub_llm_server.state.update({"requests": 0, "failed": 0, "cached_requests": 0, "seen_prefixes": set(), "by_model": {}})
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(stub_llm_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("stub LLM server 启动超时")
+        time.sleep(0.05)
+    try:
+        yield stub_llm_server, f"http://127.0.0.1:{port}/api/v1/chat/completions"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        stub_llm_server.config.clear()
+        stub_llm_server.config.update(saved_config)
+
+
+@pytest.fixture
+def main_module(stub_llm, monkeypatch):
+    """指向本地桩服务的 main 模块（LLM 响应缓存使用临时目录）"""
+    pytest.importorskip("fastapi")
+    import main
+    from scripts.llm_cache import LLMCache
+    from scripts.prompt_registry import prompt_registry
+
+    _, url = stub_llm
+    monkeypatch.setattr(main, "OPENROUTER_API_URL", url)
+    monkeypatch.setattr(main, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(prompt_registry, "stats", {key: 0 for key in prompt_registry.stats})
+    cache_dir = Path(tempfile.mkdtemp(prefix="llm-cache-"))
+    monkeypatch.setattr(main, "llm_cache", LLMCache(cache_dir, ttl_seconds=3600, max_bytes=10 * 1024 * 1024))
+    yield main
+    shutil.rmtree(cache_dir, ignore_errors=True)
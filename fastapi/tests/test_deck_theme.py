@@ -0,0 +1,29 @@
+"""共享主题模式下 generate_cleaned_html 的转换前校验测试"""
+
+import asyncio
+
+from scripts.deck_theme import theme_css, theme_instruction
+
+THEME = {
+    "background": "#ffffff", "text": "#222222", "muted": "#666666", "accent": "#c0392b",
+    "font_family": "Arial, sans-serif", "title_size": 32, "body_size": 18,
+}
+
+# 共享主题模式下 LLM 只输出页面特有的样式，不重复 body 尺寸
+THEMED_HTML = "<html><head><style>.card{padding:12pt;}</style></head><body><h1>Title</h1><p>Body</p></body></html>"
+
+
+def test_theme_body_size_visible_to_validator(main_module, monkeypatch):
+    async def fake_llm(messages, model, x_title, **kwargs):
+        return {"content": THEMED_HTML, "usage": {}, "cache_hit": False, "cacheable": True}
+
+    monkeypatch.setattr(main_module, "call_llm_for_html", fake_llm)
+    css = theme_css(THEME)
+    result = asyncio.run(main_module.generate_cleaned_html(
+        "system prompt", "# Title", {"pdf_info": []}, "openai/gpt-4o", "test", "image-hash",
+        image_url="https://example.com/slide.png", extra_instruction=theme_instruction(css), deck_theme_css=css,
+    ))
+
+    assert result["validation"]["valid"]
+    assert result["validation"]["fixes"] == []
+    assert "data-deck-theme" in result["html"]
@@ -0,0 +1,87 @@
+"""scripts/image_ingest.py 类型检查与直传对象下载测试"""
+
+import asyncio
+import io
+import uuid
+
+import pytest
+from PIL import Image
+
+from scripts.image_ingest import ImageIngestError, check_image_file, sniff_image_type
+
+
+def _png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(_png_bytes()[:16]) == (".png", "image/png")
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == (".webp", "image/webp")
+    assert sniff_image_type(b"<!DOCTYPE html>\n") is None
+
+
+def test_check_image_file(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(_png_bytes())
+    assert check_image_file(image) == (".png", "image/png")
+
+    script = tmp_path / "b.png"
+    script.write_bytes(b"#!/bin/sh\necho not an image\n")
+    with pytest.raises(ImageIngestError) as excinfo:
+        check_image_file(script)
+    assert excinfo.value.status_code == 415
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    pytest.importorskip("fastapi")
+    import main
+    from scripts import r2_upload
+
+    monkeypatch.setattr(r2_upload, "R2_ENDPOINT", "https://s3.amazonaws.com")
+    monkeypatch.setattr(r2_upload, "R2_ACCESS_KEY_ID", "test")
+    monkeypatch.setattr(r2_upload, "R2_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(main.image_precomputer, "enabled", False)
+    with moto.mock_aws():
+        r2_upload.reset_r2_client()
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=r2_upload.R2_BUCKET_NAME)
+        yield main, client
+    r2_upload.reset_r2_client()
+    test_dir = main.INPUT_DIR / "2000-01-01"
+    if test_dir.is_dir() and not any(test_dir.iterdir()):
+        test_dir.rmdir()
+
+
+def _put(main, client, body: bytes) -> str:
+    from scripts import r2_upload
+
+    object_key = f"input/2000-01-01/{uuid.uuid4()}.png"
+    client.put_object(Bucket=r2_upload.R2_BUCKET_NAME, Key=object_key, Body=body)
+    return object_key
+
+
+def test_fetch_input_object_accepts_image(bucket):
+    main, client = bucket
+    object_key = _put(main, client, _png_bytes())
+    path = asyncio.run(main.fetch_input_object(object_key))
+    try:
+        assert path == main.BASE_DIR / object_key
+        assert path.read_bytes() == _png_bytes()
+    finally:
+        path.unlink()
+
+
+def test_fetch_input_object_rejects_non_image(bucket):
+    main, client = bucket
+    object_key = _put(main, client, b"<html><script>alert(1)</script></html>")
+    with pytest.raises(ImageIngestError) as excinfo:
+        asyncio.run(main.fetch_input_object(object_key))
+    assert excinfo.value.status_code == 415
+    target = main.BASE_DIR / object_key
+    assert not target.exists()
+    assert list(target.parent.glob(f".{target.name}*")) == []
@@ -0,0 +1,79 @@
+"""scripts/llm_cache.py 缓存键与 generate_cleaned_html 缓存命中路径测试"""
+
+import asyncio
+
+import pytest
+
+from scripts.llm_cache import make_cache_key
+
+LAYOUT = {"pdf_info": [{"para_blocks": [{"type": "title", "lines": []}]}]}
+
+
+def _key(**settings):
+    return make_cache_key("m", 0.7, "system", "# md", LAYOUT, "hash", settings=settings)
+
+
+def test_cache_key_includes_settings():
+    base = _key(max_tokens=16000, image_profile={"max_side": 2048, "format": "jpeg", "quality": 85})
+    assert base == _key(image_profile={"quality": 85, "format": "jpeg", "max_side": 2048}, max_tokens=16000)
+    assert base != _key(max_tokens=8000, image_profile={"max_side": 2048, "format": "jpeg", "quality": 85})
+    assert base != _key(max_tokens=16000, image_profile={"max_side": 1568, "format": "jpeg", "quality": 85})
+    assert base != _key(max_tokens=16000, image_profile={"max_side": 2048, "format": "webp", "quality": 85})
+    assert base != _key(max_tokens=16000, image_profile={"max_side": 2048, "format": "jpeg", "quality": 70})
+
+
+def _generate(main):
+    return asyncio.run(main.generate_cleaned_html(
+        "system prompt", "# Title", LAYOUT, "openai/gpt-4o", "test", "image-hash",
+        image_url="https://example.com/slide.png", reject_invalid=False,
+    ))
+
+
+@pytest.fixture
+def counted_prepare(main_module, monkeypatch):
+    """统计 prepare_slide_prompt 调用次数，并关闭规则生成路由"""
+    calls = []
+    original = main_module.prepare_slide_prompt
+
+    def prepare(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(main_module, "prepare_slide_prompt", prepare)
+    monkeypatch.setattr(main_module.slide_router, "enabled", False)
+    return calls
+
+
+def test_cache_hit_skips_prompt_preparation(main_module, counted_prepare, stub_llm):
+    stub, _ = stub_llm
+    first = _generate(main_module)
+    second = _generate(main_module)
+
+    assert not first["llm_cache_hit"] and second["llm_cache_hit"]
+    assert second["html"] == first["html"]
+    assert second["token_report"] is None
+    assert len(counted_prepare) == 1
+    assert stub.state["requests"] == 1
+
+
+def test_changed_max_tokens_misses_cache(main_module, counted_prepare, monkeypatch, stub_llm):
+    stub, _ = stub_llm
+    _generate(main_module)
+    monkeypatch.setattr(main_module, "LLM_MAX_TOKENS", main_module.LLM_MAX_TOKENS // 2)
+    result = _generate(main_module)
+
+    assert not result["llm_cache_hit"]
+    assert stub.state["requests"] == 2
+
+
+def test_invalid_html_not_cached(main_module, counted_prepare, monkeypatch, stub_llm):
+    stub, _ = stub_llm
+    check = main_module.html_validator.check
+    monkeypatch.setattr(main_module.html_validator, "check", lambda html, label="": {**check(html, label=label), "valid": False})
+    _generate(main_module)
+    monkeypatch.setattr(main_module.html_validator, "check", check)
+    result = _generate(main_module)
+
+    assert not result["llm_cache_hit"]
+    assert stub.state["requests"] == 2
+    assert _generate(main_module)["llm_cache_hit"]
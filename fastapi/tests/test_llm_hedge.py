@@ -0,0 +1,65 @@
+"""scripts/llm_hedge.py 回退条件测试"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from scripts.llm_hedge import HedgePolicy, is_fallback_error
+
+
+class _StatusError(Exception):
+    """模拟 main.py send 抛出的 HTTPException"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _policy() -> HedgePolicy:
+    return HedgePolicy(["backup"], percentile=95, min_samples=20, default_delay=30, min_delay=5, max_hedges=1)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_StatusError(429), True),
+    (_StatusError(502), True),
+    (_StatusError(500), True),
+    (asyncio.TimeoutError(), True),
+    (httpx.ReadTimeout("timeout"), True),
+    (_StatusError(400), False),
+    (_StatusError(401), False),
+    (ValueError("bad response"), False),
+])
+def test_is_fallback_error(error, expected):
+    assert is_fallback_error(error) is expected
+
+
+def test_falls_back_on_retryable_error():
+    calls = []
+
+    async def send(model):
+        calls.append(model)
+        if model == "primary":
+            raise _StatusError(503)
+        return {"model": model}
+
+    policy = _policy()
+    result, info = asyncio.run(policy.run(send, "primary"))
+    assert result == {"model": "backup"}
+    assert calls == ["primary", "backup"]
+    assert info["fallbacks_fired"] == 1
+
+
+def test_raises_non_retryable_error_without_fallback():
+    calls = []
+
+    async def send(model):
+        calls.append(model)
+        raise _StatusError(400)
+
+    policy = _policy()
+    with pytest.raises(_StatusError):
+        asyncio.run(policy.run(send, "primary"))
+    assert calls == ["primary"]
+    assert policy.stats["fallbacks_fired"] == 0
+    assert policy.stats["not_retryable"] == 1
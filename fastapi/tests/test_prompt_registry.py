@@ -0,0 +1,123 @@
+"""scripts/prompt_registry.py 与 main.call_llm_for_html 续写逻辑测试"""
+
+import asyncio
+import os
+
+import pytest
+
+from scripts.prompt_registry import PromptRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return PromptRegistry(tmp_path, check_interval=0, cache_control=True)
+
+
+def test_get_reloads_when_mtime_changes(registry, tmp_path):
+    prompt = tmp_path / "system_prompt.md"
+    prompt.write_text("  v1  \n", encoding="utf-8")
+    assert registry.get("system_prompt.md") == "v1"
+    assert registry.get("system_prompt.md") == "v1"
+    assert registry.stats["loads"] == 1
+    assert registry.stats["hits"] == 1
+
+    prompt.write_text("v2", encoding="utf-8")
+    stat = prompt.stat()
+    os.utime(prompt, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert registry.get("system_prompt.md") == "v2"
+    assert registry.stats["reloads"] == 1
+    assert registry.stats["loads"] == 2
+
+
+def test_get_respects_check_interval(tmp_path):
+    registry = PromptRegistry(tmp_path, check_interval=3600, cache_control=True)
+    prompt = tmp_path / "system_prompt.md"
+    prompt.write_text("v1", encoding="utf-8")
+    assert registry.get("system_prompt.md") == "v1"
+
+    prompt.write_text("v2", encoding="utf-8")
+    stat = prompt.stat()
+    os.utime(prompt, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    # 检查间隔内不读取 mtime
+    assert registry.get("system_prompt.md") == "v1"
+
+
+def test_get_missing_file_returns_default(registry):
+    assert registry.get("missing.md", default="fallback") == "fallback"
+    assert registry.stats["loads"] == 0
+
+
+def test_system_message_cache_control_for_marked_models(registry):
+    message = registry.system_message("SYSTEM", model="anthropic/claude-sonnet-4")
+    assert message["role"] == "system"
+    assert message["content"] == [{"type": "text", "text": "SYSTEM", "cache_control": {"type": "ephemeral"}}]
+    # 同一提示词复用同一个消息对象
+    assert registry.system_message("SYSTEM", model="anthropic/claude-sonnet-4") is message
+
+
+def test_system_message_plain_for_other_models(registry, tmp_path):
+    assert registry.system_message("SYSTEM", model="openai/gpt-4o")["content"] == "SYSTEM"
+    assert registry.system_message("SYSTEM", model=None)["content"] == "SYSTEM"
+
+    disabled = PromptRegistry(tmp_path, check_interval=0, cache_control=False)
+    assert disabled.system_message("SYSTEM", model="anthropic/claude-sonnet-4")["content"] == "SYSTEM"
+
+
+def test_record_usage_counts_cached_tokens(registry):
+    registry.record_usage({"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 800}})
+    registry.record_usage({"prompt_tokens": 500, "prompt_tokens_details": None})
+    registry.record_usage({"prompt_tokens": 200})
+
+    stats = registry.get_stats()
+    assert stats["llm_requests"] == 3
+    assert stats["llm_cached_requests"] == 1
+    assert stats["prompt_tokens"] == 1700
+    assert stats["cached_prompt_tokens"] == 800
+    assert stats["cached_token_ratio"] == round(800 / 1700, 3)
+
+
+def _messages(main, model):
+    from scripts.prompt_registry import prompt_registry
+
+    return [
+        prompt_registry.system_message("You convert slides to HTML. " * 50, model=model),
+        {"role": "user", "content": "Convert this slide."},
+    ]
+
+
+def test_cached_tokens_recorded_from_stub(main_module, stub_llm):
+    from scripts.prompt_registry import prompt_registry
+
+    model = "anthropic/claude-sonnet-4"
+    for _ in range(2):
+        asyncio.run(main_module.call_llm_for_html(_messages(main_module, model), model, "test", cache_key=None))
+
+    stats = prompt_registry.get_stats()
+    assert stats["llm_requests"] == 2
+    assert stats["llm_cached_requests"] == 1
+    assert stats["cached_prompt_tokens"] > 0
+
+
+def test_continuation_completes_truncated_output(main_module, stub_llm, monkeypatch):
+    stub, _ = stub_llm
+    stub.config["truncate_rounds"] = 2
+    monkeypatch.setattr(main_module, "LLM_MAX_CONTINUATIONS", 2)
+
+    result = asyncio.run(main_module.call_llm_for_html(_messages(main_module, "openai/gpt-4o"), "openai/gpt-4o", "test"))
+
+    assert result["usage"]["continuation"] == {"rounds": 2, "completed": True, "max_rounds": 2}
+    assert main_module.clean_html_from_markdown_code_block(result["content"]) == \
+        main_module.clean_html_from_markdown_code_block(stub.STUB_HTML)
+    assert stub.state["requests"] == 3
+
+
+def test_continuation_gives_up_after_max_rounds(main_module, stub_llm, monkeypatch):
+    stub, _ = stub_llm
+    stub.config["truncate_rounds"] = 3
+    monkeypatch.setattr(main_module, "LLM_MAX_CONTINUATIONS", 1)
+
+    result = asyncio.run(main_module.call_llm_for_html(_messages(main_module, "openai/gpt-4o"), "openai/gpt-4o", "test"))
+
+    assert result["usage"]["continuation"] == {"rounds": 1, "completed": False, "max_rounds": 1}
+    assert not main_module.is_html_complete(result["content"])
+    assert stub.state["requests"] == 2
@@ -0,0 +1,147 @@
+"""scripts/r2_upload.py 测试（moto 模拟 S3）"""
+
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+from boto3.s3.transfer import TransferConfig
+
+from scripts import r2_upload
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def r2(monkeypatch):
+    """moto 模拟的 bucket；每个用例使用新的客户端和统计"""
+    monkeypatch.setattr(r2_upload, "R2_ENDPOINT", "https://s3.amazonaws.com")
+    monkeypatch.setattr(r2_upload, "R2_ACCESS_KEY_ID", "test")
+    monkeypatch.setattr(r2_upload, "R2_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(r2_upload, "R2_PUBLIC_URL", "https://cdn.example.com")
+    monkeypatch.setattr(r2_upload, "_upload_stats", {key: 0 for key in r2_upload._upload_stats})
+    with moto.mock_aws():
+        r2_upload.reset_r2_client()
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=r2_upload.R2_BUCKET_NAME)
+        yield r2_upload
+    r2_upload.reset_r2_client()
+
+
+def _write(path, size):
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def test_client_is_singleton_until_reset(r2):
+    client = r2.get_r2_client()
+    assert r2.get_r2_client() is client
+    r2.reset_r2_client()
+    assert r2.get_r2_client() is not client
+
+
+def test_client_requires_config(r2, monkeypatch):
+    r2.reset_r2_client()
+    monkeypatch.setattr(r2, "R2_SECRET_ACCESS_KEY", None)
+    with pytest.raises(ValueError):
+        r2.get_r2_client()
+
+
+def test_upload_below_threshold_is_single_put(r2, tmp_path):
+    path = _write(tmp_path / "small.png", 1024)
+    url = r2.upload_file_to_r2(path, "images/small.png")
+
+    assert url == "https://cdn.example.com/images/small.png"
+    head = r2.get_r2_client().head_object(Bucket=r2.R2_BUCKET_NAME, Key="images/small.png")
+    assert head["ContentType"] == "image/png"
+    assert "-" not in head["ETag"]
+    stats = r2.get_upload_stats()
+    assert stats["uploads"] == 1
+    assert stats["multipart_uploads"] == 0
+    assert stats["bytes"] == 1024
+
+
+def test_upload_above_threshold_is_multipart(r2, tmp_path, monkeypatch):
+    monkeypatch.setattr(r2, "_transfer_config", TransferConfig(
+        multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=2,
+    ))
+    path = _write(tmp_path / "large.pptx", 11 * MB)
+    r2.upload_file_to_r2(path, "pptx/large.pptx")
+
+    head = r2.get_r2_client().head_object(Bucket=r2.R2_BUCKET_NAME, Key="pptx/large.pptx")
+    # 分片上传的 ETag 形如 "<md5>-<分片数>"
+    assert head["ETag"].strip('"').endswith("-3")
+    assert head["ContentLength"] == 11 * MB
+    assert r2.get_upload_stats()["multipart_uploads"] == 1
+
+
+def test_skip_if_exists_heads_before_put(r2, tmp_path, monkeypatch):
+    path = _write(tmp_path / "a.pptx", 2048)
+    r2.upload_file_to_r2(path, "pptx/sha256/a.pptx", skip_if_exists=True)
+
+    client = r2.get_r2_client()
+    calls = []
+    original = client.upload_file
+    monkeypatch.setattr(client, "upload_file", lambda *a, **kw: calls.append(a) or original(*a, **kw))
+    r2.upload_file_to_r2(path, "pptx/sha256/a.pptx", skip_if_exists=True)
+
+    assert calls == []
+    stats = r2.get_upload_stats()
+    assert stats["uploads"] == 1
+    assert stats["dedup_hits"] == 1
+    assert stats["bytes_skipped"] == 2048
+
+
+def test_content_addressed_pptx_uses_per_download_filename(r2, tmp_path, monkeypatch):
+    pptx = pytest.importorskip("pptx")
+    monkeypatch.setattr(r2, "R2_CONTENT_ADDRESSED", True)
+    first, second = tmp_path / "第一份.pptx", tmp_path / "second.pptx"
+    pptx.Presentation().save(first)
+    r2.pptx_optimizer.optimize(first)
+    second.write_bytes(first.read_bytes())
+
+    url1 = r2.upload_pptx_to_r2(first, "2025-01-01", "uuid-1")
+    url2 = r2.upload_pptx_to_r2(second, "2025-01-01", "uuid-2")
+
+    listing = r2.get_r2_client().list_objects_v2(Bucket=r2.R2_BUCKET_NAME, Prefix="pptx/")
+    keys = [obj["Key"] for obj in listing["Contents"]]
+    assert len(keys) == 1 and keys[0].startswith("pptx/sha256/")
+    key = keys[0]
+    assert urlparse(url1).path.endswith(key) and urlparse(url2).path.endswith(key)
+    assert r2.get_upload_stats()["dedup_hits"] == 1
+    # 对象本身不带下载文件名，文件名由各自的下载链接指定
+    head = r2.get_r2_client().head_object(Bucket=r2.R2_BUCKET_NAME, Key=key)
+    assert "ContentDisposition" not in head
+    assert parse_qs(urlparse(url1).query)["response-content-disposition"] == [
+        "attachment; filename*=UTF-8''%E7%AC%AC%E4%B8%80%E4%BB%BD.pptx"
+    ]
+    assert parse_qs(urlparse(url2).query)["response-content-disposition"] == [
+        "attachment; filename*=UTF-8''second.pptx"
+    ]
+
+
+def test_download_round_trip(r2, tmp_path):
+    source = _write(tmp_path / "src.jpg", 4096)
+    r2.upload_file_to_r2(source, "inputs/x.jpg")
+
+    target = tmp_path / "out" / "x.jpg"
+    assert r2.download_file_from_r2("inputs/x.jpg", target) == target
+    assert target.read_bytes() == source.read_bytes()
+    assert sorted(p.name for p in target.parent.iterdir()) == ["x.jpg"]
+    stats = r2.get_upload_stats()
+    assert stats["downloads"] == 1
+    assert stats["download_bytes"] == 4096
+
+
+def test_download_enforces_max_bytes(r2, tmp_path):
+    r2.upload_file_to_r2(_write(tmp_path / "big.jpg", 4096), "inputs/big.jpg")
+    target = tmp_path / "out" / "big.jpg"
+    with pytest.raises(ValueError):
+        r2.download_file_from_r2("inputs/big.jpg", target, max_bytes=1024)
+    assert not target.exists()
+
+
+def test_download_missing_object(r2, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        r2.download_file_from_r2("inputs/missing.jpg", tmp_path / "missing.jpg")
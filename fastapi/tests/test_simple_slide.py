@@ -0,0 +1,36 @@
+"""scripts/simple_slide.py 路由测试"""
+
+from scripts.simple_slide import SlideRouter, classify_slide, render_simple_slide
+
+
+def _block(block_type, bbox, text):
+    return {"type": block_type, "bbox": bbox, "lines": [{"bbox": bbox, "spans": [{"type": "text", "content": text}]}]}
+
+
+def _layout(discarded):
+    return {"pdf_info": [{
+        "page_size": [720, 405],
+        "para_blocks": [
+            _block("title", [36, 36, 684, 76], "Quarterly Review"),
+            _block("text", [36, 108, 684, 128], "Revenue grew in every region."),
+        ],
+        "discarded_blocks": discarded,
+    }]}
+
+
+def test_page_number_slide_routes_to_rule():
+    layout = _layout([_block("page_number", [660, 370, 684, 382], "7")])
+    assert classify_slide(layout)["reason"] == "simple"
+    assert SlideRouter().route(layout)["path"] == "rule"
+
+    result = render_simple_slide(layout)
+    assert result["errors"] == []
+    assert ">7<" in result["html"]
+
+
+def test_header_and_footer_are_simple():
+    layout = _layout([
+        _block("header", [36, 8, 300, 20], "ACME Corp"),
+        _block("footer", [36, 385, 300, 397], "Confidential"),
+    ])
+    assert classify_slide(layout)["simple"]
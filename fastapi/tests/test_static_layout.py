@@ -0,0 +1,118 @@
+"""
+scripts/static_layout.py 测试
+
+fixtures/slides/ 下的样例页分别用静态布局和 html2pptx.js 的 extractSlideData（Chromium）提取 slideData 并对比；
+未安装 Node 依赖或 Chromium 时只运行静态布局部分
+"""
+
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from scripts.static_layout import StaticLayoutUnsupported, extract_slide_data
+
+FIXTURES = Path(__file__).parent / "fixtures" / "slides"
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+SLIDES = sorted(FIXTURES.glob("*.html"))
+POSITION_TOLERANCE = 0.02   # 英寸
+
+
+def _static(path: Path) -> dict:
+    return extract_slide_data(path.read_text(encoding="utf-8"), path.parent)
+
+
+def _text(element: dict) -> str:
+    value = element.get("text", element.get("items"))
+    if isinstance(value, list):
+        return "".join(run["text"] for run in value)
+    return value or ""
+
+
+def _summary(element: dict) -> dict:
+    """对比用的字段：类型、文本、字号、颜色、加粗、填充和边框"""
+    style = element.get("style", {})
+    shape = element.get("shape") or {}
+    return {
+        "type": element["type"],
+        "text": _text(element),
+        "fontSize": round(style["fontSize"], 1) if "fontSize" in style else None,
+        "color": style.get("color"),
+        "bold": style.get("bold"),
+        "fill": shape.get("fill"),
+        "line": shape.get("line"),
+    }
+
+
+def test_title_text_positions():
+    data = _static(FIXTURES / "title_text.html")
+    assert data["background"] == {"type": "color", "value": "ffffff"}
+    assert data["errors"] == []
+    title, body = data["elements"]
+    assert title["type"] == "h1" and title["text"] == "Quarterly Review"
+    assert title["position"] == pytest.approx({"x": 0.5, "y": 0.5, "w": 9.0, "h": 40 / 72})
+    assert title["style"]["bold"] is True and title["style"]["color"] == "1f3864"
+    assert body["position"] == pytest.approx({"x": 0.5, "y": 1.5, "w": 9.0, "h": 24 / 72})
+    assert body["style"]["fontSize"] == pytest.approx(16)
+
+
+def test_bullet_list_items():
+    data = _static(FIXTURES / "bullets.html")
+    heading, bullets = data["elements"]
+    assert heading["type"] == "h2"
+    assert bullets["type"] == "list"
+    assert [item["text"] for item in bullets["items"]] == ["Results", "Roadmap", "Questions"]
+    assert [item["options"]["breakLine"] for item in bullets["items"]] == [True, True, False]
+    assert all("bullet" in item["options"] for item in bullets["items"])
+    assert bullets["position"]["h"] == pytest.approx(3 * 27 / 72)
+
+
+def test_shapes_and_inline_runs():
+    data = _static(FIXTURES / "shapes.html")
+    card, card_text, accent, accent_text = data["elements"]
+    assert card["type"] == "shape" and card["shape"]["fill"] == "dbe8f5"
+    assert card["shape"]["line"]["color"] == "2f5597"
+    assert accent["shape"]["line"] is None
+    assert card_text["text"] == [
+        {"text": "Plan ", "options": {}},
+        {"text": "A", "options": {"bold": True, "color": "1f1f1f", "fontSize": 18.0}},
+    ]
+    assert accent_text["text"] == "Plan B"
+    # 文本位于卡片内部
+    assert card["position"]["x"] < card_text["position"]["x"] < card["position"]["x"] + card["position"]["w"]
+
+
+def test_unsupported_page_raises():
+    with pytest.raises(StaticLayoutUnsupported):
+        extract_slide_data("<p>no document</p>", FIXTURES)
+
+
+@pytest.fixture(scope="module")
+def browser_slide_data():
+    """用 scripts/extract-slide-data.js 提取全部样例页；缺少 Node 依赖或 Chromium 时跳过"""
+    if shutil.which("node") is None:
+        pytest.skip("未安装 Node.js")
+    if not (SCRIPTS_DIR / "node_modules" / "playwright").exists():
+        pytest.skip("未安装 Node 依赖（cd scripts && npm install）")
+    process = subprocess.run(
+        ["node", str(SCRIPTS_DIR / "extract-slide-data.js"), *map(str, SLIDES)],
+        capture_output=True, text=True, encoding="utf-8", cwd=str(SCRIPTS_DIR), timeout=180,
+    )
+    if process.returncode != 0 and "Executable doesn't exist" in process.stderr:
+        pytest.skip("未安装 Chromium（npx playwright install chromium）")
+    assert process.returncode == 0, process.stderr[-1000:]
+    return {Path(item["file"]).name: item["slideData"] for item in json.loads(process.stdout)}
+
+
+@pytest.mark.parametrize("slide", SLIDES, ids=lambda p: p.stem)
+def test_matches_html2pptx(slide, browser_slide_data):
+    expected = browser_slide_data[slide.name]
+    actual = _static(slide)
+
+    assert actual["background"] == expected["background"]
+    assert actual["errors"] == expected["errors"]
+    assert [_summary(e) for e in actual["elements"]] == [_summary(e) for e in expected["elements"]]
+    for ours, theirs in zip(actual["elements"], expected["elements"]):
+        assert ours["position"] == pytest.approx(theirs["position"], abs=POSITION_TOLERANCE), _text(theirs)